@@ -24,6 +24,8 @@ class UserAdmin(BaseUserAdmin):
     ]
     search_fields = ['email', 'first_name', 'last_name', 'telephone']
     ordering = ['-date_joined']
+    # Un utilisateur référencé par le grand livre ne peut pas être supprimé
+    actions = ['anonymiser_utilisateurs']
     
     fieldsets = (
         ('Informations de base', {
@@ -68,6 +70,14 @@ class UserAdmin(BaseUserAdmin):
                 '<span style="color: red;">●</span> Inactif'
             )
     colored_status.short_description = 'Statut'
+    
+    def anonymiser_utilisateurs(self, request, queryset):
+        """Anonymiser les utilisateurs (alternative à la suppression)."""
+        utilisateurs = list(queryset)
+        for utilisateur in utilisateurs:
+            utilisateur.anonymiser()
+        self.message_user(request, f"{len(utilisateurs)} utilisateur(s) anonymisé(s).")
+    anonymiser_utilisateurs.short_description = "🕶️ Anonymiser"
 
 
 class AvailabilityInline(admin.TabularInline):
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:27
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def remplir_sommes_notes(apps, schema_editor):
+    """Initialise somme, nombre et moyenne des notes depuis les avis visibles."""
+    ProviderProfile = apps.get_model('accounts', 'ProviderProfile')
+    NoteAvis = apps.get_model('reviews', 'NoteAvis')
+    avis = NoteAvis.objects.filter(
+        destinataire_id=OuterRef('user_id'),
+        type_avis='client_prestataire',
+        est_visible=True,
+    ).values('destinataire_id').order_by()
+
+    def agregat(fonction):
+        return Subquery(avis.annotate(valeur=fonction).values('valeur'))
+
+    ProviderProfile.objects.update(
+        rating_sum=Coalesce(agregat(Sum('note')), 0),
+        total_reviews=Coalesce(agregat(Count('pk')), 0),
+        average_rating=Coalesce(
+            Round(agregat(Avg('note')), 2), Value(0),
+            output_field=models.DecimalField(max_digits=3, decimal_places=2)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='providerprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, help_text='Somme des notes des avis visibles, pour le calcul incrémental de la moyenne', verbose_name='Somme des notes'),
+        ),
+        migrations.RunPython(remplir_sommes_notes, migrations.RunPython.noop),
+    ]
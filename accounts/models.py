@@ -7,10 +7,13 @@ géolocalisation et données spécifiques.
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast, Greatest, Round
 # from django.contrib.gis.geos import Point  # Commenté pour dev
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from PIL import Image
+from tabali_platform.utils.cache import incrementer_version
 import uuid
 
 
@@ -98,6 +101,24 @@ class User(AbstractUser):
         self.latitude = latitude
         self.longitude = longitude
         self.save()
+    
+    def anonymiser(self):
+        """
+        Efface les données personnelles et désactive le compte.
+        
+        Remplace la suppression d'un utilisateur que le grand livre référence
+        (``billing.MouvementFinancier``, ``on_delete=PROTECT``) : la ligne est
+        conservée pour que les écritures restent rattachées à un compte.
+        """
+        self.email = f"anonyme-{self.pk}@anonyme.invalid"
+        self.username = f"anonyme-{self.pk}"
+        self.first_name = self.last_name = ''
+        self.telephone = self.address = self.city = self.postal_code = ''
+        self.latitude = self.longitude = None
+        self.verification_token = ''
+        self.is_active = False
+        self.set_unusable_password()
+        self.save()
 
 
 class ClientProfile(models.Model):
@@ -202,6 +223,11 @@ class ProviderProfile(models.Model):
         help_text=_('Note moyenne basée sur les avis clients')
     )
     total_reviews = models.PositiveIntegerField(_('Nombre d\'avis'), default=0)
+    rating_sum = models.PositiveIntegerField(
+        _('Somme des notes'),
+        default=0,
+        help_text=_('Somme des notes des avis visibles, pour le calcul incrémental de la moyenne')
+    )
     
     # Métadonnées
     created_at = models.DateTimeField(_('Date de création'), auto_now_add=True)
@@ -243,10 +269,79 @@ class ProviderProfile(models.Model):
     
     def update_rating(self, new_rating):
         """Met à jour la note moyenne après un nouvel avis."""
-        total_points = self.average_rating * self.total_reviews + new_rating
-        self.total_reviews += 1
-        self.average_rating = total_points / self.total_reviews
-        self.save()
+        self.ajuster_notes(self.user_id, somme=new_rating, nombre=1)
+        self.refresh_from_db(fields=['rating_sum', 'total_reviews', 'average_rating'])
+    
+    @classmethod
+    def ajuster_notes(cls, user_id, somme=0, nombre=0):
+        """
+        Applique une variation à la somme et au nombre des notes d'un prestataire.
+        
+        Une seule requête UPDATE, sans lecture préalable : la moyenne est
+        recalculée à partir des anciennes valeurs des colonnes dans le même
+        ordre SQL, ce qui reste correct sous accès concurrents.
+        
+        Returns:
+            int: 1 si le profil existe (l'utilisateur est prestataire), sinon 0
+        """
+        if not somme and not nombre:
+            return 0
+        # UPDATE sans signal : les réponses en cache qui affichent les notes sont invalidées ici
+        incrementer_version(cls)
+        return cls.objects.filter(user_id=user_id).update(
+            rating_sum=Greatest(F('rating_sum') + somme, 0),
+            total_reviews=Greatest(F('total_reviews') + nombre, 0),
+            average_rating=Case(
+                When(
+                    total_reviews__gt=-nombre,
+                    then=Round(
+                        Cast(F('rating_sum') + somme, FloatField()) /
+                        Cast(F('total_reviews') + nombre, FloatField()),
+                        2
+                    )
+                ),
+                default=Value(0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2)
+            )
+        )
+    
+    @classmethod
+    def recalculer_notes(cls, queryset=None):
+        """
+        Recalcule depuis les avis la somme, le nombre et la moyenne des notes
+        (réparation d'une dérive, par exemple après une suppression en cascade).
+        
+        Returns:
+            int: nombre de profils corrigés
+        """
+        from django.db.models import Avg, Count, OuterRef, Q, Subquery, Sum
+        from django.db.models.functions import Coalesce
+        from reviews.models import NoteAvis
+        
+        avis = NoteAvis.objects.filter(
+            destinataire_id=OuterRef('user_id'),
+            type_avis=NoteAvis.TypeAvis.CLIENT_VERS_PRESTATAIRE,
+            est_visible=True
+        ).values('destinataire_id').order_by()
+        
+        def agregat(fonction):
+            return Subquery(avis.annotate(valeur=fonction).values('valeur'))
+        
+        somme = Coalesce(agregat(Sum('note')), 0)
+        nombre = Coalesce(agregat(Count('pk')), 0)
+        queryset = queryset if queryset is not None else cls.objects.all()
+        derives = queryset.annotate(somme_reelle=somme, nombre_reel=nombre).filter(
+            ~Q(rating_sum=F('somme_reelle')) | ~Q(total_reviews=F('nombre_reel'))
+        )
+        incrementer_version(cls)
+        return cls.objects.filter(pk__in=derives.values('pk')).update(
+            rating_sum=somme,
+            total_reviews=nombre,
+            average_rating=Coalesce(
+                Round(agregat(Avg('note')), 2), Value(0),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2)
+            )
+        )
 
 
 class Availability(models.Model):
@@ -211,13 +211,17 @@ class ProviderProfileSerializer(serializers.ModelSerializer):
         read_only=True,
         label="Note moyenne"
     )
+    repartition_notes = serializers.SerializerMethodField(
+        label="Répartition des notes",
+        help_text="Nombre d'avis par note et nombre d'avis avec réponse"
+    )
     
     class Meta:
         model = ProviderProfile
         fields = [
             'id', 'user', 'user_details', 'company_name', 'siret', 'description',
             'hourly_rate', 'service_radius', 'is_available', 'is_verified',
-            'average_rating', 'rating_display', 'total_jobs', 'services_count'
+            'average_rating', 'rating_display', 'repartition_notes', 'total_jobs', 'services_count'
         ]
         extra_kwargs = {
             'company_name': {'label': 'Nom de l\'entreprise'},
@@ -235,6 +239,16 @@ class ProviderProfileSerializer(serializers.ModelSerializer):
             'total_jobs': {'label': 'Nombre d\'interventions', 'read_only': True}
         }
 
+    def get_repartition_notes(self, obj):
+        """Répartition des notes reçues (à précharger avec ``user__repartition_notes``)."""
+        from reviews.models import RepartitionNotes
+        
+        try:
+            repartition = obj.user.repartition_notes
+        except RepartitionNotes.DoesNotExist:
+            repartition = RepartitionNotes(utilisateur_id=obj.user_id)
+        return repartition.statistiques
+    
     def get_services_count(self, obj):
         """Retourne le nombre de services du prestataire."""
         return getattr(obj, 'providerservice_set', []).count() if hasattr(obj, 'providerservice_set') else 0 
\ No newline at end of file
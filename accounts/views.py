@@ -21,7 +21,10 @@ from .serializers import (
     ChangePasswordSerializer, ClientProfileSerializer, ProviderProfileSerializer
 )
 from .models import ClientProfile, ProviderProfile
-from django.db import models
+from historiques.detection import ConnexionSuspecteThrottle, adresse_client
+from historiques.models import Historique
+from django.db import models, transaction
+from django.db.models import ProtectedError
 
 User = get_user_model()
 
@@ -38,6 +41,8 @@ User = get_user_model()
 )
 class CustomTokenObtainPairView(TokenObtainPairView):
     """Vue de connexion avec JWT personnalisée."""
+    # Adresses et comptes bloqués par le détecteur d'anomalies de connexion
+    throttle_classes = [ConnexionSuspecteThrottle]
     
     def get(self, request):
         """Affiche la page de connexion avec l'interface DRF."""
@@ -66,6 +71,11 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             user = serializer.user
+            Historique.log_user_connection(
+                user,
+                adresse_ip=adresse_client(request),
+                user_agent=request.META.get('HTTP_USER_AGENT', '')
+            )
             
             response.data.update({
                 'user': {
@@ -197,6 +207,14 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    
+    def perform_destroy(self, instance):
+        """Supprime l'utilisateur, ou l'anonymise si des écritures comptables le référencent."""
+        try:
+            with transaction.atomic():
+                instance.delete()
+        except ProtectedError:
+            instance.anonymiser()
 
 
 @extend_schema_view(
@@ -216,7 +234,7 @@ class ClientProfileViewSet(viewsets.ModelViewSet):
 )
 class ProviderProfileViewSet(viewsets.ModelViewSet):
     """ViewSet pour les profils prestataires."""
-    queryset = ProviderProfile.objects.all()
+    queryset = ProviderProfile.objects.select_related('user', 'user__repartition_notes')
     serializer_class = ProviderProfileSerializer
     permission_classes = [AllowAny]
 
@@ -252,7 +270,7 @@ class SearchProvidersView(APIView):
         query = request.query_params.get('q', '')
         service_id = request.query_params.get('service')
         
-        providers = ProviderProfile.objects.all()
+        providers = ProviderProfile.objects.select_related('user', 'user__repartition_notes')
         
         if query:
             providers = providers.filter(
@@ -7,7 +7,7 @@ from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.urls import reverse
 from django.db.models import Count, Sum
-from .models import Paiement, Facture
+from .models import Paiement, Facture, MouvementFinancier, SoldeInstantane
 
 
 @admin.register(Paiement)
@@ -46,6 +46,12 @@ class PaiementAdmin(admin.ModelAdmin):
     # Actions personnalisées
     actions = ['marquer_confirme', 'marquer_echec']
     
+    def has_delete_permission(self, request, obj=None):
+        """Un paiement inscrit au grand livre ne se supprime pas : il se rembourse."""
+        if obj is not None and obj.mouvements.exists():
+            return False
+        return super().has_delete_permission(request, obj)
+    
     def id_paiement_court(self, obj):
         """Affiche un ID court."""
         return str(obj.id_paiement)[:8] + "..."
@@ -123,7 +129,12 @@ class PaiementAdmin(admin.ModelAdmin):
     
     def marquer_confirme(self, request, queryset):
         """Marquer les paiements comme confirmés."""
+        a_confirmer = list(
+            queryset.exclude(statut='confirme').values_list('id_paiement', flat=True)
+        )
         updated = queryset.update(statut='confirme')
+        # update() contourne save() : alimenter le grand livre explicitement
+        MouvementFinancier.enregistrer_encaissements(a_confirmer)
         self.message_user(request, f"{updated} paiement(s) marqué(s) comme confirmé(s).")
     marquer_confirme.short_description = "✅ Marquer comme confirmé"
     
@@ -268,4 +279,37 @@ class FactureAdmin(admin.ModelAdmin):
         """Générer PDF des factures."""
         count = queryset.count()
         self.message_user(request, f"Génération PDF pour {count} facture(s) (fonctionnalité à implémenter).")
-    generer_pdf.short_description = "📄 Générer PDF" 
\ No newline at end of file
+    generer_pdf.short_description = "📄 Générer PDF" 
+
+
+@admin.register(MouvementFinancier)
+class MouvementFinancierAdmin(admin.ModelAdmin):
+    """Configuration admin pour le grand livre (lecture seule)."""
+    
+    list_display = [
+        'id', 'type_mouvement', 'role', 'utilisateur', 'montant', 'paiement', 'date_creation'
+    ]
+    list_filter = ['type_mouvement', 'role', 'date_creation']
+    search_fields = ['utilisateur__email', 'libelle']
+    raw_id_fields = ['utilisateur', 'paiement']
+    ordering = ['-id']
+    date_hierarchy = 'date_creation'
+    
+    def has_change_permission(self, request, obj=None):
+        """Les écritures sont immuables."""
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        """Les écritures ne peuvent pas être supprimées."""
+        return False
+
+
+@admin.register(SoldeInstantane)
+class SoldeInstantaneAdmin(admin.ModelAdmin):
+    """Configuration admin pour les instantanés de soldes."""
+    
+    list_display = ['utilisateur', 'role', 'solde', 'dernier_mouvement_id', 'date_creation']
+    list_filter = ['role', 'date_creation']
+    search_fields = ['utilisateur__email']
+    raw_id_fields = ['utilisateur']
+    ordering = ['-dernier_mouvement_id']
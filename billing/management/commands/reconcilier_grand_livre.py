@@ -0,0 +1,90 @@
+"""
+Commande de rapprochement du grand livre avec les paiements.
+
+Parcourt les paiements par lots (pagination par clé) et vérifie que les
+écritures du grand livre correspondent au statut de chaque paiement.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from billing.models import Paiement, MouvementFinancier
+
+
+class Command(BaseCommand):
+    help = "Vérifie les totaux du grand livre par rapport aux paiements"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=1000,
+            help='Nombre de paiements traités par lot'
+        )
+        parser.add_argument(
+            '--max-ecarts',
+            type=int,
+            default=50,
+            help='Nombre maximum d\'écarts détaillés dans la sortie'
+        )
+    
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+        max_ecarts = options['max_ecarts']
+        
+        nb_paiements = 0
+        nb_ecarts = 0
+        total_attendu = Decimal('0')
+        total_grand_livre = Decimal('0')
+        dernier_id = None
+        
+        while True:
+            paiements = Paiement.objects.order_by('id_paiement')
+            if dernier_id is not None:
+                paiements = paiements.filter(id_paiement__gt=dernier_id)
+            lot = list(paiements.values('id_paiement', 'montant', 'statut')[:taille_lot])
+            if not lot:
+                break
+            dernier_id = lot[-1]['id_paiement']
+            
+            ecritures = defaultdict(Decimal)
+            for ligne in MouvementFinancier.objects.filter(
+                paiement_id__in=[p['id_paiement'] for p in lot]
+            ).values('paiement_id', 'role').annotate(total=Sum('montant')).order_by():
+                ecritures[(ligne['paiement_id'], ligne['role'])] = ligne['total']
+            
+            for paiement in lot:
+                # Un paiement confirmé est dû par le client et acquis au prestataire ;
+                # tout autre statut doit avoir un solde nul dans le grand livre.
+                attendu = (
+                    paiement['montant']
+                    if paiement['statut'] == Paiement.StatutPaiement.CONFIRME
+                    else Decimal('0')
+                )
+                for role in MouvementFinancier.Role.values:
+                    constate = ecritures[(paiement['id_paiement'], role)]
+                    total_attendu += attendu
+                    total_grand_livre += constate
+                    if constate != attendu:
+                        nb_ecarts += 1
+                        if nb_ecarts <= max_ecarts:
+                            self.stdout.write(
+                                f"Écart paiement {paiement['id_paiement']} ({role}, "
+                                f"{paiement['statut']}) : attendu {attendu}, "
+                                f"grand livre {constate}"
+                            )
+            
+            nb_paiements += len(lot)
+        
+        self.stdout.write(
+            f"{nb_paiements} paiement(s) vérifié(s) - total attendu {total_attendu}€, "
+            f"total grand livre {total_grand_livre}€"
+        )
+        
+        if nb_ecarts:
+            raise CommandError(f"{nb_ecarts} écart(s) détecté(s) dans le grand livre")
+        
+        self.stdout.write(self.style.SUCCESS("Grand livre cohérent avec les paiements"))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['statut', 'date_echeance'], name='tabali_fact_statut_92967c_idx'),
+        ),
+    ]
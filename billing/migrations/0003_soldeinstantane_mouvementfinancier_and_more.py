@@ -0,0 +1,58 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('billing', '0002_facture_tabali_fact_statut_92967c_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoldeInstantane',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('client', 'Client'), ('prestataire', 'Prestataire')], max_length=20, verbose_name='Rôle')),
+                ('solde', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Solde')),
+                ('dernier_mouvement_id', models.BigIntegerField(verbose_name='Dernière écriture incluse')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name="Date de l'instantané")),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='soldes_instantanes', to=settings.AUTH_USER_MODEL, verbose_name='Titulaire du compte')),
+            ],
+            options={
+                'verbose_name': 'Instantané de solde',
+                'verbose_name_plural': 'Instantanés de soldes',
+                'db_table': 'tabali_soldes_instantanes',
+                'ordering': ['-dernier_mouvement_id'],
+                'indexes': [models.Index(fields=['utilisateur', 'role', '-dernier_mouvement_id'], name='tabali_sold_utilisa_afcebe_idx'), models.Index(fields=['-dernier_mouvement_id'], name='tabali_sold_dernier_d579e6_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MouvementFinancier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_mouvement', models.CharField(choices=[('encaissement', 'Encaissement'), ('remboursement', 'Remboursement'), ('versement', 'Versement au prestataire'), ('ajustement', 'Ajustement')], max_length=20, verbose_name='Type de mouvement')),
+                ('role', models.CharField(choices=[('client', 'Client'), ('prestataire', 'Prestataire')], max_length=20, verbose_name='Rôle')),
+                ('montant', models.DecimalField(decimal_places=2, help_text='Positif pour un crédit, négatif pour un débit', max_digits=12, verbose_name='Montant')),
+                ('libelle', models.CharField(blank=True, max_length=255, verbose_name='Libellé')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name="Date de l'écriture")),
+                ('paiement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='mouvements', to='billing.paiement', verbose_name="Paiement d'origine")),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='mouvements_financiers', to=settings.AUTH_USER_MODEL, verbose_name='Titulaire du compte')),
+            ],
+            options={
+                'verbose_name': 'Mouvement financier',
+                'verbose_name_plural': 'Mouvements financiers',
+                'db_table': 'tabali_mouvements_financiers',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['utilisateur', 'role', 'id'], name='tabali_mouv_utilisa_bf2acd_idx'), models.Index(fields=['date_creation'], name='tabali_mouv_date_cr_33842d_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mouvementfinancier',
+            constraint=models.UniqueConstraint(fields=('paiement', 'type_mouvement', 'role'), name='unique_mouvement_par_paiement'),
+        ),
+    ]
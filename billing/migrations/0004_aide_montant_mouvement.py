@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_soldeinstantane_mouvementfinancier_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mouvementfinancier',
+            name='montant',
+            field=models.DecimalField(decimal_places=2, help_text='Positif pour un encaissement (dépense du client, gain du prestataire), négatif pour un remboursement', max_digits=12, verbose_name='Montant'),
+        ),
+    ]
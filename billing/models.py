@@ -4,11 +4,13 @@ Modèles pour la gestion des paiements et facturation - Application billing.
 Basé sur le diagramme de base de données : Paiements et Factures.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
 from accounts.models import User
 from reservations.models import Reservation
+from historiques.audit import QuerySetAudite
 import uuid
 
 
@@ -79,6 +81,14 @@ class Paiement(models.Model):
         help_text=_('ID de la transaction Stripe/PayPal/etc.')
     )
     
+    # Mises à jour groupées historisées (voir historiques.audit)
+    objects = QuerySetAudite.as_manager()
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Statut tel que chargé, pour détecter les transitions dans save()
+        self._statut_initial = self.__dict__.get('statut')
+    
     # Méthodes du diagramme
     def ajouter(self):
         """Ajouter un nouveau paiement."""
@@ -100,6 +110,20 @@ class Paiement(models.Model):
         """Méthode de listage (à implémenter dans les vues)."""
         pass
     
+    def save(self, *args, **kwargs):
+        """Override save pour alimenter le grand livre lors des changements de statut."""
+        statut_change = self._state.adding or self.statut != self._statut_initial
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if statut_change:
+                if self.statut == self.StatutPaiement.CONFIRME:
+                    MouvementFinancier.enregistrer_encaissements([self.pk])
+                elif self.statut == self.StatutPaiement.REMBOURSE:
+                    MouvementFinancier.enregistrer_remboursements([self.pk])
+        
+        self._statut_initial = self.statut
+    
     class Meta:
         verbose_name = _('Paiement')
         verbose_name_plural = _('Paiements')
@@ -192,6 +216,9 @@ class Facture(models.Model):
         validators=[MinValueValidator(0)]
     )
     
+    # Mises à jour groupées historisées (voir historiques.audit)
+    objects = QuerySetAudite.as_manager()
+    
     # Méthodes du diagramme
     def ajouter(self):
         """Ajouter une nouvelle facture."""
@@ -229,6 +256,81 @@ class Facture(models.Model):
         
         super().save(*args, **kwargs)
     
+    @classmethod
+    def marquer_factures_en_retard(cls, date_reference=None, taille_lot=None):
+        """
+        Passe en retard toutes les factures envoyées dont l'échéance est dépassée.
+        
+        Les factures échues sont parcourues par lots de ``taille_lot`` clés
+        (pagination par clé, index composite (statut, date_echeance)) ; chaque
+        lot est traité dans sa propre transaction courte : verrouillage des
+        factures, un UPDATE sur leurs clés, puis un email de rappel mis en file
+        pour chacune via un ``bulk_create``.
+        
+        Args:
+            date_reference: Date du jour à utiliser (aujourd'hui par défaut)
+            taille_lot: Factures par transaction (``OVERDUE_INVOICES_BATCH_SIZE``)
+            
+        Returns:
+            Nombre de factures passées en retard
+        """
+        from django.conf import settings
+        from django.db import transaction
+        from django.utils import timezone
+        from messaging.models import EnvoiMail
+        
+        date_reference = date_reference or timezone.localdate()
+        taille_lot = taille_lot or settings.TABALI_SETTINGS.get('OVERDUE_INVOICES_BATCH_SIZE', 500)
+        echues = cls.objects.filter(
+            statut=cls.StatutFacture.ENVOYEE,
+            date_echeance__lt=date_reference
+        ).order_by('pk')
+        
+        nb_factures = 0
+        derniere_cle = None
+        while True:
+            lot = echues if derniere_cle is None else echues.filter(pk__gt=derniere_cle)
+            with transaction.atomic():
+                # Verrouiller les factures du lot (pas les lignes jointes) ; l'UPDATE
+                # porte sur leurs clés, donc exactement sur les factures notifiées
+                lignes = list(
+                    lot.select_for_update(of=('self',)).values(
+                        'pk', 'numero_facture', 'montant', 'date_echeance',
+                        'reservation__client__user_id',
+                        'reservation__client__user__email',
+                        'reservation__client__user__first_name',
+                        'reservation__client__user__last_name',
+                    )[:taille_lot]
+                )
+                if not lignes:
+                    break
+                
+                nb_factures += cls.objects.filter(
+                    pk__in=[ligne['pk'] for ligne in lignes]
+                ).update(statut=cls.StatutFacture.EN_RETARD)
+                
+                EnvoiMail.objects.bulk_create([
+                    EnvoiMail.construire_email_type(
+                        EnvoiMail.TypeEmail.RAPPEL,
+                        ligne['reservation__client__user__email'],
+                        f"{ligne['reservation__client__user__first_name']} "
+                        f"{ligne['reservation__client__user__last_name']}".strip(),
+                        utilisateur_id=ligne['reservation__client__user_id'],
+                        modele='rappel_facture',
+                        contexte={
+                            'numero_facture': ligne['numero_facture'],
+                            'montant': ligne['montant'],
+                            'date_echeance': ligne['date_echeance'],
+                        },
+                    )
+                    for ligne in lignes
+                ])
+            if len(lignes) < taille_lot:
+                break
+            derniere_cle = lignes[-1]['pk']
+        
+        return nb_factures
+    
     class Meta:
         verbose_name = _('Facture')
         verbose_name_plural = _('Factures')
@@ -239,7 +341,269 @@ class Facture(models.Model):
             models.Index(fields=['statut']),
             models.Index(fields=['date']),
             models.Index(fields=['date_echeance']),
+            models.Index(fields=['statut', 'date_echeance']),
         ]
     
     def __str__(self):
         return f"Facture {self.numero_facture} - {self.montant}€"
+
+
+class MouvementFinancier(models.Model):
+    """
+    Grand livre des mouvements d'argent (append-only).
+    
+    Chaque paiement confirmé produit une écriture côté client (dépense) et une
+    écriture côté prestataire (gain) ; un remboursement produit les écritures
+    inverses. Les écritures ne sont jamais modifiées ni supprimées : le solde
+    d'un compte est le dernier ``SoldeInstantane`` plus les écritures
+    postérieures.
+    
+    L'utilisateur et le paiement d'une écriture sont protégés
+    (``on_delete=PROTECT``) : un compte qui a des écritures est anonymisé
+    (``User.anonymiser``) au lieu d'être supprimé, et un paiement comptabilisé
+    s'annule par un remboursement, jamais par une suppression.
+    """
+    
+    class TypeMouvement(models.TextChoices):
+        """Types de mouvements."""
+        ENCAISSEMENT = 'encaissement', _('Encaissement')
+        REMBOURSEMENT = 'remboursement', _('Remboursement')
+        VERSEMENT = 'versement', _('Versement au prestataire')
+        AJUSTEMENT = 'ajustement', _('Ajustement')
+    
+    class Role(models.TextChoices):
+        """Rôle du compte concerné par l'écriture."""
+        CLIENT = 'client', _('Client')
+        PRESTATAIRE = 'prestataire', _('Prestataire')
+    
+    type_mouvement = models.CharField(
+        _('Type de mouvement'),
+        max_length=20,
+        choices=TypeMouvement.choices
+    )
+    role = models.CharField(
+        _('Rôle'),
+        max_length=20,
+        choices=Role.choices
+    )
+    utilisateur = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name='mouvements_financiers',
+        verbose_name=_('Titulaire du compte')
+    )
+    montant = models.DecimalField(
+        _('Montant'),
+        max_digits=12,
+        decimal_places=2,
+        help_text=_('Positif pour un encaissement (dépense du client, gain du prestataire), '
+                    'négatif pour un remboursement')
+    )
+    paiement = models.ForeignKey(
+        Paiement,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='mouvements',
+        verbose_name=_('Paiement d\'origine')
+    )
+    libelle = models.CharField(_('Libellé'), max_length=255, blank=True)
+    date_creation = models.DateTimeField(_('Date de l\'écriture'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Mouvement financier')
+        verbose_name_plural = _('Mouvements financiers')
+        db_table = 'tabali_mouvements_financiers'
+        ordering = ['-id']
+        constraints = [
+            # Une seule écriture par paiement, type et rôle : rejouer est sans effet
+            models.UniqueConstraint(
+                fields=['paiement', 'type_mouvement', 'role'],
+                name='unique_mouvement_par_paiement'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['utilisateur', 'role', 'id']),
+            models.Index(fields=['date_creation']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_mouvement_display()} {self.montant}€ - {self.utilisateur_id}"
+    
+    def save(self, *args, **kwargs):
+        """Les écritures sont immuables une fois enregistrées."""
+        if not self._state.adding:
+            raise ValueError("Une écriture du grand livre ne peut pas être modifiée")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        """Les écritures ne peuvent pas être supprimées."""
+        raise ValueError("Une écriture du grand livre ne peut pas être supprimée")
+    
+    @classmethod
+    def _ecritures_paiements(cls, paiement_ids, type_mouvement, signe):
+        """Construit les écritures client/prestataire d'une liste de paiements."""
+        paiements = Paiement.objects.filter(pk__in=paiement_ids).values(
+            'id_paiement', 'montant', 'utilisateur_id',
+            'reservation__provider__user_id',
+        )
+        ecritures = []
+        for paiement in paiements:
+            montant = paiement['montant'] * signe
+            ecritures.append(cls(
+                type_mouvement=type_mouvement,
+                role=cls.Role.CLIENT,
+                utilisateur_id=paiement['utilisateur_id'],
+                montant=montant,
+                paiement_id=paiement['id_paiement'],
+            ))
+            ecritures.append(cls(
+                type_mouvement=type_mouvement,
+                role=cls.Role.PRESTATAIRE,
+                utilisateur_id=paiement['reservation__provider__user_id'],
+                montant=montant,
+                paiement_id=paiement['id_paiement'],
+            ))
+        return ecritures
+    
+    @classmethod
+    def enregistrer_encaissements(cls, paiement_ids):
+        """Enregistre les écritures de paiements confirmés (idempotent)."""
+        ecritures = cls._ecritures_paiements(paiement_ids, cls.TypeMouvement.ENCAISSEMENT, 1)
+        cls.objects.bulk_create(ecritures, batch_size=500, ignore_conflicts=True)
+    
+    @classmethod
+    def enregistrer_remboursements(cls, paiement_ids):
+        """Enregistre les écritures inverses des paiements remboursés (idempotent)."""
+        # Seuls les paiements effectivement encaissés peuvent être remboursés
+        encaisses = cls.objects.filter(
+            paiement_id__in=paiement_ids,
+            type_mouvement=cls.TypeMouvement.ENCAISSEMENT
+        ).values_list('paiement_id', flat=True).distinct()
+        ecritures = cls._ecritures_paiements(list(encaisses), cls.TypeMouvement.REMBOURSEMENT, -1)
+        cls.objects.bulk_create(ecritures, batch_size=500, ignore_conflicts=True)
+    
+    @classmethod
+    def solde(cls, utilisateur, role):
+        """
+        Solde d'un compte : dernier instantané + écritures postérieures.
+        
+        Le coût est proportionnel au nombre d'écritures depuis le dernier
+        instantané, pas à l'historique complet du compte.
+        """
+        instantane = SoldeInstantane.objects.filter(
+            utilisateur=utilisateur, role=role
+        ).order_by('-dernier_mouvement_id').first()
+        
+        solde = instantane.solde if instantane else 0
+        depuis = instantane.dernier_mouvement_id if instantane else 0
+        recent = cls.objects.filter(
+            utilisateur=utilisateur, role=role, id__gt=depuis
+        ).aggregate(total=Sum('montant'))['total']
+        return solde + (recent or 0)
+
+
+class SoldeInstantane(models.Model):
+    """
+    Instantanés matérialisés des soldes du grand livre.
+    
+    Un instantané fige le solde d'un compte jusqu'à l'écriture
+    ``dernier_mouvement_id`` incluse.
+    """
+    
+    utilisateur = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='soldes_instantanes',
+        verbose_name=_('Titulaire du compte')
+    )
+    role = models.CharField(
+        _('Rôle'),
+        max_length=20,
+        choices=MouvementFinancier.Role.choices
+    )
+    solde = models.DecimalField(_('Solde'), max_digits=12, decimal_places=2)
+    dernier_mouvement_id = models.BigIntegerField(_('Dernière écriture incluse'))
+    date_creation = models.DateTimeField(_('Date de l\'instantané'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Instantané de solde')
+        verbose_name_plural = _('Instantanés de soldes')
+        db_table = 'tabali_soldes_instantanes'
+        ordering = ['-dernier_mouvement_id']
+        indexes = [
+            models.Index(fields=['utilisateur', 'role', '-dernier_mouvement_id']),
+            models.Index(fields=['-dernier_mouvement_id']),
+        ]
+    
+    def __str__(self):
+        return f"Solde {self.get_role_display()} {self.solde}€ - {self.utilisateur_id}"
+    
+    @classmethod
+    def materialiser(cls, delai_securite=None):
+        """
+        Crée un instantané pour chaque compte ayant bougé depuis le dernier passage.
+        
+        Les écritures les plus récentes (``delai_securite``) sont laissées de
+        côté pour ne pas figer un état auquel une transaction encore en cours
+        ajouterait une écriture d'identifiant inférieur. Les totaux
+        ``total_earnings`` / ``total_spent`` des profils sont rafraîchis dans
+        la foulée.
+        
+        Returns:
+            Nombre d'instantanés créés
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        from accounts.models import ClientProfile, ProviderProfile
+        
+        delai_securite = delai_securite if delai_securite is not None else timedelta(minutes=5)
+        depuis = cls.objects.aggregate(m=Max('dernier_mouvement_id'))['m'] or 0
+        jusqu_a = MouvementFinancier.objects.filter(
+            id__gt=depuis,
+            date_creation__lte=timezone.now() - delai_securite
+        ).aggregate(m=Max('id'))['m']
+        if not jusqu_a:
+            return 0
+        
+        precedent = cls.objects.filter(
+            utilisateur=OuterRef('utilisateur_id'), role=OuterRef('role')
+        ).order_by('-dernier_mouvement_id').values('solde')[:1]
+        variations = MouvementFinancier.objects.filter(
+            id__gt=depuis, id__lte=jusqu_a
+        ).values('utilisateur_id', 'role').annotate(
+            variation=Sum('montant'),
+            precedent=Subquery(precedent),
+        ).order_by()
+        
+        instantanes = [
+            cls(
+                utilisateur_id=ligne['utilisateur_id'],
+                role=ligne['role'],
+                solde=(ligne['precedent'] or 0) + ligne['variation'],
+                dernier_mouvement_id=jusqu_a,
+            )
+            for ligne in variations
+        ]
+        
+        with transaction.atomic():
+            cls.objects.bulk_create(instantanes, batch_size=500)
+            
+            gains = {
+                i.utilisateur_id: i.solde for i in instantanes
+                if i.role == MouvementFinancier.Role.PRESTATAIRE
+            }
+            depenses = {
+                i.utilisateur_id: i.solde for i in instantanes
+                if i.role == MouvementFinancier.Role.CLIENT
+            }
+            prestataires = list(ProviderProfile.objects.filter(user_id__in=gains))
+            for profil in prestataires:
+                profil.total_earnings = gains[profil.user_id]
+            ProviderProfile.objects.bulk_update(prestataires, ['total_earnings'], batch_size=500)
+            clients = list(ClientProfile.objects.filter(user_id__in=depenses))
+            for profil in clients:
+                profil.total_spent = depenses[profil.user_id]
+            ClientProfile.objects.bulk_update(clients, ['total_spent'], batch_size=500)
+        
+        return len(instantanes)
@@ -0,0 +1,27 @@
+"""
+Tâches asynchrones pour l'application billing.
+"""
+
+import logging
+
+from celery import shared_task
+
+from .models import Facture, SoldeInstantane
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def detect_overdue_invoices():
+    """Passe en retard les factures échues et met en file les rappels."""
+    nb_factures = Facture.marquer_factures_en_retard()
+    logger.info(f"{nb_factures} facture(s) passée(s) en retard")
+    return nb_factures
+
+
+@shared_task
+def snapshot_balances():
+    """Matérialise les soldes du grand livre des comptes ayant bougé."""
+    nb_instantanes = SoldeInstantane.materialiser()
+    logger.info(f"{nb_instantanes} instantané(s) de solde créé(s)")
+    return nb_instantanes
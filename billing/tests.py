@@ -1,3 +1,203 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from messaging.models import EnvoiMail
+from tabali_platform.utils.fabriques import creer_reservation, creer_utilisateur
+
+from .admin import PaiementAdmin
+from .models import Facture, MouvementFinancier, Paiement, SoldeInstantane
+from .tasks import detect_overdue_invoices
+
+
+class FacturesEnRetardTests(TestCase):
+    """Passage en retard des factures échues et rappels aux clients."""
+
+    def setUp(self):
+        self.aujourd_hui = timezone.localdate()
+        self.client_facture = creer_utilisateur('client')
+
+    def creer_facture(self, echeance_jours, statut=Facture.StatutFacture.ENVOYEE):
+        # Une facture par réservation
+        return Facture.objects.create(
+            reservation=creer_reservation(client=self.client_facture), montant=120, statut=statut,
+            date_echeance=self.aujourd_hui + timedelta(days=echeance_jours)
+        )
+
+    def test_factures_echues_passees_en_retard(self):
+        echue = self.creer_facture(-3)
+        a_venir = self.creer_facture(3)
+        brouillon = self.creer_facture(-3, Facture.StatutFacture.BROUILLON)
+
+        self.assertEqual(detect_overdue_invoices(), 1)
+
+        statuts = dict(Facture.objects.values_list('pk', 'statut'))
+        self.assertEqual(statuts[echue.pk], Facture.StatutFacture.EN_RETARD)
+        self.assertEqual(statuts[a_venir.pk], Facture.StatutFacture.ENVOYEE)
+        self.assertEqual(statuts[brouillon.pk], Facture.StatutFacture.BROUILLON)
+
+    def test_un_rappel_par_facture_au_client(self):
+        echue = self.creer_facture(-3)
+
+        detect_overdue_invoices()
+        detect_overdue_invoices()
+
+        rappel = EnvoiMail.objects.get()
+        client = self.client_facture
+        self.assertEqual(rappel.type_email, EnvoiMail.TypeEmail.RAPPEL)
+        self.assertEqual(rappel.utilisateur_id, client.pk)
+        self.assertEqual(rappel.email_destinataire, client.email)
+        self.assertIn(echue.numero_facture, rappel.sujet + rappel.contenu)
+
+    def test_requetes_constantes(self):
+        for _ in range(5):
+            self.creer_facture(-3)
+        # SELECT ... FOR UPDATE, UPDATE, INSERT des rappels (+ points de sauvegarde)
+        with self.assertNumQueries(5):
+            self.assertEqual(Facture.marquer_factures_en_retard(), 5)
+
+    def test_traitement_par_lots(self):
+        factures = [self.creer_facture(-3) for _ in range(5)]
+        a_venir = self.creer_facture(3)
+
+        # Trois transactions courtes de deux factures au plus
+        self.assertEqual(Facture.marquer_factures_en_retard(taille_lot=2), 5)
+
+        self.assertEqual(
+            set(Facture.objects.filter(statut=Facture.StatutFacture.EN_RETARD).values_list('pk', flat=True)),
+            {facture.pk for facture in factures}
+        )
+        self.assertEqual(Facture.objects.get(pk=a_venir.pk).statut, Facture.StatutFacture.ENVOYEE)
+        self.assertEqual(EnvoiMail.objects.filter(type_email=EnvoiMail.TypeEmail.RAPPEL).count(), 5)
+
+
+class GrandLivreTests(TestCase):
+    """Écritures du grand livre, soldes et rapprochement avec les paiements."""
+
+    def setUp(self):
+        self.reservation = creer_reservation()
+        self.client_paiement = self.reservation.client.user
+        self.prestataire = self.reservation.provider.user
+
+    def payer(self, montant, **champs):
+        return Paiement.objects.create(
+            reservation=self.reservation, utilisateur=self.client_paiement, montant=montant, **champs
+        )
+
+    def test_ecritures_a_la_confirmation(self):
+        paiement = self.payer(100)
+        self.assertFalse(MouvementFinancier.objects.exists())
+
+        paiement.statut = Paiement.StatutPaiement.CONFIRME
+        paiement.save()
+        paiement.save()
+
+        ecritures = MouvementFinancier.objects.filter(paiement=paiement)
+        self.assertEqual(
+            sorted(ecritures.values_list('role', 'utilisateur_id', 'montant')),
+            [('client', self.client_paiement.pk, Decimal('100.00')),
+             ('prestataire', self.prestataire.pk, Decimal('100.00'))]
+        )
+
+    def test_remboursement_ecritures_inverses(self):
+        self.payer(100, statut=Paiement.StatutPaiement.CONFIRME)
+        rembourse = self.payer(50, statut=Paiement.StatutPaiement.CONFIRME)
+        self.assertEqual(MouvementFinancier.solde(self.prestataire, 'prestataire'), 150)
+
+        rembourse.statut = Paiement.StatutPaiement.REMBOURSE
+        rembourse.save()
+
+        self.assertEqual(MouvementFinancier.solde(self.prestataire, 'prestataire'), 100)
+        self.assertEqual(MouvementFinancier.solde(self.client_paiement, 'client'), 100)
+
+    def test_instantanes_de_solde(self):
+        self.payer(100, statut=Paiement.StatutPaiement.CONFIRME)
+
+        self.assertEqual(SoldeInstantane.materialiser(delai_securite=timedelta(0)), 2)
+        self.assertEqual(SoldeInstantane.materialiser(delai_securite=timedelta(0)), 0)
+
+        self.prestataire.provider_profile.refresh_from_db()
+        self.assertEqual(self.prestataire.provider_profile.total_earnings, 100)
+        self.payer(30, statut=Paiement.StatutPaiement.CONFIRME)
+        self.assertEqual(MouvementFinancier.solde(self.prestataire, 'prestataire'), 130)
+
+    def test_ecritures_immuables(self):
+        self.payer(100, statut=Paiement.StatutPaiement.CONFIRME)
+        ecriture = MouvementFinancier.objects.first()
+
+        with self.assertRaises(ValueError):
+            ecriture.save()
+        with self.assertRaises(ValueError):
+            ecriture.delete()
+
+    def test_rapprochement(self):
+        paiement = self.payer(100, statut=Paiement.StatutPaiement.CONFIRME)
+        sortie = StringIO()
+        call_command('reconcilier_grand_livre', taille_lot=1, stdout=sortie)
+        self.assertIn('cohérent', sortie.getvalue())
+
+        # Changement de statut sans passer par save() : écart détecté
+        Paiement.objects.filter(pk=paiement.pk).update(statut=Paiement.StatutPaiement.ANNULE)
+        with self.assertRaises(CommandError):
+            call_command('reconcilier_grand_livre', stdout=StringIO())
+
+
+class SuppressionsProtegeesTests(TestCase):
+    """Suppressions bloquées par les écritures du grand livre (``on_delete=PROTECT``)."""
+
+    def setUp(self):
+        self.reservation = creer_reservation()
+        self.client_paiement = self.reservation.client.user
+        self.paiement = Paiement.objects.create(
+            reservation=self.reservation, utilisateur=self.client_paiement, montant=10,
+            statut=Paiement.StatutPaiement.CONFIRME
+        )
+        self.admin = creer_utilisateur('admin', is_staff=True, is_superuser=True)
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def test_paiement_comptabilise_non_supprimable(self):
+        reponse = self.api.delete(f'/api/v1/billing/api/paiements/{self.paiement.pk}/')
+
+        self.assertEqual(reponse.status_code, 409)
+        self.assertTrue(Paiement.objects.filter(pk=self.paiement.pk).exists())
+
+    def test_paiement_sans_ecriture_supprimable(self):
+        paiement = Paiement.objects.create(reservation=self.reservation, utilisateur=self.admin, montant=10)
+
+        reponse = self.api.delete(f'/api/v1/billing/api/paiements/{paiement.pk}/')
+
+        self.assertEqual(reponse.status_code, 204)
+
+    def test_utilisateur_avec_ecritures_anonymise(self):
+        reponse = self.api.delete(f'/api/v1/auth/users/{self.client_paiement.pk}/')
+
+        self.assertEqual(reponse.status_code, 204)
+        self.client_paiement.refresh_from_db()
+        self.assertFalse(self.client_paiement.is_active)
+        self.assertEqual(self.client_paiement.first_name, '')
+        self.assertTrue(self.client_paiement.email.endswith('.invalid'))
+        self.assertEqual(MouvementFinancier.objects.filter(utilisateur=self.client_paiement).count(), 1)
+
+    def test_utilisateur_sans_ecriture_supprime(self):
+        utilisateur = creer_utilisateur('client')
+
+        reponse = self.api.delete(f'/api/v1/auth/users/{utilisateur.pk}/')
+
+        self.assertEqual(reponse.status_code, 204)
+        self.assertFalse(User.objects.filter(pk=utilisateur.pk).exists())
+
+    def test_admin_masque_la_suppression(self):
+        requete = RequestFactory().get('/')
+        requete.user = self.admin
+        admin_paiements = PaiementAdmin(Paiement, site)
+
+        self.assertFalse(admin_paiements.has_delete_permission(requete, self.paiement))
+        self.assertTrue(admin_paiements.has_delete_permission(requete))
@@ -5,22 +5,30 @@ Vues pour l'application billing.
 from django.shortcuts import render
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.db.models import ProtectedError, Q, Sum, Count
 from django.utils import timezone
 from datetime import datetime, timedelta
 
-from .models import Paiement, Facture
+from .models import Paiement, Facture, MouvementFinancier
 from .serializers import (
     PaiementSerializer, PaiementCreateSerializer,
     FactureSerializer, FactureCreateSerializer
 )
 
 
+class PaiementComptabilise(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Ce paiement est inscrit au grand livre : remboursez-le au lieu de le supprimer."
+    default_code = 'paiement_comptabilise'
+
+
 @extend_schema_view(
     list=extend_schema(
         summary="Liste des paiements",
@@ -70,6 +78,14 @@ class PaiementViewSet(viewsets.ModelViewSet):
             return PaiementCreateSerializer
         return PaiementSerializer
     
+    def perform_destroy(self, instance):
+        """Un paiement inscrit au grand livre ne se supprime pas : il se rembourse."""
+        try:
+            with transaction.atomic():
+                instance.delete()
+        except ProtectedError:
+            raise PaiementComptabilise()
+    
     def get_queryset(self):
         """Filtrer selon l'utilisateur et ses droits."""
         queryset = super().get_queryset()
@@ -150,6 +166,19 @@ class PaiementViewSet(viewsets.ModelViewSet):
         }
         
         return Response(stats)
+    
+    @extend_schema(
+        summary="Solde du grand livre",
+        description="Solde client et prestataire de l'utilisateur connecté",
+        tags=["Paiements"]
+    )
+    @action(detail=False, methods=['get'])
+    def solde(self, request):
+        """Soldes de l'utilisateur connecté calculés depuis le grand livre."""
+        return Response({
+            'depenses': MouvementFinancier.solde(request.user, MouvementFinancier.Role.CLIENT),
+            'gains': MouvementFinancier.solde(request.user, MouvementFinancier.Role.PRESTATAIRE),
+        })
 
 
 @extend_schema_view(
@@ -241,17 +270,23 @@ class FactureViewSet(viewsets.ModelViewSet):
     
     @extend_schema(
         summary="Factures échues",
-        description="Liste les factures en retard de paiement",
+        description="Liste paginée des factures en retard de paiement",
         tags=["Factures"]
     )
     @action(detail=False, methods=['get'])
     def echues(self, request):
         """Factures échues."""
-        from django.utils import timezone
+        # Prédicat et tri servis par l'index composite (statut, date_echeance) ;
+        # les factures envoyées pas encore basculées par la tâche périodique
+        # sont incluses pour rester exact entre deux passages.
         factures = self.get_queryset().filter(
-            date_echeance__lt=timezone.now().date(),
-            statut__in=['envoyee', 'en_retard']
-        )
+            statut__in=[Facture.StatutFacture.ENVOYEE, Facture.StatutFacture.EN_RETARD],
+            date_echeance__lt=timezone.localdate()
+        ).order_by('date_echeance', 'id_facture')
+        page = self.paginate_queryset(factures)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(factures, many=True)
         return Response(serializer.data)
     
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class HistoriquesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'historiques'
+    
+    def ready(self):
+        from celery.signals import worker_process_shutdown, worker_shutdown
+        from django.contrib.auth.signals import user_logged_in, user_login_failed
+        
+        from .audit import configurer_audit
+        from .detection import connexion, echec_connexion
+        from .tampon import vider_tampon
+        
+        configurer_audit()
+        
+        # Connexions et échecs d'authentification, consommés par le détecteur d'anomalies
+        user_logged_in.connect(connexion, dispatch_uid='historiques-connexion')
+        user_login_failed.connect(echec_connexion, dispatch_uid='historiques-echec-connexion')
+        
+        # Les processus du pool Celery ne passent pas par atexit
+        worker_process_shutdown.connect(vider_tampon, weak=False)
+        worker_shutdown.connect(vider_tampon, weak=False)
@@ -0,0 +1,204 @@
+"""
+Audit automatique des modifications de modèles.
+
+Les modèles déclarés dans ``TABALI_SETTINGS['AUDIT_MODELS']`` sont audités
+(``auditer`` est appelé au démarrage de l'application) :
+
+- au chargement, un instantané des valeurs brutes des champs audités est
+  conservé sur l'instance (un simple dict, sans sérialisation) ;
+- à l'enregistrement, seuls les champs dont la valeur a changé sont
+  historisés (``donnees_avant`` / ``donnees_apres``) ;
+- un ``QuerySet.update()`` sur un modèle audité dont le gestionnaire utilise
+  ``QuerySetAudite`` produit un seul historique résumé par requête, et non
+  un par objet.
+
+L'utilisateur, l'adresse IP (derrière les proxys déclarés, voir
+``detection.adresse_client``) et le user agent sont ceux de la requête en
+cours, exposée par ``ContexteAuditMiddleware``.
+"""
+
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .detection import adresse_client
+
+_requete = ContextVar('requete_auditee', default=None)
+
+_encodeur = DjangoJSONEncoder()
+
+
+class ContexteAuditMiddleware:
+    """
+    Expose la requête en cours à l'audit des modèles.
+
+    Hybride : sous ASGI, les vues asynchrones (long-poll, SSE) ne passent
+    pas par un adaptateur synchrone.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        jeton = _requete.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _requete.reset(jeton)
+
+    async def __acall__(self, request):
+        jeton = _requete.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _requete.reset(jeton)
+
+
+def contexte_audit():
+    """Utilisateur, adresse IP et user agent de la requête en cours."""
+    request = _requete.get()
+    if request is None:
+        return {}
+    # DRF reporte l'utilisateur authentifié (JWT) sur la requête Django
+    utilisateur = getattr(request, 'user', None)
+    return {
+        'utilisateur': utilisateur if utilisateur is not None and utilisateur.is_authenticated else None,
+        'adresse_ip': adresse_client(request),
+        'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+    }
+
+
+def _valeur_json(valeur):
+    if valeur is None or isinstance(valeur, (str, int, float, bool)):
+        return valeur
+    try:
+        return _encodeur.default(valeur)
+    except TypeError:
+        # Expressions (F(), Case...) des mises à jour groupées
+        return str(valeur)
+
+
+def _instantane(instance):
+    return {attname: instance.__dict__.get(attname, DEFERRED) for attname in instance._audit_champs}
+
+
+def _description(action, instance):
+    # Pas de str(instance) : il chargerait souvent des objets liés
+    return f"{action.label} {instance._meta.verbose_name} {instance.pk}"
+
+
+def _apres_init(sender, instance, **kwargs):
+    instance._audit_initial = _instantane(instance)
+
+
+def _apres_save(sender, instance, created, update_fields=None, **kwargs):
+    from .models import Historique
+
+    actuel = _instantane(instance)
+    if created:
+        action = Historique.TypeAction.CREATION
+        avant = None
+        apres = {attname: _valeur_json(valeur) for attname, valeur in actuel.items() if valeur is not DEFERRED}
+    else:
+        initial = instance._audit_initial
+        champs = actuel
+        if update_fields is not None:
+            attnames = {instance._meta.get_field(nom).attname for nom in update_fields}
+            champs = {attname: valeur for attname, valeur in actuel.items() if attname in attnames}
+        modifies = [
+            attname for attname, valeur in champs.items()
+            if valeur is not DEFERRED and initial.get(attname, DEFERRED) is not DEFERRED
+            and valeur != initial[attname]
+        ]
+        if not modifies:
+            instance._audit_initial = actuel
+            return
+        action = Historique.TypeAction.MODIFICATION
+        avant = {attname: _valeur_json(initial[attname]) for attname in modifies}
+        apres = {attname: _valeur_json(actuel[attname]) for attname in modifies}
+
+    Historique.log_model_change(
+        action, instance, description=_description(action, instance),
+        donnees_avant=avant, donnees_apres=apres, **contexte_audit()
+    )
+    instance._audit_initial = actuel
+
+
+def _apres_delete(sender, instance, **kwargs):
+    from .models import Historique
+
+    avant = {
+        attname: _valeur_json(valeur) for attname, valeur in instance._audit_initial.items()
+        if valeur is not DEFERRED
+    }
+    action = Historique.TypeAction.SUPPRESSION
+    Historique.log_model_change(
+        action, instance, description=_description(action, instance),
+        donnees_avant=avant, **contexte_audit()
+    )
+
+
+class QuerySetAudite(models.QuerySet):
+    """QuerySet dont les ``update()`` sur un modèle audité sont historisés, un événement par requête."""
+
+    def update(self, **kwargs):
+        nombre = super().update(**kwargs)
+        champs = getattr(self.model, '_audit_champs', None)
+        if nombre and champs:
+            attnames = {self.model._meta.get_field(nom).attname: nom for nom in kwargs}
+            valeurs = {
+                attname: _valeur_json(kwargs[nom]) for attname, nom in attnames.items() if attname in champs
+            }
+            if valeurs:
+                from .models import Historique
+
+                Historique.log_action(
+                    action=Historique.TypeAction.MODIFICATION,
+                    objet=self.model,
+                    description=f"Mise à jour groupée de {nombre} {self.model._meta.verbose_name_plural}",
+                    donnees_apres=valeurs,
+                    contexte={'nombre': nombre, 'filtre': str(self.query.where)},
+                    **contexte_audit()
+                )
+        return nombre
+
+    update.alters_data = True
+
+
+def auditer(modele, exclus=()):
+    """
+    Active l'audit automatique d'un modèle.
+
+    Args:
+        exclus: noms des champs à ne pas historiser (les champs ``auto_now``
+            sont toujours exclus)
+    """
+    modele._audit_champs = frozenset(
+        champ.attname for champ in modele._meta.concrete_fields
+        if champ.name not in exclus and not getattr(champ, 'auto_now', False)
+    )
+    uid = f'audit-{modele._meta.label_lower}'
+    post_init.connect(_apres_init, sender=modele, dispatch_uid=uid)
+    post_save.connect(_apres_save, sender=modele, dispatch_uid=uid)
+    post_delete.connect(_apres_delete, sender=modele, dispatch_uid=uid)
+
+
+def configurer_audit():
+    """Active l'audit des modèles déclarés dans ``AUDIT_MODELS``."""
+    from django.apps import apps
+
+    for label, options in settings.TABALI_SETTINGS.get('AUDIT_MODELS', {}).items():
+        auditer(apps.get_model(label), **options)
@@ -0,0 +1,309 @@
+"""
+Détection en continu des anomalies de connexion.
+
+Les historiques de connexion (réussie ou échouée) sont observés au moment
+où ils sont émis (``Historique.log_action``), sans relire la table des
+historiques. Pour chaque adresse IP et chaque identifiant de compte, le
+détecteur tient des compteurs sur une fenêtre glissante de
+``AUTH_ANOMALY_WINDOW_SECONDS`` secondes, découpée en seaux de
+``AUTH_ANOMALY_BUCKET_SECONDS`` secondes (tampon circulaire : un seau
+périmé est simplement réutilisé).
+
+Motifs détectés :
+
+- force brute sur un compte : ``AUTH_ANOMALY_MAX_FAILURES_PER_ACCOUNT``
+  échecs sur un même identifiant ;
+- force brute depuis une adresse : ``AUTH_ANOMALY_MAX_FAILURES_PER_IP``
+  échecs depuis une même adresse IP ;
+- credential stuffing : ``AUTH_ANOMALY_MAX_ACCOUNTS_PER_IP`` identifiants
+  distincts essayés sans succès depuis une même adresse IP.
+
+Un motif détecté bloque l'adresse ou le compte pendant
+``AUTH_ANOMALY_BLOCK_SECONDS`` secondes (``ConnexionSuspecteThrottle`` sur la
+vue de connexion) et produit un historique de niveau ``securite``.
+
+Le détecteur est propre au processus, comme ``LimiteurDomaines`` : avec
+plusieurs workers, chacun compte les tentatives qu'il reçoit. Le nombre
+d'adresses et de comptes suivis est borné par ``AUTH_ANOMALY_MAX_TRACKED``
+(les moins récemment vus sont oubliés en premier).
+"""
+
+import ipaddress
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+FORCE_BRUTE_COMPTE = 'force_brute_compte'
+FORCE_BRUTE_IP = 'force_brute_ip'
+CREDENTIAL_STUFFING = 'credential_stuffing'
+
+# Période d'un seau jamais utilisé
+PERIODE_VIDE = -2 ** 62
+
+DESCRIPTIONS = {
+    FORCE_BRUTE_COMPTE: "Force brute sur le compte",
+    FORCE_BRUTE_IP: "Force brute depuis l'adresse",
+    CREDENTIAL_STUFFING: "Credential stuffing depuis l'adresse",
+}
+
+
+class FenetreGlissante:
+    """Nombre d'événements sur une fenêtre glissante, par seaux de durée fixe."""
+
+    __slots__ = ('duree_seau', '_comptes', '_periodes')
+
+    def __init__(self, nb_seaux, duree_seau):
+        self.duree_seau = duree_seau
+        self._comptes = array('I', [0]) * nb_seaux
+        self._periodes = array('q', [PERIODE_VIDE]) * nb_seaux
+
+    def ajouter(self, maintenant):
+        periode = int(maintenant // self.duree_seau)
+        i = periode % len(self._periodes)
+        if self._periodes[i] != periode:
+            self._periodes[i] = periode
+            self._comptes[i] = 0
+        self._comptes[i] += 1
+
+    def total(self, maintenant):
+        periode = int(maintenant // self.duree_seau)
+        nb_seaux = len(self._periodes)
+        return sum(
+            compte for compte, seau in zip(self._comptes, self._periodes)
+            if periode - seau < nb_seaux
+        )
+
+
+class FenetreDistincts:
+    """Nombre de valeurs distinctes vues sur une fenêtre glissante, par seaux de durée fixe."""
+
+    __slots__ = ('duree_seau', '_valeurs', '_periodes')
+
+    def __init__(self, nb_seaux, duree_seau):
+        self.duree_seau = duree_seau
+        self._valeurs = [None] * nb_seaux
+        self._periodes = array('q', [PERIODE_VIDE]) * nb_seaux
+
+    def ajouter(self, valeur, maintenant):
+        periode = int(maintenant // self.duree_seau)
+        i = periode % len(self._periodes)
+        if self._periodes[i] != periode:
+            self._periodes[i] = periode
+            self._valeurs[i] = set()
+        # Empreinte entière plutôt que la chaîne : quelques octets par valeur
+        self._valeurs[i].add(hash(valeur))
+
+    def total(self, maintenant):
+        periode = int(maintenant // self.duree_seau)
+        nb_seaux = len(self._periodes)
+        valeurs = set()
+        for seau, periode_seau in zip(self._valeurs, self._periodes):
+            if periode - periode_seau < nb_seaux:
+                valeurs |= seau
+        return len(valeurs)
+
+
+class DetecteurAnomalies:
+    """Compteurs glissants des connexions par adresse IP et par compte."""
+
+    def __init__(self, **options):
+        tabali_settings = settings.TABALI_SETTINGS
+
+        def option(nom, cle, defaut):
+            return options[nom] if nom in options else tabali_settings.get(cle, defaut)
+
+        self.duree_seau = option('duree_seau', 'AUTH_ANOMALY_BUCKET_SECONDS', 10)
+        fenetre = option('fenetre', 'AUTH_ANOMALY_WINDOW_SECONDS', 300)
+        self.nb_seaux = max(-(-fenetre // self.duree_seau), 1)
+        self.max_echecs_compte = option('max_echecs_compte', 'AUTH_ANOMALY_MAX_FAILURES_PER_ACCOUNT', 5)
+        self.max_echecs_ip = option('max_echecs_ip', 'AUTH_ANOMALY_MAX_FAILURES_PER_IP', 20)
+        self.max_comptes_ip = option('max_comptes_ip', 'AUTH_ANOMALY_MAX_ACCOUNTS_PER_IP', 10)
+        self.duree_blocage = option('duree_blocage', 'AUTH_ANOMALY_BLOCK_SECONDS', 900)
+        self.max_suivis = option('max_suivis', 'AUTH_ANOMALY_MAX_TRACKED', 100000)
+        self._echecs_compte = OrderedDict()
+        self._echecs_ip = OrderedDict()
+        self._comptes_ip = OrderedDict()
+        # (type, clé) -> (fin du blocage, motif)
+        self._blocages = {}
+        self._verrou = threading.Lock()
+
+    def _fenetre(self, fenetres, cle, classe):
+        fenetre = fenetres.get(cle)
+        if fenetre is None:
+            if len(fenetres) >= self.max_suivis:
+                fenetres.popitem(last=False)
+            fenetre = fenetres[cle] = classe(self.nb_seaux, self.duree_seau)
+        else:
+            fenetres.move_to_end(cle)
+        return fenetre
+
+    def _bloquer(self, type_cle, cle, motif, maintenant):
+        """Bloque la clé ; retourne vrai si elle ne l'était pas déjà."""
+        deja_bloquee = self._blocages.get((type_cle, cle), (0, None))[0] > maintenant
+        if not deja_bloquee and len(self._blocages) >= self.max_suivis:
+            self._purger_blocages(maintenant)
+        self._blocages[(type_cle, cle)] = (maintenant + self.duree_blocage, motif)
+        return not deja_bloquee
+
+    def _purger_blocages(self, maintenant):
+        for cle in [cle for cle, (fin, _) in self._blocages.items() if fin <= maintenant]:
+            del self._blocages[cle]
+
+    def enregistrer_echec(self, adresse_ip=None, identifiant=None, maintenant=None):
+        """
+        Compte une connexion échouée.
+
+        Returns:
+            list: motifs nouvellement détectés, (motif, adresse IP ou identifiant)
+        """
+        maintenant = time.monotonic() if maintenant is None else maintenant
+        identifiant = normaliser_identifiant(identifiant)
+        detectes = []
+        with self._verrou:
+            if identifiant:
+                fenetre = self._fenetre(self._echecs_compte, identifiant, FenetreGlissante)
+                fenetre.ajouter(maintenant)
+                if (fenetre.total(maintenant) >= self.max_echecs_compte
+                        and self._bloquer('compte', identifiant, FORCE_BRUTE_COMPTE, maintenant)):
+                    detectes.append((FORCE_BRUTE_COMPTE, identifiant))
+            if adresse_ip:
+                fenetre = self._fenetre(self._echecs_ip, adresse_ip, FenetreGlissante)
+                fenetre.ajouter(maintenant)
+                if (fenetre.total(maintenant) >= self.max_echecs_ip
+                        and self._bloquer('ip', adresse_ip, FORCE_BRUTE_IP, maintenant)):
+                    detectes.append((FORCE_BRUTE_IP, adresse_ip))
+                if identifiant:
+                    comptes = self._fenetre(self._comptes_ip, adresse_ip, FenetreDistincts)
+                    comptes.ajouter(identifiant, maintenant)
+                    if (comptes.total(maintenant) >= self.max_comptes_ip
+                            and self._bloquer('ip', adresse_ip, CREDENTIAL_STUFFING, maintenant)):
+                        detectes.append((CREDENTIAL_STUFFING, adresse_ip))
+        return detectes
+
+    def enregistrer_succes(self, adresse_ip=None, identifiant=None):
+        """Une connexion réussie remet à zéro les échecs du compte (pas ceux de l'adresse)."""
+        identifiant = normaliser_identifiant(identifiant)
+        if identifiant:
+            with self._verrou:
+                self._echecs_compte.pop(identifiant, None)
+
+    def attente(self, adresse_ip=None, identifiant=None, maintenant=None):
+        """
+        Durée restante du blocage de l'adresse ou du compte.
+
+        Returns:
+            float: secondes avant de pouvoir réessayer, 0 si aucun blocage
+        """
+        maintenant = time.monotonic() if maintenant is None else maintenant
+        identifiant = normaliser_identifiant(identifiant)
+        attente = 0
+        with self._verrou:
+            for cle in (('ip', adresse_ip), ('compte', identifiant)):
+                if not cle[1] or cle not in self._blocages:
+                    continue
+                fin, _ = self._blocages[cle]
+                if fin <= maintenant:
+                    del self._blocages[cle]
+                else:
+                    attente = max(attente, fin - maintenant)
+        return attente
+
+    def observer(self, historique):
+        """Consomme un historique de connexion (voir ``Historique.log_user_connection``)."""
+        contexte = historique.contexte or {}
+        identifiant = contexte.get('identifiant')
+        if contexte.get('echec'):
+            for motif, cle in self.enregistrer_echec(historique.adresse_ip, identifiant):
+                signaler(motif, cle, historique)
+        else:
+            self.enregistrer_succes(historique.adresse_ip, identifiant)
+
+
+def normaliser_identifiant(identifiant):
+    return (identifiant or '').strip().lower()
+
+
+def signaler(motif, cle, historique):
+    """Historise une anomalie détectée (niveau ``securite``, écrit immédiatement)."""
+    from .models import Historique
+
+    logger.warning(f"{DESCRIPTIONS[motif]} {cle}")
+    Historique.log_action(
+        action=Historique.TypeAction.AUTRE,
+        description=f"{DESCRIPTIONS[motif]} {cle}",
+        contexte={'motif': motif, 'cle': cle, 'identifiant': (historique.contexte or {}).get('identifiant')},
+        niveau=Historique.NiveauImportance.SECURITE,
+        adresse_ip=historique.adresse_ip,
+        user_agent=historique.user_agent,
+        tags=f"securite,anomalie,{motif}"
+    )
+
+
+_detecteur = None
+_verrou_detecteur = threading.Lock()
+
+
+def obtenir_detecteur():
+    """Retourne l'instance (unique par processus) du détecteur d'anomalies."""
+    global _detecteur
+    if _detecteur is None:
+        with _verrou_detecteur:
+            if _detecteur is None:
+                _detecteur = DetecteurAnomalies()
+    return _detecteur
+
+
+def adresse_client(request):
+    """
+    Adresse IP du client, derrière les proxys déclarés par
+    ``REST_FRAMEWORK['NUM_PROXIES']`` (même règle que les throttles DRF).
+    """
+    adresse = BaseThrottle().get_ident(request)
+    try:
+        ipaddress.ip_address(adresse)
+    except ValueError:
+        # En-tête X-Forwarded-For complet (NUM_PROXIES non défini) ou invalide
+        return request.META.get('REMOTE_ADDR')
+    return adresse
+
+
+def echec_connexion(sender, credentials, request=None, **kwargs):
+    """Historise un échec d'authentification (signal ``user_login_failed``)."""
+    from .models import Historique
+
+    Historique.log_failed_connection(
+        credentials.get(get_user_model().USERNAME_FIELD),
+        adresse_ip=adresse_client(request) if request is not None else None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '') if request is not None else ''
+    )
+
+
+def connexion(sender, request, user, **kwargs):
+    """Historise une connexion par session (signal ``user_logged_in``)."""
+    from .models import Historique
+
+    Historique.log_user_connection(
+        user, adresse_ip=adresse_client(request), user_agent=request.META.get('HTTP_USER_AGENT', '')
+    )
+
+
+class ConnexionSuspecteThrottle(BaseThrottle):
+    """Refuse les tentatives de connexion d'une adresse ou vers un compte bloqués par le détecteur."""
+
+    def allow_request(self, request, view):
+        if request.method != 'POST':
+            return True
+        identifiant = request.data.get(get_user_model().USERNAME_FIELD) if hasattr(request.data, 'get') else None
+        self._attente = obtenir_detecteur().attente(adresse_client(request), identifiant)
+        return not self._attente
+
+    def wait(self):
+        return self._attente
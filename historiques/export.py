@@ -0,0 +1,122 @@
+"""
+Export des historiques en flux (CSV ou JSON Lines, éventuellement compressé).
+
+Les lignes sont lues par un curseur côté serveur (``iterator(chunk_size=...)``)
+sous forme de tuples, sans instancier de modèle, et écrites par morceaux :
+la mémoire reste constante quel que soit le volume exporté et les premiers
+octets partent dès la première ligne lue.
+
+Sous ASGI, Django 4.2 consomme entièrement un itérateur synchrone avant
+d'envoyer le premier octet : les morceaux y sont produits un à un dans le
+thread synchrone (``en_flux_asynchrone``).
+"""
+
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+COLONNES = [
+    'id_historique', 'date', 'action', 'niveau_importance',
+    'utilisateur_id', 'utilisateur__email',
+    'content_type__app_label', 'content_type__model', 'object_id',
+    'description', 'adresse_ip', 'user_agent', 'tags',
+    'contexte', 'donnees_avant', 'donnees_apres',
+]
+
+COLONNES_JSON = {'contexte', 'donnees_avant', 'donnees_apres'}
+
+# Lignes regroupées par morceau envoyé
+LIGNES_PAR_MORCEAU = 500
+
+
+def lignes_export(queryset, taille_lot=None):
+    """Tuples des colonnes exportées, lus par lots sur un curseur côté serveur."""
+    taille_lot = taille_lot or settings.TABALI_SETTINGS.get('AUDIT_EXPORT_CHUNK_SIZE', 2000)
+    return queryset.values_list(*COLONNES).iterator(chunk_size=taille_lot)
+
+
+def _json(valeur):
+    return json.dumps(valeur, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def exporter_csv(lignes):
+    """Morceaux de texte CSV (en-tête compris)."""
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon)
+    ecrivain.writerow(COLONNES)
+    indices_json = [i for i, colonne in enumerate(COLONNES) if colonne in COLONNES_JSON]
+    indice_date = COLONNES.index('date')
+    nb_lignes = 0
+    for ligne in lignes:
+        ligne = list(ligne)
+        ligne[indice_date] = ligne[indice_date].isoformat()
+        for i in indices_json:
+            if ligne[i] is not None:
+                ligne[i] = _json(ligne[i])
+        ecrivain.writerow(ligne)
+        nb_lignes += 1
+        # Premier morceau dès la première ligne, puis tous les LIGNES_PAR_MORCEAU
+        if nb_lignes % LIGNES_PAR_MORCEAU == 1:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
+
+
+def exporter_jsonl(lignes):
+    """Morceaux de texte JSON Lines, un objet par historique."""
+    morceau = []
+    for ligne in lignes:
+        morceau.append(_json(dict(zip(COLONNES, ligne))))
+        if len(morceau) >= LIGNES_PAR_MORCEAU:
+            yield '\n'.join(morceau) + '\n'
+            morceau = []
+    if morceau:
+        yield '\n'.join(morceau) + '\n'
+
+
+def encoder(morceaux, compression=False):
+    """Encode les morceaux en UTF-8 et, si demandé, les compresse au fil de l'eau (gzip)."""
+    if not compression:
+        for morceau in morceaux:
+            yield morceau.encode('utf-8')
+        return
+    compresseur = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for morceau in morceaux:
+        donnees = compresseur.compress(morceau.encode('utf-8'))
+        if donnees:
+            yield donnees
+    yield compresseur.flush()
+
+
+async def en_flux_asynchrone(morceaux):
+    """
+    Itérateur asynchrone sur des morceaux produits de façon synchrone.
+
+    Chaque morceau est produit dans le thread synchrone partagé
+    (``thread_sensitive``) : le curseur côté serveur reste sur sa connexion.
+    """
+    morceaux = iter(morceaux)
+    suivant = sync_to_async(next)
+    try:
+        while True:
+            morceau = await suivant(morceaux, None)
+            if morceau is None:
+                return
+            yield morceau
+    finally:
+        # Client déconnecté : le générateur et son curseur sont fermés dans le même thread
+        if hasattr(morceaux, 'close'):
+            await sync_to_async(morceaux.close)()
+
+
+# Format -> (type de contenu, extension, générateur)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', exporter_csv),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl', exporter_jsonl),
+}
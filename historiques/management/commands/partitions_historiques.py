@@ -0,0 +1,47 @@
+"""
+Maintenance des partitions mensuelles des historiques et de l'index de leurs tags.
+
+    python manage.py partitions_historiques --liste
+    python manage.py partitions_historiques --simulation
+    python manage.py partitions_historiques --retention-mois 12
+"""
+
+from django.core.management.base import BaseCommand
+
+from historiques.partitions import lister_partitions, maintenir_partitions
+
+
+class Command(BaseCommand):
+    help = "Crée les partitions mensuelles à venir des historiques (et de leurs tags) et supprime celles hors rétention"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--liste',
+            action='store_true',
+            help='Affiche les partitions existantes sans rien modifier'
+        )
+        parser.add_argument(
+            '--retention-mois',
+            type=int,
+            help='Mois complets conservés (par défaut AUDIT_RETENTION_MONTHS)'
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Affiche les partitions qui seraient créées ou supprimées'
+        )
+    
+    def handle(self, *args, **options):
+        if options['liste']:
+            for mois in lister_partitions():
+                self.stdout.write(f"{mois:%Y-%m}")
+            return
+        
+        bilan = maintenir_partitions(
+            retention_mois=options['retention_mois'], simulation=options['simulation']
+        )
+        prefixe = "[simulation] " if options['simulation'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixe}Partitions créées : {', '.join(bilan['creees']) or 'aucune'} ; "
+            f"supprimées : {', '.join(bilan['supprimees']) or 'aucune'}"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiques', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historique',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name="Date de l'action"),
+        ),
+    ]
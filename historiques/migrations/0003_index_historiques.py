@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('historiques', '0002_date_evenement'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='historique',
+            options={'ordering': ['-date'], 'select_on_save': True, 'verbose_name': 'Historique', 'verbose_name_plural': 'Historiques'},
+        ),
+        migrations.RemoveIndex(
+            model_name='historique',
+            name='tabali_hist_action_b459ff_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='historique',
+            name='tabali_hist_utilisa_de03e2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='historique',
+            name='tabali_hist_niveau__97d8a4_idx',
+        ),
+        migrations.AlterField(
+            model_name='historique',
+            name='content_type',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name="Type d'objet concerné"),
+        ),
+        migrations.AlterField(
+            model_name='historique',
+            name='utilisateur',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historiques', to=settings.AUTH_USER_MODEL, verbose_name="Utilisateur ayant effectué l'action"),
+        ),
+        migrations.AddIndex(
+            model_name='historique',
+            index=models.Index(fields=['utilisateur', '-date'], name='tabali_hist_utilisa_76db76_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Partitionnement mensuel de tabali_historiques (voir historiques.partitions)
+
+from django.db import migrations
+
+from historiques.partitions import departitionner, partitionner
+
+
+def partitionner_historiques(apps, schema_editor):
+    partitionner(apps.get_model('historiques', 'Historique'), schema_editor)
+
+
+def departitionner_historiques(apps, schema_editor):
+    departitionner(apps.get_model('historiques', 'Historique'), schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiques', '0003_index_historiques'),
+    ]
+
+    operations = [
+        migrations.RunPython(partitionner_historiques, departitionner_historiques),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiques', '0004_partitionnement_mensuel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoriqueTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100, verbose_name='Tag')),
+                ('date', models.DateTimeField(verbose_name="Date de l'action")),
+                ('historique', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='index_tags', to='historiques.historique', verbose_name='Historique')),
+            ],
+            options={
+                'verbose_name': "Tag d'historique",
+                'verbose_name_plural': "Tags d'historiques",
+                'db_table': 'tabali_historiques_tags',
+                'indexes': [models.Index(fields=['tag', '-date'], name='tabali_hist_tag_f5af32_idx'), models.Index(fields=['date'], name='tabali_hist_date_c1fbd4_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='historiquetag',
+            constraint=models.UniqueConstraint(fields=('historique', 'tag'), name='historique_tag_unique'),
+        ),
+    ]
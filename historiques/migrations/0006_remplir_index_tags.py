@@ -0,0 +1,42 @@
+# Indexation des tags des historiques existants, par lots
+
+from django.db import migrations, transaction
+from django.db.models import Q
+
+TAILLE_LOT = 2000
+
+
+def remplir_index_tags(apps, schema_editor):
+    Historique = apps.get_model('historiques', 'Historique')
+    HistoriqueTag = apps.get_model('historiques', 'HistoriqueTag')
+    
+    a_indexer = Historique.objects.exclude(tags='').order_by('date', 'pk')
+    position = None
+    while True:
+        lot = a_indexer
+        if position is not None:
+            lot = lot.filter(Q(date__gt=position[0]) | Q(date=position[0], pk__gt=position[1]))
+        lot = list(lot.values_list('pk', 'date', 'tags')[:TAILLE_LOT])
+        if not lot:
+            return
+        position = (lot[-1][1], lot[-1][0])
+        # Une transaction par lot : la migration ne verrouille pas toute la table
+        with transaction.atomic():
+            HistoriqueTag.objects.bulk_create([
+                HistoriqueTag(historique_id=pk, tag=tag, date=date)
+                for pk, date, tags in lot
+                for tag in dict.fromkeys(t.strip().lower()[:100] for t in tags.split(',') if t.strip())
+            ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('historiques', '0005_index_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(remplir_index_tags, migrations.RunPython.noop),
+    ]
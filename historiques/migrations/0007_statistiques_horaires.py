@@ -0,0 +1,32 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiques', '0006_remplir_index_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueHoraire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('heure', models.DateTimeField(verbose_name='Heure')),
+                ('action', models.CharField(choices=[('creation', 'Création'), ('modification', 'Modification'), ('suppression', 'Suppression'), ('connexion', 'Connexion'), ('deconnexion', 'Déconnexion'), ('reservation', 'Réservation'), ('paiement', 'Paiement'), ('annulation', 'Annulation'), ('validation', 'Validation'), ('rejet', 'Rejet'), ('message', 'Message'), ('avis', 'Avis'), ('upload', 'Upload'), ('export', 'Export'), ('recherche', 'Recherche'), ('autre', 'Autre')], max_length=50, verbose_name='Action')),
+                ('niveau_importance', models.CharField(choices=[('info', 'Information'), ('attention', 'Attention'), ('critique', 'Critique'), ('securite', 'Sécurité')], max_length=20, verbose_name="Niveau d'importance")),
+                ('nombre', models.PositiveIntegerField(default=0, verbose_name='Nombre')),
+            ],
+            options={
+                'verbose_name': 'Statistique horaire des historiques',
+                'verbose_name_plural': 'Statistiques horaires des historiques',
+                'db_table': 'tabali_historiques_stats_horaires',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statistiquehoraire',
+            constraint=models.UniqueConstraint(fields=('heure', 'action', 'niveau_importance'), name='statistique_horaire_unique'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Index des tags recréé avant son partitionnement (0009) : clé primaire UUID
+# (pas de séquence partagée entre les partitions) et contrainte d'unicité
+# incluant la date. Ses lignes sont reconstruites à partir des historiques.
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historiques', '0007_statistiques_horaires'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='HistoriqueTag',
+        ),
+        migrations.CreateModel(
+            name='HistoriqueTag',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tag', models.CharField(max_length=100, verbose_name='Tag')),
+                ('date', models.DateTimeField(verbose_name="Date de l'action")),
+                ('historique', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='index_tags', to='historiques.historique', verbose_name='Historique')),
+            ],
+            options={
+                'verbose_name': "Tag d'historique",
+                'verbose_name_plural': "Tags d'historiques",
+                'db_table': 'tabali_historiques_tags',
+                'indexes': [models.Index(fields=['tag', '-date'], name='tabali_hist_tag_f5af32_idx'), models.Index(fields=['date'], name='tabali_hist_date_c1fbd4_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='historiquetag',
+            constraint=models.UniqueConstraint(fields=('historique', 'tag', 'date'), name='historique_tag_unique'),
+        ),
+    ]
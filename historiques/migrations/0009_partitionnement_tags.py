@@ -0,0 +1,37 @@
+# Partitionnement mensuel de tabali_historiques_tags, aligné sur celui des
+# historiques (voir historiques.partitions), puis réindexation par lots
+
+import importlib
+
+from django.db import migrations
+
+from historiques.partitions import departitionner, obtenir_partitions, partitionner
+
+remplir_index_tags = importlib.import_module(
+    'historiques.migrations.0006_remplir_index_tags'
+).remplir_index_tags
+
+
+def partitionner_tags(apps, schema_editor):
+    # Mêmes mois que les historiques : leurs partitions sont supprimées ensemble
+    historiques = obtenir_partitions(schema_editor)
+    mois = historiques.lister() if historiques else ()
+    partitionner(apps.get_model('historiques', 'HistoriqueTag'), schema_editor, mois)
+
+
+def departitionner_tags(apps, schema_editor):
+    departitionner(apps.get_model('historiques', 'HistoriqueTag'), schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('historiques', '0008_tags_cle_uuid'),
+    ]
+
+    operations = [
+        migrations.RunPython(partitionner_tags, departitionner_tags, atomic=True),
+        migrations.RunPython(remplir_index_tags, migrations.RunPython.noop),
+    ]
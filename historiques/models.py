@@ -4,12 +4,18 @@ Modèles pour la gestion des historiques - Application historiques.
 Basé sur le diagramme de base de données : Historiques.
 """
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from accounts.models import User
 import uuid
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
 
 
 class Historique(models.Model):
@@ -53,7 +59,8 @@ class Historique(models.Model):
         choices=TypeAction.choices,
         default=TypeAction.AUTRE
     )
-    date = models.DateTimeField(_('Date de l\'action'), auto_now_add=True)
+    # Date de l'événement, et non de son insertion (les écritures sont groupées)
+    date = models.DateTimeField(_('Date de l\'action'), default=timezone.now, editable=False)
     
     # Relations avec autres tables
     utilisateur = models.ForeignKey(
@@ -62,7 +69,8 @@ class Historique(models.Model):
         null=True,
         blank=True,
         related_name='historiques',
-        verbose_name=_('Utilisateur ayant effectué l\'action')
+        verbose_name=_('Utilisateur ayant effectué l\'action'),
+        db_index=False  # Couvert par l'index (utilisateur, date)
     )
     
     # Champs génériques pour lier à n'importe quel objet
@@ -71,7 +79,8 @@ class Historique(models.Model):
         on_delete=models.CASCADE,
         null=True,
         blank=True,
-        verbose_name=_('Type d\'objet concerné')
+        verbose_name=_('Type d\'objet concerné'),
+        db_index=False  # Couvert par l'index (content_type, object_id)
     )
     object_id = models.CharField(
         _('ID de l\'objet'),
@@ -153,17 +162,26 @@ class Historique(models.Model):
         """Méthode de listage (à implémenter dans les vues)."""
         pass
     
+    # Niveaux toujours écrits immédiatement, sans passer par le tampon
+    NIVEAUX_SYNCHRONES = (NiveauImportance.SECURITE, NiveauImportance.CRITIQUE)
+    
     @classmethod
     def log_action(cls, action, utilisateur=None, objet=None, description="", 
                    contexte=None, niveau=None, adresse_ip=None, user_agent="", 
-                   donnees_avant=None, donnees_apres=None, tags=""):
+                   donnees_avant=None, donnees_apres=None, tags="", synchrone=None):
         """
         Méthode utilitaire pour créer rapidement un historique.
         
+        Sauf pour les niveaux ``securite`` et ``critique`` (ou si ``synchrone``
+        est vrai), l'historique est placé dans le tampon d'écriture groupée
+        (voir ``historiques.tampon``) à la validation de la transaction en
+        cours : comme avec une écriture directe, un historique émis dans une
+        transaction annulée n'est pas conservé.
+        
         Args:
             action: Type d'action (TypeAction)
             utilisateur: Utilisateur ayant effectué l'action
-            objet: Objet concerné par l'action
+            objet: Objet concerné par l'action, ou modèle pour une action groupée
             description: Description de l'action
             contexte: Données contextuelles (dict)
             niveau: Niveau d'importance
@@ -172,9 +190,10 @@ class Historique(models.Model):
             donnees_avant: État avant modification
             donnees_apres: État après modification
             tags: Tags pour la recherche
+            synchrone: Force (True) ou interdit (False) l'écriture immédiate
             
         Returns:
-            Instance d'Historique créée
+            Instance d'Historique, créée ou en attente d'insertion
         """
         historique_data = {
             'action': action,
@@ -189,13 +208,31 @@ class Historique(models.Model):
             'tags': tags,
         }
         
-        if objet:
-            historique_data.update({
-                'content_type': ContentType.objects.get_for_model(objet),
-                'object_id': str(objet.pk),
-            })
+        if objet is not None:
+            # Un modèle (classe) désigne tous ses objets, sans identifiant
+            historique_data['content_type'] = ContentType.objects.get_for_model(objet)
+            if not isinstance(objet, type):
+                historique_data['object_id'] = str(objet.pk)
         
-        return cls.objects.create(**historique_data)
+        historique = cls(**historique_data)
+        if action == cls.TypeAction.CONNEXION:
+            # Détection des anomalies au fil de l'eau, sans relire la table
+            from .detection import obtenir_detecteur
+            
+            obtenir_detecteur().observer(historique)
+        if synchrone is None:
+            synchrone = (
+                historique.niveau_importance in cls.NIVEAUX_SYNCHRONES
+                or not settings.TABALI_SETTINGS.get('AUDIT_BUFFERED', True)
+            )
+        if synchrone:
+            historique.save(force_insert=True)
+        else:
+            from .tampon import obtenir_tampon
+            
+            tampon = obtenir_tampon()
+            transaction.on_commit(lambda: tampon.ajouter(historique))
+        return historique
     
     @classmethod
     def log_user_connection(cls, utilisateur, adresse_ip=None, user_agent=""):
@@ -204,11 +241,25 @@ class Historique(models.Model):
             action=cls.TypeAction.CONNEXION,
             utilisateur=utilisateur,
             description=f"Connexion de l'utilisateur {utilisateur.get_full_name()}",
+            contexte={'identifiant': utilisateur.get_username()},
             adresse_ip=adresse_ip,
             user_agent=user_agent,
             tags="connexion,auth"
         )
     
+    @classmethod
+    def log_failed_connection(cls, identifiant, adresse_ip=None, user_agent=""):
+        """Log d'échec de connexion (identifiant saisi, compte existant ou non)."""
+        return cls.log_action(
+            action=cls.TypeAction.CONNEXION,
+            description=f"Échec de connexion pour {identifiant}",
+            contexte={'identifiant': identifiant, 'echec': True},
+            niveau=cls.NiveauImportance.ATTENTION,
+            adresse_ip=adresse_ip,
+            user_agent=user_agent,
+            tags="connexion,auth,echec"
+        )
+    
     @classmethod
     def log_user_disconnection(cls, utilisateur, adresse_ip=None):
         """Log de déconnexion utilisateur."""
@@ -250,20 +301,259 @@ class Historique(models.Model):
             return [tag.strip() for tag in self.tags.split(',')]
         return []
     
+    def save(self, *args, **kwargs):
+        """Override save pour tenir à jour l'index des tags."""
+        creation = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            HistoriqueTag.indexer([self], remplacer=not creation)
+    
     class Meta:
         verbose_name = _('Historique')
         verbose_name_plural = _('Historiques')
         db_table = 'tabali_historiques'
         ordering = ['-date']
+        # Table partitionnée par mois (voir historiques.partitions) : peu d'index,
+        # chacun étant maintenu à chaque insertion dans la partition du mois
         indexes = [
-            models.Index(fields=['action']),
-            models.Index(fields=['utilisateur']),
-            models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['-date']),
-            models.Index(fields=['niveau_importance']),
+            models.Index(fields=['utilisateur', '-date']),
+            models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['adresse_ip']),
         ]
+        # Sous SQLite, les écritures passent par des déclencheurs qui ne rapportent
+        # pas le nombre de lignes modifiées : save() vérifie l'existence par un SELECT
+        select_on_save = True
     
     def __str__(self):
         user_name = self.utilisateur.get_full_name() if self.utilisateur else "Système"
         return f"[{self.get_action_display()}] {user_name} - {self.description[:50]}..."
+
+
+class HistoriqueTag(models.Model):
+    """
+    Index des tags des historiques : une ligne par (historique, tag).
+    
+    Le champ ``Historique.tags`` reste la forme affichée ; les recherches par
+    tag passent par cette table (index (tag, date)), dont le coût dépend du
+    nombre d'historiques correspondants et non de la taille de la table.
+    """
+    
+    # Table partitionnée par mois comme celle des historiques (voir
+    # historiques.partitions) : pas de séquence partagée entre les partitions
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Pas de contrainte en base : la clé primaire de la table partitionnée
+    # inclut la date et ne peut pas être référencée par une clé étrangère
+    historique = models.ForeignKey(
+        Historique,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        db_index=False,  # Couvert par la contrainte d'unicité
+        related_name='index_tags',
+        verbose_name=_('Historique')
+    )
+    tag = models.CharField(_('Tag'), max_length=100)
+    # Copie de Historique.date : filtres par période et purge avec les partitions
+    date = models.DateTimeField(_('Date de l\'action'))
+    
+    @staticmethod
+    def normaliser(tags):
+        """Tags uniques, sans espaces superflus, en minuscules."""
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        return list(dict.fromkeys(tag.strip().lower()[:100] for tag in tags if tag and tag.strip()))
+    
+    @classmethod
+    def indexer(cls, historiques, remplacer=False):
+        """
+        Crée les lignes d'index des tags d'historiques enregistrés.
+        
+        Args:
+            remplacer: supprime d'abord les lignes existantes (tags modifiés)
+        """
+        if remplacer:
+            cls.objects.filter(historique__in=[historique.pk for historique in historiques]).delete()
+        cls.objects.bulk_create([
+            cls(historique_id=historique.pk, tag=tag, date=historique.date)
+            for historique in historiques
+            for tag in cls.normaliser(historique.tags)
+        ], ignore_conflicts=True)
+    
+    @classmethod
+    def filtrer(cls, queryset, tags, tous=True, debut=None, fin=None):
+        """
+        Restreint des historiques à ceux portant des tags.
+        
+        Args:
+            tous: tous les tags (ET) ou au moins un (OU)
+            debut, fin: bornes de date [debut, fin[ appliquées aussi à l'index
+        """
+        tags = cls.normaliser(tags)
+        if not tags:
+            return queryset
+        lignes = cls.objects.filter(tag__in=tags)
+        if debut:
+            lignes = lignes.filter(date__gte=debut)
+        if fin:
+            lignes = lignes.filter(date__lt=fin)
+        if tous and len(tags) > 1:
+            lignes = lignes.values('historique_id').annotate(nb_tags=models.Count('tag')).filter(nb_tags=len(tags))
+        return queryset.filter(pk__in=lignes.values('historique_id'))
+    
+    class Meta:
+        verbose_name = _('Tag d\'historique')
+        verbose_name_plural = _('Tags d\'historiques')
+        db_table = 'tabali_historiques_tags'
+        constraints = [
+            # La clé de partitionnement (date) fait partie de toute contrainte
+            # d'unicité ; un historique n'a qu'une date, l'unicité est la même
+            models.UniqueConstraint(fields=['historique', 'tag', 'date'], name='historique_tag_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-date']),
+            models.Index(fields=['date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tag} ({self.historique_id})"
+
+
+class StatistiqueHoraire(models.Model):
+    """
+    Nombre d'historiques par heure, action et niveau d'importance.
+    
+    Les heures révolues (depuis au moins ``AUDIT_ROLLUP_DELAY_SECONDS``, le
+    temps que le tampon d'écriture soit vidé) sont agrégées périodiquement
+    (``agreger``) ; les statistiques se calculent sur ces agrégats, plus un
+    comptage direct de la fin non encore agrégée et des heures entamées aux
+    bornes de la période.
+    
+    Des historiques peuvent arriver après l'agrégation de leur heure (lots
+    conservés par le tampon pendant une panne de la base, écritures après
+    commit) : chaque passage recalcule aussi les ``AUDIT_ROLLUP_REFRESH_HOURS``
+    dernières heures déjà agrégées.
+    """
+    
+    heure = models.DateTimeField(_('Heure'))
+    action = models.CharField(_('Action'), max_length=50, choices=Historique.TypeAction.choices)
+    niveau_importance = models.CharField(
+        _('Niveau d\'importance'),
+        max_length=20,
+        choices=Historique.NiveauImportance.choices
+    )
+    nombre = models.PositiveIntegerField(_('Nombre'), default=0)
+    
+    @staticmethod
+    def _heure_pleine(moment, superieure=False):
+        heure = moment.replace(minute=0, second=0, microsecond=0)
+        if superieure and heure < moment:
+            heure += timedelta(hours=1)
+        return heure
+    
+    @classmethod
+    def limite(cls):
+        """Début de la période non encore agrégée (None si rien n'a été agrégé)."""
+        derniere = cls.objects.aggregate(derniere=Max('heure'))['derniere']
+        return derniere + timedelta(hours=1) if derniere else None
+    
+    @classmethod
+    def agreger(cls, maintenant=None, heures_par_lot=24):
+        """
+        Agrège les heures révolues pas encore agrégées, et recalcule les
+        ``AUDIT_ROLLUP_REFRESH_HOURS`` dernières heures déjà agrégées pour
+        prendre en compte les historiques arrivés en retard.
+        
+        Chaque heure est recalculée en entier (suppression puis insertion) :
+        l'agrégation peut être relancée sans risque de double comptage.
+        
+        Returns:
+            int: nombre d'heures traitées
+        """
+        maintenant = maintenant or timezone.now()
+        tabali_settings = settings.TABALI_SETTINGS
+        delai = tabali_settings.get('AUDIT_ROLLUP_DELAY_SECONDS', 300)
+        fin = cls._heure_pleine(maintenant - timedelta(seconds=delai))
+        debut = cls.limite()
+        if debut is not None:
+            debut -= timedelta(hours=tabali_settings.get('AUDIT_ROLLUP_REFRESH_HOURS', 24))
+        else:
+            premiere = Historique.objects.aggregate(premiere=Min('date'))['premiere']
+            if premiere is None:
+                return 0
+            debut = cls._heure_pleine(premiere)
+        
+        nb_heures = 0
+        while debut < fin:
+            fin_lot = min(debut + timedelta(hours=heures_par_lot), fin)
+            comptes = (
+                Historique.objects.filter(date__gte=debut, date__lt=fin_lot)
+                .annotate(heure=TruncHour('date', tzinfo=dt_timezone.utc))
+                .values('heure', 'action', 'niveau_importance')
+                .annotate(nombre=Count('pk'))
+                .order_by()
+            )
+            with transaction.atomic():
+                cls.objects.filter(heure__gte=debut, heure__lt=fin_lot).delete()
+                cls.objects.bulk_create([cls(**compte) for compte in comptes])
+            nb_heures += int((fin_lot - debut).total_seconds() // 3600)
+            debut = fin_lot
+        return nb_heures
+    
+    @classmethod
+    def compter(cls, debut=None, fin=None, actions=None, niveaux=None, limite=None):
+        """
+        Nombre d'historiques de [debut, fin[ par (action, niveau d'importance).
+        
+        Args:
+            limite: résultat de ``limite()`` s'il est déjà connu
+        
+        Returns:
+            Counter: {(action, niveau_importance): nombre}
+        """
+        filtres = {}
+        if actions:
+            filtres['action__in'] = actions
+        if niveaux:
+            filtres['niveau_importance__in'] = niveaux
+        
+        def compter_direct(bas, haut):
+            historiques = Historique.objects.filter(**filtres)
+            if bas is not None:
+                historiques = historiques.filter(date__gte=bas)
+            if haut is not None:
+                historiques = historiques.filter(date__lt=haut)
+            for ligne in historiques.values('action', 'niveau_importance').annotate(nombre=Count('pk')).order_by():
+                comptes[(ligne['action'], ligne['niveau_importance'])] += ligne['nombre']
+        
+        comptes = Counter()
+        limite = limite or cls.limite()
+        # Heures entièrement comprises dans la période et déjà agrégées
+        bas_agrege = cls._heure_pleine(debut, superieure=True) if debut else None
+        haut_agrege = min(limite, cls._heure_pleine(fin)) if limite and fin else limite
+        if haut_agrege is None or (bas_agrege is not None and bas_agrege >= haut_agrege):
+            compter_direct(debut, fin)
+            return comptes
+        
+        agreges = cls.objects.filter(heure__lt=haut_agrege, **filtres)
+        if bas_agrege is not None:
+            agreges = agreges.filter(heure__gte=bas_agrege)
+            if debut < bas_agrege:
+                compter_direct(debut, bas_agrege)
+        for ligne in agreges.values('action', 'niveau_importance').annotate(total=Sum('nombre')).order_by():
+            comptes[(ligne['action'], ligne['niveau_importance'])] += ligne['total']
+        if fin is None or haut_agrege < fin:
+            compter_direct(haut_agrege, fin)
+        return comptes
+    
+    class Meta:
+        verbose_name = _('Statistique horaire des historiques')
+        verbose_name_plural = _('Statistiques horaires des historiques')
+        db_table = 'tabali_historiques_stats_horaires'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['heure', 'action', 'niveau_importance'], name='statistique_horaire_unique'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.heure:%Y-%m-%d %H:00} {self.action}/{self.niveau_importance} : {self.nombre}"
@@ -0,0 +1,356 @@
+"""
+Partitionnement mensuel de la table des historiques et de l'index des tags.
+
+``tabali_historiques`` ne reçoit que des insertions et grossit sans limite,
+comme ``tabali_historiques_tags`` qui en indexe les tags : chacune est
+découpée en une partition par mois (UTC) de la date de l'événement,
+``<table>_pAAAA_MM``, plus une partition par défaut ``<table>_defaut`` qui
+recueille les lignes d'un mois sans partition (elles y sont reprises à la
+création de la partition du mois).
+
+- PostgreSQL : partitionnement déclaratif natif (``PARTITION BY RANGE (date)``).
+  La clé primaire devient (clé, ``date``) ; un filtre sur la date ne
+  parcourt que les partitions concernées.
+- SQLite (développement) : une table par mois, et ``tabali_historiques``
+  devient une vue ``UNION ALL`` de ces tables ; des déclencheurs
+  ``INSTEAD OF`` routent chaque écriture vers la table de son mois. Le filtre
+  sur la date est propagé à chaque table, qui y répond par son index.
+  Une migration modifiant le schéma d'``Historique`` ou d'``HistoriqueTag``
+  doit d'abord revenir à une table simple (``departitionner``) sous SQLite.
+
+Les partitions des prochains mois sont créées à l'avance et les plus
+anciennes supprimées d'un bloc, pour les deux tables ensemble
+(``maintenir_partitions``, tâche quotidienne) : la rétention ne coûte plus
+un DELETE par ligne.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+TABLE = 'tabali_historiques'
+TABLE_TAGS = 'tabali_historiques_tags'
+
+# Tables partitionnées -> colonne de leur clé primaire
+TABLES = {TABLE: 'id_historique', TABLE_TAGS: 'id'}
+
+
+def debut_mois(moment):
+    """Premier instant (UTC) du mois de ``moment``."""
+    if timezone.is_aware(moment):
+        moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def mois_suivant(mois):
+    return debut_mois(mois + timedelta(days=32))
+
+
+def nom_partition(mois, table=TABLE):
+    return f'{table}_p{mois:%Y_%m}'
+
+
+def mois_partition(nom, table=TABLE):
+    return datetime.strptime(nom[len(table) + 2:], '%Y_%m').replace(tzinfo=dt_timezone.utc)
+
+
+class Partitions:
+    """Partitions mensuelles d'une table (voir ``TABLES``)."""
+
+    def __init__(self, schema_editor, table=TABLE):
+        self.schema_editor = schema_editor
+        self.q = schema_editor.quote_name
+        self.table = table
+        self.cle = TABLES[table]
+        self.defaut = f'{table}_defaut'
+        self.prefixe = f'{table}_p'
+
+    def _nom(self, mois):
+        return nom_partition(mois, self.table)
+
+    def _executer(self, sql, params=None):
+        self.schema_editor.execute(sql, params)
+
+    def _lire(self, sql, params=None):
+        with self.schema_editor.connection.cursor() as curseur:
+            curseur.execute(sql, params)
+            return curseur.fetchall()
+
+
+class PartitionsPostgres(Partitions):
+    """Partitions déclaratives natives de PostgreSQL."""
+
+    @staticmethod
+    def _bornes(mois):
+        return f"FROM ('{mois.isoformat()}') TO ('{mois_suivant(mois).isoformat()}')"
+
+    def lister(self):
+        lignes = self._lire(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass", [self.table]
+        )
+        return sorted(mois_partition(nom, self.table) for nom, in lignes if nom.startswith(self.prefixe))
+
+    def creer(self, mois):
+        """Crée la partition d'un mois, en y reprenant les lignes de la partition par défaut."""
+        if mois in self.lister():
+            return False
+        q, partition = self.q, self._nom(mois)
+        self._executer(f"CREATE TABLE {q(partition)} (LIKE {q(self.table)} INCLUDING DEFAULTS)")
+        self._executer(
+            f"WITH deplacees AS (DELETE FROM {q(self.defaut)} WHERE {q('date')} >= %s AND {q('date')} < %s "
+            f"RETURNING *) INSERT INTO {q(partition)} SELECT * FROM deplacees",
+            [mois, mois_suivant(mois)]
+        )
+        # Les index et la clé primaire de la table mère sont créés sur la partition à l'attachement
+        self._executer(f"ALTER TABLE {q(self.table)} ATTACH PARTITION {q(partition)} FOR VALUES {self._bornes(mois)}")
+        return True
+
+    def supprimer(self, mois):
+        q, partition = self.q, self._nom(mois)
+        self._executer(f"ALTER TABLE {q(self.table)} DETACH PARTITION {q(partition)}")
+        self._executer(f"DROP TABLE {q(partition)}")
+
+    def _recreer_index_et_cles(self, modele):
+        for index in modele._meta.indexes:
+            self.schema_editor.add_index(modele, index)
+        # Les contraintes d'unicité d'une table partitionnée incluent la date
+        for contrainte in modele._meta.constraints:
+            self.schema_editor.add_constraint(modele, contrainte)
+        for champ in modele._meta.concrete_fields:
+            if champ.remote_field and champ.db_constraint:
+                self._executer(self.schema_editor._create_fk_sql(modele, champ, '_fk_%(to_table)s_%(to_column)s'))
+
+    def partitionner(self, modele, mois):
+        q, table, ancienne = self.q, self.table, f'{self.table}_ancienne'
+        self._executer(f"ALTER TABLE {q(table)} RENAME TO {q(ancienne)}")
+        self._executer(f"CREATE TABLE {q(table)} (LIKE {q(ancienne)} INCLUDING DEFAULTS) PARTITION BY RANGE ({q('date')})")
+        self._executer(f"ALTER TABLE {q(table)} ADD PRIMARY KEY ({q(self.cle)}, {q('date')})")
+        self._executer(f"CREATE TABLE {q(self.defaut)} PARTITION OF {q(table)} DEFAULT")
+        for debut in mois:
+            self._executer(f"CREATE TABLE {q(self._nom(debut))} PARTITION OF {q(table)} FOR VALUES {self._bornes(debut)}")
+        self._executer(f"INSERT INTO {q(table)} SELECT * FROM {q(ancienne)}")
+        self._executer(f"DROP TABLE {q(ancienne)}")
+        self._recreer_index_et_cles(modele)
+
+    def departitionner(self, modele):
+        q, table, partitionnee = self.q, self.table, f'{self.table}_partitionnee'
+        self._executer(f"ALTER TABLE {q(table)} RENAME TO {q(partitionnee)}")
+        self._executer(f"CREATE TABLE {q(table)} (LIKE {q(partitionnee)} INCLUDING DEFAULTS)")
+        self._executer(f"ALTER TABLE {q(table)} ADD PRIMARY KEY ({q(self.cle)})")
+        self._executer(f"INSERT INTO {q(table)} SELECT * FROM {q(partitionnee)}")
+        self._executer(f"DROP TABLE {q(partitionnee)} CASCADE")
+        self._recreer_index_et_cles(modele)
+
+    def mois_presents(self):
+        """Mois des lignes existantes (avant partitionnement)."""
+        lignes = self._lire(
+            f"SELECT DISTINCT date_trunc('month', {self.q('date')} AT TIME ZONE 'UTC') FROM {self.q(self.table)}"
+        )
+        return [debut.replace(tzinfo=dt_timezone.utc) for debut, in lignes]
+
+
+class PartitionsSQLite(Partitions):
+    """Une table par mois derrière une vue ``UNION ALL`` et des déclencheurs de routage."""
+
+    @staticmethod
+    def _valeur_date(moment):
+        # Format de stockage des dates par Django sous SQLite (UTC)
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+    def lister(self):
+        lignes = self._lire(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE %s ESCAPE '\\'",
+            [self.prefixe.replace('_', '\\_') + '%']
+        )
+        return sorted(mois_partition(nom, self.table) for nom, in lignes)
+
+    def _creer_table(self, mois):
+        """Crée la table d'un mois sur le modèle de la table par défaut et y reprend ses lignes."""
+        q, partition = self.q, self._nom(mois)
+        definitions = self._lire(
+            "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL "
+            "ORDER BY type = 'index'", [self.defaut]
+        )
+        for type_objet, nom, sql in definitions:
+            sql = re.sub(rf'(["`]?){re.escape(self.defaut)}\1', q(partition), sql, count=1 if type_objet == 'table' else 0)
+            if type_objet == 'index':
+                sql = sql.replace(q(nom), q(f'{nom}_{partition[len(self.table) + 1:]}'), 1)
+            self._executer(sql)
+        colonnes = ', '.join(q(colonne) for colonne in self._colonnes())
+        self._executer(
+            f"INSERT INTO {q(partition)} ({colonnes}) SELECT {colonnes} FROM {q(self.defaut)} "
+            f"WHERE {q('date')} >= %s AND {q('date')} < %s",
+            [self._valeur_date(mois), self._valeur_date(mois_suivant(mois))]
+        )
+        self._executer(
+            f"DELETE FROM {q(self.defaut)} WHERE {q('date')} >= %s AND {q('date')} < %s",
+            [self._valeur_date(mois), self._valeur_date(mois_suivant(mois))]
+        )
+
+    def _colonnes(self):
+        return [ligne[1] for ligne in self._lire(f"PRAGMA table_info({self.q(self.defaut)})")]
+
+    def _recreer_vue(self):
+        q = self.q
+        colonnes = self._colonnes()
+        liste = ', '.join(q(colonne) for colonne in colonnes)
+        nouvelles = ', '.join(f'NEW.{q(colonne)}' for colonne in colonnes)
+        affectations = ', '.join(f'{q(colonne)} = NEW.{q(colonne)}' for colonne in colonnes)
+        cle, vue = q(self.cle), self.table
+
+        partitions = [(self._nom(mois), mois) for mois in self.lister()]
+        self._executer(f"DROP VIEW IF EXISTS {q(vue)}")
+        self._executer(f"CREATE VIEW {q(vue)} AS " + " UNION ALL ".join(
+            f"SELECT {liste} FROM {q(table)}" for table in [self.defaut] + [table for table, _ in partitions]
+        ))
+
+        def condition(ligne, mois):
+            return (
+                f"{ligne}.{q('date')} >= '{self._valeur_date(mois)}' "
+                f"AND {ligne}.{q('date')} < '{self._valeur_date(mois_suivant(mois))}'"
+            )
+
+        routes = [(table, lambda ligne, mois=mois: condition(ligne, mois)) for table, mois in partitions]
+        # La table par défaut reçoit ce qu'aucune partition ne couvre
+        routes.append((self.defaut, lambda ligne: (
+            'NOT (' + ' OR '.join(f'({condition(ligne, mois)})' for _, mois in partitions) + ')'
+            if partitions else '1'
+        )))
+        for table, quand in routes:
+            self._executer(
+                f"CREATE TRIGGER {q(table + '_insertion')} INSTEAD OF INSERT ON {q(vue)} "
+                f"WHEN {quand('NEW')} BEGIN INSERT INTO {q(table)} ({liste}) VALUES ({nouvelles}); END"
+            )
+            self._executer(
+                f"CREATE TRIGGER {q(table + '_modification')} INSTEAD OF UPDATE ON {q(vue)} "
+                f"WHEN {quand('OLD')} BEGIN UPDATE {q(table)} SET {affectations} WHERE {cle} = OLD.{cle}; END"
+            )
+            self._executer(
+                f"CREATE TRIGGER {q(table + '_suppression')} INSTEAD OF DELETE ON {q(vue)} "
+                f"WHEN {quand('OLD')} BEGIN DELETE FROM {q(table)} WHERE {cle} = OLD.{cle}; END"
+            )
+
+    def creer(self, mois):
+        if mois in self.lister():
+            return False
+        self._creer_table(mois)
+        self._recreer_vue()
+        return True
+
+    def supprimer(self, mois):
+        self._executer(f"DROP TABLE {self.q(self._nom(mois))}")
+        self._recreer_vue()
+
+    def partitionner(self, modele, mois):
+        self._executer(f"ALTER TABLE {self.q(self.table)} RENAME TO {self.q(self.defaut)}")
+        for debut in mois:
+            self._creer_table(debut)
+        self._recreer_vue()
+
+    def departitionner(self, modele):
+        q = self.q
+        partitions = self.lister()
+        colonnes = ', '.join(q(colonne) for colonne in self._colonnes())
+        self._executer(f"DROP VIEW {q(self.table)}")
+        self._executer(f"ALTER TABLE {q(self.defaut)} RENAME TO {q(self.table)}")
+        for mois in partitions:
+            partition = self._nom(mois)
+            self._executer(f"INSERT INTO {q(self.table)} ({colonnes}) SELECT {colonnes} FROM {q(partition)}")
+            self._executer(f"DROP TABLE {q(partition)}")
+
+    def mois_presents(self):
+        lignes = self._lire(f"SELECT DISTINCT substr({self.q('date')}, 1, 7) FROM {self.q(self.table)}")
+        return [datetime.strptime(mois, '%Y-%m').replace(tzinfo=dt_timezone.utc) for mois, in lignes if mois]
+
+
+BACKENDS = {'postgresql': PartitionsPostgres, 'sqlite': PartitionsSQLite}
+
+
+def obtenir_partitions(schema_editor, table=TABLE):
+    """Gestionnaire des partitions d'une table adapté à la base, ou None si elle n'est pas prise en charge."""
+    classe = BACKENDS.get(schema_editor.connection.vendor)
+    return classe(schema_editor, table) if classe else None
+
+
+def mois_a_venir(maintenant=None, nb_mois=None):
+    """Mois courant et ``AUDIT_PARTITIONS_AHEAD`` mois suivants."""
+    nb_mois = settings.TABALI_SETTINGS.get('AUDIT_PARTITIONS_AHEAD', 3) if nb_mois is None else nb_mois
+    mois = [debut_mois(maintenant or timezone.now())]
+    for _ in range(nb_mois):
+        mois.append(mois_suivant(mois[-1]))
+    return mois
+
+
+def partitionner(modele, schema_editor, mois=()):
+    """
+    Convertit la table du modèle (voir ``TABLES``) en table partitionnée (migration).
+
+    Args:
+        mois: mois à partitionner en plus de ceux présents et à venir
+    """
+    partitions = obtenir_partitions(schema_editor, modele._meta.db_table)
+    if partitions is not None:
+        partitions.partitionner(modele, sorted(set(partitions.mois_presents()) | set(mois_a_venir()) | set(mois)))
+
+
+def departitionner(modele, schema_editor):
+    """Revient à une table simple (migration inverse)."""
+    partitions = obtenir_partitions(schema_editor, modele._meta.db_table)
+    if partitions is not None:
+        partitions.departitionner(modele)
+
+
+def lister_partitions():
+    """Mois des partitions existantes."""
+    with connection.schema_editor(atomic=False) as schema_editor:
+        partitions = obtenir_partitions(schema_editor)
+        return partitions.lister() if partitions else []
+
+
+def maintenir_partitions(maintenant=None, retention_mois=None, simulation=False):
+    """
+    Crée les partitions des mois à venir et supprime celles dont tout le
+    contenu a dépassé la rétention (``AUDIT_RETENTION_MONTHS``, aucune si None),
+    pour les historiques et l'index de leurs tags ensemble.
+
+    Returns:
+        dict: bilan (creees, supprimees), listes de mois ``AAAA-MM``
+    """
+    maintenant = maintenant or timezone.now()
+    if retention_mois is None:
+        retention_mois = settings.TABALI_SETTINGS.get('AUDIT_RETENTION_MONTHS')
+
+    bilan = {'creees': [], 'supprimees': []}
+    limite = None
+    if retention_mois:
+        limite = debut_mois(maintenant)
+        for _ in range(retention_mois):
+            limite = debut_mois(limite - timedelta(days=1))
+
+    with connection.schema_editor() as schema_editor:
+        for table in TABLES:
+            partitions = obtenir_partitions(schema_editor, table)
+            if partitions is None:
+                return bilan
+            existantes = partitions.lister()
+            creees = [mois for mois in mois_a_venir(maintenant) if mois not in existantes]
+            supprimees = [mois for mois in existantes if limite and mois_suivant(mois) <= limite]
+            if not simulation:
+                for mois in creees:
+                    partitions.creer(mois)
+                for mois in supprimees:
+                    partitions.supprimer(mois)
+            bilan['creees'].extend(f'{mois:%Y-%m}' for mois in creees)
+            bilan['supprimees'].extend(f'{mois:%Y-%m}' for mois in supprimees)
+        if limite and not simulation:
+            # Les agrégats horaires ne sont pas partitionnés : leurs lignes sont purgées par date
+            from .models import StatistiqueHoraire
+
+            StatistiqueHoraire.objects.filter(heure__lt=limite).delete()
+    bilan['creees'] = sorted(set(bilan['creees']))
+    bilan['supprimees'] = sorted(set(bilan['supprimees']))
+    return bilan
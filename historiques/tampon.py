@@ -0,0 +1,190 @@
+"""
+Écriture groupée des historiques.
+
+``Historique.log_action`` ne fait plus un INSERT par événement : les
+historiques sont placés dans un tampon propre au processus et insérés par
+``bulk_create`` dès que ``AUDIT_BATCH_SIZE`` événements attendent, ou au plus
+tard toutes les ``AUDIT_FLUSH_INTERVAL_MS`` millisecondes, par un thread de fond.
+
+Les événements de niveau ``securite`` ou ``critique`` restent écrits de façon
+synchrone. Si la base est indisponible, les lots restent dans le tampon
+(borné à ``AUDIT_BUFFER_MAX_SIZE`` : au-delà, les plus anciens sont abandonnés
+et journalisés) et sont réessayés avec un délai croissant.
+
+Le tampon est vidé à l'arrêt du processus (``atexit``) et des workers Celery (signaux ``worker_process_shutdown`` / ``worker_shutdown``,
+les processus enfants du pool ne passant pas par ``atexit``).
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class TamponHistoriques:
+    """Tampon des historiques en attente d'insertion, vidé par un thread de fond."""
+
+    def __init__(self, taille_lot=None, intervalle_ms=None, taille_max=None):
+        tabali_settings = settings.TABALI_SETTINGS
+        self.taille_lot = taille_lot or tabali_settings.get('AUDIT_BATCH_SIZE', 500)
+        self.intervalle = (intervalle_ms or tabali_settings.get('AUDIT_FLUSH_INTERVAL_MS', 1000)) / 1000
+        self.taille_max = taille_max or tabali_settings.get('AUDIT_BUFFER_MAX_SIZE', 100000)
+        self.attente_max = tabali_settings.get('AUDIT_FLUSH_MAX_BACKOFF_SECONDS', 60)
+        self._historiques = deque()
+        self._reveil = threading.Event()
+        self._verrou = threading.Lock()
+        self._verrou_ecriture = threading.Lock()
+        self._thread = None
+        # Échecs consécutifs de la base et instant de la prochaine tentative
+        self._echecs = 0
+        self._reprise = 0
+
+    def __len__(self):
+        return len(self._historiques)
+
+    def ajouter(self, historique):
+        self._historiques.append(historique)
+        self._borner()
+        self._demarrer()
+        if len(self._historiques) >= self.taille_lot:
+            self._reveil.set()
+
+    def _borner(self):
+        """Abandonne les plus anciens historiques au-delà de la taille maximale."""
+        while len(self._historiques) > self.taille_max:
+            try:
+                historique = self._historiques.popleft()
+            except IndexError:
+                return
+            logger.error(
+                f"Historique abandonné (tampon plein, {self.taille_max}) : "
+                f"{historique.action} {historique.date:%Y-%m-%d %H:%M:%S} {historique.description[:100]}"
+            )
+
+    def _remettre(self, lot):
+        """Remet un lot en tête du tampon, pour une nouvelle tentative."""
+        self._historiques.extendleft(reversed(lot))
+        self._borner()
+
+    def vider(self):
+        """
+        Insère les historiques en attente.
+
+        Si la base est indisponible (ou verrouillée par un autre écrivain),
+        le lot est remis dans le tampon et le thread de fond réessaie avec
+        un délai croissant. Seules les erreurs d'intégrité font insérer le
+        lot ligne à ligne, pour isoler les lignes invalides.
+
+        Returns:
+            int: nombre d'historiques insérés
+        """
+        from .models import Historique, HistoriqueTag
+
+        total = 0
+        # Un seul vidage à la fois : le thread de fond et un vidage à l'arrêt ne se chevauchent pas
+        with self._verrou_ecriture:
+            while self._historiques:
+                lot = []
+                while self._historiques and len(lot) < self.taille_lot:
+                    lot.append(self._historiques.popleft())
+                try:
+                    with transaction.atomic():
+                        Historique.objects.bulk_create(lot)
+                        HistoriqueTag.indexer(lot)
+                    total += len(lot)
+                except (IntegrityError, DataError):
+                    # Une ligne invalide ne doit pas faire perdre tout le lot
+                    logger.exception("Échec de l'insertion groupée des historiques, insertion ligne à ligne")
+                    try:
+                        total += self._inserer_ligne_a_ligne(lot)
+                    except DatabaseError:
+                        self._echouer()
+                        return total
+                except DatabaseError:
+                    self._remettre(lot)
+                    self._echouer()
+                    return total
+            self._echecs = 0
+        return total
+
+    def _inserer_ligne_a_ligne(self, lot):
+        inseres = 0
+        for i, historique in enumerate(lot):
+            try:
+                with transaction.atomic():
+                    historique.save(force_insert=True)
+                inseres += 1
+            except (IntegrityError, DataError):
+                logger.exception(f"Historique perdu : {historique.action} {historique.description[:100]}")
+            except DatabaseError:
+                # Base indisponible en cours de route : le reste du lot attend
+                self._remettre(lot[i:])
+                raise
+        return inseres
+
+    def _echouer(self):
+        self._echecs += 1
+        attente = min(self.intervalle * 2 ** (self._echecs - 1), self.attente_max)
+        self._reprise = time.monotonic() + attente
+        logger.warning(
+            f"Base indisponible pour les historiques ({len(self._historiques)} en attente), "
+            f"nouvelle tentative dans {attente:.1f} s",
+            exc_info=True
+        )
+
+    def _demarrer(self):
+        if self._thread is None:
+            with self._verrou:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._boucle, name='vidage-historiques', daemon=True
+                    )
+                    self._thread.start()
+                    atexit.register(vider_tampon)
+
+    def _boucle(self):
+        while True:
+            self._reveil.wait(self.intervalle)
+            self._reveil.clear()
+            if not self._historiques or time.monotonic() < self._reprise:
+                continue
+            try:
+                close_old_connections()
+                self.vider()
+            except Exception:
+                logger.exception("Échec du vidage des historiques")
+
+
+_tampon = None
+_verrou_tampon = threading.Lock()
+
+
+def obtenir_tampon():
+    """Retourne l'instance (unique par processus) du tampon des historiques."""
+    global _tampon
+    if _tampon is None:
+        with _verrou_tampon:
+            if _tampon is None:
+                _tampon = TamponHistoriques()
+    return _tampon
+
+
+def vider_tampon(**kwargs):
+    """
+    Insère les historiques en attente (accepte les arguments des signaux Celery).
+
+    Returns:
+        int: nombre d'historiques insérés
+    """
+    if _tampon is None:
+        return 0
+    total = _tampon.vider()
+    if len(_tampon):
+        logger.error(f"{len(_tampon)} historique(s) non écrit(s) : base indisponible")
+    return total
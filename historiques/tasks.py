@@ -0,0 +1,31 @@
+"""
+Tâches asynchrones pour l'application historiques.
+"""
+
+import logging
+
+from celery import shared_task
+
+from .models import StatistiqueHoraire
+from .partitions import maintenir_partitions
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def maintain_audit_partitions():
+    """Crée les partitions des mois à venir et supprime celles hors rétention."""
+    bilan = maintenir_partitions()
+    logger.info(
+        f"Partitions des historiques : {len(bilan['creees'])} créée(s), "
+        f"{len(bilan['supprimees'])} supprimée(s)"
+    )
+    return bilan
+
+
+@shared_task
+def rollup_audit_statistics():
+    """Agrège les historiques des heures révolues."""
+    nb_heures = StatistiqueHoraire.agreger()
+    logger.info(f"{nb_heures} heure(s) d'historiques agrégée(s)")
+    return nb_heures
@@ -0,0 +1,102 @@
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
+
+from historiques.audit import ContexteAuditMiddleware, contexte_audit
+from historiques.models import Historique
+from reservations.models import Reservation
+from reviews.models import NoteAvis
+from tabali_platform.utils.fabriques import creer_reservation, reglages
+
+
+@reglages(AUDIT_BUFFERED=False)
+class AuditModelesTests(TestCase):
+    """Historisation des champs modifiés des modèles audités."""
+
+    def setUp(self):
+        self.reservation = creer_reservation()
+
+    def historiques_groupes(self):
+        return Historique.objects.filter(object_id__isnull=True)
+
+    def test_creation_et_champs_modifies(self):
+        creation = Historique.objects.get(object_id=str(self.reservation.pk), action=Historique.TypeAction.CREATION)
+        self.assertIn('status', creation.donnees_apres)
+
+        reservation = Reservation.objects.get(pk=self.reservation.pk)
+        reservation.notes = 'Sonner deux fois'
+        reservation.save()
+        reservation.save()
+
+        modification = Historique.objects.get(
+            object_id=str(reservation.pk), action=Historique.TypeAction.MODIFICATION
+        )
+        self.assertEqual(modification.donnees_apres, {'notes': 'Sonner deux fois'})
+        self.assertEqual(modification.donnees_avant, {'notes': ''})
+
+    def test_mise_a_jour_groupee_resumee(self):
+        Reservation.objects.filter(pk=self.reservation.pk).update(status=Reservation.Status.CONFIRMED)
+        self.assertEqual(self.historiques_groupes().get().donnees_apres, {'status': 'confirmed'})
+
+        # Champ non audité
+        Reservation.objects.filter(pk=self.reservation.pk).update(rappel_envoye_le=None)
+        self.assertEqual(self.historiques_groupes().count(), 1)
+
+    def test_avis_modere_puis_supprime(self):
+        avis = NoteAvis.objects.create(
+            reservation=self.reservation, auteur=self.reservation.client.user, note=3, commentaire='Correct'
+        )
+
+        NoteAvis.changer_visibilite(NoteAvis.objects.filter(pk=avis.pk), False, est_modere=True)
+        self.assertEqual(self.historiques_groupes().count(), 1)
+
+        NoteAvis.objects.get(pk=avis.pk).delete()
+        self.assertTrue(
+            Historique.objects.filter(action=Historique.TypeAction.SUPPRESSION, object_id=str(avis.pk)).exists()
+        )
+
+
+@reglages(AUDIT_BUFFERED=False)
+class ContexteAuditTests(TestCase):
+    """Requête en cours exposée à l'audit, sous WSGI comme sous ASGI."""
+
+    def setUp(self):
+        self.reservation = creer_reservation()
+        self.utilisateur = self.reservation.client.user
+        self.requete = RequestFactory().get('/', REMOTE_ADDR='203.0.113.7', HTTP_USER_AGENT='Navigateur')
+        self.requete.user = self.utilisateur
+
+    def test_modification_attribuee(self):
+        def vue(request):
+            self.reservation.notes = 'Modifié'
+            self.reservation.save()
+
+        ContexteAuditMiddleware(vue)(self.requete)
+
+        historique = Historique.objects.get(action=Historique.TypeAction.MODIFICATION)
+        self.assertEqual(historique.utilisateur, self.utilisateur)
+        self.assertEqual((historique.adresse_ip, historique.user_agent), ('203.0.113.7', 'Navigateur'))
+        self.assertEqual(contexte_audit(), {})
+
+    def test_adresse_du_client_derriere_le_proxy(self):
+        requete = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.9')
+        requete.user = self.utilisateur
+
+        def vue(request):
+            return contexte_audit()
+
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            contexte = ContexteAuditMiddleware(vue)(requete)
+
+        self.assertEqual(contexte['adresse_ip'], '203.0.113.9')
+
+    def test_vue_asynchrone(self):
+        async def vue(request):
+            return contexte_audit()
+
+        middleware = ContexteAuditMiddleware(vue)
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        contexte = async_to_sync(middleware)(self.requete)
+        self.assertEqual(contexte['utilisateur'], self.utilisateur)
+        self.assertEqual(contexte['adresse_ip'], '203.0.113.7')
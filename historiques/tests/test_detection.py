@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from historiques import detection
+from historiques.detection import DetecteurAnomalies, FenetreDistincts, FenetreGlissante, adresse_client
+from historiques.models import Historique
+from tabali_platform.utils.fabriques import reglages
+
+
+class FenetresTests(TestCase):
+    """Compteurs sur fenêtre glissante à mémoire bornée."""
+
+    def test_fenetre_glissante(self):
+        fenetre = FenetreGlissante(30, 10)
+        for seconde in range(0, 300, 5):
+            fenetre.ajouter(1000 + seconde)
+
+        self.assertEqual(fenetre.total(1295), 60)
+        self.assertEqual(fenetre.total(1300), 58)
+        self.assertEqual(fenetre.total(2000), 0)
+
+    def test_valeurs_distinctes(self):
+        fenetre = FenetreDistincts(3, 10)
+        fenetre.ajouter('a', 0)
+        fenetre.ajouter('b', 5)
+        fenetre.ajouter('a', 15)
+
+        self.assertEqual(fenetre.total(15), 2)
+        self.assertEqual(fenetre.total(35), 1)
+        self.assertEqual(fenetre.total(45), 0)
+
+
+class DetecteurAnomaliesTests(TestCase):
+    """Force brute sur un compte et credential stuffing depuis une adresse."""
+
+    def setUp(self):
+        self.detecteur = DetecteurAnomalies(max_echecs_compte=3, max_echecs_ip=100, max_comptes_ip=4, max_suivis=50)
+
+    def test_force_brute_sur_un_compte(self):
+        self.assertEqual(self.detecteur.enregistrer_echec('192.0.2.1', 'A@exemple.fr', 0), [])
+        self.detecteur.enregistrer_echec('192.0.2.1', 'a@exemple.fr', 1)
+
+        self.assertEqual(
+            self.detecteur.enregistrer_echec('192.0.2.1', 'a@exemple.fr', 2), [('force_brute_compte', 'a@exemple.fr')]
+        )
+        # Alerte unique pendant le blocage
+        self.assertEqual(self.detecteur.enregistrer_echec('192.0.2.1', 'a@exemple.fr', 3), [])
+        self.assertGreater(self.detecteur.attente(None, 'a@exemple.fr', 4), 800)
+        self.assertEqual(self.detecteur.attente('192.0.2.1', None, 4), 0)
+
+    def test_credential_stuffing(self):
+        for i in range(3):
+            self.assertEqual(self.detecteur.enregistrer_echec('192.0.2.2', f'compte{i}', 5), [])
+
+        self.assertEqual(
+            self.detecteur.enregistrer_echec('192.0.2.2', 'compte9', 5), [('credential_stuffing', '192.0.2.2')]
+        )
+        self.assertEqual(self.detecteur.attente('192.0.2.2', None, 5 + 901), 0)
+
+    def test_memoire_bornee(self):
+        for i in range(200):
+            self.detecteur.enregistrer_echec(f'198.51.{i}.1', f'compte{i}', 10)
+
+        self.assertLessEqual(len(self.detecteur._echecs_ip), 50)
+
+
+class AdresseClientTests(TestCase):
+    """Adresse du client derrière les proxys déclarés."""
+
+    def requete(self, transmise):
+        return RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=transmise)
+
+    def test_derriere_un_proxy(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            # La première adresse est fournie par le client : ignorée
+            self.assertEqual(adresse_client(self.requete('192.0.2.66, 203.0.113.5')), '203.0.113.5')
+
+    def test_sans_proxy_declare(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': None}):
+            self.assertEqual(adresse_client(self.requete('192.0.2.66, 203.0.113.5')), '10.0.0.1')
+
+
+@reglages(AUDIT_BUFFERED=False)
+class ConnexionsSuspectesTests(TestCase):
+    """Détection branchée sur l'obtention des jetons JWT."""
+
+    def setUp(self):
+        self.addCleanup(setattr, detection, '_detecteur', detection._detecteur)
+        detection._detecteur = DetecteurAnomalies(max_echecs_compte=3, max_comptes_ip=5)
+        User.objects.create_user(username='alice', email='alice@exemple.fr', password='MotDePasse123')
+        self.api = APIClient()
+        self.url = reverse('token_obtain_pair')
+
+    def connecter(self, email='alice@exemple.fr', mot_de_passe='MotDePasse123'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post(self.url, {'email': email, 'password': mot_de_passe}, format='json')
+
+    def test_compte_bloque_apres_echecs(self):
+        self.assertEqual(self.connecter().status_code, 200)
+        for _ in range(3):
+            self.assertEqual(self.connecter(mot_de_passe='incorrect').status_code, 401)
+
+        reponse = self.connecter()
+
+        self.assertEqual(reponse.status_code, 429)
+        self.assertIn('Retry-After', reponse)
+        # Les autres comptes restent accessibles
+        self.assertEqual(self.connecter('bob@exemple.fr', 'incorrect').status_code, 401)
+
+    def test_echecs_et_alertes_historises(self):
+        for _ in range(3):
+            self.connecter(mot_de_passe='incorrect')
+
+        self.assertEqual(Historique.objects.filter(tags__contains='echec').count(), 3)
+        self.assertEqual(
+            Historique.objects.filter(
+                niveau_importance=Historique.NiveauImportance.SECURITE, tags__contains='force_brute_compte'
+            ).count(), 1
+        )
+        with self.assertNumQueries(0):
+            detection.obtenir_detecteur().attente('127.0.0.1', 'alice@exemple.fr')
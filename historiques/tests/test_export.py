@@ -0,0 +1,90 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from historiques.export import lignes_export
+from historiques.models import Historique
+from tabali_platform.utils.fabriques import creer_utilisateur, reglages
+
+URL_EXPORT = '/api/v1/historiques/api/historiques/export/'
+
+
+def creer_historiques(nombre, **champs):
+    Historique.objects.bulk_create([
+        Historique(action=Historique.TypeAction.AUTRE, description=f'Événement {i}', **champs)
+        for i in range(nombre)
+    ])
+
+
+class ExportHistoriquesTests(TestCase):
+    """Export en flux des historiques, en CSV ou JSON Lines."""
+
+    def setUp(self):
+        utilisateur = creer_utilisateur()
+        maintenant = timezone.now()
+        Historique.objects.bulk_create([
+            Historique(
+                action=Historique.TypeAction.AUTRE, description=f'Événement {i}', utilisateur=utilisateur,
+                contexte={'rang': i}, tags='a,b', date=maintenant - timedelta(days=i % 3)
+            )
+            for i in range(1200)
+        ])
+
+    def contenu(self, reponse):
+        return b''.join(reponse.streaming_content)
+
+    def test_export_csv(self):
+        reponse = self.client.get(URL_EXPORT)
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertIn('attachment', reponse['Content-Disposition'])
+        lignes = list(csv.reader(io.StringIO(self.contenu(reponse).decode())))
+        self.assertEqual(len(lignes), 1201)
+
+    def test_export_jsonl_compresse_et_filtre(self):
+        reponse = self.client.get(URL_EXPORT, {
+            'format_export': 'jsonl', 'compression': 'gzip', 'date_debut': timezone.localdate().isoformat()
+        })
+
+        lignes = gzip.decompress(self.contenu(reponse)).decode().splitlines()
+        self.assertEqual(len(lignes), 400)
+        self.assertIn('rang', json.loads(lignes[0])['contexte'])
+
+    def test_format_inconnu(self):
+        self.assertEqual(self.client.get(URL_EXPORT, {'format_export': 'xml'}).status_code, 400)
+
+
+@reglages(AUDIT_BUFFERED=False)
+class ExportAsynchroneTests(TransactionTestCase):
+    """Sous ASGI, l'export est lu au fil de l'itération asynchrone."""
+
+    async def test_lecture_progressive(self):
+        await sync_to_async(creer_historiques)(3000)
+        self.addCleanup(Historique.objects.all().delete)
+        lues = []
+
+        def lignes_comptees(queryset, taille_lot=None):
+            for ligne in lignes_export(queryset, 100):
+                lues.append(ligne)
+                yield ligne
+
+        with mock.patch('historiques.views.lignes_export', lignes_comptees):
+            reponse = await AsyncClient().get(URL_EXPORT)
+            self.assertTrue(reponse.is_async)
+            iterateur = aiter(reponse.streaming_content)
+            premier = await anext(iterateur)
+            # Le premier morceau est envoyé sans avoir lu toute la table
+            self.assertLess(len(lues), 600)
+            reste = [morceau async for morceau in iterateur]
+
+        contenu = b''.join([premier, *reste]).decode()
+        # En-tête, historiques et historique de l'export lui-même (écrit avant la lecture)
+        self.assertEqual(contenu.count('\n'), 3002)
+        self.assertIn('Export des historiques (csv)', contenu)
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from historiques.models import Historique, HistoriqueTag
+from historiques.partitions import (
+    TABLES, debut_mois, lister_partitions, maintenir_partitions, mois_a_venir, obtenir_partitions
+)
+
+
+class PartitionsTests(TransactionTestCase):
+    """Partitions mensuelles des historiques et de l'index de leurs tags."""
+
+    def setUp(self):
+        self.ancien = datetime(2023, 3, 5, tzinfo=timezone.utc)
+        with connection.schema_editor() as schema_editor:
+            for table in TABLES:
+                obtenir_partitions(schema_editor, table).creer(debut_mois(self.ancien))
+        # Ni les partitions ni les lignes derrière la vue ne sont vidées entre les tests
+        self.addCleanup(maintenir_partitions, retention_mois=12)
+        self.addCleanup(Historique.objects.all().delete)
+
+    def test_mois_a_venir_crees(self):
+        maintenir_partitions(retention_mois=12)
+
+        self.assertLessEqual(set(mois_a_venir()), set(lister_partitions()))
+
+    def test_partitions_expirees_supprimees_ensemble(self):
+        ancien = Historique.objects.create(
+            action=Historique.TypeAction.AUTRE, description='Ancien', date=self.ancien, tags='a,b'
+        )
+        recent = Historique.objects.create(action=Historique.TypeAction.AUTRE, description='Récent', tags='a')
+        HistoriqueTag.indexer([ancien, recent])
+        HistoriqueTag.indexer([ancien, recent])
+        self.assertEqual(HistoriqueTag.objects.count(), 3)
+        self.assertEqual(list(HistoriqueTag.filtrer(Historique.objects.all(), 'a,b')), [ancien])
+
+        simulation = maintenir_partitions(retention_mois=12, simulation=True)
+        self.assertIn('2023-03', simulation['supprimees'])
+        self.assertEqual(HistoriqueTag.objects.count(), 3)
+
+        bilan = maintenir_partitions(retention_mois=12)
+
+        self.assertIn('2023-03', bilan['supprimees'])
+        self.assertNotIn(debut_mois(self.ancien), lister_partitions())
+        self.assertEqual(list(Historique.objects.all()), [recent])
+        self.assertEqual(list(HistoriqueTag.objects.values_list('tag', flat=True)), ['a'])
+
+    def test_index_des_tags_maintenu(self):
+        historique = Historique.objects.create(action=Historique.TypeAction.AUTRE, description='Tags', tags='a')
+        HistoriqueTag.indexer([historique])
+
+        HistoriqueTag.indexer([historique], remplacer=True)
+        self.assertEqual(HistoriqueTag.objects.count(), 1)
+        historique.delete()
+        self.assertFalse(HistoriqueTag.objects.exists())
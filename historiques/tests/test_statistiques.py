@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from historiques.models import Historique, StatistiqueHoraire
+from historiques.partitions import maintenir_partitions
+
+URL_STATISTIQUES = '/api/v1/historiques/api/historiques/statistiques/'
+
+
+class StatistiquesHorairesTests(TestCase):
+    """Statistiques servies par les agrégats horaires, identiques au calcul direct."""
+
+    def setUp(self):
+        maintenant = timezone.now()
+        actions = [Historique.TypeAction.CREATION, Historique.TypeAction.CONNEXION, Historique.TypeAction.AUTRE]
+        Historique.objects.bulk_create([
+            Historique(
+                action=actions[i % 3], description='Événement', date=maintenant - timedelta(minutes=i * 17),
+                niveau_importance=Historique.NiveauImportance.INFO if i % 4 else Historique.NiveauImportance.SECURITE
+            )
+            for i in range(300)
+        ])
+        self.api = APIClient()
+
+    def statistiques(self, **parametres):
+        return self.api.get(URL_STATISTIQUES, parametres).json()
+
+    def test_agregation_idempotente(self):
+        avant = self.statistiques()
+
+        self.assertGreater(StatistiqueHoraire.agreger(), 80)
+        agregats = list(StatistiqueHoraire.objects.values_list('heure', 'action', 'niveau_importance', 'nombre'))
+        StatistiqueHoraire.agreger()
+
+        self.assertCountEqual(
+            StatistiqueHoraire.objects.values_list('heure', 'action', 'niveau_importance', 'nombre'), agregats
+        )
+        with self.assertNumQueries(6):
+            self.assertEqual(self.statistiques(), avant)
+
+    def test_historique_arrive_apres_agregation(self):
+        StatistiqueHoraire.agreger()
+        heure_agregee = timezone.now() - timedelta(hours=3)
+        # Lot conservé par le tampon pendant une panne, inséré après l'agrégation de son heure
+        Historique.objects.create(
+            action=Historique.TypeAction.AUTRE, description='En retard', date=heure_agregee,
+            niveau_importance=Historique.NiveauImportance.INFO
+        )
+        self.assertEqual(self.statistiques()['total_historiques'], 300)
+
+        StatistiqueHoraire.agreger()
+
+        self.assertEqual(self.statistiques()['total_historiques'], 301)
+
+    def test_filtres_couverts_par_les_agregats(self):
+        jour = (timezone.localdate() - timedelta(days=2)).isoformat()
+        for parametres in (
+            {'date_debut': jour}, {'date_fin': jour},
+            {'date_debut': jour, 'date_fin': jour, 'action': Historique.TypeAction.AUTRE},
+            {'niveau_importance': Historique.NiveauImportance.SECURITE},
+        ):
+            with self.subTest(**parametres):
+                StatistiqueHoraire.objects.all().delete()
+                attendu = self.statistiques(**parametres)
+                StatistiqueHoraire.agreger()
+                self.assertEqual(self.statistiques(**parametres), attendu)
+
+    def test_filtre_non_couvert_calcule_directement(self):
+        StatistiqueHoraire.agreger()
+
+        self.assertEqual(self.statistiques(search='Événement')['total_historiques'], 300)
+
+
+class PurgeStatistiquesTests(TransactionTestCase):
+    """Agrégats purgés avec la rétention des historiques."""
+
+    def test_agregats_expires_purges(self):
+        ancien = (timezone.now() - timedelta(days=900)).replace(minute=0, second=0, microsecond=0)
+        StatistiqueHoraire.objects.create(
+            heure=ancien, action=Historique.TypeAction.AUTRE, niveau_importance=Historique.NiveauImportance.INFO,
+            nombre=3
+        )
+        recent = StatistiqueHoraire.objects.create(
+            heure=timezone.now().replace(minute=0, second=0, microsecond=0), action=Historique.TypeAction.AUTRE,
+            niveau_importance=Historique.NiveauImportance.INFO, nombre=1
+        )
+
+        maintenir_partitions(retention_mois=24)
+
+        self.assertEqual(list(StatistiqueHoraire.objects.all()), [recent])
@@ -0,0 +1,49 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from historiques import tampon
+from historiques.models import Historique, HistoriqueTag
+
+URL_HISTORIQUES = '/api/v1/historiques/api/historiques/'
+
+
+class IndexTagsTests(TestCase):
+    """Filtrage des historiques par l'index de leurs tags."""
+
+    def setUp(self):
+        for description, tags in (('1', 'Auth, connexion'), ('2', 'auth'), ('3', 'authentification')):
+            Historique.log_action(Historique.TypeAction.AUTRE, description=description, tags=tags, synchrone=True)
+        tampon_local = tampon.TamponHistoriques()
+        tampon_local._thread = object()
+        tampon_local.ajouter(
+            Historique(action=Historique.TypeAction.AUTRE, description='4', tags='connexion,paiement')
+        )
+        tampon_local.vider()
+        self.api = APIClient()
+
+    def descriptions(self, **parametres):
+        donnees = self.api.get(URL_HISTORIQUES, parametres).json()
+        return sorted(historique['description'] for historique in donnees.get('results', donnees))
+
+    def test_tags_normalises_et_indexes(self):
+        self.assertEqual(HistoriqueTag.objects.count(), 6)
+        self.assertEqual(
+            sorted(HistoriqueTag.objects.filter(historique__description='1').values_list('tag', flat=True)),
+            ['auth', 'connexion']
+        )
+
+    def test_filtre_tag_exact(self):
+        self.assertEqual(self.descriptions(tags='auth'), ['1', '2'])
+
+    def test_filtre_tous_les_tags(self):
+        self.assertEqual(self.descriptions(tags='auth,connexion'), ['1'])
+
+    def test_filtre_un_des_tags(self):
+        self.assertEqual(self.descriptions(tags='auth,paiement', tags_mode='ou'), ['1', '2', '4'])
+
+    def test_index_mis_a_jour(self):
+        historique = Historique.objects.get(description='2')
+        historique.tags = 'autre'
+        historique.save()
+
+        self.assertEqual(self.descriptions(tags='auth'), ['1'])
@@ -0,0 +1,120 @@
+import time
+from unittest import mock
+
+from django.db import OperationalError, transaction
+from django.test import TestCase, TransactionTestCase
+
+from historiques import tampon
+from historiques.models import Historique
+from tabali_platform.utils.fabriques import creer_utilisateur
+
+
+def remplacer_tampon(test, nouveau):
+    """Installe ``nouveau`` comme tampon du processus pour la durée du test."""
+    test.addCleanup(setattr, tampon, '_tampon', tampon._tampon)
+    tampon._tampon = nouveau
+    return nouveau
+
+
+def sans_thread(nouveau):
+    # Vidages explicites uniquement
+    nouveau._thread = object()
+    return nouveau
+
+
+class TamponHistoriquesTests(TestCase):
+    """Écriture groupée des historiques par ``log_action``."""
+
+    def setUp(self):
+        self.tampon = remplacer_tampon(self, sans_thread(tampon.TamponHistoriques(taille_lot=3, intervalle_ms=60000)))
+
+    def test_insertion_par_lots(self):
+        utilisateur = creer_utilisateur()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                Historique.log_action(
+                    Historique.TypeAction.AUTRE, utilisateur=utilisateur, objet=utilisateur, description=f'Événement {i}'
+                )
+        self.assertFalse(Historique.objects.exists())
+        self.assertEqual(len(self.tampon), 5)
+
+        # Deux lots : point de sauvegarde, insertion, index des tags, libération
+        with self.assertNumQueries(6):
+            self.assertEqual(tampon.vider_tampon(), 5)
+
+        self.assertEqual(Historique.objects.filter(content_type__isnull=False).count(), 5)
+
+    def test_niveau_securite_synchrone(self):
+        historique = Historique.log_action(
+            Historique.TypeAction.CONNEXION, niveau=Historique.NiveauImportance.SECURITE, description='Connexion'
+        )
+
+        self.assertTrue(Historique.objects.filter(pk=historique.pk).exists())
+        self.assertEqual(len(self.tampon), 0)
+
+    def test_transaction_annulee(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                Historique.log_action(Historique.TypeAction.AUTRE, description='Annulé')
+                raise ValueError
+
+        self.assertEqual(len(self.tampon), 0)
+
+    def test_ligne_invalide_isolee(self):
+        existant = Historique.log_action(Historique.TypeAction.AUTRE, description='Existant', synchrone=True)
+        self.tampon.ajouter(Historique(action=Historique.TypeAction.AUTRE, description='Valide'))
+        self.tampon.ajouter(Historique(pk=existant.pk, action=Historique.TypeAction.AUTRE, description='Doublon'))
+
+        with self.assertLogs('historiques.tampon', 'ERROR'):
+            self.assertEqual(tampon.vider_tampon(), 1)
+
+        self.assertTrue(Historique.objects.filter(description='Valide').exists())
+
+
+class PanneBaseTests(TestCase):
+    """Historiques conservés dans le tampon pendant une indisponibilité de la base."""
+
+    def test_lots_remis_et_tampon_borne(self):
+        tampon_borne = sans_thread(tampon.TamponHistoriques(taille_lot=2, intervalle_ms=100, taille_max=4))
+        for i in range(3):
+            tampon_borne.ajouter(Historique(action=Historique.TypeAction.AUTRE, description=f'Événement {i}'))
+
+        with mock.patch.object(
+            type(Historique.objects), 'bulk_create', side_effect=OperationalError('database table is locked')
+        ), self.assertLogs('historiques.tampon', 'WARNING'):
+            self.assertEqual(tampon_borne.vider(), 0)
+
+        self.assertEqual(tampon_borne._echecs, 1)
+        self.assertEqual(
+            [historique.description for historique in tampon_borne._historiques],
+            ['Événement 0', 'Événement 1', 'Événement 2']
+        )
+
+        # Au-delà de la taille maximale, les plus anciens sont abandonnés
+        with self.assertLogs('historiques.tampon', 'ERROR') as journaux:
+            for i in range(3, 5):
+                tampon_borne.ajouter(Historique(action=Historique.TypeAction.AUTRE, description=f'Événement {i}'))
+        self.assertEqual(len(tampon_borne), 4)
+        self.assertIn('Événement 0', journaux.output[0])
+
+        self.assertEqual(tampon_borne.vider(), 4)
+        self.assertEqual(tampon_borne._echecs, 0)
+        self.assertEqual(Historique.objects.count(), 4)
+
+
+class ThreadVidageTests(TransactionTestCase):
+    """Vidage périodique par le thread de fond."""
+
+    def test_vidage_par_le_thread(self):
+        remplacer_tampon(self, tampon.TamponHistoriques(taille_lot=2, intervalle_ms=50))
+        # Table partitionnée (vue) : ses lignes ne sont pas vidées entre les tests
+        self.addCleanup(Historique.objects.all().delete)
+
+        Historique.log_action(Historique.TypeAction.AUTRE, description='Premier')
+        Historique.log_action(Historique.TypeAction.AUTRE, description='Second')
+
+        for _ in range(100):
+            if Historique.objects.count() == 2:
+                break
+            time.sleep(0.05)
+        self.assertEqual(Historique.objects.count(), 2)
@@ -10,12 +10,15 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db.models import Q, Count
 from django.utils import timezone
+from collections import Counter
 from datetime import datetime, timedelta
-from drf_spectacular.utils import extend_schema, extend_schema_view
-from .models import Historique
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from .detection import adresse_client
+from .export import FORMATS, en_flux_asynchrone, encoder, lignes_export
+from .models import Historique, HistoriqueTag, StatistiqueHoraire
 from .serializers import HistoriqueSerializer, HistoriqueCreateSerializer
-import csv
-import io
 
 
 @extend_schema_view(
@@ -40,34 +43,45 @@ class HistoriqueViewSet(viewsets.ModelViewSet):
     ordering_fields = ['date', 'niveau_importance']
     ordering = ['-date']
     
-    def get_queryset(self):
-        """Filtre les historiques selon différents critères."""
-        queryset = super().get_queryset()
-        
-        # Filtrage par période
+    # Filtres auxquels les statistiques horaires pré-agrégées savent répondre
+    FILTRES_AGREGES = {'date_debut', 'date_fin', 'action', 'niveau_importance', 'ordering', 'page', 'page_size'}
+    
+    def _periode(self):
+        """Bornes [debut, fin[ des paramètres date_debut / date_fin (journée de fin incluse)."""
+        debut = fin = None
         date_debut = self.request.query_params.get('date_debut')
         date_fin = self.request.query_params.get('date_fin')
         
         if date_debut:
             try:
-                date_debut = datetime.strptime(date_debut, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__gte=date_debut)
+                debut = timezone.make_aware(datetime.strptime(date_debut, '%Y-%m-%d'))
             except ValueError:
                 pass
         
         if date_fin:
             try:
-                date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date()
-                queryset = queryset.filter(date__lte=date_fin)
+                fin = timezone.make_aware(datetime.strptime(date_fin, '%Y-%m-%d') + timedelta(days=1))
             except ValueError:
                 pass
+        return debut, fin
+    
+    def get_queryset(self):
+        """Filtre les historiques selon différents critères."""
+        queryset = super().get_queryset()
         
-        # Filtrage par tags
+        # Filtrage par période : bornes en instants explicites, pour que seules
+        # les partitions mensuelles concernées soient parcourues
+        debut, fin = self._periode()
+        if debut:
+            queryset = queryset.filter(date__gte=debut)
+        if fin:
+            queryset = queryset.filter(date__lt=fin)
+        
+        # Filtrage par tags (index des tags) : tous par défaut, au moins un avec tags_mode=ou
         tags = self.request.query_params.get('tags')
         if tags:
-            tag_list = [tag.strip() for tag in tags.split(',')]
-            for tag in tag_list:
-                queryset = queryset.filter(tags__icontains=tag)
+            tous = self.request.query_params.get('tags_mode', 'et') != 'ou'
+            queryset = HistoriqueTag.filtrer(queryset, tags, tous=tous, debut=debut, fin=fin)
         
         return queryset
     
@@ -122,7 +136,11 @@ class HistoriqueViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistiques(self, request):
         """Retourne les statistiques des historiques."""
-        queryset = self.get_queryset()
+        if set(request.query_params) <= self.FILTRES_AGREGES:
+            return Response(self._statistiques_agregees())
+        
+        # Filtres non couverts par les agrégats (utilisateur, objet, tags, recherche)
+        queryset = self.filter_queryset(self.get_queryset())
         
         # Statistiques par action
         actions_stats = queryset.values('action').annotate(count=Count('action')).order_by('-count')
@@ -141,15 +159,71 @@ class HistoriqueViewSet(viewsets.ModelViewSet):
             'repartition_niveaux': list(niveaux_stats),
         })
     
+    def _statistiques_agregees(self):
+        """Statistiques calculées sur les agrégats horaires et la fin non agrégée."""
+        debut, fin = self._periode()
+        filtres = {
+            'actions': self.request.query_params.getlist('action'),
+            'niveaux': self.request.query_params.getlist('niveau_importance'),
+        }
+        filtres['limite'] = StatistiqueHoraire.limite()
+        comptes = StatistiqueHoraire.compter(debut, fin, **filtres)
+        hier = timezone.now() - timedelta(days=1)
+        comptes_24h = StatistiqueHoraire.compter(max(debut, hier) if debut else hier, fin, **filtres)
+        
+        par_action, par_niveau = Counter(), Counter()
+        for (action_historique, niveau), nombre in comptes.items():
+            par_action[action_historique] += nombre
+            par_niveau[niveau] += nombre
+        return {
+            'total_historiques': sum(comptes.values()),
+            'actions_24h': sum(comptes_24h.values()),
+            'repartition_actions': [
+                {'action': action_historique, 'count': nombre} for action_historique, nombre in par_action.most_common()
+            ],
+            'repartition_niveaux': [
+                {'niveau_importance': niveau, 'count': nombre} for niveau, nombre in par_niveau.items()
+            ],
+        }
+    
     @extend_schema(
         summary="Exporter les historiques",
-        description="Exporte les historiques au format CSV"
+        description="Exporte en flux les historiques filtrés, au format CSV ou JSON Lines",
+        parameters=[
+            OpenApiParameter(name='format_export', enum=list(FORMATS), description='Format (csv par défaut)'),
+            OpenApiParameter(name='compression', enum=['gzip'], description='Compression gzip à la volée'),
+        ]
     )
     @action(detail=False, methods=['get'])
     def export(self, request):
-        """Exporte les historiques."""
-        # TODO: Implémenter l'export CSV
-        return Response({
-            "message": "Export CSV à implémenter",
-            "total_records": self.get_queryset().count()
-        })
+        """Exporte les historiques (mêmes filtres que la liste)."""
+        format_export = request.query_params.get('format_export', 'csv')
+        if format_export not in FORMATS:
+            return Response(
+                {"error": f"Format inconnu, attendu : {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        compression = request.query_params.get('compression') == 'gzip'
+        type_contenu, extension, exporter = FORMATS[format_export]
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        morceaux = encoder(exporter(lignes_export(queryset)), compression)
+        if isinstance(request._request, ASGIRequest):
+            morceaux = en_flux_asynchrone(morceaux)
+        response = StreamingHttpResponse(
+            morceaux,
+            content_type='application/gzip' if compression else type_contenu
+        )
+        nom_fichier = f"historiques-{timezone.localtime():%Y%m%d-%H%M}.{extension}{'.gz' if compression else ''}"
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+        
+        Historique.log_action(
+            action=Historique.TypeAction.EXPORT,
+            utilisateur=request.user if request.user.is_authenticated else None,
+            description=f"Export des historiques ({format_export})",
+            contexte={'filtres': request.query_params.dict()},
+            adresse_ip=adresse_client(request),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            tags="export,historiques"
+        )
+        return response
@@ -6,8 +6,12 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.urls import reverse
+from django.utils import timezone
 from django.db.models import Count, Q
-from .models import Messagerie, Notification, EnvoiMail
+from .models import (
+    Messagerie, Notification, EnvoiMail, Conversation, ParticipantConversation, CompteurNonLus,
+    EvenementSortant
+)
 
 
 @admin.register(Messagerie)
@@ -140,17 +144,73 @@ class MessagerieAdmin(admin.ModelAdmin):
     
     def marquer_lu(self, request, queryset):
         """Marquer comme lu."""
+        destinataires = set(queryset.values_list('destinataire_id', flat=True))
         updated = queryset.update(statut='lu')
+        CompteurNonLus.recalculer(destinataires)
         self.message_user(request, f"{updated} message(s) marqué(s) comme lu(s).")
     marquer_lu.short_description = "✅ Marquer comme lu"
     
     def archiver_messages(self, request, queryset):
         """Archiver les messages."""
+        destinataires = set(queryset.values_list('destinataire_id', flat=True))
         updated = queryset.update(statut='archive')
+        CompteurNonLus.recalculer(destinataires)
         self.message_user(request, f"{updated} message(s) archivé(s).")
     archiver_messages.short_description = "📦 Archiver"
 
 
+class ParticipantConversationInline(admin.TabularInline):
+    """Participants d'une conversation."""
+    
+    model = ParticipantConversation
+    fields = ['utilisateur', 'interlocuteur', 'nb_non_lus', 'derniere_activite']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    """Configuration admin pour l'index des conversations."""
+    
+    list_display = ['id_conversation', 'reservation', 'derniere_activite', 'date_creation']
+    search_fields = ['id_conversation', 'cle_participants']
+    readonly_fields = [
+        'id_conversation', 'cle_participants', 'reservation', 'dernier_message',
+        'derniere_activite', 'date_creation'
+    ]
+    inlines = [ParticipantConversationInline]
+    ordering = ['-derniere_activite']
+
+
+@admin.register(EvenementSortant)
+class EvenementSortantAdmin(admin.ModelAdmin):
+    """Configuration admin pour l'outbox des événements."""
+    
+    list_display = [
+        'id_evenement', 'type_evenement', 'cle_deduplication', 'statut',
+        'tentatives', 'prochaine_tentative', 'date_creation'
+    ]
+    list_filter = ['statut', 'type_evenement']
+    search_fields = ['cle_deduplication']
+    readonly_fields = [
+        'id_evenement', 'type_evenement', 'cle_deduplication', 'charge', 'statut',
+        'canaux_livres', 'tentatives', 'prochaine_tentative', 'derniere_erreur',
+        'date_creation', 'date_traitement'
+    ]
+    actions = ['relancer']
+    
+    def relancer(self, request, queryset):
+        """Remettre en file les événements en échec."""
+        updated = queryset.filter(statut=EvenementSortant.Statut.ECHEC).update(
+            statut=EvenementSortant.Statut.EN_ATTENTE,
+            tentatives=0,
+            prochaine_tentative=timezone.now()
+        )
+        self.message_user(request, f"{updated} événement(s) remis en file.")
+    relancer.short_description = "🔁 Relancer"
+
+
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     """Configuration admin pour les notifications."""
@@ -254,13 +314,17 @@ class NotificationAdmin(admin.ModelAdmin):
     
     def marquer_lue(self, request, queryset):
         """Marquer comme lue."""
+        utilisateurs = set(queryset.values_list('utilisateur_id', flat=True))
         updated = queryset.update(statut='lue')
+        CompteurNonLus.recalculer(utilisateurs)
         self.message_user(request, f"{updated} notification(s) marquée(s) comme lue(s).")
     marquer_lue.short_description = "✅ Marquer comme lue"
     
     def archiver_notifications(self, request, queryset):
         """Archiver les notifications."""
+        utilisateurs = set(queryset.values_list('utilisateur_id', flat=True))
         updated = queryset.update(statut='archivee')
+        CompteurNonLus.recalculer(utilisateurs)
         self.message_user(request, f"{updated} notification(s) archivée(s).")
     archiver_notifications.short_description = "📦 Archiver"
     
@@ -287,7 +351,7 @@ class EnvoiMailAdmin(admin.ModelAdmin):
     ]
     readonly_fields = [
         'id_emails', 'date_envoi', 'date_ouverture', 'nb_ouvertures',
-        'utilisateur_details', 'contenu_preview'
+        'utilisateur_details', 'contenu_preview', 'tentatives', 'date_expedition'
     ]
     fieldsets = (
         ('📧 Email', {
@@ -302,6 +366,9 @@ class EnvoiMailAdmin(admin.ModelAdmin):
         ('📊 Tracking', {
             'fields': ('date_envoi', 'date_ouverture', 'nb_ouvertures', 'id_externe')
         }),
+        ('🚚 Expédition', {
+            'fields': ('tentatives', 'prochaine_tentative', 'date_expedition')
+        }),
         ('❌ Erreurs', {
             'fields': ('erreur_envoi',)
         }),
@@ -383,8 +450,10 @@ class EnvoiMailAdmin(admin.ModelAdmin):
     
     def renvoyer_emails(self, request, queryset):
         """Renvoyer les emails."""
-        count = queryset.filter(statut__in=['echec', 'rejete']).count()
-        self.message_user(request, f"Renvoi de {count} email(s) (à implémenter).")
+        count = queryset.filter(statut__in=['echec', 'rejete']).update(
+            statut='en_attente', tentatives=0, prochaine_tentative=timezone.now()
+        )
+        self.message_user(request, f"{count} email(s) remis en file d'envoi.")
     renvoyer_emails.short_description = "🔄 Renvoyer"
     
     def marquer_envoye(self, request, queryset):
@@ -0,0 +1,269 @@
+"""
+Moteur d'envoi par lots des emails en file (``EnvoiMail``).
+
+Chaque lot :
+
+- réserve les emails en attente dans une transaction courte
+  (``SELECT ... FOR UPDATE SKIP LOCKED``) en les passant ``en_cours`` avec
+  un bail (``EMAIL_CLAIM_LEASE_SECONDS``) : plusieurs workers se partagent
+  la file sans doublon, et les emails d'un worker arrêté en cours de lot
+  sont repris à l'expiration du bail ;
+- expédie hors transaction (aucun verrou n'est tenu pendant les échanges
+  SMTP) et enregistre le résultat de chaque email dès son envoi ;
+- réutilise une seule connexion SMTP pour tout le lot ;
+- respecte un débit maximal par domaine destinataire (les emails au-delà
+  sont reportés, sans compter de tentative) ;
+- reprogramme les échecs temporaires avec un backoff exponentiel, tracé
+  dans ``erreur_envoi``, et rejette définitivement les refus permanents (5xx).
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape, linebreaks
+
+from .models import EnvoiMail
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale conservée de l'historique des erreurs d'un email
+TAILLE_MAX_ERREUR = 2000
+
+
+def url_pixel(email):
+    """URL absolue du pixel de suivi des ouvertures d'un email."""
+    base = settings.TABALI_SETTINGS.get('EMAIL_TRACKING_BASE_URL', '').rstrip('/')
+    return base + reverse('emails-pixel-ouverture', args=[email.id_emails])
+
+
+def contenu_html(email):
+    """Version HTML du contenu texte, avec le pixel de suivi des ouvertures."""
+    return (
+        '<!DOCTYPE html><html><body>'
+        f'{linebreaks(email.contenu, autoescape=True)}'
+        f'<img src="{escape(url_pixel(email))}" width="1" height="1" alt="" style="display:block;border:0">'
+        '</body></html>'
+    )
+
+
+def construire_message(email, connexion=None):
+    """Message Django (texte et HTML avec pixel de suivi) correspondant à une ligne ``EnvoiMail``."""
+    destinataire = email.email_destinataire
+    if email.nom_destinataire:
+        destinataire = f"{email.nom_destinataire} <{email.email_destinataire}>"
+    message = EmailMultiAlternatives(
+        subject=email.sujet,
+        body=email.contenu,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[destinataire],
+        connection=connexion,
+        headers={'X-Tabali-Email-Id': str(email.id_emails)}
+    )
+    message.attach_alternative(contenu_html(email), 'text/html')
+    return message
+
+
+class LimiteurDomaines:
+    """
+    Limiteur de débit par domaine destinataire (seau à jetons).
+
+    Le débit par minute d'un domaine est lu dans
+    ``TABALI_SETTINGS['EMAIL_DOMAIN_RATES']``, à défaut
+    ``EMAIL_DEFAULT_DOMAIN_RATE``. Le limiteur est propre au processus :
+    avec plusieurs workers, le débit effectif est multiplié d'autant.
+    """
+
+    def __init__(self, debits=None, debit_par_defaut=None):
+        tabali_settings = settings.TABALI_SETTINGS
+        self.debits = debits if debits is not None else tabali_settings.get('EMAIL_DOMAIN_RATES', {})
+        self.debit_par_defaut = debit_par_defaut or tabali_settings.get('EMAIL_DEFAULT_DOMAIN_RATE', 600)
+        self._seaux = {}
+        self._verrou = threading.Lock()
+
+    def reserver(self, domaine):
+        """
+        Consomme un jeton pour le domaine.
+
+        Returns:
+            float: 0 si l'envoi est autorisé, sinon le délai d'attente en secondes
+        """
+        debit = self.debits.get(domaine, self.debit_par_defaut)
+        par_seconde = debit / 60
+        maintenant = time.monotonic()
+        with self._verrou:
+            jetons, derniere_maj = self._seaux.get(domaine, (debit, maintenant))
+            jetons = min(debit, jetons + (maintenant - derniere_maj) * par_seconde)
+            if jetons >= 1:
+                self._seaux[domaine] = (jetons - 1, maintenant)
+                return 0
+            self._seaux[domaine] = (jetons, maintenant)
+            return (1 - jetons) / par_seconde
+
+
+_limiteur = None
+
+
+def obtenir_limiteur():
+    """Limiteur partagé par les lots successifs du processus."""
+    global _limiteur
+    if _limiteur is None:
+        _limiteur = LimiteurDomaines()
+    return _limiteur
+
+
+def _est_permanent(exc):
+    """Vrai si l'erreur SMTP est un refus définitif (inutile de réessayer)."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def _tracer_erreur(email, exc, maintenant):
+    ligne = f"[{maintenant:%Y-%m-%d %H:%M:%S}] tentative {email.tentatives} : {exc}"
+    historique = f"{email.erreur_envoi}\n{ligne}" if email.erreur_envoi else ligne
+    email.erreur_envoi = historique[-TAILLE_MAX_ERREUR:]
+
+
+def _reouvrir(connexion):
+    """Rouvre la connexion SMTP après une déconnexion du serveur."""
+    try:
+        connexion.close()
+    except Exception:
+        pass
+    connexion.open()
+
+
+def reserver_lot(taille, maintenant=None):
+    """
+    Réserve un lot d'emails à expédier : en attente, ou en cours dont le bail
+    a expiré (worker arrêté en cours de lot).
+
+    Returns:
+        list: emails réservés, ``en_cours`` jusqu'à leur ``prochaine_tentative``
+    """
+    maintenant = maintenant or timezone.now()
+    bail = maintenant + timedelta(seconds=settings.TABALI_SETTINGS.get('EMAIL_CLAIM_LEASE_SECONDS', 600))
+    with transaction.atomic():
+        lot = list(
+            EnvoiMail.objects.select_for_update(skip_locked=True)
+            .filter(
+                statut__in=[EnvoiMail.StatutEnvoi.EN_ATTENTE, EnvoiMail.StatutEnvoi.EN_COURS],
+                prochaine_tentative__lte=maintenant
+            )
+            .order_by('prochaine_tentative', 'date_envoi')[:taille]
+        )
+        EnvoiMail.objects.filter(pk__in=[email.pk for email in lot]).update(
+            statut=EnvoiMail.StatutEnvoi.EN_COURS, prochaine_tentative=bail
+        )
+    for email in lot:
+        email.statut = EnvoiMail.StatutEnvoi.EN_COURS
+        email.prochaine_tentative = bail
+    return lot
+
+
+def _enregistrer(email, bail):
+    """
+    Enregistre le résultat d'un email réservé (une requête, donc sa propre
+    transaction). Sans effet si le bail a expiré et l'email a été repris.
+    """
+    return EnvoiMail.objects.filter(
+        pk=email.pk, statut=EnvoiMail.StatutEnvoi.EN_COURS, prochaine_tentative=bail
+    ).update(
+        statut=email.statut,
+        tentatives=email.tentatives,
+        prochaine_tentative=email.prochaine_tentative,
+        erreur_envoi=email.erreur_envoi,
+        date_expedition=email.date_expedition,
+    )
+
+
+def expedier_lot(taille=None, connexion=None, limiteur=None):
+    """
+    Expédie un lot d'emails en attente sur une seule connexion SMTP.
+
+    Returns:
+        dict: bilan du lot (envoyes, reportes, a_reessayer, echecs, rejetes,
+        duree, debit_par_minute)
+    """
+    tabali_settings = settings.TABALI_SETTINGS
+    taille = taille or tabali_settings.get('EMAIL_BATCH_SIZE', 200)
+    max_tentatives = tabali_settings.get('EMAIL_MAX_RETRIES', 5)
+    limiteur = limiteur or obtenir_limiteur()
+
+    bilan = {'envoyes': 0, 'reportes': 0, 'a_reessayer': 0, 'echecs': 0, 'rejetes': 0}
+    debut = time.monotonic()
+    maintenant = timezone.now()
+
+    lot = reserver_lot(taille, maintenant)
+    traites = 0
+    try:
+        if lot:
+            connexion = connexion or get_connection(fail_silently=False)
+            with connexion:
+                for email in lot:
+                    bail = email.prochaine_tentative
+                    email.statut = EnvoiMail.StatutEnvoi.EN_ATTENTE
+                    domaine = email.email_destinataire.rpartition('@')[2].lower()
+                    attente = limiteur.reserver(domaine)
+                    if attente:
+                        email.prochaine_tentative = maintenant + timedelta(seconds=attente)
+                        _enregistrer(email, bail)
+                        traites += 1
+                        bilan['reportes'] += 1
+                        continue
+
+                    coupure = False
+                    try:
+                        connexion.send_messages([construire_message(email, connexion)])
+                    except (smtplib.SMTPException, OSError) as exc:
+                        email.tentatives += 1
+                        _tracer_erreur(email, exc, maintenant)
+                        if _est_permanent(exc):
+                            email.statut = EnvoiMail.StatutEnvoi.REJETE
+                            bilan['rejetes'] += 1
+                        elif email.tentatives >= max_tentatives:
+                            email.statut = EnvoiMail.StatutEnvoi.ECHEC
+                            bilan['echecs'] += 1
+                        else:
+                            # Backoff exponentiel : 1 min, 2 min, 4 min... plafonné à 6 h
+                            delai = min(60 * 2 ** (email.tentatives - 1), 6 * 3600)
+                            email.prochaine_tentative = maintenant + timedelta(seconds=delai)
+                            bilan['a_reessayer'] += 1
+                        # SMTPException hérite d'OSError : seules les coupures imposent de rouvrir
+                        coupure = isinstance(exc, smtplib.SMTPServerDisconnected) or not isinstance(
+                            exc, smtplib.SMTPException
+                        )
+                    else:
+                        email.statut = EnvoiMail.StatutEnvoi.ENVOYE
+                        email.date_expedition = timezone.now()
+                        bilan['envoyes'] += 1
+                    _enregistrer(email, bail)
+                    traites += 1
+
+                    if coupure:
+                        try:
+                            _reouvrir(connexion)
+                        except (smtplib.SMTPException, OSError):
+                            logger.exception("Serveur SMTP injoignable, fin du lot")
+                            break
+    finally:
+        # Emails réservés mais non tentés : rendus à la file sans compter de tentative
+        if traites < len(lot):
+            EnvoiMail.objects.filter(
+                pk__in=[email.pk for email in lot[traites:]], statut=EnvoiMail.StatutEnvoi.EN_COURS
+            ).update(statut=EnvoiMail.StatutEnvoi.EN_ATTENTE, prochaine_tentative=maintenant)
+
+    duree = time.monotonic() - debut
+    bilan['duree'] = round(duree, 3)
+    bilan['debit_par_minute'] = round(bilan['envoyes'] / duree * 60) if duree and bilan['envoyes'] else 0
+    return bilan
@@ -0,0 +1,45 @@
+"""
+Application des politiques de rétention (``TABALI_SETTINGS['RETENTION_POLICIES']``).
+
+    python manage.py appliquer_retention --simulation
+    python manage.py appliquer_retention --politique notifications_lues
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from messaging.retention import appliquer_retention
+
+
+class Command(BaseCommand):
+    help = "Supprime ou archive les notifications et messages expirés"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--politique',
+            action='append',
+            dest='politiques',
+            help='Politique à appliquer (répétable, toutes par défaut)'
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Compte les lignes concernées sans rien supprimer'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            bilans = appliquer_retention(options['politiques'], simulation=options['simulation'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        
+        for bilan in bilans:
+            octets = bilan['octets_liberes_estimes']
+            liberes = f"~{filesizeformat(octets)} libérés" if octets is not None else "espace libéré inconnu"
+            verbe = 'concernée(s)' if options['simulation'] else 'traitée(s)'
+            self.stdout.write(
+                f"{bilan['politique']} : {bilan['lignes']} ligne(s) {verbe} en {bilan['lots']} lot(s), "
+                f"{liberes}, {filesizeformat(bilan['octets_archives'])} archivés, {bilan['duree']} s"
+            )
+        self.stdout.write(self.style.SUCCESS("Rétention appliquée"))
@@ -0,0 +1,68 @@
+"""
+Benchmark du moteur d'envoi des emails.
+
+Met en file N emails dans une transaction annulée à la fin, puis les expédie
+par lots vers un serveur SMTP local de test, par exemple :
+
+    python -m aiosmtpd -n -l localhost:1025
+    python manage.py benchmark_envoi_emails --port 1025 --emails 5000
+"""
+
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from messaging.emails import LimiteurDomaines, expedier_lot
+from messaging.models import EnvoiMail
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit d'expédition des emails vers un serveur SMTP de test"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=5000, help='Nombre d\'emails mis en file')
+        parser.add_argument('--domaines', type=int, default=10, help='Nombre de domaines destinataires')
+        parser.add_argument('--taille-lot', type=int, default=200, help='Emails par connexion SMTP')
+        parser.add_argument('--host', default='localhost', help='Serveur SMTP de test')
+        parser.add_argument('--port', type=int, default=1025, help='Port du serveur SMTP de test')
+    
+    def handle(self, *args, **options):
+        nb_emails = options['emails']
+        
+        with transaction.atomic():
+            EnvoiMail.objects.bulk_create([
+                EnvoiMail.construire_email_type(
+                    EnvoiMail.TypeEmail.NOTIFICATION,
+                    f"bench{i}@domaine{i % options['domaines']}.test",
+                    f"Destinataire {i}"
+                )
+                for i in range(nb_emails)
+            ], batch_size=1000)
+            
+            # Pas de limitation de débit : on mesure le moteur et le serveur
+            limiteur = LimiteurDomaines(debit_par_defaut=10 ** 9)
+            connexion = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host=options['host'], port=options['port'],
+                use_tls=False, username='', password='', fail_silently=False
+            )
+            
+            debut = time.monotonic()
+            envoyes = lots = 0
+            while True:
+                bilan = expedier_lot(options['taille_lot'], connexion=connexion, limiteur=limiteur)
+                if not bilan['envoyes'] and not bilan['a_reessayer']:
+                    break
+                envoyes += bilan['envoyes']
+                lots += 1
+            duree = time.monotonic() - debut
+            
+            self.stdout.write(
+                f"{envoyes}/{nb_emails} emails envoyés en {lots} lot(s), {duree:.2f} s "
+                f"soit {envoyes / duree * 60:.0f} emails/min"
+            )
+            
+            # Ne rien laisser en base
+            transaction.set_rollback(True)
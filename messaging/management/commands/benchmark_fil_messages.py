@@ -0,0 +1,89 @@
+"""
+Benchmark de la pagination des fils de discussion.
+
+Génère un fil de N messages dans une transaction annulée à la fin, puis
+compare le temps de lecture d'une page par curseur (clé date_envoi,
+id_messagerie) et par offset à différentes profondeurs du fil.
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User
+from messaging.models import Messagerie
+from messaging.pagination import FilMessagesPagination
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps de lecture d'une page de fil selon sa profondeur"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=100_000, help='Taille du fil généré')
+        parser.add_argument('--page-size', type=int, default=50, help='Taille des pages lues')
+        parser.add_argument('--repetitions', type=int, default=20, help='Lectures par mesure')
+    
+    def handle(self, *args, **options):
+        nb_messages = options['messages']
+        taille = options['page_size']
+        repetitions = options['repetitions']
+        
+        with transaction.atomic():
+            conversation_id = self._generer_fil(nb_messages)
+            fil = Messagerie.objects.filter(conversation_id=conversation_id)
+            recents = fil.order_by('-date_envoi', '-id_messagerie')
+            
+            self.stdout.write(f"Fil de {nb_messages} messages, pages de {taille}")
+            self.stdout.write(f"{'profondeur':>12} {'curseur (ms)':>14} {'offset (ms)':>14}")
+            
+            for ratio in (0, 0.1, 0.5, 0.9, 0.99):
+                profondeur = int(nb_messages * ratio)
+                pivot = recents.values('date_envoi', 'id_messagerie')[profondeur]
+                position = (pivot['date_envoi'], pivot['id_messagerie'])
+                
+                curseur = self._mesurer(
+                    lambda: list(FilMessagesPagination.filtrer_avant(fil, position)[:taille + 1]),
+                    repetitions
+                )
+                offset = self._mesurer(
+                    lambda: list(recents[profondeur + 1:profondeur + 1 + taille + 1]),
+                    repetitions
+                )
+                self.stdout.write(f"{profondeur:>12} {curseur:>14.2f} {offset:>14.2f}")
+            
+            # Ne rien laisser en base
+            transaction.set_rollback(True)
+    
+    def _generer_fil(self, nb_messages):
+        """Crée deux utilisateurs et un fil de discussion de ``nb_messages`` messages."""
+        suffixe = uuid.uuid4().hex[:8]
+        user1 = User.objects.create(username=f'bench1-{suffixe}', email=f'bench1-{suffixe}@example.com')
+        user2 = User.objects.create(username=f'bench2-{suffixe}', email=f'bench2-{suffixe}@example.com')
+        conversation_id = uuid.uuid4()
+        
+        debut = time.perf_counter()
+        Messagerie.objects.bulk_create(
+            (
+                Messagerie(
+                    contenu=f"Message {i}",
+                    expediteur=user1 if i % 2 else user2,
+                    destinataire=user2 if i % 2 else user1,
+                    conversation_id=conversation_id,
+                )
+                for i in range(nb_messages)
+            ),
+            batch_size=5000
+        )
+        self.stdout.write(f"Génération : {time.perf_counter() - debut:.1f}s")
+        return conversation_id
+    
+    @staticmethod
+    def _mesurer(lecture, repetitions):
+        """Temps moyen d'une lecture, en millisecondes."""
+        lecture()
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            lecture()
+        return (time.perf_counter() - debut) * 1000 / repetitions
@@ -0,0 +1,53 @@
+"""
+Restauration de lignes archivées par la rétention.
+
+    python manage.py restaurer_archive messaging.Messagerie 2024-03
+    python manage.py restaurer_archive messaging.Messagerie 2024-03 --filtre conversation_id=<uuid>
+    python manage.py restaurer_archive messaging.Messagerie --liste
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.retention import mois_archives, restaurer_archive
+
+
+class Command(BaseCommand):
+    help = "Réinsère en base les lignes archivées d'un mois"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('modele', help='Modèle archivé, ex. messaging.Messagerie')
+        parser.add_argument('mois', nargs='?', help='Mois à restaurer (AAAA-MM)')
+        parser.add_argument(
+            '--filtre',
+            action='append',
+            default=[],
+            help='Condition champ=valeur sur les lignes à restaurer (répétable)'
+        )
+        parser.add_argument('--liste', action='store_true', help='Liste les mois archivés')
+    
+    def handle(self, *args, **options):
+        try:
+            modele = apps.get_model(options['modele'])
+        except (LookupError, ValueError) as exc:
+            raise CommandError(str(exc))
+        
+        if options['liste']:
+            for mois in mois_archives(modele):
+                self.stdout.write(mois)
+            return
+        if not options['mois']:
+            raise CommandError("Indiquez le mois à restaurer (AAAA-MM) ou --liste")
+        
+        filtre = {}
+        for condition in options['filtre']:
+            champ, separateur, valeur = condition.partition('=')
+            if not separateur:
+                raise CommandError(f"Filtre invalide : {condition} (attendu champ=valeur)")
+            filtre[champ] = valeur
+        
+        try:
+            nb_lignes = restaurer_archive(modele, options['mois'], filtre)
+        except FileNotFoundError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"{nb_lignes} ligne(s) restaurée(s)"))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reservations', '0001_initial'),
+        ('messaging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id_conversation', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('cle_participants', models.CharField(help_text='Identifiants des participants triés et réservation, pour retrouver la conversation', max_length=120, unique=True, verbose_name='Clé des participants')),
+                ('derniere_activite', models.DateTimeField(blank=True, null=True, verbose_name='Dernière activité')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('dernier_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.messagerie', verbose_name='Dernier message')),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='reservations.reservation', verbose_name='Réservation concernée')),
+            ],
+            options={
+                'verbose_name': 'Conversation',
+                'verbose_name_plural': 'Conversations',
+                'db_table': 'tabali_conversations',
+                'ordering': ['-derniere_activite'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ParticipantConversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nb_non_lus', models.PositiveIntegerField(default=0, verbose_name='Messages non lus')),
+                ('derniere_activite', models.DateTimeField(blank=True, null=True, verbose_name='Dernière activité')),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='messaging.conversation', verbose_name='Conversation')),
+                ('interlocuteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Interlocuteur')),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations_conversations', to=settings.AUTH_USER_MODEL, verbose_name='Participant')),
+            ],
+            options={
+                'verbose_name': 'Participant à une conversation',
+                'verbose_name_plural': 'Participants aux conversations',
+                'db_table': 'tabali_participants_conversations',
+                'ordering': ['-derniere_activite'],
+                'indexes': [models.Index(fields=['utilisateur', '-derniere_activite'], name='tabali_part_utilisa_1e703f_idx')],
+                'unique_together': {('conversation', 'utilisateur')},
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+
+def construire_cle(user1_id, user2_id, reservation_id=None):
+    premier, second = sorted([str(user1_id), str(user2_id)])
+    return f"{premier}:{second}:{reservation_id or ''}"
+
+
+def remplir_conversations(apps, schema_editor):
+    """Construit l'index des conversations à partir des messages existants."""
+    Messagerie = apps.get_model('messaging', 'Messagerie')
+    Conversation = apps.get_model('messaging', 'Conversation')
+    ParticipantConversation = apps.get_model('messaging', 'ParticipantConversation')
+    
+    conversations = {}
+    renommages = {}
+    messages = Messagerie.objects.order_by('date_envoi').values(
+        'id_messagerie', 'conversation_id', 'expediteur_id', 'destinataire_id',
+        'reservation_id', 'date_envoi', 'statut'
+    )
+    for message in messages.iterator(chunk_size=2000):
+        cle = construire_cle(
+            message['expediteur_id'], message['destinataire_id'], message['reservation_id']
+        )
+        conversation = conversations.setdefault(cle, {
+            'id': message['conversation_id'],
+            'reservation_id': message['reservation_id'],
+            'participants': {
+                message['expediteur_id']: message['destinataire_id'],
+                message['destinataire_id']: message['expediteur_id'],
+            },
+            'non_lus': {},
+        })
+        # Plusieurs conversation_id ont pu être attribués à la même paire
+        if message['conversation_id'] != conversation['id']:
+            renommages[message['conversation_id']] = conversation['id']
+        conversation['dernier_message_id'] = message['id_messagerie']
+        conversation['derniere_activite'] = message['date_envoi']
+        if message['statut'] in ('envoye', 'delivre'):
+            destinataire = message['destinataire_id']
+            conversation['non_lus'][destinataire] = conversation['non_lus'].get(destinataire, 0) + 1
+    
+    Conversation.objects.bulk_create([
+        Conversation(
+            id_conversation=conversation['id'],
+            cle_participants=cle,
+            reservation_id=conversation['reservation_id'],
+            dernier_message_id=conversation['dernier_message_id'],
+            derniere_activite=conversation['derniere_activite'],
+        )
+        for cle, conversation in conversations.items()
+    ], batch_size=1000)
+    ParticipantConversation.objects.bulk_create([
+        ParticipantConversation(
+            conversation_id=conversation['id'],
+            utilisateur_id=utilisateur_id,
+            interlocuteur_id=interlocuteur_id,
+            nb_non_lus=conversation['non_lus'].get(utilisateur_id, 0),
+            derniere_activite=conversation['derniere_activite'],
+        )
+        for conversation in conversations.values()
+        for utilisateur_id, interlocuteur_id in conversation['participants'].items()
+    ], batch_size=1000)
+    
+    for ancien_id, nouvel_id in renommages.items():
+        Messagerie.objects.filter(conversation_id=ancien_id).update(conversation_id=nouvel_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_conversation_participantconversation'),
+    ]
+
+    operations = [
+        migrations.RunPython(remplir_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_backfill_conversations'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='messagerie',
+            name='tabali_mess_convers_2883d7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='messagerie',
+            index=models.Index(fields=['conversation_id', 'date_envoi', 'id_messagerie'], name='tabali_mess_convers_dd668e_idx'),
+        ),
+    ]
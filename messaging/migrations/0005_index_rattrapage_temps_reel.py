@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_remove_messagerie_tabali_mess_convers_2883d7_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='messagerie',
+            name='tabali_mess_destina_8675d9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='tabali_noti_utilisa_83a8b7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='messagerie',
+            index=models.Index(fields=['destinataire', 'date_envoi', 'id_messagerie'], name='tabali_mess_destina_a6ded8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['utilisateur', 'date', 'id_notification'], name='tabali_noti_utilisa_7c9859_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def remplir_compteurs(apps, schema_editor):
+    """Initialise les compteurs de non-lus à partir des lignes existantes."""
+    ParticipantConversation = apps.get_model('messaging', 'ParticipantConversation')
+    Notification = apps.get_model('messaging', 'Notification')
+    CompteurNonLus = apps.get_model('messaging', 'CompteurNonLus')
+    
+    messages = dict(
+        ParticipantConversation.objects.filter(nb_non_lus__gt=0)
+        .values('utilisateur_id').annotate(total=Sum('nb_non_lus'))
+        .values_list('utilisateur_id', 'total')
+    )
+    notifications = dict(
+        Notification.objects.filter(statut='non_lue')
+        .values('utilisateur_id').annotate(total=Count('pk'))
+        .values_list('utilisateur_id', 'total')
+    )
+    CompteurNonLus.objects.bulk_create([
+        CompteurNonLus(
+            utilisateur_id=utilisateur_id,
+            messages_non_lus=messages.get(utilisateur_id, 0),
+            notifications_non_lues=notifications.get(utilisateur_id, 0),
+        )
+        for utilisateur_id in set(messages) | set(notifications)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('messaging', '0005_index_rattrapage_temps_reel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurNonLus',
+            fields=[
+                ('utilisateur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compteur_non_lus', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+                ('messages_non_lus', models.PositiveIntegerField(default=0, verbose_name='Messages non lus')),
+                ('notifications_non_lues', models.PositiveIntegerField(default=0, verbose_name='Notifications non lues')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Compteur de non-lus',
+                'verbose_name_plural': 'Compteurs de non-lus',
+                'db_table': 'tabali_compteurs_non_lus',
+            },
+        ),
+        migrations.RunPython(remplir_compteurs, migrations.RunPython.noop),
+    ]
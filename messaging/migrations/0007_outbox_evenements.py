@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_compteurs_non_lus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvenementSortant',
+            fields=[
+                ('id_evenement', models.BigAutoField(primary_key=True, serialize=False)),
+                ('type_evenement', models.CharField(choices=[('message_envoye', 'Message envoyé')], max_length=30, verbose_name="Type d'événement")),
+                ('cle_deduplication', models.CharField(help_text="Un même événement publié deux fois n'est livré qu'une fois", max_length=150, unique=True, verbose_name='Clé de déduplication')),
+                ('charge', models.JSONField(default=dict, verbose_name='Données')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('traite', 'Traité'), ('echec', 'Échec définitif')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('canaux_livres', models.JSONField(blank=True, default=list, verbose_name='Canaux livrés')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('derniere_erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_traitement', models.DateTimeField(blank=True, null=True, verbose_name='Date de traitement')),
+            ],
+            options={
+                'verbose_name': 'Événement sortant',
+                'verbose_name_plural': 'Événements sortants',
+                'db_table': 'tabali_evenements_sortants',
+                'ordering': ['id_evenement'],
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative', 'id_evenement'], name='tabali_even_statut_4c7d39_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_outbox_evenements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='envoimail',
+            name='date_expedition',
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Date d'expédition"),
+        ),
+        migrations.AddField(
+            model_name='envoimail',
+            name='prochaine_tentative',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text="Date à partir de laquelle l'email peut être expédié", verbose_name='Prochaine tentative'),
+        ),
+        migrations.AddField(
+            model_name='envoimail',
+            name='tentatives',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives d'envoi"),
+        ),
+        migrations.AddIndex(
+            model_name='envoimail',
+            index=models.Index(fields=['statut', 'prochaine_tentative'], name='tabali_envo_statut_aeaf02_idx'),
+        ),
+    ]
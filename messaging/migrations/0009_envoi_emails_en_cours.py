@@ -0,0 +1,24 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:18
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0008_expedition_emails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='envoimail',
+            name='prochaine_tentative',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text="Date à partir de laquelle l'email peut être expédié (fin du bail s'il est en cours d'envoi)", verbose_name='Prochaine tentative'),
+        ),
+        migrations.AlterField(
+            model_name='envoimail',
+            name='statut',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', "En cours d'envoi"), ('envoye', 'Envoyé'), ('delivre', 'Délivré'), ('ouvert', 'Ouvert'), ('echec', 'Échec'), ('rejete', 'Rejeté')], default='en_attente', max_length=20, verbose_name='Statut'),
+        ),
+    ]
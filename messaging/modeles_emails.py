@@ -0,0 +1,325 @@
+"""
+Registre des modèles d'emails transactionnels.
+
+Chaque modèle est identifié par un type d'email (``EnvoiMail.TypeEmail``) ou
+par une variante nommée (``rappel_facture``...), et décliné par langue. Les
+sources sont des gabarits Django compilés une seule fois par processus ; les
+blocs communs (signature, pied de page) sont rendus une fois par langue et
+conservés dans un cache LRU, puis injectés dans le contexte de chaque email.
+
+Pour un envoi en masse, ``rendre_en_masse`` réutilise les gabarits compilés et
+un unique ``Context`` : seul le contexte propre à chaque destinataire change.
+"""
+
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import Context, Engine
+
+# Langue utilisée si la langue demandée n'a pas de variante
+LANGUE_PAR_DEFAUT = 'fr'
+
+MODELES = {
+    'bienvenue': {
+        'fr': {
+            'sujet': "Bienvenue sur {{ site }}{% if prenom %}, {{ prenom }}{% endif %} !",
+            'contenu': (
+                "Bonjour {{ nom|default:'et bienvenue' }},\n\n"
+                "Votre compte {{ site }} est prêt. Vous pouvez dès maintenant rechercher "
+                "un prestataire près de chez vous et réserver en quelques clics.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Welcome to {{ site }}{% if prenom %}, {{ prenom }}{% endif %}!",
+            'contenu': (
+                "Hello {{ nom|default:'and welcome' }},\n\n"
+                "Your {{ site }} account is ready. You can now find a provider near you "
+                "and book in a few clicks.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'confirmation': {
+        'fr': {
+            'sujet': "Confirmation de votre réservation{% if reference %} {{ reference }}{% endif %}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "Votre réservation{% if service %} « {{ service }} »{% endif %} a été confirmée"
+                "{% if date %} pour le {{ date }}{% endif %}.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Your booking is confirmed{% if reference %} ({{ reference }}){% endif %}",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "Your booking{% if service %} \"{{ service }}\"{% endif %} has been confirmed"
+                "{% if date %} for {{ date }}{% endif %}.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'notification': {
+        'fr': {
+            'sujet': "{% if titre %}{{ titre }}{% else %}Notification {{ site }}{% endif %}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "{{ message|default:'Vous avez reçu une notification.' }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "{% if titre %}{{ titre }}{% else %}Notification from {{ site }}{% endif %}",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "{{ message|default:'You have a new notification.' }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'marketing': {
+        'fr': {
+            'sujet': "{% if titre %}{{ titre }}{% else %}Les nouveautés de {{ site }}{% endif %}",
+            'contenu': "Bonjour {{ nom }},\n\n{{ message }}\n\n{{ signature }}\n\n{{ pied_de_page }}",
+        },
+        'en': {
+            'sujet': "{% if titre %}{{ titre }}{% else %}What is new at {{ site }}{% endif %}",
+            'contenu': "Hello {{ nom }},\n\n{{ message }}\n\n{{ signature }}\n\n{{ pied_de_page }}",
+        },
+    },
+    'facture': {
+        'fr': {
+            'sujet': "Votre facture{% if numero_facture %} {{ numero_facture }}{% endif %}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "Votre facture{% if numero_facture %} {{ numero_facture }}{% endif %}"
+                "{% if montant %} d'un montant de {{ montant }} €{% endif %} est disponible "
+                "dans votre espace client.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Your invoice{% if numero_facture %} {{ numero_facture }}{% endif %}",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "Your invoice{% if numero_facture %} {{ numero_facture }}{% endif %}"
+                "{% if montant %} for €{{ montant }}{% endif %} is available in your account.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'rappel': {
+        'fr': {
+            'sujet': "Rappel{% if titre %} : {{ titre }}{% endif %}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "{{ message|default:'Ceci est un rappel de votre activité sur la plateforme.' }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Reminder{% if titre %}: {{ titre }}{% endif %}",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "{{ message|default:'This is a reminder about your activity on the platform.' }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'mot_de_passe': {
+        'fr': {
+            'sujet': "Réinitialisation de votre mot de passe {{ site }}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "Pour choisir un nouveau mot de passe, suivez ce lien : {{ lien }}\n"
+                "Si vous n'êtes pas à l'origine de cette demande, ignorez cet email.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Reset your {{ site }} password",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "To choose a new password, follow this link: {{ lien }}\n"
+                "If you did not request this, you can ignore this email.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    # Variantes nommées
+    'rappel_facture': {
+        'fr': {
+            'sujet': "Rappel : facture {{ numero_facture }} en retard",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "Votre facture {{ numero_facture }} d'un montant de {{ montant }}€ était "
+                "payable avant le {{ date_echeance|date:'d/m/Y' }}. Merci de procéder à son "
+                "règlement dans les meilleurs délais.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Reminder: invoice {{ numero_facture }} is overdue",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "Your invoice {{ numero_facture }} for €{{ montant }} was due on "
+                "{{ date_echeance|date:'Y-m-d' }}. Please settle it as soon as possible.\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'rappel_reservation': {
+        'fr': {
+            'sujet': "Rappel : {{ service }} le {{ date|date:'d/m/Y' }} à {{ date|time:'H:i' }}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "Nous vous rappelons votre intervention « {{ service }} » avec {{ interlocuteur }}, "
+                "prévue le {{ date|date:'d/m/Y' }} à {{ date|time:'H:i' }} à l'adresse suivante :\n"
+                "{{ adresse }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "Reminder: {{ service }} on {{ date|date:'Y-m-d' }} at {{ date|time:'H:i' }}",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "This is a reminder of your \"{{ service }}\" appointment with {{ interlocuteur }}, "
+                "scheduled on {{ date|date:'Y-m-d' }} at {{ date|time:'H:i' }} at:\n"
+                "{{ adresse }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+    'nouveau_message': {
+        'fr': {
+            'sujet': "Nouveau message de {{ expediteur }}",
+            'contenu': (
+                "Bonjour {{ nom }},\n\n"
+                "{{ expediteur }} vous a écrit :\n\n{{ message }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+        'en': {
+            'sujet': "New message from {{ expediteur }}",
+            'contenu': (
+                "Hello {{ nom }},\n\n"
+                "{{ expediteur }} wrote to you:\n\n{{ message }}\n\n"
+                "{{ signature }}\n\n{{ pied_de_page }}"
+            ),
+        },
+    },
+}
+
+# Blocs communs, rendus une fois par langue (et par modèle pour le pied de page)
+FRAGMENTS = {
+    'signature': {
+        'fr': "À très bientôt,\nL'équipe {{ site }}",
+        'en': "See you soon,\nThe {{ site }} team",
+    },
+    'pied_de_page': {
+        'fr': (
+            "—\nVous recevez cet email ({{ modele }}) car vous avez un compte sur {{ site }}.\n"
+            "Une question ? Écrivez-nous à {{ support }}."
+        ),
+        'en': (
+            "—\nYou are receiving this email ({{ modele }}) because you have a {{ site }} account.\n"
+            "Any question? Write to us at {{ support }}."
+        ),
+    },
+}
+
+
+class RegistreModeles:
+    """Gabarits compilés (une fois par processus) et blocs communs mis en cache."""
+
+    def __init__(self, modeles=None, fragments=None):
+        self.modeles = modeles if modeles is not None else MODELES
+        self.fragments = fragments if fragments is not None else FRAGMENTS
+        self._compiles = {}
+        self._verrou = threading.Lock()
+        # Cache LRU propre à l'instance des blocs communs rendus
+        self.rendre_fragment = lru_cache(maxsize=256)(self._rendre_fragment)
+
+    @staticmethod
+    def _moteur():
+        return Engine.get_default()
+
+    def resoudre_langue(self, variantes, langue=None):
+        """Choisit la variante : 'fr-fr' → 'fr-fr', puis 'fr', puis la langue par défaut."""
+        langue = (langue or settings.LANGUAGE_CODE).lower()
+        for candidate in (langue, langue.split('-')[0], LANGUE_PAR_DEFAUT):
+            if candidate in variantes:
+                return candidate
+        return next(iter(variantes))
+
+    def obtenir(self, modele, langue=None):
+        """
+        Gabarits compilés (sujet, contenu) d'un modèle.
+
+        Returns:
+            (gabarit_sujet, gabarit_contenu, langue_retenue)
+        """
+        modele = str(modele)
+        variantes = self.modeles.get(modele) or self.modeles['notification']
+        langue = self.resoudre_langue(variantes, langue)
+        cle = (modele, langue)
+        compiles = self._compiles.get(cle)
+        if compiles is None:
+            with self._verrou:
+                compiles = self._compiles.get(cle)
+                if compiles is None:
+                    moteur = self._moteur()
+                    source = variantes[langue]
+                    compiles = (
+                        moteur.from_string(source['sujet']),
+                        moteur.from_string(source['contenu'])
+                    )
+                    self._compiles[cle] = compiles
+        return compiles[0], compiles[1], langue
+
+    @staticmethod
+    def contexte_commun():
+        """Variables disponibles dans tous les gabarits et blocs communs."""
+        tabali_settings = settings.TABALI_SETTINGS
+        return {
+            'site': tabali_settings.get('SITE_NAME', 'Tabali Platform'),
+            'support': tabali_settings.get('SUPPORT_EMAIL', settings.DEFAULT_FROM_EMAIL),
+        }
+
+    def _rendre_fragment(self, nom, langue, modele):
+        variantes = self.fragments[nom]
+        source = variantes[self.resoudre_langue(variantes, langue)]
+        contexte = Context({**self.contexte_commun(), 'modele': modele}, autoescape=False)
+        return self._moteur().from_string(source).render(contexte)
+
+    def fragments_partages(self, modele, langue):
+        """Blocs communs rendus (depuis le cache LRU) pour un modèle et une langue."""
+        return {nom: self.rendre_fragment(nom, langue, str(modele)) for nom in self.fragments}
+
+    def rendre_en_masse(self, modele, contextes, langue=None):
+        """
+        Rend un modèle pour une suite de contextes de destinataires.
+
+        Les gabarits ne sont compilés qu'une fois et un seul ``Context`` est
+        réutilisé : seul le contexte propre au destinataire est empilé.
+
+        Yields:
+            (sujet, contenu) pour chaque contexte
+        """
+        gabarit_sujet, gabarit_contenu, langue = self.obtenir(modele, langue)
+        contexte = Context(
+            {**self.contexte_commun(), **self.fragments_partages(modele, langue)},
+            autoescape=False
+        )
+        for donnees in contextes:
+            with contexte.push(donnees):
+                yield gabarit_sujet.render(contexte).strip(), gabarit_contenu.render(contexte).strip()
+
+    def rendre(self, modele, contexte=None, langue=None):
+        """Rend un modèle pour un seul destinataire : (sujet, contenu)."""
+        return next(self.rendre_en_masse(modele, [contexte or {}], langue))
+
+
+registre = RegistreModeles()
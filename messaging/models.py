@@ -4,11 +4,18 @@ Modèles pour la gestion de la messagerie et notifications - Application messagi
 Basé sur le diagramme de base de données : Messageries, Notifications, Envoimails.
 """
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce, Greatest, Now
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import EmailValidator
 from accounts.models import User
 from reservations.models import Reservation
+from collections import Counter
+from datetime import timedelta
+from itertools import islice, tee
 import uuid
 
 
@@ -26,6 +33,9 @@ class Messagerie(models.Model):
         LU = 'lu', _('Lu')
         ARCHIVE = 'archive', _('Archivé')
     
+    # Statuts comptés dans les messages non lus
+    STATUTS_NON_LUS = (StatutMessage.ENVOYE, StatutMessage.DELIVRE)
+    
     # Champs du diagramme
     id_messagerie = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     contenu = models.TextField(_('Contenu du message'))
@@ -85,28 +95,89 @@ class Messagerie(models.Model):
     def envoyer(self):
         """Envoyer un message."""
         self.statut = self.StatutMessage.ENVOYE
-        self.save()
-        # Créer une notification pour le destinataire
-        Notification.objects.create(
-            utilisateur=self.destinataire,
-            type_notification=Notification.TypeNotification.MESSAGE,
-            titre=f"Nouveau message de {self.expediteur.get_full_name()}",
-            contenu=self.contenu[:100] + "..." if len(self.contenu) > 100 else self.contenu,
-            lien_action=f"/messages/{self.conversation_id}/",
-            objet_lie_id=str(self.id_messagerie)
-        )
+        with transaction.atomic():
+            # Rattacher le message à l'index des conversations
+            conversation = Conversation.obtenir(
+                self.expediteur, self.destinataire, self.reservation
+            )
+            self.conversation_id = conversation.pk
+            self.save()
+            conversation.enregistrer_message(self)
+            
+            # Notification, email, push... sont livrés par le worker de l'outbox
+            EvenementSortant.publier(
+                EvenementSortant.TypeEvenement.MESSAGE_ENVOYE,
+                f"message:{self.pk}",
+                {'message_id': str(self.pk)}
+            )
+            
+            from .realtime import publier_messages
+            publier_messages([self])
+    
+    def _quitter_non_lus(self, statut, **valeurs):
+        """
+        Passe le message au statut donné et, s'il était non lu, décrémente les
+        compteurs de non-lus dans la même transaction.
+        
+        La mise à jour conditionnelle garantit qu'un message n'est décompté
+        qu'une fois, même en cas d'appels concurrents.
+        """
+        with transaction.atomic():
+            etait_non_lu = Messagerie.objects.filter(
+                pk=self.pk, statut__in=self.STATUTS_NON_LUS
+            ).update(statut=statut, **valeurs)
+            if not etait_non_lu:
+                Messagerie.objects.filter(pk=self.pk).exclude(statut=statut).update(
+                    statut=statut, **valeurs
+                )
+            elif self.expediteur_id != self.destinataire_id:
+                ParticipantConversation.objects.filter(
+                    conversation_id=self.conversation_id,
+                    utilisateur_id=self.destinataire_id
+                ).update(
+                    nb_non_lus=Greatest(F('nb_non_lus') - 1, 0, output_field=models.IntegerField())
+                )
+                CompteurNonLus.ajuster(self.destinataire_id, messages=-1)
+        self.statut = statut
+        for champ, valeur in valeurs.items():
+            setattr(self, champ, valeur)
     
     def marquer_comme_lu(self):
         """Marquer le message comme lu."""
         if self.statut != self.StatutMessage.LU:
-            self.statut = self.StatutMessage.LU
-            self.date_lecture = models.functions.Now()
-            self.save()
+            self._quitter_non_lus(self.StatutMessage.LU, date_lecture=timezone.now())
     
     def archiver(self):
         """Archiver le message."""
-        self.statut = self.StatutMessage.ARCHIVE
-        self.save()
+        self._quitter_non_lus(self.StatutMessage.ARCHIVE)
+    
+    @classmethod
+    def marquer_conversation_lue(cls, conversation_id, utilisateur):
+        """
+        Marque comme lus tous les messages reçus par l'utilisateur dans une
+        conversation (un seul UPDATE) et remet ses compteurs à jour.
+        
+        Returns:
+            int: nombre de messages marqués comme lus
+        """
+        with transaction.atomic():
+            # Verrouille la participation pour sérialiser avec les envois concurrents
+            participation = ParticipantConversation.objects.select_for_update().filter(
+                conversation_id=conversation_id, utilisateur=utilisateur
+            ).first()
+            if participation is None:
+                return 0
+            
+            nb_marques = cls.objects.filter(
+                conversation_id=conversation_id,
+                destinataire=utilisateur,
+                statut__in=cls.STATUTS_NON_LUS
+            ).update(statut=cls.StatutMessage.LU, date_lecture=Now())
+            
+            if participation.nb_non_lus:
+                ParticipantConversation.objects.filter(pk=participation.pk).update(nb_non_lus=0)
+                CompteurNonLus.ajuster(utilisateur.pk, messages=-participation.nb_non_lus)
+        return nb_marques
     
     def rechercher(self):
         """Méthode de recherche (à implémenter dans les vues)."""
@@ -119,18 +190,7 @@ class Messagerie(models.Model):
     @classmethod
     def get_or_create_conversation(cls, user1, user2, reservation=None):
         """Récupère ou crée une conversation entre deux utilisateurs."""
-        # Chercher une conversation existante
-        existing_message = cls.objects.filter(
-            models.Q(expediteur=user1, destinataire=user2) |
-            models.Q(expediteur=user2, destinataire=user1),
-            reservation=reservation
-        ).first()
-        
-        if existing_message:
-            return existing_message.conversation_id
-        else:
-            # Créer un nouvel ID de conversation
-            return uuid.uuid4()
+        return Conversation.obtenir(user1, user2, reservation).pk
     
     class Meta:
         verbose_name = _('Message')
@@ -138,9 +198,11 @@ class Messagerie(models.Model):
         db_table = 'tabali_messageries'
         ordering = ['-date_envoi']
         indexes = [
-            models.Index(fields=['conversation_id']),
+            # Pagination par clé des fils de discussion
+            models.Index(fields=['conversation_id', 'date_envoi', 'id_messagerie']),
             models.Index(fields=['expediteur']),
-            models.Index(fields=['destinataire']),
+            # Rattrapage temps réel des messages reçus depuis un curseur
+            models.Index(fields=['destinataire', 'date_envoi', 'id_messagerie']),
             models.Index(fields=['statut']),
             models.Index(fields=['-date_envoi']),
             models.Index(fields=['reservation']),
@@ -150,6 +212,316 @@ class Messagerie(models.Model):
         return f"Message de {self.expediteur.get_full_name()} à {self.destinataire.get_full_name()}"
 
 
+class Conversation(models.Model):
+    """
+    Index des conversations entre deux utilisateurs.
+    
+    Maintenu à chaque envoi de message : dernier message, date de dernière
+    activité et compteurs de non-lus par participant (voir
+    ``ParticipantConversation``). La boîte de réception se lit ainsi sans
+    regrouper la table des messages.
+    """
+    
+    # Même valeur que Messagerie.conversation_id
+    id_conversation = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    cle_participants = models.CharField(
+        _('Clé des participants'),
+        max_length=120,
+        unique=True,
+        help_text=_('Identifiants des participants triés et réservation, pour retrouver la conversation')
+    )
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.CASCADE,
+        related_name='conversations',
+        verbose_name=_('Réservation concernée'),
+        null=True,
+        blank=True
+    )
+    dernier_message = models.ForeignKey(
+        Messagerie,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name=_('Dernier message'),
+        null=True,
+        blank=True
+    )
+    derniere_activite = models.DateTimeField(_('Dernière activité'), null=True, blank=True)
+    date_creation = models.DateTimeField(_('Date de création'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Conversation')
+        verbose_name_plural = _('Conversations')
+        db_table = 'tabali_conversations'
+        ordering = ['-derniere_activite']
+    
+    def __str__(self):
+        return f"Conversation {self.id_conversation}"
+    
+    @staticmethod
+    def construire_cle(user1_id, user2_id, reservation_id=None):
+        """Clé canonique d'une conversation, indépendante de l'ordre des participants."""
+        premier, second = sorted([str(user1_id), str(user2_id)])
+        return f"{premier}:{second}:{reservation_id or ''}"
+    
+    @classmethod
+    def obtenir(cls, user1, user2, reservation=None):
+        """Récupère ou crée la conversation entre deux utilisateurs."""
+        cle = cls.construire_cle(user1.pk, user2.pk, reservation.pk if reservation else None)
+        conversation = cls.objects.filter(cle_participants=cle).first()
+        if conversation:
+            return conversation
+        
+        try:
+            with transaction.atomic():
+                conversation = cls.objects.create(cle_participants=cle, reservation=reservation)
+                participants = {user1.pk: user2.pk, user2.pk: user1.pk}
+                ParticipantConversation.objects.bulk_create([
+                    ParticipantConversation(
+                        conversation=conversation,
+                        utilisateur_id=utilisateur_id,
+                        interlocuteur_id=interlocuteur_id,
+                    )
+                    for utilisateur_id, interlocuteur_id in participants.items()
+                ])
+        except IntegrityError:
+            # Créée en parallèle par une autre requête
+            conversation = cls.objects.get(cle_participants=cle)
+        return conversation
+    
+    def enregistrer_message(self, message):
+        """Met à jour l'index et le compteur de non-lus du destinataire après l'envoi d'un message."""
+        Conversation.objects.filter(pk=self.pk).update(
+            dernier_message=message,
+            derniere_activite=message.date_envoi
+        )
+        increment = 0 if message.expediteur_id == message.destinataire_id else 1
+        self.participants.update(
+            derniere_activite=message.date_envoi,
+            nb_non_lus=Case(
+                When(utilisateur_id=message.destinataire_id, then=F('nb_non_lus') + increment),
+                default=F('nb_non_lus'),
+                output_field=models.PositiveIntegerField()
+            )
+        )
+        CompteurNonLus.ajuster(message.destinataire_id, messages=increment)
+        self.dernier_message = message
+        self.derniere_activite = message.date_envoi
+
+    @classmethod
+    def recalculer_dernier_message(cls, conversation_ids):
+        """
+        Recalcule depuis les messages le dernier message et la dernière activité
+        des conversations données (après une insertion en masse qui contourne
+        ``enregistrer_message``, par exemple la restauration d'une archive).
+        """
+        conversation_ids = set(conversation_ids)
+        if not conversation_ids:
+            return
+        dernier = Messagerie.objects.filter(
+            conversation_id=OuterRef('pk')
+        ).order_by('-date_envoi', '-pk')
+        cls.objects.filter(pk__in=conversation_ids).update(
+            dernier_message=Subquery(dernier.values('pk')[:1]),
+            derniere_activite=Coalesce(Subquery(dernier.values('date_envoi')[:1]), F('derniere_activite'))
+        )
+
+
+class ParticipantConversation(models.Model):
+    """
+    Participation d'un utilisateur à une conversation.
+    
+    Une ligne par participant, portant son compteur de non-lus et une copie de
+    la date de dernière activité : la boîte de réception d'un utilisateur est
+    une simple lecture de l'index (utilisateur, -derniere_activite).
+    """
+    
+    conversation = models.ForeignKey(
+        Conversation,
+        on_delete=models.CASCADE,
+        related_name='participants',
+        verbose_name=_('Conversation')
+    )
+    utilisateur = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='participations_conversations',
+        verbose_name=_('Participant')
+    )
+    interlocuteur = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Interlocuteur')
+    )
+    nb_non_lus = models.PositiveIntegerField(_('Messages non lus'), default=0)
+    derniere_activite = models.DateTimeField(_('Dernière activité'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Participant à une conversation')
+        verbose_name_plural = _('Participants aux conversations')
+        db_table = 'tabali_participants_conversations'
+        ordering = ['-derniere_activite']
+        unique_together = [['conversation', 'utilisateur']]
+        indexes = [
+            models.Index(fields=['utilisateur', '-derniere_activite']),
+        ]
+    
+    def __str__(self):
+        return f"{self.utilisateur_id} dans {self.conversation_id}"
+
+
+class CompteurNonLus(models.Model):
+    """
+    Compteurs dénormalisés des messages et notifications non lus d'un utilisateur.
+    
+    Tenus à jour dans la transaction de chaque envoi, lecture ou archivage :
+    le badge de l'application se lit par clé primaire, sans compter de lignes.
+    Une ligne absente équivaut à des compteurs nuls.
+    """
+    
+    utilisateur = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='compteur_non_lus',
+        verbose_name=_('Utilisateur')
+    )
+    messages_non_lus = models.PositiveIntegerField(_('Messages non lus'), default=0)
+    notifications_non_lues = models.PositiveIntegerField(_('Notifications non lues'), default=0)
+    date_mise_a_jour = models.DateTimeField(_('Dernière mise à jour'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Compteur de non-lus')
+        verbose_name_plural = _('Compteurs de non-lus')
+        db_table = 'tabali_compteurs_non_lus'
+    
+    def __str__(self):
+        return f"Non-lus de {self.utilisateur_id}"
+    
+    @classmethod
+    def lire(cls, utilisateur_id):
+        """Compteurs de l'utilisateur (lecture par clé primaire)."""
+        compteurs = cls.objects.filter(pk=utilisateur_id).values(
+            'messages_non_lus', 'notifications_non_lues'
+        ).first()
+        return compteurs or {'messages_non_lus': 0, 'notifications_non_lues': 0}
+    
+    @classmethod
+    def ajuster(cls, utilisateur_id, messages=0, notifications=0):
+        """
+        Applique un delta aux compteurs (à appeler dans la transaction qui
+        modifie les lignes comptées). Les compteurs ne descendent pas sous zéro.
+        """
+        if not messages and not notifications:
+            return
+        valeurs = {'date_mise_a_jour': Now()}
+        if messages:
+            valeurs['messages_non_lus'] = Greatest(
+                F('messages_non_lus') + messages, 0, output_field=models.IntegerField()
+            )
+        if notifications:
+            valeurs['notifications_non_lues'] = Greatest(
+                F('notifications_non_lues') + notifications, 0, output_field=models.IntegerField()
+            )
+        if cls.objects.filter(pk=utilisateur_id).update(**valeurs):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    utilisateur_id=utilisateur_id,
+                    messages_non_lus=max(messages, 0),
+                    notifications_non_lues=max(notifications, 0)
+                )
+        except IntegrityError:
+            # Ligne créée en parallèle
+            cls.objects.filter(pk=utilisateur_id).update(**valeurs)
+    
+    @classmethod
+    def ajuster_en_masse(cls, notifications_par_utilisateur, taille_lot=1000):
+        """
+        Incrémente les compteurs de notifications de nombreux utilisateurs :
+        une requête par lot et par valeur d'incrément, au lieu d'une par utilisateur.
+        
+        Args:
+            notifications_par_utilisateur: {utilisateur_id: nombre}
+        """
+        par_increment = {}
+        for utilisateur_id, nombre in notifications_par_utilisateur.items():
+            if nombre:
+                par_increment.setdefault(nombre, []).append(utilisateur_id)
+        
+        for nombre, utilisateur_ids in par_increment.items():
+            for debut in range(0, len(utilisateur_ids), taille_lot):
+                lot = utilisateur_ids[debut:debut + taille_lot]
+                # Garantir l'existence des lignes, puis incrémenter sans course possible
+                cls.objects.bulk_create(
+                    [cls(utilisateur_id=utilisateur_id) for utilisateur_id in lot],
+                    ignore_conflicts=True
+                )
+                cls.objects.filter(pk__in=lot).update(
+                    notifications_non_lues=Greatest(
+                        F('notifications_non_lues') + nombre, 0, output_field=models.IntegerField()
+                    ),
+                    date_mise_a_jour=Now()
+                )
+    
+    @classmethod
+    def recalculer(cls, utilisateur_ids):
+        """
+        Recalcule depuis les lignes les compteurs des utilisateurs donnés, ainsi
+        que leurs non-lus par conversation (après une mise à jour en masse qui
+        contourne les méthodes du modèle, par exemple depuis l'admin).
+        """
+        utilisateur_ids = set(utilisateur_ids)
+        if not utilisateur_ids:
+            return
+        non_lus = Messagerie.objects.filter(
+            statut__in=Messagerie.STATUTS_NON_LUS
+        ).exclude(expediteur_id=F('destinataire_id'))
+        
+        with transaction.atomic():
+            par_conversation = non_lus.filter(
+                conversation_id=OuterRef('conversation_id'),
+                destinataire_id=OuterRef('utilisateur_id')
+            ).values('destinataire_id').annotate(total=Count('pk')).values('total')
+            ParticipantConversation.objects.filter(utilisateur_id__in=utilisateur_ids).update(
+                nb_non_lus=Coalesce(Subquery(par_conversation), 0)
+            )
+            
+            messages = dict(
+                non_lus.filter(destinataire_id__in=utilisateur_ids)
+                .values('destinataire_id').annotate(total=Count('pk'))
+                .values_list('destinataire_id', 'total')
+            )
+            notifications = dict(
+                Notification.objects.filter(
+                    utilisateur_id__in=utilisateur_ids,
+                    statut=Notification.StatutNotification.NON_LUE
+                ).values('utilisateur_id').annotate(total=Count('pk'))
+                .values_list('utilisateur_id', 'total')
+            )
+            compteurs = [
+                cls(
+                    utilisateur_id=utilisateur_id,
+                    messages_non_lus=messages.get(utilisateur_id, 0),
+                    notifications_non_lues=notifications.get(utilisateur_id, 0)
+                )
+                for utilisateur_id in utilisateur_ids
+            ]
+            existants = set(cls.objects.select_for_update().filter(
+                pk__in=utilisateur_ids
+            ).values_list('pk', flat=True))
+            cls.objects.bulk_update(
+                [c for c in compteurs if c.utilisateur_id in existants],
+                ['messages_non_lus', 'notifications_non_lues']
+            )
+            cls.objects.bulk_create(
+                [c for c in compteurs if c.utilisateur_id not in existants],
+                ignore_conflicts=True
+            )
+
+
 class Notification(models.Model):
     """
     Table Notifications du diagramme.
@@ -232,6 +604,49 @@ class Notification(models.Model):
         """Ajouter une nouvelle notification."""
         self.save()
     
+    def save(self, *args, **kwargs):
+        """Override save pour compter et pousser en temps réel les nouvelles notifications."""
+        creation = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creation and self.statut == self.StatutNotification.NON_LUE:
+                CompteurNonLus.ajuster(self.utilisateur_id, notifications=1)
+        if creation:
+            from .realtime import publier_notifications
+            publier_notifications([self])
+    
+    @classmethod
+    def creer_en_masse(cls, notifications, temps_reel=True, taille_lot=None):
+        """
+        Crée un lot de notifications (``bulk_create``) en tenant à jour les
+        compteurs de non-lus et en les poussant en temps réel.
+        
+        Pour les traitements de masse, ``temps_reel=False`` évite de publier un
+        événement par notification : les clients les récupèrent à la reprise.
+        """
+        with transaction.atomic():
+            cls.objects.bulk_create(notifications, batch_size=taille_lot)
+            CompteurNonLus.ajuster_en_masse(Counter(
+                notification.utilisateur_id for notification in notifications
+                if notification.statut == cls.StatutNotification.NON_LUE
+            ))
+            
+            if temps_reel:
+                from .realtime import publier_notifications
+                publier_notifications(notifications)
+        return notifications
+    
+    def delete(self, *args, **kwargs):
+        """Override delete pour décompter une notification non lue."""
+        with transaction.atomic():
+            etait_non_lue = Notification.objects.filter(
+                pk=self.pk, statut=self.StatutNotification.NON_LUE
+            ).exists()
+            resultat = super().delete(*args, **kwargs)
+            if etait_non_lue:
+                CompteurNonLus.ajuster(self.utilisateur_id, notifications=-1)
+        return resultat
+    
     def envoyer(self):
         """Envoyer la notification (marquer comme envoyée)."""
         # Ici on pourrait ajouter l'envoi push, email, etc.
@@ -241,17 +656,56 @@ class Notification(models.Model):
         """Supprimer une notification."""
         self.delete()
     
+    def _quitter_non_lue(self, statut, **valeurs):
+        """Passe la notification au statut donné en décomptant une notification non lue."""
+        with transaction.atomic():
+            etait_non_lue = Notification.objects.filter(
+                pk=self.pk, statut=self.StatutNotification.NON_LUE
+            ).update(statut=statut, **valeurs)
+            if etait_non_lue:
+                CompteurNonLus.ajuster(self.utilisateur_id, notifications=-1)
+            else:
+                Notification.objects.filter(pk=self.pk).exclude(statut=statut).update(
+                    statut=statut, **valeurs
+                )
+        self.statut = statut
+        for champ, valeur in valeurs.items():
+            setattr(self, champ, valeur)
+    
     def marquer_comme_lue(self):
         """Marquer la notification comme lue."""
         if self.statut == self.StatutNotification.NON_LUE:
-            self.statut = self.StatutNotification.LUE
-            self.date_lecture = models.functions.Now()
-            self.save()
+            self._quitter_non_lue(self.StatutNotification.LUE, date_lecture=timezone.now())
     
     def archiver(self):
         """Archiver la notification."""
-        self.statut = self.StatutNotification.ARCHIVEE
-        self.save()
+        self._quitter_non_lue(self.StatutNotification.ARCHIVEE)
+    
+    @classmethod
+    def marquer_lues_jusqua(cls, utilisateur, position=None):
+        """
+        Marque comme lues, en un seul UPDATE, les notifications non lues de
+        l'utilisateur jusqu'à la position (date, id_notification) incluse, ou
+        toutes si aucune position n'est donnée.
+        
+        Returns:
+            int: nombre de notifications marquées comme lues
+        """
+        notifications = cls.objects.filter(
+            utilisateur=utilisateur, statut=cls.StatutNotification.NON_LUE
+        )
+        if position is not None:
+            date, identifiant = position
+            notifications = notifications.filter(
+                Q(date__lt=date) | Q(date=date, id_notification__lte=identifiant),
+                date__lte=date
+            )
+        with transaction.atomic():
+            nb_marquees = notifications.update(
+                statut=cls.StatutNotification.LUE, date_lecture=Now()
+            )
+            CompteurNonLus.ajuster(utilisateur.pk, notifications=-nb_marquees)
+        return nb_marquees
     
     class Meta:
         verbose_name = _('Notification')
@@ -259,7 +713,8 @@ class Notification(models.Model):
         db_table = 'tabali_notifications'
         ordering = ['-date']
         indexes = [
-            models.Index(fields=['utilisateur']),
+            # Rattrapage temps réel des notifications depuis un curseur
+            models.Index(fields=['utilisateur', 'date', 'id_notification']),
             models.Index(fields=['statut']),
             models.Index(fields=['type_notification']),
             models.Index(fields=['-date']),
@@ -280,6 +735,7 @@ class EnvoiMail(models.Model):
     class StatutEnvoi(models.TextChoices):
         """Statuts d'envoi des emails."""
         EN_ATTENTE = 'en_attente', _('En attente')
+        EN_COURS = 'en_cours', _('En cours d\'envoi')
         ENVOYE = 'envoye', _('Envoyé')
         DELIVRE = 'delivre', _('Délivré')
         OUVERT = 'ouvert', _('Ouvert')
@@ -355,6 +811,19 @@ class EnvoiMail(models.Model):
         help_text=_('Détails de l\'erreur en cas d\'échec')
     )
     
+    # Expédition (moteur d'envoi par lots)
+    tentatives = models.PositiveSmallIntegerField(_('Tentatives d\'envoi'), default=0)
+    prochaine_tentative = models.DateTimeField(
+        _('Prochaine tentative'),
+        default=timezone.now,
+        help_text=_('Date à partir de laquelle l\'email peut être expédié (fin du bail s\'il est en cours d\'envoi)')
+    )
+    date_expedition = models.DateTimeField(
+        _('Date d\'expédition'),
+        null=True,
+        blank=True
+    )
+    
     # ID externe (pour intégration avec services comme SendGrid, Mailgun, etc.)
     id_externe = models.CharField(
         _('ID externe'),
@@ -368,11 +837,17 @@ class EnvoiMail(models.Model):
         """Ajouter un nouvel email à envoyer."""
         self.save()
     
-    def envoyer(self):
-        """Envoyer l'email."""
-        # Ici on intégrerait avec le service d'envoi d'email
-        # Pour l'instant, on marque juste comme envoyé
+    def envoyer(self, connexion=None):
+        """
+        Envoyer l'email immédiatement.
+        
+        Les envois en nombre passent par le moteur d'envoi par lots
+        (``messaging.emails.expedier_lot``), qui réutilise une connexion SMTP.
+        """
+        from .emails import construire_message
+        construire_message(self, connexion).send()
         self.statut = self.StatutEnvoi.ENVOYE
+        self.date_expedition = timezone.now()
         self.save()
     
     def modifier(self):
@@ -385,44 +860,146 @@ class EnvoiMail(models.Model):
         self.delete()
     
     def marquer_comme_ouvert(self):
-        """Marquer l'email comme ouvert (tracking)."""
-        if not self.date_ouverture:
-            self.date_ouverture = models.functions.Now()
+        """
+        Marquer l'email comme ouvert (tracking), en un UPDATE atomique.
+        
+        Le pixel de suivi passe par le tampon de ``messaging.tracking`` et
+        ``appliquer_ouvertures`` pour regrouper les écritures.
+        """
+        maintenant = timezone.now()
+        EnvoiMail.appliquer_ouvertures({self.pk: (1, maintenant)})
+        self.date_ouverture = self.date_ouverture or maintenant
         self.nb_ouvertures += 1
         self.statut = self.StatutEnvoi.OUVERT
-        self.save()
     
     @classmethod
-    def creer_email_type(cls, type_email, destinataire_email, destinataire_nom="", utilisateur=None, **kwargs):
-        """Crée un email pré-formaté selon le type."""
-        templates = {
-            cls.TypeEmail.BIENVENUE: {
-                'sujet': 'Bienvenue sur Tabali Platform !',
-                'contenu': 'Bienvenue sur notre plateforme de services...'
-            },
-            cls.TypeEmail.CONFIRMATION: {
-                'sujet': 'Confirmation de votre réservation',
-                'contenu': 'Votre réservation a été confirmée...'
-            },
-            # Ajouter d'autres templates...
-        }
+    def appliquer_ouvertures(cls, ouvertures, taille_lot=500):
+        """
+        Applique des ouvertures agrégées en quelques UPDATE.
         
-        template = templates.get(type_email, {
-            'sujet': 'Notification Tabali Platform',
-            'contenu': 'Vous avez reçu une notification...'
-        })
+        Les emails sont regroupés par nombre d'ouvertures : chaque groupe est
+        mis à jour en une requête ``nb_ouvertures = nb_ouvertures + n``, la
+        date de première ouverture n'étant renseignée que si elle est vide.
         
-        # Merger avec les kwargs pour personnaliser
-        template.update(kwargs)
+        Args:
+            ouvertures: {id_emails: (nombre, date_premiere_ouverture)}
         
-        return cls.objects.create(
+        Returns:
+            int: nombre d'emails mis à jour
+        """
+        maintenant = timezone.now()
+        par_nombre = {}
+        for email_id, (nombre, premiere) in ouvertures.items():
+            par_nombre.setdefault(nombre, []).append((email_id, premiere or maintenant))
+        
+        statuts_avant_ouverture = [cls.StatutEnvoi.ENVOYE, cls.StatutEnvoi.DELIVRE]
+        total = 0
+        with transaction.atomic():
+            for nombre, lignes in par_nombre.items():
+                for debut in range(0, len(lignes), taille_lot):
+                    lot = lignes[debut:debut + taille_lot]
+                    premieres = Case(
+                        *[When(pk=email_id, then=models.Value(premiere)) for email_id, premiere in lot],
+                        output_field=models.DateTimeField()
+                    )
+                    total += cls.objects.filter(pk__in=[email_id for email_id, _ in lot]).update(
+                        nb_ouvertures=F('nb_ouvertures') + nombre,
+                        date_ouverture=Coalesce(F('date_ouverture'), premieres),
+                        statut=Case(
+                            When(statut__in=statuts_avant_ouverture, then=models.Value(cls.StatutEnvoi.OUVERT)),
+                            default=F('statut')
+                        )
+                    )
+        return total
+    
+    @classmethod
+    def construire_email_type(cls, type_email, destinataire_email, destinataire_nom="", utilisateur=None,
+                              contexte=None, modele=None, langue=None, **kwargs):
+        """
+        Construit un email pré-formaté selon le type, sans le sauvegarder.
+        
+        Le sujet et le contenu sont rendus depuis le registre des modèles
+        (``messaging.modeles_emails``), avec ``modele`` pour choisir une
+        variante nommée ; ``sujet`` et ``contenu`` passés en kwargs restent
+        prioritaires. Permet de préparer des lots d'emails pour un ``bulk_create``.
+        """
+        valeurs = dict(kwargs)
+        if 'sujet' not in valeurs or 'contenu' not in valeurs:
+            from .modeles_emails import registre
+            sujet, contenu = registre.rendre(
+                modele or type_email, {'nom': destinataire_nom, **(contexte or {})}, langue
+            )
+            valeurs.setdefault('sujet', sujet)
+            valeurs.setdefault('contenu', contenu)
+        
+        # L'utilisateur peut aussi être fourni par ``utilisateur_id`` dans les kwargs
+        if utilisateur is not None:
+            valeurs['utilisateur'] = utilisateur
+        
+        return cls(
             type_email=type_email,
             email_destinataire=destinataire_email,
             nom_destinataire=destinataire_nom,
-            utilisateur=utilisateur,
-            **template
+            **valeurs
         )
     
+    @classmethod
+    def construire_en_masse(cls, type_email, destinataires, modele=None, langue=None):
+        """
+        Construit (sans les sauvegarder) les emails d'un envoi en masse.
+        
+        Args:
+            destinataires: itérable de dicts ``email``, ``nom``, ``utilisateur_id``
+                (optionnel) et ``contexte`` (variables propres au destinataire)
+        
+        Yields:
+            EnvoiMail non sauvegardés, rendus sans recompiler les modèles
+        """
+        from .modeles_emails import registre
+        
+        # Deux itérateurs avancés de concert : tee ne garde qu'un élément en mémoire
+        pour_rendu, pour_lignes = tee(destinataires)
+        contextes = (
+            {'nom': destinataire.get('nom', ''), **destinataire.get('contexte', {})}
+            for destinataire in pour_rendu
+        )
+        rendus = registre.rendre_en_masse(modele or type_email, contextes, langue)
+        for (sujet, contenu), destinataire in zip(rendus, pour_lignes):
+            yield cls(
+                type_email=type_email,
+                email_destinataire=destinataire['email'],
+                nom_destinataire=destinataire.get('nom', ''),
+                utilisateur_id=destinataire.get('utilisateur_id'),
+                sujet=sujet,
+                contenu=contenu
+            )
+    
+    @classmethod
+    def preparer_campagne(cls, type_email, destinataires, modele=None, langue=None, taille_lot=2000):
+        """
+        Rend et met en file les emails d'une campagne, par lots de ``bulk_create``.
+        
+        Returns:
+            int: nombre d'emails mis en file
+        """
+        emails = cls.construire_en_masse(type_email, destinataires, modele, langue)
+        total = 0
+        while True:
+            lot = list(islice(emails, taille_lot))
+            if not lot:
+                return total
+            cls.objects.bulk_create(lot)
+            total += len(lot)
+    
+    @classmethod
+    def creer_email_type(cls, type_email, destinataire_email, destinataire_nom="", utilisateur=None, **kwargs):
+        """Crée un email pré-formaté selon le type."""
+        email = cls.construire_email_type(
+            type_email, destinataire_email, destinataire_nom, utilisateur, **kwargs
+        )
+        email.save()
+        return email
+    
     class Meta:
         verbose_name = _('Envoi d\'email')
         verbose_name_plural = _('Envois d\'emails')
@@ -434,7 +1011,152 @@ class EnvoiMail(models.Model):
             models.Index(fields=['type_email']),
             models.Index(fields=['-date_envoi']),
             models.Index(fields=['utilisateur']),
+            models.Index(fields=['statut', 'prochaine_tentative']),
         ]
     
     def __str__(self):
         return f"Email: {self.sujet} → {self.email_destinataire}"
+
+
+class EvenementSortant(models.Model):
+    """
+    Outbox des événements à livrer hors de la requête.
+    
+    L'événement est écrit dans la même transaction que la donnée qui le
+    produit ; un worker (``messaging.tasks.drain_outbox``) draine ensuite
+    la table par lots et appelle chaque canal de livraison configuré
+    (notification interne, email, push...). Un envoi de message ne paie
+    donc qu'une insertion, quel que soit le nombre de canaux.
+    
+    Chaque canal livré est mémorisé dans ``canaux_livres`` : une nouvelle
+    tentative ne rejoue que les canaux en échec.
+    """
+    
+    class TypeEvenement(models.TextChoices):
+        """Types d'événements."""
+        MESSAGE_ENVOYE = 'message_envoye', _('Message envoyé')
+    
+    class Statut(models.TextChoices):
+        """Statuts de livraison."""
+        EN_ATTENTE = 'en_attente', _('En attente')
+        TRAITE = 'traite', _('Traité')
+        ECHEC = 'echec', _('Échec définitif')
+    
+    id_evenement = models.BigAutoField(primary_key=True)
+    type_evenement = models.CharField(
+        _('Type d\'événement'),
+        max_length=30,
+        choices=TypeEvenement.choices
+    )
+    cle_deduplication = models.CharField(
+        _('Clé de déduplication'),
+        max_length=150,
+        unique=True,
+        help_text=_('Un même événement publié deux fois n\'est livré qu\'une fois')
+    )
+    charge = models.JSONField(_('Données'), default=dict)
+    statut = models.CharField(
+        _('Statut'),
+        max_length=20,
+        choices=Statut.choices,
+        default=Statut.EN_ATTENTE
+    )
+    canaux_livres = models.JSONField(_('Canaux livrés'), default=list, blank=True)
+    tentatives = models.PositiveSmallIntegerField(_('Tentatives'), default=0)
+    prochaine_tentative = models.DateTimeField(_('Prochaine tentative'), default=timezone.now)
+    derniere_erreur = models.TextField(_('Dernière erreur'), blank=True)
+    date_creation = models.DateTimeField(_('Date de création'), auto_now_add=True)
+    date_traitement = models.DateTimeField(_('Date de traitement'), null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('Événement sortant')
+        verbose_name_plural = _('Événements sortants')
+        db_table = 'tabali_evenements_sortants'
+        ordering = ['id_evenement']
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative', 'id_evenement']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_evenement_display()} ({self.cle_deduplication})"
+    
+    @classmethod
+    def publier(cls, type_evenement, cle_deduplication, charge):
+        """
+        Écrit un événement dans l'outbox (à appeler dans la transaction de la
+        donnée source). Une clé déjà publiée est ignorée.
+        """
+        cls.objects.bulk_create(
+            [cls(type_evenement=type_evenement, cle_deduplication=cle_deduplication, charge=charge)],
+            ignore_conflicts=True
+        )
+    
+    @classmethod
+    def traiter_lot(cls, taille=None):
+        """
+        Livre un lot d'événements en attente.
+        
+        Les lignes sont verrouillées avec ``SKIP LOCKED`` : plusieurs workers
+        peuvent drainer l'outbox en parallèle sans se marcher dessus. Chaque
+        canal reçoit tout le lot en un appel et s'exécute dans un point de
+        sauvegarde : l'échec d'un canal n'annule pas les autres.
+        
+        Returns:
+            int: nombre d'événements traités (livrés ou non)
+        """
+        from .outbox import canaux_pour
+        
+        tabali_settings = settings.TABALI_SETTINGS
+        taille = taille or tabali_settings.get('OUTBOX_BATCH_SIZE', 200)
+        max_tentatives = tabali_settings.get('OUTBOX_MAX_RETRIES', 8)
+        maintenant = timezone.now()
+        
+        with transaction.atomic():
+            lot = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(statut=cls.Statut.EN_ATTENTE, prochaine_tentative__lte=maintenant)
+                .order_by('id_evenement')[:taille]
+            )
+            if not lot:
+                return 0
+            
+            erreurs = {}
+            par_type = {}
+            for evenement in lot:
+                par_type.setdefault(evenement.type_evenement, []).append(evenement)
+            
+            for type_evenement, evenements in par_type.items():
+                for nom, canal in canaux_pour(type_evenement):
+                    a_livrer = [e for e in evenements if nom not in e.canaux_livres]
+                    if not a_livrer:
+                        continue
+                    try:
+                        with transaction.atomic():
+                            canal(a_livrer)
+                    except Exception as exc:
+                        for evenement in a_livrer:
+                            erreurs.setdefault(evenement.pk, []).append(f"{nom}: {exc}")
+                    else:
+                        for evenement in a_livrer:
+                            evenement.canaux_livres = evenement.canaux_livres + [nom]
+            
+            for evenement in lot:
+                if evenement.pk not in erreurs:
+                    evenement.statut = cls.Statut.TRAITE
+                    evenement.date_traitement = maintenant
+                    evenement.derniere_erreur = ''
+                    continue
+                evenement.tentatives += 1
+                evenement.derniere_erreur = "\n".join(erreurs[evenement.pk])
+                if evenement.tentatives >= max_tentatives:
+                    evenement.statut = cls.Statut.ECHEC
+                else:
+                    # Backoff exponentiel plafonné à une heure
+                    delai = min(30 * 2 ** (evenement.tentatives - 1), 3600)
+                    evenement.prochaine_tentative = maintenant + timedelta(seconds=delai)
+            
+            cls.objects.bulk_update(lot, [
+                'statut', 'canaux_livres', 'tentatives', 'prochaine_tentative',
+                'derniere_erreur', 'date_traitement'
+            ])
+        return len(lot)
@@ -0,0 +1,72 @@
+"""
+Canaux de livraison des événements de l'outbox (``EvenementSortant``).
+
+Un canal est une fonction recevant une liste d'événements d'un même type et
+les livrant en lot ; elle lève une exception en cas d'échec, ce qui
+programme une nouvelle tentative pour ces événements. Les canaux actifs par
+type d'événement sont configurés par ``TABALI_SETTINGS['OUTBOX_CANAUX']`` ;
+ajouter un canal (push...) ne change rien au coût d'un envoi de message.
+"""
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import EvenementSortant, EnvoiMail, Messagerie, Notification
+
+CANAUX_PAR_DEFAUT = {
+    EvenementSortant.TypeEvenement.MESSAGE_ENVOYE: {
+        'notification': 'messaging.outbox.notifier_messages',
+    },
+}
+
+
+def canaux_pour(type_evenement):
+    """Liste des couples (nom, fonction) des canaux actifs pour un type d'événement."""
+    configuration = settings.TABALI_SETTINGS.get('OUTBOX_CANAUX', CANAUX_PAR_DEFAUT)
+    return [
+        (nom, import_string(chemin))
+        for nom, chemin in configuration.get(type_evenement, {}).items()
+    ]
+
+
+def _messages(evenements):
+    """Messages concernés par un lot d'événements ``message_envoye``, en une requête."""
+    identifiants = [evenement.charge['message_id'] for evenement in evenements]
+    return Messagerie.objects.filter(pk__in=identifiants).select_related(
+        'expediteur', 'destinataire'
+    ).order_by()
+
+
+def notifier_messages(evenements):
+    """Crée en un ``bulk_create`` la notification interne de chaque message reçu."""
+    Notification.creer_en_masse([
+        Notification(
+            utilisateur_id=message.destinataire_id,
+            type_notification=Notification.TypeNotification.MESSAGE,
+            titre=f"Nouveau message de {message.expediteur.get_full_name()}",
+            contenu=message.contenu[:100] + "..." if len(message.contenu) > 100 else message.contenu,
+            lien_action=f"/messages/{message.conversation_id}/",
+            objet_lie_type='message',
+            objet_lie_id=str(message.id_messagerie)
+        )
+        for message in _messages(evenements)
+    ])
+
+
+def envoyer_emails_messages(evenements):
+    """Met en file un email de notification par message reçu."""
+    EnvoiMail.objects.bulk_create([
+        EnvoiMail.construire_email_type(
+            EnvoiMail.TypeEmail.NOTIFICATION,
+            message.destinataire.email,
+            message.destinataire.get_full_name(),
+            utilisateur=message.destinataire,
+            modele='nouveau_message',
+            contexte={
+                'expediteur': message.expediteur.get_full_name(),
+                'message': message.contenu,
+            }
+        )
+        for message in _messages(evenements)
+        if message.destinataire.email
+    ])
@@ -0,0 +1,159 @@
+"""
+Classes de pagination pour l'application messaging.
+"""
+
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+
+
+def encoder_position(date, identifiant):
+    """Encode une position (date, identifiant) en curseur opaque."""
+    position = f"{date.isoformat()}|{identifiant}"
+    return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+
+def decoder_position(curseur):
+    """
+    Décode un curseur en couple (date, identifiant).
+    
+    Raises:
+        ValueError: si le curseur est invalide
+    """
+    try:
+        date, identifiant = urlsafe_b64decode(curseur.encode('ascii')).decode('ascii').split('|')
+        return datetime.fromisoformat(date), uuid.UUID(identifiant)
+    except (AttributeError, TypeError, UnicodeError) as exc:
+        raise ValueError(str(exc))
+
+
+def filtrer_avant_position(queryset, position, champ_date, champ_id):
+    """Lignes strictement antérieures à la position, de la plus récente à la plus ancienne."""
+    date, identifiant = position
+    # La borne redondante sur la date rend le prédicat exploitable par l'index
+    return queryset.filter(
+        Q(**{f'{champ_date}__lt': date}) |
+        Q(**{champ_date: date, f'{champ_id}__lt': identifiant}),
+        **{f'{champ_date}__lte': date}
+    ).order_by(f'-{champ_date}', f'-{champ_id}')
+
+
+def filtrer_apres_position(queryset, position, champ_date, champ_id):
+    """Lignes strictement postérieures à la position, de la plus ancienne à la plus récente."""
+    date, identifiant = position
+    return queryset.filter(
+        Q(**{f'{champ_date}__gt': date}) |
+        Q(**{champ_date: date, f'{champ_id}__gt': identifiant}),
+        **{f'{champ_date}__gte': date}
+    ).order_by(champ_date, champ_id)
+
+
+class ConversationCursorPagination(CursorPagination):
+    """Pagination par curseur de la boîte de réception, par activité décroissante."""
+    
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-derniere_activite'
+    
+    def get_ordering(self, request, queryset, view):
+        """Ordre fixe aligné sur l'index, indépendant des filtres de tri de la vue."""
+        return (self.ordering,)
+
+
+class FilMessagesPagination(BasePagination):
+    """
+    Pagination par clé d'un fil de messages, dans les deux sens.
+    
+    La position est le couple (date_envoi, id_messagerie), servi par l'index
+    (conversation_id, date_envoi, id_messagerie) : le coût d'une page ne
+    dépend pas de sa profondeur dans le fil.
+    
+    - sans curseur : les messages les plus récents ;
+    - ``?avant=<curseur>`` : charger les messages plus anciens ;
+    - ``?apres=<curseur>`` : récupérer les nouveaux messages depuis le curseur.
+    
+    Les résultats sont toujours renvoyés dans l'ordre chronologique.
+    """
+    
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    avant_query_param = 'avant'
+    apres_query_param = 'apres'
+    invalid_cursor_message = 'Curseur invalide'
+    
+    @staticmethod
+    def encoder_curseur(message):
+        """Encode la position d'un message dans le fil."""
+        return encoder_position(message.date_envoi, message.id_messagerie)
+    
+    def decoder_curseur(self, curseur):
+        """Décode un curseur en couple (date_envoi, id_messagerie)."""
+        if not curseur:
+            return None
+        try:
+            return decoder_position(curseur)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+    
+    @staticmethod
+    def filtrer_avant(queryset, position):
+        """Messages strictement antérieurs à la position, du plus récent au plus ancien."""
+        return filtrer_avant_position(queryset, position, 'date_envoi', 'id_messagerie')
+    
+    @staticmethod
+    def filtrer_apres(queryset, position):
+        """Messages strictement postérieurs à la position, du plus ancien au plus récent."""
+        return filtrer_apres_position(queryset, position, 'date_envoi', 'id_messagerie')
+    
+    def get_page_size(self, request):
+        """Taille de page demandée, bornée par ``max_page_size``."""
+        try:
+            taille = int(request.query_params[self.page_size_query_param])
+            if taille > 0:
+                return min(taille, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        taille = self.get_page_size(request)
+        avant = self.decoder_curseur(request.query_params.get(self.avant_query_param))
+        apres = self.decoder_curseur(request.query_params.get(self.apres_query_param))
+        
+        if apres:
+            messages = list(self.filtrer_apres(queryset, apres)[:taille + 1])
+            self.nouveaux_restants = len(messages) > taille
+            page = messages[:taille]
+            # Rester sur le curseur reçu tant qu'aucun nouveau message n'arrive
+            self.curseur_nouveaux = (
+                self.encoder_curseur(page[-1]) if page
+                else request.query_params.get(self.apres_query_param)
+            )
+            self.curseur_anciens = self.encoder_curseur(page[0]) if page else None
+            return page
+        
+        if avant:
+            messages = list(self.filtrer_avant(queryset, avant)[:taille + 1])
+        else:
+            messages = list(queryset.order_by('-date_envoi', '-id_messagerie')[:taille + 1])
+        anciens_restants = len(messages) > taille
+        page = messages[:taille][::-1]
+        self.nouveaux_restants = False
+        self.curseur_anciens = self.encoder_curseur(page[0]) if page and anciens_restants else None
+        self.curseur_nouveaux = self.encoder_curseur(page[-1]) if page else None
+        return page
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'curseur_anciens': self.curseur_anciens,
+            'curseur_nouveaux': self.curseur_nouveaux,
+            'nouveaux_restants': self.nouveaux_restants,
+            'results': data,
+        })
@@ -0,0 +1,132 @@
+"""
+Rappels des réservations à venir.
+
+Le traitement est ensembliste : les réservations de la fenêtre de rappel sont
+réservées par lots (``SELECT ... FOR UPDATE SKIP LOCKED``), marquées rappelées
+par un seul UPDATE, et leurs notifications et emails sont créés par
+``bulk_create``. Le marquage et les créations partagent la transaction du lot :
+une réservation n'est rappelée qu'une fois, même si la tâche est lancée deux
+fois en parallèle.
+"""
+
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from reservations.models import Reservation
+
+from .models import EnvoiMail, Notification
+
+# Statuts des réservations pour lesquelles un rappel a un sens
+STATUTS_A_RAPPELER = (Reservation.Status.PENDING, Reservation.Status.CONFIRMED)
+
+CHAMPS_RESERVATION = (
+    'id', 'scheduled_date', 'service_address',
+    'client__user_id', 'client__user__email', 'client__user__first_name', 'client__user__last_name',
+    'provider__user_id', 'provider__user__email', 'provider__user__first_name',
+    'provider__user__last_name', 'provider__company_name',
+    'provider_service__service__name',
+)
+
+
+def reservations_a_rappeler(maintenant=None):
+    """Réservations dont la date tombe dans la fenêtre de rappel et pas encore rappelées."""
+    maintenant = maintenant or timezone.now()
+    fenetre = timedelta(hours=settings.TABALI_SETTINGS.get('REMINDER_WINDOW_HOURS', 24))
+    return Reservation.objects.filter(
+        rappel_envoye_le__isnull=True,
+        status__in=STATUTS_A_RAPPELER,
+        scheduled_date__gt=maintenant,
+        scheduled_date__lte=maintenant + fenetre,
+    )
+
+
+def _nom_complet(reservation, prefixe):
+    return f"{reservation[prefixe + '__user__first_name']} {reservation[prefixe + '__user__last_name']}".strip()
+
+
+def _participants(reservation):
+    """(utilisateur_id, email, nom, interlocuteur) du client puis du prestataire."""
+    nom_client = _nom_complet(reservation, 'client')
+    nom_prestataire = reservation['provider__company_name'] or _nom_complet(reservation, 'provider')
+    return (
+        (reservation['client__user_id'], reservation['client__user__email'], nom_client, nom_prestataire),
+        (reservation['provider__user_id'], reservation['provider__user__email'], nom_prestataire, nom_client),
+    )
+
+
+def _notifications(lot):
+    for reservation in lot:
+        date = timezone.localtime(reservation['scheduled_date'])
+        service = reservation['provider_service__service__name']
+        for utilisateur_id, _, _, interlocuteur in _participants(reservation):
+            yield Notification(
+                utilisateur_id=utilisateur_id,
+                type_notification=Notification.TypeNotification.RAPPEL,
+                titre=f"Rappel : {service}",
+                contenu=(
+                    f"Votre intervention « {service} » avec {interlocuteur} est prévue "
+                    f"le {date:%d/%m/%Y} à {date:%H:%M}."
+                ),
+                lien_action=f"/reservations/{reservation['id']}/",
+                objet_lie_type='reservation',
+                objet_lie_id=str(reservation['id']),
+            )
+
+
+def _destinataires(lot):
+    for reservation in lot:
+        for utilisateur_id, email, nom, interlocuteur in _participants(reservation):
+            yield {
+                'email': email,
+                'nom': nom,
+                'utilisateur_id': utilisateur_id,
+                'contexte': {
+                    'service': reservation['provider_service__service__name'],
+                    'interlocuteur': interlocuteur,
+                    'date': reservation['scheduled_date'],
+                    'adresse': reservation['service_address'],
+                },
+            }
+
+
+def envoyer_rappels_reservations(maintenant=None, taille_lot=None):
+    """
+    Crée les notifications et met en file les emails de rappel des réservations à venir.
+
+    Returns:
+        int: nombre de réservations rappelées
+    """
+    maintenant = maintenant or timezone.now()
+    taille_lot = taille_lot or settings.TABALI_SETTINGS.get('REMINDER_BATCH_SIZE', 5000)
+    a_rappeler = reservations_a_rappeler(maintenant)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            lot = list(
+                a_rappeler.select_for_update(skip_locked=True, of=('self',))
+                .order_by('scheduled_date')
+                .values(*CHAMPS_RESERVATION)[:taille_lot]
+            )
+            if not lot:
+                return total
+
+            Reservation.objects.filter(pk__in=[reservation['id'] for reservation in lot]).update(
+                rappel_envoye_le=maintenant
+            )
+            # Pas de diffusion temps réel d'un rappel à J-1 : il est récupéré à la reprise
+            Notification.creer_en_masse(list(_notifications(lot)), temps_reel=False, taille_lot=2000)
+
+            emails = EnvoiMail.construire_en_masse(
+                EnvoiMail.TypeEmail.RAPPEL, _destinataires(lot), modele='rappel_reservation'
+            )
+            while True:
+                emails_lot = list(islice(emails, 2000))
+                if not emails_lot:
+                    break
+                EnvoiMail.objects.bulk_create(emails_lot)
+        total += len(lot)
@@ -0,0 +1,14 @@
+"""
+Diffusion temps réel des messages et notifications.
+
+Les événements sont publiés sur un canal par utilisateur via une couche de
+diffusion (``backends``) et poussés aux clients connectés en WebSocket
+(``consumers``).
+"""
+
+from .events import publier_messages, publier_notifications, canal_utilisateur
+from .backends import obtenir_backend
+
+__all__ = (
+    'publier_messages', 'publier_notifications', 'canal_utilisateur', 'obtenir_backend',
+)
@@ -0,0 +1,27 @@
+"""Authentification JWT des connexions temps réel (hors DRF)."""
+
+
+def authentifier_jeton(token):
+    """Retourne l'utilisateur correspondant au jeton JWT d'accès, ou None."""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+    
+    authentification = JWTAuthentication()
+    try:
+        return authentification.get_user(authentification.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def authentifier_requete(request):
+    """
+    Utilisateur d'une requête HTTP, d'après l'en-tête ``Authorization: Bearer``
+    ou, à défaut, le paramètre ``?token=`` (``EventSource`` ne permet pas
+    d'envoyer d'en-têtes).
+    """
+    entete = request.headers.get('Authorization', '')
+    if entete.startswith('Bearer '):
+        token = entete[len('Bearer '):].strip()
+    else:
+        token = request.GET.get('token')
+    return authentifier_jeton(token) if token else None
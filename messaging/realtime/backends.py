@@ -0,0 +1,193 @@
+"""
+Couches de diffusion (fan-out) des événements temps réel.
+
+``MemoireBackend`` diffuse dans le processus courant : réservé aux tests et
+au développement (refusé hors DEBUG), car les notifications publiées par les
+workers Celery n'atteindraient pas les processus ASGI. ``RedisBackend``
+relaie les événements via Redis pub/sub pour que tous les nœuds ASGI les
+reçoivent. Le backend utilisé est choisi par
+``TABALI_SETTINGS['REALTIME_BACKEND']`` (Redis par défaut dès que
+``REDIS_URL`` est défini).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Événement envoyé à un abonné dont la file a débordé
+EVENEMENT_DESYNCHRONISE = {'type': 'desynchronise'}
+
+
+class Abonnement:
+    """
+    Abonnement d'une connexion à un canal, avec une file bornée.
+    
+    Si le client ne consomme pas assez vite et que la file déborde, les
+    événements en attente sont abandonnés et remplacés par un unique
+    événement ``desynchronise`` : la connexion est alors fermée et le client
+    se reconnecte avec son curseur pour rattraper depuis la base.
+    """
+    
+    def __init__(self, canal, taille_file):
+        self.canal = canal
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue(maxsize=taille_file)
+        self.deborde = False
+    
+    def pousser(self, evenement):
+        """Ajoute un événement à la file (à appeler depuis la boucle de l'abonné)."""
+        if self.deborde:
+            return
+        try:
+            self.file.put_nowait(evenement)
+        except asyncio.QueueFull:
+            self.deborde = True
+            while not self.file.empty():
+                self.file.get_nowait()
+            self.file.put_nowait(EVENEMENT_DESYNCHRONISE)
+            logger.warning(f"File temps réel saturée sur {self.canal}, abonné désynchronisé")
+    
+    async def recevoir(self):
+        """Attend le prochain événement."""
+        return await self.file.get()
+
+
+class BaseBackend:
+    """Interface commune des couches de diffusion."""
+    
+    def __init__(self, taille_file=100, **options):
+        self.taille_file = taille_file
+    
+    async def abonner(self, canal):
+        """Abonne la connexion courante à un canal et retourne l'``Abonnement``."""
+        raise NotImplementedError
+    
+    async def desabonner(self, abonnement):
+        """Met fin à un abonnement."""
+        raise NotImplementedError
+    
+    def publier(self, canal, evenement):
+        """Publie un événement (appelable depuis du code synchrone, thread-safe)."""
+        raise NotImplementedError
+
+
+class MemoireBackend(BaseBackend):
+    """Diffusion en mémoire, limitée au processus courant."""
+    
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._abonnements = {}
+        self._verrou = threading.Lock()
+    
+    async def abonner(self, canal):
+        abonnement = Abonnement(canal, self.taille_file)
+        with self._verrou:
+            self._abonnements.setdefault(canal, set()).add(abonnement)
+        return abonnement
+    
+    async def desabonner(self, abonnement):
+        with self._verrou:
+            abonnes = self._abonnements.get(abonnement.canal)
+            if abonnes:
+                abonnes.discard(abonnement)
+                if not abonnes:
+                    del self._abonnements[abonnement.canal]
+    
+    def publier(self, canal, evenement):
+        self._distribuer(canal, evenement)
+    
+    def _distribuer(self, canal, evenement):
+        """Remet l'événement aux abonnés locaux du canal, dans leur boucle."""
+        with self._verrou:
+            abonnes = list(self._abonnements.get(canal, ()))
+        for abonnement in abonnes:
+            try:
+                abonnement.boucle.call_soon_threadsafe(abonnement.pousser, evenement)
+            except RuntimeError:
+                # Boucle fermée : l'abonnement sera retiré à la déconnexion
+                pass
+
+
+class RedisBackend(MemoireBackend):
+    """
+    Diffusion via Redis pub/sub.
+    
+    Chaque processus ASGI maintient une seule connexion d'abonnement qui
+    redistribue localement les événements reçus ; la publication se fait par
+    un ``PUBLISH`` synchrone.
+    """
+    
+    prefixe = 'tabali:temps-reel:'
+    
+    def __init__(self, url=None, **options):
+        super().__init__(**options)
+        import redis
+        
+        self.url = url or settings.TABALI_SETTINGS.get('REALTIME_REDIS_URL')
+        self._client = redis.Redis.from_url(self.url)
+        self._pubsub = None
+        self._lecteur = None
+    
+    async def _demarrer(self):
+        """Ouvre la connexion d'abonnement et la tâche de lecture au premier abonné."""
+        if self._pubsub is None:
+            import redis.asyncio
+            
+            self._pubsub = redis.asyncio.Redis.from_url(self.url).pubsub()
+            # Permet d'appeler get_message avant le premier SUBSCRIBE
+            await self._pubsub.subscribe(self.prefixe + '__init__')
+            self._lecteur = asyncio.get_running_loop().create_task(self._lire())
+    
+    async def _lire(self):
+        """Redistribue localement les événements reçus de Redis."""
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message['type'] == 'message':
+                    canal = message['channel'].decode()[len(self.prefixe):]
+                    self._distribuer(canal, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Erreur de lecture du pub/sub Redis")
+                await asyncio.sleep(1)
+    
+    async def abonner(self, canal):
+        await self._demarrer()
+        abonnement = await super().abonner(canal)
+        await self._pubsub.subscribe(self.prefixe + canal)
+        return abonnement
+    
+    async def desabonner(self, abonnement):
+        await super().desabonner(abonnement)
+        with self._verrou:
+            encore_abonne = abonnement.canal in self._abonnements
+        if not encore_abonne and self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.prefixe + abonnement.canal)
+    
+    def publier(self, canal, evenement):
+        self._client.publish(self.prefixe + canal, json.dumps(evenement))
+
+
+_backend = None
+_verrou_backend = threading.Lock()
+
+
+def obtenir_backend():
+    """Retourne l'instance (unique par processus) du backend configuré."""
+    global _backend
+    if _backend is None:
+        with _verrou_backend:
+            if _backend is None:
+                tabali_settings = settings.TABALI_SETTINGS
+                classe = import_string(tabali_settings.get(
+                    'REALTIME_BACKEND', 'messaging.realtime.backends.MemoireBackend'
+                ))
+                _backend = classe(taille_file=tabali_settings.get('REALTIME_QUEUE_SIZE', 100))
+    return _backend
@@ -0,0 +1,177 @@
+"""
+Point d'entrée WebSocket (ASGI) de la diffusion temps réel.
+
+Protocole :
+
+1. connexion sur ``/ws/temps-reel/?token=<jwt>`` ;
+2. le client envoie ``{"type": "reprise", "curseurs": {"messages": ..., "notifications": ...}}``
+   avec les curseurs des derniers éléments reçus (ou ``null``) ;
+3. le serveur renvoie les éléments manqués depuis ces curseurs, puis
+   ``{"type": "pret"}``, puis pousse les nouveaux éléments au fil de l'eau.
+   Chaque événement porte un ``curseur`` à conserver pour la prochaine reprise ;
+4. si le client ne suit pas le rythme, le serveur envoie
+   ``{"type": "desynchronise"}`` et ferme la connexion (code 4008) : le
+   client se reconnecte et reprend depuis ses curseurs.
+"""
+
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from ..pagination import decoder_position, filtrer_apres_position
+from .auth import authentifier_jeton
+from .backends import obtenir_backend
+from .events import canal_utilisateur, evenement_message, evenement_notification
+
+logger = logging.getLogger(__name__)
+
+CODE_NON_AUTHENTIFIE = 4001
+CODE_PROTOCOLE = 4002
+CODE_DESYNCHRONISE = 4008
+
+
+def _rattrapage(utilisateur_id, curseurs, limite):
+    """
+    Événements manqués depuis les curseurs du client.
+    
+    Returns:
+        (evenements, complet) où ``complet`` est faux si la limite a été atteinte
+    """
+    from ..models import Messagerie, Notification
+    
+    sources = {
+        'messages': (
+            Messagerie.objects.filter(destinataire_id=utilisateur_id),
+            'date_envoi', 'id_messagerie', evenement_message
+        ),
+        'notifications': (
+            Notification.objects.filter(utilisateur_id=utilisateur_id),
+            'date', 'id_notification', evenement_notification
+        ),
+    }
+    evenements = []
+    complet = True
+    for nom, (queryset, champ_date, champ_id, construire) in sources.items():
+        curseur = curseurs.get(nom)
+        if not curseur:
+            continue
+        try:
+            position = decoder_position(curseur)
+        except ValueError:
+            continue
+        lignes = list(filtrer_apres_position(queryset, position, champ_date, champ_id)[:limite + 1])
+        complet = complet and len(lignes) <= limite
+        evenements.extend(construire(ligne) for ligne in lignes[:limite])
+    return evenements, complet
+
+
+async def application_temps_reel(scope, receive, send):
+    """Application ASGI gérant une connexion WebSocket temps réel."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    utilisateur = await sync_to_async(authentifier_jeton)(token) if token else None
+    if utilisateur is None:
+        await send({'type': 'websocket.close', 'code': CODE_NON_AUTHENTIFIE})
+        return
+    
+    await send({'type': 'websocket.accept'})
+    connexion = ConnexionTempsReel(utilisateur, receive, send)
+    await connexion.servir()
+
+
+class ConnexionTempsReel:
+    """Session WebSocket d'un utilisateur authentifié."""
+    
+    def __init__(self, utilisateur, receive, send):
+        self.utilisateur = utilisateur
+        self.receive = receive
+        self.send = send
+        tabali_settings = settings.TABALI_SETTINGS
+        self.delai_reprise = tabali_settings.get('REALTIME_HANDSHAKE_TIMEOUT', 10)
+        self.limite_rattrapage = tabali_settings.get('REALTIME_REPLAY_LIMIT', 500)
+    
+    async def envoyer(self, evenement):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(evenement)})
+    
+    async def fermer(self, code):
+        await self.send({'type': 'websocket.close', 'code': code})
+    
+    async def attendre_reprise(self):
+        """Attend la trame de reprise du client et retourne ses curseurs (ou None)."""
+        try:
+            message = await asyncio.wait_for(self.receive(), self.delai_reprise)
+        except asyncio.TimeoutError:
+            return None
+        if message['type'] != 'websocket.receive':
+            return None
+        try:
+            trame = json.loads(message.get('text') or '')
+        except ValueError:
+            return None
+        if not isinstance(trame, dict) or trame.get('type') != 'reprise':
+            return None
+        return trame.get('curseurs') or {}
+    
+    async def servir(self):
+        curseurs = await self.attendre_reprise()
+        if curseurs is None:
+            await self.fermer(CODE_PROTOCOLE)
+            return
+        
+        backend = obtenir_backend()
+        # S'abonner avant le rattrapage pour ne rien perdre entre les deux
+        abonnement = await backend.abonner(canal_utilisateur(self.utilisateur.pk))
+        try:
+            evenements, complet = await sync_to_async(_rattrapage)(
+                self.utilisateur.pk, curseurs, self.limite_rattrapage
+            )
+            deja_envoyes = set()
+            for evenement in evenements:
+                deja_envoyes.add(evenement['curseur'])
+                await self.envoyer(evenement)
+            if not complet:
+                # Trop d'éléments manqués : le client doit se resynchroniser via l'API REST
+                await self.envoyer({'type': 'reprise_incomplete'})
+            await self.envoyer({'type': 'pret'})
+            
+            await self.diffuser(abonnement, deja_envoyes)
+        finally:
+            await backend.desabonner(abonnement)
+    
+    async def diffuser(self, abonnement, deja_envoyes):
+        """Pousse les événements du canal jusqu'à la déconnexion du client."""
+        reception = asyncio.ensure_future(self.receive())
+        evenement = asyncio.ensure_future(abonnement.recevoir())
+        try:
+            while True:
+                termines, _ = await asyncio.wait(
+                    {reception, evenement}, return_when=asyncio.FIRST_COMPLETED
+                )
+                
+                if reception in termines:
+                    message = reception.result()
+                    if message['type'] == 'websocket.disconnect':
+                        return
+                    if message.get('text') == 'ping':
+                        await self.send({'type': 'websocket.send', 'text': 'pong'})
+                    reception = asyncio.ensure_future(self.receive())
+                
+                if evenement in termines:
+                    donnees = evenement.result()
+                    if donnees.get('type') == 'desynchronise':
+                        await self.envoyer(donnees)
+                        await self.fermer(CODE_DESYNCHRONISE)
+                        return
+                    if donnees.get('curseur') not in deja_envoyes:
+                        await self.envoyer(donnees)
+                    evenement = asyncio.ensure_future(abonnement.recevoir())
+        finally:
+            reception.cancel()
+            evenement.cancel()
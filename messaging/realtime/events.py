@@ -0,0 +1,80 @@
+"""
+Construction et publication des événements temps réel.
+
+Les événements sont publiés après validation de la transaction courante,
+pour ne jamais pousser une ligne qui serait ensuite annulée.
+"""
+
+import json
+import logging
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from ..pagination import encoder_position
+from .backends import obtenir_backend
+
+logger = logging.getLogger(__name__)
+
+
+def canal_utilisateur(utilisateur_id):
+    """Nom du canal de diffusion d'un utilisateur."""
+    return f"utilisateur:{utilisateur_id}"
+
+
+def _en_json(data):
+    """Convertit des données de serializer en types JSON natifs (UUID, dates...)."""
+    return json.loads(JSONRenderer().render(data))
+
+
+def evenement_message(message):
+    """Événement temps réel d'un nouveau message."""
+    from ..serializers import MessageFilSerializer
+    
+    return {
+        'type': 'message',
+        'curseur': encoder_position(message.date_envoi, message.id_messagerie),
+        'conversation_id': str(message.conversation_id),
+        'data': _en_json(MessageFilSerializer(message).data),
+    }
+
+
+def evenement_notification(notification):
+    """Événement temps réel d'une nouvelle notification."""
+    from ..serializers import NotificationFluxSerializer
+    
+    return {
+        'type': 'notification',
+        'curseur': encoder_position(notification.date, notification.id_notification),
+        'data': _en_json(NotificationFluxSerializer(notification).data),
+    }
+
+
+def _publier(evenements):
+    """Publie une liste de couples (canal, événement) sans faire échouer l'appelant."""
+    backend = obtenir_backend()
+    for canal, evenement in evenements:
+        try:
+            backend.publier(canal, evenement)
+        except Exception:
+            logger.exception(f"Échec de publication temps réel sur {canal}")
+
+
+def publier_messages(messages):
+    """Pousse des messages à leurs destinataires après le commit."""
+    evenements = [
+        (canal_utilisateur(message.destinataire_id), evenement_message(message))
+        for message in messages
+    ]
+    if evenements:
+        transaction.on_commit(lambda: _publier(evenements))
+
+
+def publier_notifications(notifications):
+    """Pousse des notifications à leurs destinataires après le commit."""
+    evenements = [
+        (canal_utilisateur(notification.utilisateur_id), evenement_notification(notification))
+        for notification in notifications
+    ]
+    if evenements:
+        transaction.on_commit(lambda: _publier(evenements))
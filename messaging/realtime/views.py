@@ -0,0 +1,188 @@
+"""
+Vues asynchrones d'attente des notifications, pour les clients qui ne
+peuvent pas maintenir de WebSocket.
+
+- ``attente_notifications`` (long-poll) : la requête reste en attente jusqu'à
+  l'arrivée d'une notification postérieure au curseur ou jusqu'au délai ;
+- ``flux_notifications`` (Server-Sent Events) : flux continu, repris via
+  l'en-tête ``Last-Event-ID`` à la reconnexion.
+
+Ces vues sont asynchrones : servies en ASGI, une requête en attente
+n'occupe aucun worker.
+"""
+
+import asyncio
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+
+from ..pagination import decoder_position, encoder_position, filtrer_apres_position
+from .auth import authentifier_requete
+from .backends import obtenir_backend
+from .events import canal_utilisateur
+
+# Nombre maximal de notifications renvoyées par réponse
+LIMITE_NOTIFICATIONS = 100
+
+
+def _position_courante(utilisateur_id):
+    """Position de la dernière notification de l'utilisateur, ou None."""
+    from ..models import Notification
+
+    derniere = Notification.objects.filter(
+        utilisateur_id=utilisateur_id
+    ).order_by('-date', '-id_notification').values_list('date', 'id_notification').first()
+    return tuple(derniere) if derniere else None
+
+
+def _notifications_apres(utilisateur_id, position):
+    """Notifications postérieures à la position, de la plus ancienne à la plus récente."""
+    from ..models import Notification
+
+    queryset = Notification.objects.filter(utilisateur_id=utilisateur_id)
+    if position is None:
+        queryset = queryset.order_by('date', 'id_notification')
+    else:
+        queryset = filtrer_apres_position(queryset, position, 'date', 'id_notification')
+    return list(queryset[:LIMITE_NOTIFICATIONS])
+
+
+async def attendre_notifications(utilisateur_id, position, delai):
+    """
+    Attend des notifications postérieures à ``position`` pendant au plus ``delai`` secondes.
+
+    L'abonnement au canal ne sert qu'à réveiller l'attente : les notifications
+    sont toujours relues en base depuis la position, si bien qu'aucune n'est
+    perdue entre deux appels ni en cas de débordement de la file.
+    """
+    backend = obtenir_backend()
+    abonnement = await backend.abonner(canal_utilisateur(utilisateur_id))
+    try:
+        boucle = asyncio.get_running_loop()
+        echeance = boucle.time() + delai
+        while True:
+            notifications = await sync_to_async(_notifications_apres)(utilisateur_id, position)
+            if notifications:
+                return notifications
+            # Attendre un événement pertinent (le canal transporte aussi les messages)
+            while True:
+                restant = echeance - boucle.time()
+                if restant <= 0:
+                    return []
+                try:
+                    evenement = await asyncio.wait_for(abonnement.recevoir(), restant)
+                except asyncio.TimeoutError:
+                    return []
+                if evenement.get('type') in ('notification', 'desynchronise'):
+                    break
+    finally:
+        await backend.desabonner(abonnement)
+
+
+def _serialiser(notifications):
+    from ..serializers import NotificationFluxSerializer
+    return NotificationFluxSerializer(notifications, many=True).data
+
+
+async def _contexte(request, curseur):
+    """
+    Authentifie la requête et décode le curseur de départ.
+
+    Returns:
+        (utilisateur, position, reponse_erreur)
+    """
+    # require_GET ne prend pas en charge les vues asynchrones avant Django 5.0
+    if request.method != 'GET':
+        return None, None, HttpResponseNotAllowed(['GET'])
+    utilisateur = await sync_to_async(authentifier_requete)(request)
+    if utilisateur is None:
+        return None, None, JsonResponse(
+            {'detail': "Informations d'authentification non fournies ou invalides."}, status=401
+        )
+    if curseur:
+        try:
+            position = decoder_position(curseur)
+        except ValueError:
+            return None, None, JsonResponse({'detail': 'Curseur invalide.'}, status=400)
+    else:
+        # Sans curseur, on n'attend que les notifications à venir
+        position = await sync_to_async(_position_courante)(utilisateur.pk)
+    return utilisateur, position, None
+
+
+async def attente_notifications(request):
+    """
+    Long-poll : ``GET ?curseur=<curseur>&timeout=<secondes>``.
+
+    Répond dès qu'une notification postérieure au curseur existe, sinon à
+    l'expiration du délai avec une liste vide. Le ``curseur`` renvoyé est à
+    passer à l'appel suivant.
+    """
+    utilisateur, position, erreur = await _contexte(request, request.GET.get('curseur'))
+    if erreur:
+        return erreur
+
+    delai_max = settings.TABALI_SETTINGS.get('REALTIME_LONGPOLL_TIMEOUT', 25)
+    try:
+        delai = float(request.GET.get('timeout', delai_max))
+    except ValueError:
+        return JsonResponse({'detail': 'Délai invalide.'}, status=400)
+    # NaN traverserait min()/max() : attente sans fin
+    delai = min(max(delai, 0), delai_max) if math.isfinite(delai) else delai_max
+
+    notifications = await attendre_notifications(utilisateur.pk, position, delai)
+    if notifications:
+        derniere = notifications[-1]
+        position = (derniere.date, derniere.id_notification)
+
+    return JsonResponse({
+        'results': await sync_to_async(_serialiser)(notifications),
+        'curseur': encoder_position(*position) if position else None,
+    })
+
+
+async def flux_notifications(request):
+    """
+    Server-Sent Events : pousse chaque notification sous la forme d'un
+    événement ``notification`` dont l'``id`` est le curseur de reprise.
+
+    Le flux est fermé après ``REALTIME_SSE_DURATION`` secondes ; le navigateur
+    se reconnecte alors automatiquement en renvoyant ``Last-Event-ID``.
+    """
+    curseur = request.headers.get('Last-Event-ID') or request.GET.get('curseur')
+    utilisateur, position, erreur = await _contexte(request, curseur)
+    if erreur:
+        return erreur
+
+    tabali_settings = settings.TABALI_SETTINGS
+    duree = tabali_settings.get('REALTIME_SSE_DURATION', 300)
+    battement = tabali_settings.get('REALTIME_SSE_HEARTBEAT', 15)
+
+    async def evenements():
+        nonlocal position
+        boucle = asyncio.get_running_loop()
+        fin = boucle.time() + duree
+        yield 'retry: 3000\n\n'
+        while boucle.time() < fin:
+            delai = min(battement, fin - boucle.time())
+            notifications = await attendre_notifications(utilisateur.pk, position, delai)
+            if not notifications:
+                # Commentaire SSE : maintient la connexion ouverte à travers les proxys
+                yield ': keepalive\n\n'
+                continue
+            donnees = await sync_to_async(_serialiser)(notifications)
+            for notification, data in zip(notifications, donnees):
+                position = (notification.date, notification.id_notification)
+                yield (
+                    f"id: {encoder_position(*position)}\n"
+                    f"event: notification\n"
+                    f"data: {json.dumps(data)}\n\n"
+                )
+
+    response = StreamingHttpResponse(evenements(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,339 @@
+"""
+Moteur de rétention des tables à forte croissance (notifications, messages).
+
+Les politiques sont déclarées dans ``TABALI_SETTINGS['RETENTION_POLICIES']`` :
+chacune désigne un modèle, un champ date, un âge en jours, un filtre
+supplémentaire et une action :
+
+- ``supprimer`` : les lignes expirées sont supprimées ;
+- ``archiver`` : elles sont d'abord écrites dans des fichiers JSON Lines
+  compressés, un par lot et par mois (``<app>.<modele>/<AAAA-MM>/<lot>.jsonl.gz``),
+  puis supprimées ; ``restaurer_archive`` les réinsère à la demande.
+
+Les archives sont écrites dans un stockage Django durable
+(``RETENTION_ARCHIVE_STORAGE``, par exemple S3). À défaut, elles vont dans le
+dossier local ``RETENTION_ARCHIVE_DIR``, qui doit être déclaré persistant
+(``RETENTION_ARCHIVE_LOCAL_DURABLE``) : sur un système de fichiers éphémère,
+les lignes purgées seraient perdues, et l'archivage refuse alors de purger.
+
+Les lignes expirées sont parcourues par pagination par clé (date, identifiant)
+et traitées par lots courts, chacun dans sa propre transaction : aucun verrou
+n'est tenu longtemps et les lignes déjà supprimées ne sont jamais relues.
+"""
+
+import gzip
+import logging
+import time
+import uuid
+from datetime import timedelta
+from itertools import chain, groupby, islice
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .pagination import filtrer_apres_position
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ('supprimer', 'archiver')
+
+
+class PolitiqueRetention:
+    """Politique de rétention d'un modèle."""
+
+    def __init__(self, nom, modele, champ_date, age_jours, filtre=None, action='supprimer', taille_lot=None):
+        if action not in ACTIONS:
+            raise ImproperlyConfigured(f"Action de rétention inconnue pour '{nom}' : {action}")
+        self.nom = nom
+        self.modele = apps.get_model(modele) if isinstance(modele, str) else modele
+        self.champ_date = champ_date
+        self.champ_id = self.modele._meta.pk.name
+        self.age_jours = age_jours
+        self.filtre = filtre or {}
+        self.action = action
+        self.taille_lot = taille_lot or settings.TABALI_SETTINGS.get('RETENTION_BATCH_SIZE', 1000)
+
+    def __repr__(self):
+        return f"<PolitiqueRetention {self.nom}: {self.action} {self.modele._meta.label} > {self.age_jours} j>"
+
+    def expirees(self, maintenant=None):
+        """Lignes concernées par la politique à la date donnée."""
+        limite = (maintenant or timezone.now()) - timedelta(days=self.age_jours)
+        return self.modele._default_manager.filter(
+            **{f'{self.champ_date}__lt': limite}, **self.filtre
+        )
+
+
+def obtenir_politiques(noms=None):
+    """
+    Politiques configurées, éventuellement restreintes à certains noms.
+
+    Raises:
+        ImproperlyConfigured: si un nom demandé n'est pas configuré
+    """
+    configurees = settings.TABALI_SETTINGS.get('RETENTION_POLICIES', {})
+    noms = noms or list(configurees)
+    inconnus = set(noms) - set(configurees)
+    if inconnus:
+        raise ImproperlyConfigured(f"Politique(s) de rétention inconnue(s) : {', '.join(sorted(inconnus))}")
+    return [PolitiqueRetention(nom, **configurees[nom]) for nom in noms]
+
+
+def taille_moyenne_ligne(modele):
+    """
+    Taille moyenne d'une ligne (table et index) d'après les statistiques de
+    la base, en octets, ou None si la base ne l'expose pas.
+    """
+    table = modele._meta.db_table
+    try:
+        with connection.cursor() as curseur:
+            if connection.vendor == 'postgresql':
+                curseur.execute(
+                    "SELECT pg_total_relation_size(c.oid), c.reltuples FROM pg_class c WHERE c.oid = %s::regclass",
+                    [table]
+                )
+                taille, nb_lignes = curseur.fetchone()
+            elif connection.vendor == 'sqlite':
+                curseur.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [table]
+                )
+                taille, nb_lignes = curseur.fetchone()[0], 0
+            else:
+                return None
+            if not nb_lignes or nb_lignes < 0:
+                # Table jamais analysée : compter les lignes
+                nb_lignes = modele._default_manager.count()
+    except DatabaseError:
+        return None
+    if not taille or not nb_lignes:
+        return None
+    return taille / nb_lignes
+
+
+def obtenir_stockage():
+    """Stockage des archives : ``RETENTION_ARCHIVE_STORAGE``, à défaut le dossier ``RETENTION_ARCHIVE_DIR``."""
+    tabali_settings = settings.TABALI_SETTINGS
+    classe = tabali_settings.get('RETENTION_ARCHIVE_STORAGE')
+    if classe:
+        return import_string(classe)(**tabali_settings.get('RETENTION_ARCHIVE_STORAGE_OPTIONS', {}))
+    return FileSystemStorage(location=tabali_settings['RETENTION_ARCHIVE_DIR'])
+
+
+def verifier_stockage_durable(stockage):
+    """
+    Raises:
+        ImproperlyConfigured: si les archives iraient sur un disque local non
+            déclaré persistant (``RETENTION_ARCHIVE_LOCAL_DURABLE``)
+    """
+    if isinstance(stockage, FileSystemStorage) and not settings.TABALI_SETTINGS.get('RETENTION_ARCHIVE_LOCAL_DURABLE'):
+        raise ImproperlyConfigured(
+            "Archivage refusé : les archives seraient écrites sur le disque local "
+            f"({stockage.location}). Configurez un stockage durable (RETENTION_ARCHIVE_STORAGE) "
+            "ou déclarez ce dossier persistant (RETENTION_ARCHIVE_LOCAL_DURABLE)."
+        )
+
+
+def _dossier_archives(modele, mois=None):
+    dossier = modele._meta.label_lower
+    return f"{dossier}/{mois}" if mois else dossier
+
+
+def archiver_lignes(lignes, champ_date, stockage=None):
+    """
+    Écrit des instances (triées par date) dans les archives mensuelles de leur
+    modèle : un fichier par appel et par mois (le stockage peut ne pas
+    permettre l'ajout à un fichier existant).
+
+    Returns:
+        int: octets compressés écrits
+    """
+    stockage = stockage or obtenir_stockage()
+    octets = 0
+    for mois, groupe in groupby(lignes, key=lambda ligne: f"{getattr(ligne, champ_date):%Y-%m}"):
+        groupe = list(groupe)
+        contenu = gzip.compress(serializers.serialize('jsonl', groupe).encode('utf-8'))
+        # Préfixe horodaté : les fichiers d'un mois se relisent dans l'ordre d'écriture
+        nom = f"{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        stockage.save(f"{_dossier_archives(type(groupe[0]), mois)}/{nom}", ContentFile(contenu))
+        octets += len(contenu)
+    return octets
+
+
+def fichiers_archive(modele, mois, stockage=None):
+    """Fichiers d'archive d'un modèle pour un mois ``AAAA-MM``, dans l'ordre d'écriture."""
+    stockage = stockage or obtenir_stockage()
+    dossier = _dossier_archives(modele, mois)
+    try:
+        _, fichiers = stockage.listdir(dossier)
+    except FileNotFoundError:
+        return []
+    return [f"{dossier}/{nom}" for nom in sorted(fichiers) if nom.endswith('.jsonl.gz')]
+
+
+def _destinataires_non_lus(modele, pks):
+    """Utilisateurs dont les compteurs de non-lus dépendent des lignes données."""
+    from .models import Messagerie, Notification
+
+    if modele is Messagerie:
+        lignes = Messagerie.objects.filter(pk__in=pks, statut__in=Messagerie.STATUTS_NON_LUS)
+        return set(lignes.values_list('destinataire_id', flat=True))
+    if modele is Notification:
+        lignes = Notification.objects.filter(pk__in=pks, statut=Notification.StatutNotification.NON_LUE)
+        return set(lignes.values_list('utilisateur_id', flat=True))
+    return set()
+
+
+def appliquer_politique(politique, maintenant=None, simulation=False):
+    """
+    Applique une politique de rétention, lot par lot.
+
+    Args:
+        simulation: ne fait que compter les lignes concernées
+
+    Returns:
+        dict: bilan (politique, lignes, lots, octets_liberes_estimes,
+        octets_archives, duree)
+    """
+    from .models import CompteurNonLus
+
+    maintenant = maintenant or timezone.now()
+    stockage = None
+    if politique.action == 'archiver' and not simulation:
+        # Avant toute suppression : pas de purge sans archive durable
+        stockage = obtenir_stockage()
+        verifier_stockage_durable(stockage)
+    expirees = politique.expirees(maintenant)
+    taille_ligne = taille_moyenne_ligne(politique.modele)
+    bilan = {'politique': politique.nom, 'lignes': 0, 'lots': 0, 'octets_archives': 0}
+    debut = time.monotonic()
+
+    if simulation:
+        bilan['lignes'] = expirees.count()
+    else:
+        position = None
+        while True:
+            if position is None:
+                lot = expirees.order_by(politique.champ_date, politique.champ_id)
+            else:
+                lot = filtrer_apres_position(expirees, position, politique.champ_date, politique.champ_id)
+            if politique.action == 'archiver':
+                lignes = list(lot[:politique.taille_lot])
+                cles = [(getattr(ligne, politique.champ_date), ligne.pk) for ligne in lignes]
+            else:
+                cles = list(lot.values_list(politique.champ_date, politique.champ_id)[:politique.taille_lot])
+            if not cles:
+                break
+            position = cles[-1]
+            pks = [pk for _, pk in cles]
+
+            # L'archive est écrite avant la suppression : au pire, une ligne est
+            # archivée deux fois, et la restauration ignore les doublons
+            if politique.action == 'archiver':
+                bilan['octets_archives'] += archiver_lignes(lignes, politique.champ_date, stockage)
+
+            with transaction.atomic():
+                utilisateurs = _destinataires_non_lus(politique.modele, pks)
+                politique.modele._default_manager.filter(pk__in=pks).delete()
+                CompteurNonLus.recalculer(utilisateurs)
+            bilan['lignes'] += len(pks)
+            bilan['lots'] += 1
+
+    if taille_ligne:
+        bilan['octets_liberes_estimes'] = round(bilan['lignes'] * taille_ligne)
+    else:
+        bilan['octets_liberes_estimes'] = None if bilan['lignes'] else 0
+    bilan['duree'] = round(time.monotonic() - debut, 3)
+    return bilan
+
+
+def appliquer_retention(noms=None, maintenant=None, simulation=False):
+    """Applique les politiques configurées ; retourne la liste des bilans."""
+    bilans = []
+    for politique in obtenir_politiques(noms):
+        bilan = appliquer_politique(politique, maintenant, simulation)
+        logger.info(
+            f"Rétention {politique.nom} : {bilan['lignes']} ligne(s) en {bilan['lots']} lot(s), "
+            f"~{bilan['octets_liberes_estimes'] or 0} octet(s) libéré(s), "
+            f"{bilan['octets_archives']} octet(s) archivé(s)"
+        )
+        bilans.append(bilan)
+    return bilans
+
+
+def mois_archives(modele):
+    """Mois (``AAAA-MM``) disponibles dans les archives d'un modèle."""
+    try:
+        dossiers, _ = obtenir_stockage().listdir(_dossier_archives(modele))
+    except FileNotFoundError:
+        return []
+    return sorted(dossiers)
+
+
+def _lire_archive(stockage, nom):
+    with stockage.open(nom, 'rb') as brut, gzip.open(brut, 'rt', encoding='utf-8') as fichier:
+        yield from serializers.deserialize('jsonl', fichier)
+
+
+def restaurer_archive(modele, mois, filtre=None, taille_lot=1000):
+    """
+    Réinsère les lignes archivées d'un mois.
+
+    Args:
+        modele: classe ou libellé (``'messaging.Messagerie'``)
+        filtre: {champ: valeur} pour ne restaurer qu'une partie des lignes,
+            par exemple ``{'conversation_id': ...}``
+
+    Returns:
+        int: nombre de lignes lues dans l'archive et réinsérées (les lignes
+        déjà présentes en base sont ignorées)
+
+    Raises:
+        FileNotFoundError: si aucune archive n'existe pour ce mois
+    """
+    from .models import CompteurNonLus, Conversation, Messagerie
+
+    modele = apps.get_model(modele) if isinstance(modele, str) else modele
+    filtre = {champ: str(valeur) for champ, valeur in (filtre or {}).items()}
+    stockage = obtenir_stockage()
+    fichiers = fichiers_archive(modele, mois, stockage)
+    if not fichiers:
+        raise FileNotFoundError(f"Aucune archive {modele._meta.label} pour {mois} ({_dossier_archives(modele, mois)})")
+
+    horodatages = [
+        champ for champ in modele._meta.concrete_fields
+        if getattr(champ, 'auto_now', False) or getattr(champ, 'auto_now_add', False)
+    ]
+    total = 0
+    objets = (
+        deserialise.object
+        for deserialise in chain.from_iterable(_lire_archive(stockage, nom) for nom in fichiers)
+        if all(str(getattr(deserialise.object, champ)) == valeur for champ, valeur in filtre.items())
+    )
+    while True:
+        lot = list(islice(objets, taille_lot))
+        if not lot:
+            return total
+        # bulk_create remplace les dates auto_now(_add) par l'heure courante :
+        # les dates archivées sont remises ensuite
+        dates = [{champ.attname: getattr(objet, champ.attname) for champ in horodatages} for objet in lot]
+        with transaction.atomic():
+            modele._default_manager.bulk_create(lot, ignore_conflicts=True)
+            if horodatages:
+                for objet, valeurs in zip(lot, dates):
+                    for attribut, valeur in valeurs.items():
+                        setattr(objet, attribut, valeur)
+                modele._default_manager.bulk_update(lot, [champ.name for champ in horodatages])
+            CompteurNonLus.recalculer(_destinataires_non_lus(modele, [objet.pk for objet in lot]))
+            if modele is Messagerie:
+                # La purge a remis à NULL le dernier message des conversations
+                Conversation.recalculer_dernier_message({objet.conversation_id for objet in lot})
+        total += len(lot)
@@ -3,7 +3,7 @@ Serializers pour l'application messaging.
 """
 
 from rest_framework import serializers
-from .models import Messagerie, Notification, EnvoiMail
+from .models import Messagerie, Notification, EnvoiMail, ParticipantConversation
 
 
 class MessagerieSerializer(serializers.ModelSerializer):
@@ -59,6 +59,18 @@ class MessagerieSerializer(serializers.ModelSerializer):
         return obj.statut == obj.StatutMessage.LU
 
 
+class MessageFilSerializer(serializers.ModelSerializer):
+    """Serializer allégé d'un message dans un fil de discussion."""
+    
+    class Meta:
+        model = Messagerie
+        fields = [
+            'id_messagerie', 'contenu', 'date_envoi', 'statut',
+            'expediteur', 'destinataire', 'date_lecture', 'fichier_joint'
+        ]
+        read_only_fields = fields
+
+
 class MessagerieCreateSerializer(serializers.ModelSerializer):
     """Serializer pour créer un message."""
     
@@ -89,6 +101,42 @@ class MessagerieCreateSerializer(serializers.ModelSerializer):
         return message
 
 
+class ConversationSerializer(serializers.ModelSerializer):
+    """Serializer d'une entrée de la boîte de réception (vue d'un participant)."""
+    
+    id_conversation = serializers.UUIDField(source='conversation_id', read_only=True)
+    interlocuteur_details = serializers.SerializerMethodField()
+    dernier_message = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ParticipantConversation
+        fields = [
+            'id_conversation', 'interlocuteur', 'interlocuteur_details',
+            'dernier_message', 'derniere_activite', 'nb_non_lus'
+        ]
+        read_only_fields = fields
+    
+    def get_interlocuteur_details(self, obj):
+        """Détails de l'interlocuteur."""
+        return {
+            'id': str(obj.interlocuteur.id),
+            'nom': obj.interlocuteur.get_full_name(),
+        }
+    
+    def get_dernier_message(self, obj):
+        """Aperçu du dernier message."""
+        message = obj.conversation.dernier_message
+        if message:
+            return {
+                'id': str(message.id_messagerie),
+                'expediteur': str(message.expediteur_id),
+                'contenu': message.contenu[:100],
+                'date_envoi': message.date_envoi,
+                'statut': message.statut,
+            }
+        return None
+
+
 class NotificationSerializer(serializers.ModelSerializer):
     """Serializer pour le modèle Notification."""
     
@@ -121,6 +169,18 @@ class NotificationSerializer(serializers.ModelSerializer):
         return obj.statut == obj.StatutNotification.LUE
 
 
+class NotificationFluxSerializer(serializers.ModelSerializer):
+    """Serializer allégé des notifications poussées en temps réel."""
+    
+    class Meta:
+        model = Notification
+        fields = [
+            'id_notification', 'type_notification', 'titre', 'contenu',
+            'lien_action', 'objet_lie_type', 'objet_lie_id', 'statut', 'date'
+        ]
+        read_only_fields = fields
+
+
 class NotificationCreateSerializer(serializers.ModelSerializer):
     """Serializer pour créer une notification."""
     
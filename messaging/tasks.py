@@ -0,0 +1,79 @@
+"""
+Tâches asynchrones pour l'application messaging.
+"""
+
+import logging
+
+from celery import shared_task
+
+from .models import EvenementSortant
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def drain_outbox(max_lots=50):
+    """Livre les événements en attente de l'outbox, lot par lot."""
+    total = 0
+    for _ in range(max_lots):
+        nb_evenements = EvenementSortant.traiter_lot()
+        total += nb_evenements
+        if not nb_evenements:
+            break
+    if total:
+        logger.info(f"{total} événement(s) de l'outbox traité(s)")
+    return total
+
+
+@shared_task
+def send_queued_emails(max_lots=20):
+    """Expédie les emails en file, lot par lot, et journalise le débit obtenu."""
+    from .emails import expedier_lot
+    
+    total = {'envoyes': 0, 'reportes': 0, 'a_reessayer': 0, 'echecs': 0, 'rejetes': 0, 'duree': 0}
+    for _ in range(max_lots):
+        bilan = expedier_lot()
+        for cle in total:
+            total[cle] += bilan[cle]
+        if not bilan['envoyes'] and not bilan['a_reessayer']:
+            break
+    total['duree'] = round(total['duree'], 3)
+    total['debit_par_minute'] = round(total['envoyes'] / total['duree'] * 60) if total['duree'] else 0
+    if any(total[cle] for cle in ('envoyes', 'a_reessayer', 'echecs', 'rejetes')):
+        logger.info(
+            f"Emails : {total['envoyes']} envoyé(s), {total['reportes']} reporté(s), "
+            f"{total['a_reessayer']} à réessayer, {total['echecs']} en échec, "
+            f"{total['rejetes']} rejeté(s) — {total['debit_par_minute']} emails/min"
+        )
+    return total
+
+
+@shared_task
+def flush_email_opens():
+    """Applique en base, par lots, les ouvertures d'emails mises en tampon."""
+    from .tracking import vider_tampon
+    
+    nb_emails = vider_tampon()
+    if nb_emails:
+        logger.info(f"Ouvertures appliquées sur {nb_emails} email(s)")
+    return nb_emails
+
+
+@shared_task
+def send_reminder_notifications():
+    """Notifie clients et prestataires des réservations à venir (notification et email)."""
+    from .rappels import envoyer_rappels_reservations
+    
+    nb_reservations = envoyer_rappels_reservations()
+    if nb_reservations:
+        logger.info(f"Rappels envoyés pour {nb_reservations} réservation(s)")
+    return nb_reservations
+
+
+@shared_task
+def apply_retention_policies():
+    """Supprime ou archive les notifications et messages expirés selon les politiques configurées."""
+    from .retention import appliquer_retention
+    
+    bilans = appliquer_retention()
+    return {bilan['politique']: bilan['lignes'] for bilan in bilans}
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from messaging.models import Notification
+from messaging.realtime import backends
+from messaging.realtime.views import _notifications_apres
+from tabali_platform.asgi import application
+from tabali_platform.utils.fabriques import creer_utilisateur, reglages
+
+DELAI = 5
+URL_ATTENTE = '/api/v1/messaging/api/notifications/attente/'
+URL_FLUX = '/api/v1/messaging/api/notifications/flux/'
+
+
+def portee_http(chemin, parametres='', entetes=()):
+    return {
+        'type': 'http', 'method': 'GET', 'path': chemin, 'query_string': parametres.encode(),
+        'headers': list(entetes), 'http_version': '1.1', 'scheme': 'http',
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 1234), 'root_path': '',
+    }
+
+
+class AttenteNotificationsTests(TransactionTestCase):
+    """Long-poll et flux SSE des notifications."""
+
+    def setUp(self):
+        backends._backend = None
+        self.addCleanup(setattr, backends, '_backend', None)
+        self.utilisateur = creer_utilisateur('client')
+        self.jeton = str(AccessToken.for_user(self.utilisateur))
+        self.lectures = []
+
+        def notifications_apres(*args):
+            notifications = _notifications_apres(*args)
+            self.lectures.append(len(notifications))
+            return notifications
+
+        patcher = mock.patch('messaging.realtime.views._notifications_apres', notifications_apres)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def requete(self, chemin, parametres='', entetes=()):
+        communicateur = ApplicationCommunicator(application, portee_http(chemin, parametres, entetes))
+        await communicateur.send_input({'type': 'http.request'})
+        return communicateur
+
+    @staticmethod
+    async def lire_corps(communicateur):
+        corps = b''
+        while True:
+            morceau = await communicateur.receive_output(DELAI)
+            corps += morceau.get('body', b'')
+            if not morceau.get('more_body'):
+                return corps
+
+    async def lire(self, communicateur):
+        debut = await communicateur.receive_output(DELAI)
+        return debut['status'], json.loads(await self.lire_corps(communicateur))
+
+    async def attendre_abonnement(self):
+        """
+        Attend que la vue soit abonnée au backend et ait relu la base avant
+        de publier : sous SQLite en mémoire (cache partagé), une lecture et
+        une écriture simultanées échouent au lieu de s'attendre.
+        """
+        for _ in range(DELAI * 50):
+            if backends.obtenir_backend()._abonnements and self.lectures:
+                return
+            await asyncio.sleep(0.02)
+        raise AssertionError("Aucun abonnement au backend temps réel")
+
+    def creer_notification(self, titre):
+        return sync_to_async(Notification.objects.create)(utilisateur=self.utilisateur, titre=titre, contenu='Contenu')
+
+    def test_authentification_requise(self):
+        async def scenario():
+            statut, _ = await self.lire(await self.requete(URL_ATTENTE))
+            self.assertEqual(statut, 401)
+        async_to_sync(scenario)()
+
+    @reglages(REALTIME_LONGPOLL_TIMEOUT=0.3)
+    def test_delai_borne(self):
+        async def scenario():
+            for delai in ('nan', 'inf', '-inf'):
+                communicateur = await self.requete(URL_ATTENTE, f'timeout={delai}&token={self.jeton}')
+                statut, corps = await self.lire(communicateur)
+                self.assertEqual((statut, corps['results']), (200, []))
+
+            statut, _ = await self.lire(await self.requete(URL_ATTENTE, f'timeout=abc&token={self.jeton}'))
+            self.assertEqual(statut, 400)
+        async_to_sync(scenario)()
+
+    def test_long_poll(self):
+        Notification.objects.create(utilisateur=self.utilisateur, titre='ancienne', contenu='Contenu')
+
+        async def scenario():
+            communicateur = await self.requete(
+                URL_ATTENTE, 'timeout=5', [(b'authorization', f'Bearer {self.jeton}'.encode())]
+            )
+            await self.attendre_abonnement()
+            await self.creer_notification('nouvelle')
+            statut, corps = await self.lire(communicateur)
+            self.assertEqual(statut, 200)
+            self.assertEqual([notification['titre'] for notification in corps['results']], ['nouvelle'])
+
+            # Reprise depuis le curseur sans nouveauté : réponse vide à l'expiration
+            communicateur = await self.requete(URL_ATTENTE, f"timeout=0.3&curseur={corps['curseur']}&token={self.jeton}")
+            statut, suite = await self.lire(communicateur)
+            self.assertEqual((statut, suite['results'], suite['curseur']), (200, [], corps['curseur']))
+            self.assertEqual(backends.obtenir_backend()._abonnements, {})
+        async_to_sync(scenario)()
+
+    @reglages(REALTIME_SSE_DURATION=1, REALTIME_SSE_HEARTBEAT=0.4)
+    def test_flux_sse(self):
+        async def scenario():
+            communicateur = await self.requete(URL_FLUX, f'token={self.jeton}')
+            self.assertEqual((await communicateur.receive_output(DELAI))['status'], 200)
+            await self.attendre_abonnement()
+            await self.creer_notification('en direct')
+
+            texte = (await self.lire_corps(communicateur)).decode()
+            self.assertIn('event: notification', texte)
+            self.assertIn('"titre": "en direct"', texte)
+            self.assertIn(': keepalive', texte)
+        async_to_sync(scenario)()
@@ -0,0 +1,66 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from messaging.models import Conversation, Messagerie, ParticipantConversation
+from tabali_platform.utils.fabriques import creer_utilisateur
+
+URL_MESSAGES = '/api/v1/messaging/api/messages/'
+URL_CONVERSATIONS = '/api/v1/messaging/api/messages/conversations/'
+
+
+class ConversationsTests(TestCase):
+    """Index des conversations et boîte de réception paginée par curseur."""
+
+    def setUp(self):
+        self.client_a = creer_utilisateur('client')
+        self.prestataire = creer_utilisateur('provider')
+        self.client_b = creer_utilisateur('client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_a)
+
+    def envoyer(self, destinataire, contenu):
+        reponse = self.api.post(URL_MESSAGES, {'contenu': contenu, 'destinataire': str(destinataire.pk)}, format='json')
+        self.assertEqual(reponse.status_code, 201, reponse.content)
+
+    def test_une_conversation_par_paire(self):
+        for i in range(3):
+            self.envoyer(self.prestataire, f'Message {i}')
+        self.envoyer(self.client_b, 'Bonjour')
+
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertEqual(Messagerie.objects.values('conversation_id').distinct().count(), 2)
+        self.assertEqual(ParticipantConversation.objects.get(utilisateur=self.prestataire).nb_non_lus, 3)
+
+    def test_lecture_decremente_les_non_lus(self):
+        for i in range(3):
+            self.envoyer(self.prestataire, f'Message {i}')
+
+        Messagerie.objects.filter(destinataire=self.prestataire).first().marquer_comme_lu()
+
+        self.assertEqual(ParticipantConversation.objects.get(utilisateur=self.prestataire).nb_non_lus, 2)
+
+    def test_boite_de_reception_paginee(self):
+        self.envoyer(self.prestataire, 'Premier')
+        self.envoyer(self.client_b, 'Second')
+
+        page = self.api.get(URL_CONVERSATIONS, {'page_size': 1}).json()
+        self.assertEqual(page['results'][0]['dernier_message']['contenu'], 'Second')
+        self.assertEqual(page['results'][0]['interlocuteur'], str(self.client_b.pk))
+
+        suivante = self.api.get(page['next']).json()
+        self.assertEqual(suivante['results'][0]['dernier_message']['contenu'], 'Premier')
+        self.assertIsNone(suivante['next'])
+
+    def test_boite_de_reception_en_une_requete(self):
+        for destinataire in (self.prestataire, self.client_b):
+            self.envoyer(destinataire, 'Bonjour')
+
+        with CaptureQueriesContext(connection) as requetes:
+            self.api.get(URL_CONVERSATIONS)
+
+        # Conversations, dernier message et interlocuteur : une seule requête
+        self.assertEqual(sum('tabali_participants_conversations' in requete['sql'] for requete in requetes), 1)
+        self.assertFalse(any('tabali_messageries' in requete['sql'] and 'JOIN' not in requete['sql']
+                             for requete in requetes))
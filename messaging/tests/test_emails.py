@@ -0,0 +1,144 @@
+import smtplib
+from datetime import timedelta
+
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from messaging.emails import LimiteurDomaines, _enregistrer, expedier_lot, reserver_lot
+from messaging.models import EnvoiMail
+from messaging.tasks import send_queued_emails
+
+
+class ConnexionFactice:
+    """Connexion SMTP simulée levant, par fragment d'adresse, l'erreur donnée."""
+
+    def __init__(self, erreurs=None):
+        self.erreurs = erreurs or {}
+        self.ouvertures = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        self.ouvertures += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        destinataire = messages[0].to[0]
+        for fragment, exc in self.erreurs.items():
+            if fragment in destinataire:
+                raise exc
+        return 1
+
+
+def mettre_en_file(adresse):
+    return EnvoiMail.creer_email_type(EnvoiMail.TypeEmail.NOTIFICATION, adresse)
+
+
+class ExpeditionLotsTests(TestCase):
+    """Expédition par lots, erreurs SMTP et débit par domaine."""
+
+    def test_lot_envoye(self):
+        for i in range(5):
+            mettre_en_file(f'client{i}@exemple.fr')
+
+        bilan = send_queued_emails()
+
+        self.assertEqual(bilan['envoyes'], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('X-Tabali-Email-Id', mail.outbox[0].extra_headers)
+        self.assertFalse(EnvoiMail.objects.exclude(statut=EnvoiMail.StatutEnvoi.ENVOYE).exists())
+
+    def test_erreurs_et_debit_par_domaine(self):
+        for adresse in ('ok@exemple.fr', 'temporaire@exemple.fr', 'permanent@exemple.fr', 'coupure@exemple.fr'):
+            mettre_en_file(adresse)
+        for i in range(3):
+            mettre_en_file(f'client{i}@lent.fr')
+        connexion = ConnexionFactice({
+            'temporaire': smtplib.SMTPResponseException(451, 'Réessayez plus tard'),
+            'permanent': smtplib.SMTPRecipientsRefused({'permanent@exemple.fr': (550, b'Inconnu')}),
+            'coupure': smtplib.SMTPServerDisconnected('Connexion fermée'),
+        })
+
+        bilan = expedier_lot(connexion=connexion, limiteur=LimiteurDomaines(debits={'lent.fr': 1}))
+
+        self.assertEqual(
+            (bilan['envoyes'], bilan['a_reessayer'], bilan['rejetes'], bilan['reportes']), (2, 2, 1, 2)
+        )
+        # Réouverture après la déconnexion du serveur
+        self.assertEqual(connexion.ouvertures, 2)
+        temporaire = EnvoiMail.objects.get(email_destinataire='temporaire@exemple.fr')
+        self.assertEqual((temporaire.statut, temporaire.tentatives), (EnvoiMail.StatutEnvoi.EN_ATTENTE, 1))
+        self.assertIn('451', temporaire.erreur_envoi)
+        self.assertGreater((temporaire.prochaine_tentative - temporaire.date_envoi).total_seconds(), 55)
+        self.assertEqual(
+            EnvoiMail.objects.get(email_destinataire='permanent@exemple.fr').statut, EnvoiMail.StatutEnvoi.REJETE
+        )
+        self.assertEqual(
+            EnvoiMail.objects.filter(email_destinataire__endswith='lent.fr', statut=EnvoiMail.StatutEnvoi.ENVOYE)
+            .count(), 1
+        )
+
+
+class ReservationLotsTests(TransactionTestCase):
+    """Réservation des emails avec un bail et expédition hors transaction."""
+
+    def test_expedition_hors_transaction(self):
+        for i in range(3):
+            mettre_en_file(f'client{i}@exemple.fr')
+        observations = []
+
+        class ConnexionObservee(ConnexionFactice):
+            def send_messages(self, messages):
+                email = EnvoiMail.objects.get(email_destinataire=messages[0].to[0])
+                envoyes = EnvoiMail.objects.filter(statut=EnvoiMail.StatutEnvoi.ENVOYE).count()
+                observations.append((connection.in_atomic_block, email.statut, envoyes))
+                return 1
+
+        bilan = expedier_lot(connexion=ConnexionObservee(), limiteur=LimiteurDomaines())
+
+        self.assertEqual(bilan['envoyes'], 3)
+        # Aucun verrou pendant l'échange SMTP, résultat enregistré email par email
+        self.assertEqual(observations, [(False, 'en_cours', 0), (False, 'en_cours', 1), (False, 'en_cours', 2)])
+
+    def test_bail_expire(self):
+        mettre_en_file('client@exemple.fr')
+
+        lot = reserver_lot(10)
+        self.assertEqual(len(lot), 1)
+        self.assertEqual(reserver_lot(10), [])
+
+        # Worker arrêté : l'email est repris après expiration du bail...
+        self.assertEqual(len(reserver_lot(10, timezone.now() + timedelta(seconds=601))), 1)
+        # ... et le résultat de l'ancien worker est ignoré
+        lot[0].statut = EnvoiMail.StatutEnvoi.ENVOYE
+        self.assertEqual(_enregistrer(lot[0], lot[0].prochaine_tentative), 0)
+
+    def test_serveur_injoignable(self):
+        for i in range(3):
+            mettre_en_file(f'client{i}@exemple.fr')
+
+        class ConnexionInjoignable(ConnexionFactice):
+            def open(self):
+                super().open()
+                if self.ouvertures > 1:
+                    raise OSError('Serveur injoignable')
+
+        connexion = ConnexionInjoignable({'client0': OSError('Connexion réinitialisée')})
+        with self.assertLogs('messaging.emails', 'ERROR'):
+            bilan = expedier_lot(connexion=connexion, limiteur=LimiteurDomaines())
+
+        self.assertEqual(bilan['a_reessayer'], 1)
+        # Les emails non tentés sont rendus à la file sans tentative comptée
+        self.assertEqual(
+            EnvoiMail.objects.filter(statut=EnvoiMail.StatutEnvoi.EN_ATTENTE, tentatives=0).count(), 2
+        )
+        self.assertEqual(len(reserver_lot(10)), 2)
@@ -0,0 +1,75 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from messaging.models import Conversation
+from tabali_platform.utils.fabriques import creer_utilisateur
+
+URL_MESSAGES = '/api/v1/messaging/api/messages/'
+
+
+class FilMessagesTests(TestCase):
+    """Fil d'une conversation paginé par clé dans les deux sens."""
+
+    def setUp(self):
+        self.expediteur = creer_utilisateur('client')
+        self.destinataire = creer_utilisateur('client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.expediteur)
+        for i in range(7):
+            self.envoyer(f'm{i}')
+        self.url = f'{URL_MESSAGES}fil/{Conversation.objects.get().pk}/'
+
+    def envoyer(self, contenu):
+        self.api.post(URL_MESSAGES, {'contenu': contenu, 'destinataire': str(self.destinataire.pk)}, format='json')
+
+    def lire(self, **parametres):
+        reponse = self.api.get(self.url, {'page_size': 3, **parametres})
+        self.assertEqual(reponse.status_code, 200)
+        return reponse.json()
+
+    @staticmethod
+    def contenus(page):
+        return [message['contenu'] for message in page['results']]
+
+    def test_derniers_messages_puis_plus_anciens(self):
+        page = self.lire()
+        self.assertEqual(self.contenus(page), ['m4', 'm5', 'm6'])
+        self.assertFalse(page['nouveaux_restants'])
+
+        page = self.lire(avant=page['curseur_anciens'])
+        self.assertEqual(self.contenus(page), ['m1', 'm2', 'm3'])
+
+        page = self.lire(avant=page['curseur_anciens'])
+        self.assertEqual(self.contenus(page), ['m0'])
+        self.assertIsNone(page['curseur_anciens'])
+
+    def test_messages_plus_recents(self):
+        premiere = self.lire()
+        plus_ancienne = self.lire(avant=self.lire(avant=premiere['curseur_anciens'])['curseur_anciens'])
+
+        page = self.lire(apres=plus_ancienne['curseur_nouveaux'])
+        self.assertEqual(self.contenus(page), ['m1', 'm2', 'm3'])
+        self.assertTrue(page['nouveaux_restants'])
+
+    def test_rattrapage_des_nouveaux_messages(self):
+        page = self.lire()
+        self.envoyer('nouveau')
+
+        page = self.lire(apres=page['curseur_nouveaux'])
+        self.assertEqual(self.contenus(page), ['nouveau'])
+
+        # Rien de neuf : le curseur reste le même
+        vide = self.lire(apres=page['curseur_nouveaux'])
+        self.assertEqual(vide['results'], [])
+        self.assertEqual(vide['curseur_nouveaux'], page['curseur_nouveaux'])
+
+    def test_curseur_invalide(self):
+        self.assertEqual(self.api.get(self.url, {'apres': 'invalide'}).status_code, 404)
+
+    def test_identifiant_invalide(self):
+        self.assertEqual(self.api.get(f'{URL_MESSAGES}fil/invalide/').status_code, 400)
+
+    def test_reserve_aux_participants(self):
+        self.api.force_authenticate(creer_utilisateur('client'))
+
+        self.assertEqual(self.api.get(self.url).status_code, 404)
@@ -0,0 +1,67 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from messaging.models import EnvoiMail
+from messaging.modeles_emails import RegistreModeles
+
+
+class ModelesEmailsTests(TestCase):
+    """Rendu des emails à partir du registre de modèles compilés."""
+
+    def test_rendu_avec_contexte(self):
+        email = EnvoiMail.construire_email_type(
+            EnvoiMail.TypeEmail.BIENVENUE, 'alice@exemple.fr', 'Alice', contexte={'prenom': 'Alice'}
+        )
+
+        self.assertEqual(email.sujet, 'Bienvenue sur Tabali Platform, Alice !')
+        self.assertIn("L'équipe Tabali Platform", email.contenu)
+
+    def test_variante_par_langue(self):
+        email = EnvoiMail.construire_email_type(
+            EnvoiMail.TypeEmail.RAPPEL, 'bob@exemple.fr', 'Bob', modele='rappel_facture', langue='en-GB',
+            contexte={'numero_facture': 'F1', 'montant': Decimal('12.50'), 'date_echeance': date(2026, 1, 2)}
+        )
+
+        self.assertEqual(email.sujet, 'Reminder: invoice F1 is overdue')
+        self.assertIn('2026-01-02', email.contenu)
+        self.assertIn('The Tabali Platform team', email.contenu)
+
+    def test_sujet_et_contenu_explicites(self):
+        email = EnvoiMail.construire_email_type(
+            EnvoiMail.TypeEmail.NOTIFICATION, 'client@exemple.fr', sujet='Sujet', contenu='Contenu'
+        )
+
+        self.assertEqual((email.sujet, email.contenu), ('Sujet', 'Contenu'))
+
+    def test_texte_brut_non_echappe(self):
+        email = EnvoiMail.construire_email_type(
+            EnvoiMail.TypeEmail.NOTIFICATION, 'client@exemple.fr', 'Client', contexte={'message': '<b>&</b>'}
+        )
+
+        self.assertIn('<b>&</b>', email.contenu)
+
+    def test_rendu_en_masse_compile_une_fois(self):
+        registre = RegistreModeles()
+        destinataires = (
+            {'email': f'client{i}@exemple.fr', 'nom': f'Client{i}', 'contexte': {'titre': f'T{i}', 'message': f'M{i}'}}
+            for i in range(1000)
+        )
+
+        with mock.patch.object(registre, '_moteur', wraps=registre._moteur) as moteur, \
+                mock.patch('messaging.modeles_emails.registre', registre):
+            emails = list(EnvoiMail.construire_en_masse(EnvoiMail.TypeEmail.MARKETING, destinataires))
+
+        self.assertEqual(emails[999].sujet, 'T999')
+        self.assertIn('Bonjour Client999', emails[999].contenu)
+        self.assertEqual(emails[5].email_destinataire, 'client5@exemple.fr')
+        self.assertLessEqual(moteur.call_count, 3)
+
+    def test_preparer_campagne_par_lots(self):
+        destinataires = ({'email': f'client{i}@exemple.fr', 'nom': 'Client'} for i in range(2500))
+
+        nombre = EnvoiMail.preparer_campagne(EnvoiMail.TypeEmail.MARKETING, destinataires, taille_lot=1000)
+
+        self.assertEqual((nombre, EnvoiMail.objects.count()), (2500, 2500))
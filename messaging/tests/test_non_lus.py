@@ -0,0 +1,101 @@
+import uuid
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from messaging.models import CompteurNonLus, Messagerie, Notification, ParticipantConversation
+from messaging.pagination import encoder_position
+from tabali_platform.utils.fabriques import creer_utilisateur
+
+URL_MESSAGES = '/api/v1/messaging/api/messages/'
+URL_NOTIFICATIONS = '/api/v1/messaging/api/notifications/'
+
+
+class CompteursNonLusTests(TestCase):
+    """Compteurs dénormalisés des non-lus et marquage en masse."""
+
+    def setUp(self):
+        self.utilisateur = creer_utilisateur('client')
+        self.interlocuteur = creer_utilisateur('provider')
+        self.api = APIClient()
+        self.api.force_authenticate(self.utilisateur)
+
+    def envoyer(self, contenu, expediteur=None, destinataire=None):
+        message = Messagerie(
+            contenu=contenu, expediteur=expediteur or self.interlocuteur, destinataire=destinataire or self.utilisateur
+        )
+        message.envoyer()
+        return message
+
+    def notifier(self, nombre):
+        for i in range(nombre):
+            Notification.objects.create(utilisateur=self.utilisateur, titre=f'Notification {i}', contenu='Contenu')
+        return list(Notification.objects.filter(utilisateur=self.utilisateur).order_by('date', 'id_notification'))
+
+    def non_lus(self, utilisateur=None):
+        return CompteurNonLus.lire((utilisateur or self.utilisateur).pk)
+
+    def test_lecture_et_archivage_des_messages(self):
+        messages = [self.envoyer(str(i)) for i in range(3)]
+        self.assertEqual(self.non_lus()['messages_non_lus'], 3)
+
+        messages[0].marquer_comme_lu()
+        messages[0].marquer_comme_lu()
+        self.assertIsNotNone(messages[0].date_lecture)
+        self.assertEqual(self.non_lus()['messages_non_lus'], 2)
+
+        messages[1].archiver()
+        self.assertEqual(self.non_lus()['messages_non_lus'], 1)
+
+    def test_marquer_une_conversation_lue(self):
+        messages = [self.envoyer(str(i)) for i in range(3)]
+
+        reponse = self.api.post(f'{URL_MESSAGES}fil/{messages[0].conversation_id}/marquer_lu/')
+
+        self.assertEqual(reponse.status_code, 200, reponse.content)
+        self.assertEqual((reponse.data['nb_marques'], reponse.data['messages_non_lus']), (3, 0))
+        self.assertEqual(ParticipantConversation.objects.get(utilisateur=self.utilisateur).nb_non_lus, 0)
+
+    def test_conversation_inconnue(self):
+        reponse = self.api.post(f'{URL_MESSAGES}fil/{uuid.uuid4()}/marquer_lu/')
+
+        self.assertEqual(reponse.status_code, 404)
+
+    def test_identifiant_de_conversation_invalide(self):
+        reponse = self.api.post(f'{URL_MESSAGES}fil/invalide/marquer_lu/')
+
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_compteurs_en_une_requete(self):
+        self.notifier(3)
+
+        with self.assertNumQueries(1):
+            reponse = self.api.get(f'{URL_NOTIFICATIONS}non_lus/')
+
+        self.assertEqual(reponse.data['notifications_non_lues'], 3)
+
+    def test_marquer_les_notifications_lues_jusqu_au_curseur(self):
+        notifications = self.notifier(3)
+        curseur = encoder_position(notifications[1].date, notifications[1].id_notification)
+
+        reponse = self.api.post(f'{URL_NOTIFICATIONS}marquer_lues/', {'curseur': curseur}, format='json')
+
+        self.assertEqual((reponse.data['nb_marquees'], reponse.data['notifications_non_lues']), (2, 1))
+        notifications[2].delete()
+        self.assertEqual(self.non_lus()['notifications_non_lues'], 0)
+
+    def test_curseur_invalide(self):
+        reponse = self.api.post(f'{URL_NOTIFICATIONS}marquer_lues/', {'curseur': 'invalide'}, format='json')
+
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_recalcul_des_compteurs(self):
+        self.envoyer('Bonjour', self.utilisateur, self.interlocuteur)
+        CompteurNonLus.objects.filter(pk=self.interlocuteur.pk).update(messages_non_lus=9, notifications_non_lues=9)
+        ParticipantConversation.objects.filter(utilisateur=self.interlocuteur).update(nb_non_lus=7)
+
+        CompteurNonLus.recalculer([self.interlocuteur.pk, self.utilisateur.pk])
+
+        self.assertEqual(self.non_lus(self.interlocuteur)['messages_non_lus'], 1)
+        self.assertEqual(ParticipantConversation.objects.get(utilisateur=self.interlocuteur).nb_non_lus, 1)
+        self.assertEqual(self.non_lus(), {'messages_non_lus': 0, 'notifications_non_lues': 0})
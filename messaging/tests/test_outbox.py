@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from messaging.models import CompteurNonLus, EnvoiMail, EvenementSortant, Messagerie, Notification
+from messaging.tasks import drain_outbox
+from tabali_platform.utils.fabriques import creer_utilisateur, reglages
+
+
+def canal_en_panne(evenements):
+    raise RuntimeError('service push indisponible')
+
+
+CANAUX = {
+    EvenementSortant.TypeEvenement.MESSAGE_ENVOYE: {
+        'notification': 'messaging.outbox.notifier_messages',
+        'email': 'messaging.outbox.envoyer_emails_messages',
+        'push': 'messaging.tests.test_outbox.canal_en_panne',
+    },
+}
+
+
+class OutboxTests(TestCase):
+    """Livraison des notifications de messages par l'outbox transactionnelle."""
+
+    def setUp(self):
+        self.destinataire = creer_utilisateur('client')
+        self.expediteur = creer_utilisateur('provider')
+
+    def envoyer(self, contenu):
+        message = Messagerie(contenu=contenu, expediteur=self.expediteur, destinataire=self.destinataire)
+        message.envoyer()
+        return message
+
+    def test_notifications_livrees_en_lot(self):
+        messages = [self.envoyer(str(i)) for i in range(5)]
+        self.assertFalse(Notification.objects.exists())
+
+        # Publication idempotente : même clé, pas de doublon
+        EvenementSortant.publier(
+            EvenementSortant.TypeEvenement.MESSAGE_ENVOYE, f'message:{messages[0].pk}',
+            {'message_id': str(messages[0].pk)}
+        )
+        self.assertEqual(EvenementSortant.objects.count(), 5)
+
+        with self.assertNumQueries(12):
+            self.assertEqual(EvenementSortant.traiter_lot(), 5)
+
+        self.assertEqual(Notification.objects.filter(utilisateur=self.destinataire).count(), 5)
+        self.assertEqual(CompteurNonLus.lire(self.destinataire.pk)['notifications_non_lues'], 5)
+        self.assertEqual(drain_outbox(), 0)
+
+    @reglages(OUTBOX_CANAUX=CANAUX, OUTBOX_MAX_RETRIES=2)
+    def test_seul_le_canal_en_echec_est_rejoue(self):
+        self.envoyer('Bonjour')
+
+        drain_outbox()
+
+        evenement = EvenementSortant.objects.get()
+        self.assertEqual(evenement.statut, EvenementSortant.Statut.EN_ATTENTE)
+        self.assertEqual(evenement.tentatives, 1)
+        self.assertEqual(sorted(evenement.canaux_livres), ['email', 'notification'])
+        self.assertIn('service push indisponible', evenement.derniere_erreur)
+
+        EvenementSortant.objects.update(prochaine_tentative=timezone.now() - timedelta(seconds=1))
+        drain_outbox()
+
+        evenement.refresh_from_db()
+        self.assertEqual(evenement.statut, EvenementSortant.Statut.ECHEC)
+        self.assertEqual(evenement.tentatives, 2)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(EnvoiMail.objects.count(), 1)
@@ -0,0 +1,135 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import InMemoryStorage
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from messaging import retention
+from messaging.models import CompteurNonLus, Conversation, Messagerie, Notification
+from reservations.models import Reservation
+from tabali_platform.utils.fabriques import creer_reservation, creer_utilisateur, reglages
+
+POLITIQUE_MESSAGES = 'messages_reservations_closes'
+
+
+class RetentionTestCase(TestCase):
+
+    durable = True
+
+    def setUp(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        reglage = reglages(
+            RETENTION_ARCHIVE_DIR=dossier, RETENTION_ARCHIVE_STORAGE='',
+            RETENTION_ARCHIVE_LOCAL_DURABLE=self.durable, RETENTION_BATCH_SIZE=7
+        )
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+
+    def creer_messages(self, reservation, nombre, anciennete_jours=400):
+        for i in range(nombre):
+            Messagerie.objects.create(
+                expediteur=reservation.client.user, destinataire=reservation.provider.user,
+                contenu=f'Message {i}', reservation=reservation, conversation_id=reservation.pk
+            )
+        Messagerie.objects.filter(reservation=reservation).update(
+            date_envoi=timezone.now() - timedelta(days=anciennete_jours)
+        )
+
+
+class PolitiquesRetentionTests(RetentionTestCase):
+    """Archivage puis suppression par lots des lignes expirées."""
+
+    def test_notifications_lues(self):
+        utilisateur = creer_utilisateur('client')
+        for i in range(20):
+            Notification.objects.create(
+                utilisateur=utilisateur, titre='Notification', contenu=str(i),
+                statut=Notification.StatutNotification.LUE if i % 2 else Notification.StatutNotification.NON_LUE
+            )
+        Notification.objects.update(date=timezone.now() - timedelta(days=100))
+        Notification.objects.create(
+            utilisateur=utilisateur, titre='Récente', contenu='', statut=Notification.StatutNotification.LUE
+        )
+
+        bilan = retention.appliquer_retention(['notifications_lues'])[0]
+
+        self.assertEqual((bilan['lignes'], bilan['lots']), (10, 2))
+        self.assertEqual(Notification.objects.count(), 11)
+        self.assertEqual(CompteurNonLus.lire(utilisateur.pk)['notifications_non_lues'], 10)
+
+    def test_messages_archives_puis_restaures(self):
+        terminee = creer_reservation(status=Reservation.Status.COMPLETED)
+        en_cours = creer_reservation(status=Reservation.Status.CONFIRMED)
+        self.creer_messages(terminee, 15)
+        self.creer_messages(en_cours, 1)
+        Messagerie.objects.filter(contenu__in=['Message 0', 'Message 1'], reservation=terminee).update(
+            date_envoi=timezone.now() - timedelta(days=440)
+        )
+        prestataire = terminee.provider.user
+        CompteurNonLus.recalculer([prestataire.pk, en_cours.provider.user_id])
+        dernier = Messagerie.objects.filter(reservation=terminee).order_by('-date_envoi', '-pk').first()
+        Conversation.objects.create(
+            id_conversation=terminee.pk, cle_participants='terminee', reservation=terminee,
+            dernier_message=dernier, derniere_activite=dernier.date_envoi
+        )
+
+        call_command('appliquer_retention', '--simulation', stdout=StringIO())
+        self.assertEqual(Messagerie.objects.count(), 16)
+        call_command('appliquer_retention', '--politique', POLITIQUE_MESSAGES, stdout=StringIO())
+
+        self.assertEqual(Messagerie.objects.count(), 1)
+        self.assertEqual(CompteurNonLus.lire(prestataire.pk)['messages_non_lus'], 0)
+        self.assertIsNone(Conversation.objects.get(pk=terminee.pk).dernier_message_id)
+        mois = retention.mois_archives(Messagerie)
+        self.assertEqual(len(mois), 2)
+
+        call_command(
+            'restaurer_archive', 'messaging.Messagerie', mois[1], '--filtre', f'conversation_id={terminee.pk}',
+            stdout=StringIO()
+        )
+        # Lignes déjà restaurées ignorées
+        call_command('restaurer_archive', 'messaging.Messagerie', mois[1], stdout=StringIO())
+
+        self.assertEqual(Messagerie.objects.count(), 14)
+        self.assertEqual(CompteurNonLus.lire(prestataire.pk)['messages_non_lus'], 13)
+        conversation = Conversation.objects.get(pk=terminee.pk)
+        self.assertEqual(conversation.dernier_message_id, dernier.pk)
+        # Dates archivées, à la milliseconde près (précision de la sérialisation JSON)
+        self.assertAlmostEqual(conversation.derniere_activite, dernier.date_envoi, delta=timedelta(milliseconds=1))
+        self.assertEqual(conversation.dernier_message.date_envoi, conversation.derniere_activite)
+
+
+class StockageArchivesTests(RetentionTestCase):
+    """Suppression refusée tant que les archives ne sont pas durables."""
+
+    durable = False
+
+    def setUp(self):
+        super().setUp()
+        self.creer_messages(creer_reservation(status=Reservation.Status.COMPLETED), 1)
+
+    def test_stockage_local_refuse(self):
+        with self.assertRaises(ImproperlyConfigured):
+            retention.appliquer_retention([POLITIQUE_MESSAGES])
+
+        self.assertEqual(Messagerie.objects.count(), 1)
+        bilan = retention.appliquer_retention([POLITIQUE_MESSAGES], simulation=True)[0]
+        self.assertEqual(bilan['lignes'], 1)
+
+    def test_stockage_distant(self):
+        stockage = InMemoryStorage()
+
+        with mock.patch.object(retention, 'obtenir_stockage', return_value=stockage):
+            retention.appliquer_retention([POLITIQUE_MESSAGES])
+            self.assertFalse(Messagerie.objects.exists())
+            mois = retention.mois_archives(Messagerie)
+            self.assertEqual(retention.restaurer_archive(Messagerie, mois[0]), 1)
+
+        self.assertEqual(Messagerie.objects.count(), 1)
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from messaging import tracking
+from messaging.emails import construire_message
+from messaging.models import EnvoiMail
+from tabali_platform.utils.fabriques import reglages
+
+
+def mettre_en_file(adresse):
+    return EnvoiMail.creer_email_type(EnvoiMail.TypeEmail.NOTIFICATION, adresse)
+
+
+class SuiviOuverturesTestCase(TestCase):
+
+    def setUp(self):
+        # Tampon propre au test, vidé explicitement
+        self.addCleanup(setattr, tracking, '_tampon', tracking._tampon)
+        tracking._tampon = tracking.TamponMemoire(intervalle=3600)
+
+
+class PixelOuvertureTests(SuiviOuverturesTestCase):
+    """Pixel de suivi et écriture groupée des ouvertures."""
+
+    def ouvrir(self, email):
+        with self.assertNumQueries(0):
+            reponse = self.client.get(f'/api/v1/messaging/api/emails/{email.pk}/ouverture.gif')
+        self.assertEqual((reponse.status_code, reponse['Content-Type']), (200, 'image/gif'))
+
+    def test_ouvertures_groupees(self):
+        emails = [mettre_en_file(f'client{i}@exemple.fr') for i in range(4)]
+        EnvoiMail.objects.update(statut=EnvoiMail.StatutEnvoi.ENVOYE)
+        EnvoiMail.objects.filter(pk=emails[3].pk).update(statut=EnvoiMail.StatutEnvoi.REJETE)
+        for email, nombre in zip(emails, (3, 1, 3, 2)):
+            for _ in range(nombre):
+                self.ouvrir(email)
+        hier = timezone.now() - timedelta(days=1)
+        EnvoiMail.objects.filter(pk=emails[1].pk).update(date_ouverture=hier)
+
+        # Point de sauvegarde, une requête par groupe de compteurs, libération
+        with self.assertNumQueries(5):
+            self.assertEqual(tracking.vider_tampon(), 4)
+
+        resultats = EnvoiMail.objects.in_bulk([email.pk for email in emails])
+        self.assertEqual([resultats[email.pk].nb_ouvertures for email in emails], [3, 1, 3, 2])
+        self.assertEqual(resultats[emails[0].pk].statut, EnvoiMail.StatutEnvoi.OUVERT)
+        self.assertEqual(resultats[emails[3].pk].statut, EnvoiMail.StatutEnvoi.REJETE)
+        # Première ouverture conservée
+        self.assertEqual(resultats[emails[1].pk].date_ouverture, hier)
+        self.assertIsNotNone(resultats[emails[2].pk].date_ouverture)
+        self.assertEqual(tracking.vider_tampon(), 0)
+
+        emails[0].marquer_comme_ouvert()
+        emails[0].refresh_from_db()
+        self.assertEqual(emails[0].nb_ouvertures, 4)
+
+    def test_ouvertures_restituees_si_l_ecriture_echoue(self):
+        email = mettre_en_file('client@exemple.fr')
+        tampon = tracking.obtenir_tampon()
+        maintenant = timezone.now()
+        tampon.enregistrer(str(email.pk), maintenant)
+        tampon.enregistrer(str(email.pk), maintenant)
+
+        with mock.patch.object(EnvoiMail, 'appliquer_ouvertures', side_effect=DatabaseError('Base indisponible')):
+            with self.assertRaises(DatabaseError):
+                tracking.vider_tampon()
+
+        tampon.enregistrer(str(email.pk), maintenant + timedelta(seconds=5))
+        self.assertEqual(tampon._ouvertures[str(email.pk)], (3, maintenant))
+
+
+class MessageHtmlTests(SuiviOuverturesTestCase):
+    """Version HTML des emails, porteuse du pixel de suivi."""
+
+    @reglages(EMAIL_TRACKING_BASE_URL='https://tabali.exemple/')
+    def test_pixel_dans_la_version_html(self):
+        email = mettre_en_file('client@exemple.fr')
+        email.contenu = 'Bonjour <b>\n\nÀ bientôt'
+
+        message = construire_message(email)
+
+        html, type_mime = message.alternatives[0]
+        self.assertEqual(type_mime, 'text/html')
+        self.assertIn(f'https://tabali.exemple/api/v1/messaging/api/emails/{email.pk}/ouverture.gif', html)
+        self.assertIn('&lt;b&gt;', html)
+        self.assertIn('text/html', message.message().as_string())
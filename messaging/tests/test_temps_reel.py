@@ -0,0 +1,115 @@
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from messaging.models import Messagerie, Notification
+from messaging.pagination import encoder_position
+from messaging.realtime import backends
+from tabali_platform.asgi import application
+from tabali_platform.utils.fabriques import creer_utilisateur, reglages
+
+DELAI = 5
+
+
+def portee_websocket(jeton):
+    return {
+        'type': 'websocket', 'path': '/ws/temps-reel/',
+        'query_string': f'token={jeton}'.encode(), 'headers': [],
+    }
+
+
+class WebSocketTests(TransactionTestCase):
+    """Poussée des messages et notifications par WebSocket, avec reprise par curseur."""
+
+    def setUp(self):
+        backends._backend = None
+        self.addCleanup(setattr, backends, '_backend', None)
+        self.utilisateur = creer_utilisateur('client')
+        self.interlocuteur = creer_utilisateur('provider')
+        self.jeton = str(AccessToken.for_user(self.utilisateur))
+
+    def envoyer(self, contenu):
+        message = Messagerie(contenu=contenu, expediteur=self.interlocuteur, destinataire=self.utilisateur)
+        message.envoyer()
+        return message
+
+    async def connecter(self, jeton=None):
+        communicateur = ApplicationCommunicator(application, portee_websocket(jeton or self.jeton))
+        await communicateur.send_input({'type': 'websocket.connect'})
+        return communicateur
+
+    async def reprendre(self, communicateur, curseurs):
+        """Envoie la trame de reprise ; retourne les événements reçus avant ``pret``."""
+        await communicateur.send_input({
+            'type': 'websocket.receive', 'text': json.dumps({'type': 'reprise', 'curseurs': curseurs})
+        })
+        recus = []
+        while True:
+            evenement = json.loads((await communicateur.receive_output(DELAI))['text'])
+            if evenement['type'] == 'pret':
+                return recus
+            recus.append(evenement)
+
+    def test_jeton_invalide_refuse(self):
+        async def scenario():
+            communicateur = await self.connecter('invalide')
+            self.assertEqual(await communicateur.receive_output(DELAI), {'type': 'websocket.close', 'code': 4001})
+        async_to_sync(scenario)()
+
+    def test_reprise_puis_direct(self):
+        premier = self.envoyer('un')
+        self.envoyer('deux')
+        self.envoyer('trois')
+
+        async def scenario():
+            communicateur = await self.connecter()
+            self.assertEqual((await communicateur.receive_output(DELAI))['type'], 'websocket.accept')
+
+            rattrapes = await self.reprendre(communicateur, {
+                'messages': encoder_position(premier.date_envoi, premier.id_messagerie),
+                'notifications': None,
+            })
+            self.assertEqual([evenement['data']['contenu'] for evenement in rattrapes], ['deux', 'trois'])
+
+            await sync_to_async(self.envoyer)('en direct')
+            evenement = json.loads((await communicateur.receive_output(DELAI))['text'])
+            self.assertEqual(evenement['data']['contenu'], 'en direct')
+
+            await sync_to_async(Notification.objects.create)(utilisateur=self.utilisateur, titre='Titre', contenu='Contenu')
+            evenement = json.loads((await communicateur.receive_output(DELAI))['text'])
+            self.assertEqual(evenement['type'], 'notification')
+
+            await communicateur.send_input({'type': 'websocket.receive', 'text': 'ping'})
+            self.assertEqual((await communicateur.receive_output(DELAI))['text'], 'pong')
+
+            await communicateur.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicateur.wait(DELAI)
+            self.assertEqual(backends.obtenir_backend()._abonnements, {})
+        async_to_sync(scenario)()
+
+    def test_trame_de_reprise_obligatoire(self):
+        async def scenario():
+            communicateur = await self.connecter()
+            await communicateur.receive_output(DELAI)
+            await communicateur.send_input({'type': 'websocket.receive', 'text': 'inattendu'})
+            self.assertEqual(await communicateur.receive_output(DELAI), {'type': 'websocket.close', 'code': 4002})
+        async_to_sync(scenario)()
+
+    @reglages(REALTIME_QUEUE_SIZE=2)
+    def test_client_trop_lent_desynchronise(self):
+        async def scenario():
+            communicateur = await self.connecter()
+            await communicateur.receive_output(DELAI)
+            await self.reprendre(communicateur, {})
+
+            abonnement = next(iter(backends.obtenir_backend()._abonnements[f'utilisateur:{self.utilisateur.pk}']))
+            for position in range(5):
+                abonnement.pousser({'type': 'message', 'curseur': str(position)})
+
+            evenement = json.loads((await communicateur.receive_output(DELAI))['text'])
+            self.assertEqual(evenement['type'], 'desynchronise')
+            self.assertEqual(await communicateur.receive_output(DELAI), {'type': 'websocket.close', 'code': 4008})
+        async_to_sync(scenario)()
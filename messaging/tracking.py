@@ -0,0 +1,171 @@
+"""
+Suivi des ouvertures d'emails par pixel, avec écritures regroupées.
+
+La vue du pixel se contente d'enregistrer l'ouverture dans un tampon et
+renvoie aussitôt le GIF. Le tampon est vidé périodiquement : les ouvertures
+sont agrégées par email et appliquées en quelques UPDATE
+(``EnvoiMail.appliquer_ouvertures``), au lieu d'une écriture par ouverture.
+Si l'écriture échoue, les ouvertures vidées sont réintégrées au tampon.
+
+Deux tampons sont disponibles, choisis par ``TABALI_SETTINGS['EMAIL_TRACKING_BUFFER']`` :
+
+- ``TamponMemoire`` (par défaut) : propre au processus, vidé par un thread
+  de fond ; adapté au développement et aux déploiements mono-processus ;
+- ``TamponRedis`` : partagé entre les processus web, vidé par la tâche
+  ``messaging.tasks.flush_email_opens``.
+"""
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# GIF transparent de 1x1 pixel
+PIXEL_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class TamponMemoire:
+    """Tampon des ouvertures en mémoire, vidé par un thread de fond."""
+
+    def __init__(self, intervalle=None, **options):
+        self.intervalle = intervalle or settings.TABALI_SETTINGS.get('EMAIL_TRACKING_FLUSH_INTERVAL', 10)
+        self._ouvertures = {}
+        self._verrou = threading.Lock()
+        self._thread = None
+
+    def enregistrer(self, email_id, date):
+        with self._verrou:
+            nombre, premiere = self._ouvertures.get(email_id, (0, date))
+            self._ouvertures[email_id] = (nombre + 1, min(premiere, date))
+        self._demarrer()
+
+    def vider(self):
+        """Retourne et remet à zéro les ouvertures agrégées : {email_id: (nombre, premiere_date)}."""
+        with self._verrou:
+            ouvertures, self._ouvertures = self._ouvertures, {}
+        return ouvertures
+
+    def restituer(self, ouvertures):
+        """Réintègre des ouvertures vidées mais non appliquées (échec de l'écriture en base)."""
+        with self._verrou:
+            for email_id, (nombre, premiere) in ouvertures.items():
+                deja, date = self._ouvertures.get(email_id, (0, premiere))
+                self._ouvertures[email_id] = (deja + nombre, min(date, premiere))
+
+    def _demarrer(self):
+        if self._thread is None:
+            with self._verrou:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._boucle, name='vidage-ouvertures', daemon=True
+                    )
+                    self._thread.start()
+                    atexit.register(vider_tampon)
+
+    def _boucle(self):
+        while True:
+            time.sleep(self.intervalle)
+            try:
+                vider_tampon()
+            except Exception:
+                logger.exception("Échec du vidage des ouvertures d'emails")
+
+
+class TamponRedis:
+    """Tampon des ouvertures partagé dans Redis (hash par email)."""
+
+    cle = 'tabali:ouvertures-emails'
+
+    def __init__(self, url=None, **options):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.TABALI_SETTINGS.get('REALTIME_REDIS_URL'))
+
+    def enregistrer(self, email_id, date):
+        horodatage = date.timestamp()
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.hincrby(self.cle, f"{email_id}:n", 1)
+        pipeline.hsetnx(self.cle, f"{email_id}:t", horodatage)
+        pipeline.execute()
+
+    def vider(self):
+        # RENAME est atomique : les ouvertures suivantes repartent dans un hash neuf
+        import redis
+
+        cle_vidage = f"{self.cle}:vidage:{uuid.uuid4().hex}"
+        try:
+            self.client.rename(self.cle, cle_vidage)
+        except redis.exceptions.ResponseError:
+            # Aucune ouverture en attente
+            return {}
+        brut = self.client.hgetall(cle_vidage)
+        self.client.delete(cle_vidage)
+
+        ouvertures = {}
+        for champ, valeur in brut.items():
+            email_id, _, suffixe = champ.decode().rpartition(':')
+            nombre, premiere = ouvertures.get(email_id, (0, None))
+            if suffixe == 'n':
+                nombre = int(valeur)
+            else:
+                premiere = datetime.fromtimestamp(float(valeur), tz=dt_timezone.utc)
+            ouvertures[email_id] = (nombre, premiere)
+        return ouvertures
+
+    def restituer(self, ouvertures):
+        """Réintègre des ouvertures vidées mais non appliquées (échec de l'écriture en base)."""
+        pipeline = self.client.pipeline(transaction=False)
+        for email_id, (nombre, premiere) in ouvertures.items():
+            pipeline.hincrby(self.cle, f"{email_id}:n", nombre)
+            if premiere is not None:
+                # Antérieure à toute ouverture enregistrée depuis le vidage
+                pipeline.hset(self.cle, f"{email_id}:t", premiere.timestamp())
+        pipeline.execute()
+
+
+_tampon = None
+_verrou_tampon = threading.Lock()
+
+
+def obtenir_tampon():
+    """Retourne l'instance (unique par processus) du tampon configuré."""
+    global _tampon
+    if _tampon is None:
+        with _verrou_tampon:
+            if _tampon is None:
+                classe = import_string(settings.TABALI_SETTINGS.get(
+                    'EMAIL_TRACKING_BUFFER', 'messaging.tracking.TamponMemoire'
+                ))
+                _tampon = classe()
+    return _tampon
+
+
+def vider_tampon():
+    """
+    Applique en base les ouvertures en attente.
+
+    Returns:
+        int: nombre d'emails mis à jour
+    """
+    from .models import EnvoiMail
+
+    tampon = obtenir_tampon()
+    ouvertures = tampon.vider()
+    if not ouvertures:
+        return 0
+    try:
+        return EnvoiMail.appliquer_ouvertures(ouvertures)
+    except Exception:
+        # Les ouvertures seront appliquées au prochain vidage
+        tampon.restituer(ouvertures)
+        raise
@@ -2,6 +2,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from .realtime import views as realtime_views
 
 # Configuration du router REST
 router = DefaultRouter()
@@ -10,6 +11,14 @@ router.register(r'notifications', views.NotificationViewSet, basename='notificat
 router.register(r'emails', views.EnvoiMailViewSet, basename='email')
 
 urlpatterns = [
+    # Attente des notifications (avant le router, qui capterait /notifications/<pk>/)
+    path('api/notifications/attente/', 
+         realtime_views.attente_notifications, 
+         name='notifications-attente'),
+    path('api/notifications/flux/', 
+         realtime_views.flux_notifications, 
+         name='notifications-flux'),
+    
     # Routes REST API
     path('api/', include(router.urls)),
     
@@ -17,4 +26,9 @@ urlpatterns = [
     path('api/messages/conversations/', 
          views.MessagerieViewSet.as_view({'get': 'conversations'}), 
          name='messages-conversations'),
+    
+    # Pixel de suivi des ouvertures d'emails
+    path('api/emails/<uuid:email_id>/ouverture.gif', 
+         views.pixel_ouverture, 
+         name='emails-pixel-ouverture'),
 ] 
\ No newline at end of file
@@ -2,7 +2,11 @@
 Vues pour l'application messaging.
 """
 
+import uuid
+
 from django.db import models
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -12,12 +16,15 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
-from .models import Messagerie, Notification, EnvoiMail
+from .models import Messagerie, Notification, EnvoiMail, ParticipantConversation, CompteurNonLus
+from .pagination import ConversationCursorPagination, FilMessagesPagination, decoder_position
 from .serializers import (
-    MessagerieSerializer, MessagerieCreateSerializer,
+    MessagerieSerializer, MessagerieCreateSerializer, ConversationSerializer,
+    MessageFilSerializer,
     NotificationSerializer, NotificationCreateSerializer,
     EnvoiMailSerializer, EnvoiMailCreateSerializer
 )
+from .tracking import PIXEL_GIF, obtenir_tampon
 
 
 @extend_schema_view(
@@ -58,16 +65,78 @@ class MessagerieViewSet(viewsets.ModelViewSet):
     
     @extend_schema(
         summary="Conversations",
-        description="Récupère les conversations de l'utilisateur connecté"
+        description="Boîte de réception de l'utilisateur connecté, par activité décroissante",
+        responses=ConversationSerializer(many=True)
     )
     @action(detail=False, methods=['get'])
     def conversations(self, request):
-        """Retourne les conversations groupées."""
-        # Cette méthode sera implémentée pour regrouper les messages par conversation
-        # Pour l'instant, on retourne un exemple
+        """Retourne les conversations de l'utilisateur, paginées par curseur."""
+        participations = ParticipantConversation.objects.filter(
+            utilisateur=request.user,
+            derniere_activite__isnull=False
+        ).select_related('interlocuteur', 'conversation__dernier_message')
+        
+        paginator = ConversationCursorPagination()
+        page = paginator.paginate_queryset(participations, request, view=self)
+        serializer = ConversationSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+    
+    def _conversation_du_participant(self, request, conversation_id):
+        """
+        Valide l'identifiant d'une conversation de l'utilisateur.
+        
+        Returns:
+            (conversation_id, reponse_erreur)
+        """
+        try:
+            conversation_id = uuid.UUID(str(conversation_id))
+        except ValueError:
+            return None, Response(
+                {"error": "Identifiant de conversation invalide"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ParticipantConversation.objects.filter(
+            conversation_id=conversation_id, utilisateur=request.user
+        ).exists():
+            return None, Response({"error": "Conversation introuvable"}, status=status.HTTP_404_NOT_FOUND)
+        return conversation_id, None
+    
+    @extend_schema(
+        summary="Fil de discussion",
+        description=(
+            "Messages d'une conversation par ordre chronologique, paginés par curseur : "
+            "`avant` charge les messages plus anciens, `apres` les nouveaux depuis le curseur"
+        ),
+        responses=MessageFilSerializer(many=True)
+    )
+    @action(detail=False, methods=['get'], url_path='fil/(?P<conversation_id>[^/.]+)')
+    def fil(self, request, conversation_id=None):
+        """Retourne une page du fil d'une conversation."""
+        conversation_id, erreur = self._conversation_du_participant(request, conversation_id)
+        if erreur:
+            return erreur
+        
+        messages = Messagerie.objects.filter(conversation_id=conversation_id)
+        paginator = FilMessagesPagination()
+        page = paginator.paginate_queryset(messages, request, view=self)
+        serializer = MessageFilSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+    
+    @extend_schema(
+        summary="Marquer une conversation comme lue",
+        description="Marque comme lus tous les messages reçus dans la conversation"
+    )
+    @action(detail=False, methods=['post'], url_path='fil/(?P<conversation_id>[^/.]+)/marquer_lu')
+    def marquer_conversation_lue(self, request, conversation_id=None):
+        """Marque toute une conversation comme lue."""
+        conversation_id, erreur = self._conversation_du_participant(request, conversation_id)
+        if erreur:
+            return erreur
+        
+        nb_marques = Messagerie.marquer_conversation_lue(conversation_id, request.user)
         return Response({
-            "message": "Conversations à implémenter",
-            "conversations": []
+            'nb_marques': nb_marques,
+            **CompteurNonLus.lire(request.user.pk)
         })
     
     @extend_schema(
@@ -124,6 +193,39 @@ class NotificationViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
+    
+    @extend_schema(
+        summary="Marquer les notifications comme lues",
+        description=(
+            "Marque comme lues les notifications jusqu'au `curseur` inclus "
+            "(curseur des événements temps réel), ou toutes sans curseur"
+        )
+    )
+    @action(detail=False, methods=['post'])
+    def marquer_lues(self, request):
+        """Marque en masse les notifications comme lues."""
+        curseur = request.data.get('curseur')
+        position = None
+        if curseur:
+            try:
+                position = decoder_position(curseur)
+            except ValueError:
+                return Response({"error": "Curseur invalide"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        nb_marquees = Notification.marquer_lues_jusqua(request.user, position)
+        return Response({
+            'nb_marquees': nb_marquees,
+            **CompteurNonLus.lire(request.user.pk)
+        })
+    
+    @extend_schema(
+        summary="Compteurs de non-lus",
+        description="Nombre de messages et de notifications non lus (badge de l'application)"
+    )
+    @action(detail=False, methods=['get'])
+    def non_lus(self, request):
+        """Retourne les compteurs de non-lus de l'utilisateur connecté."""
+        return Response(CompteurNonLus.lire(request.user.pk))
 
 
 @extend_schema_view(
@@ -157,3 +259,17 @@ class EnvoiMailViewSet(viewsets.ModelViewSet):
             return super().get_queryset()
         else:
             return super().get_queryset().filter(utilisateur=user)
+
+
+@require_GET
+def pixel_ouverture(request, email_id):
+    """
+    Pixel de suivi des ouvertures d'emails.
+    
+    L'ouverture est seulement mise en tampon (appliquée en base par lots) :
+    le GIF est renvoyé sans attendre d'écriture.
+    """
+    obtenir_tampon().enregistrer(str(email_id), timezone.now())
+    response = HttpResponse(PIXEL_GIF, content_type='image/gif')
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
+    return response
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='rappel_envoye_le',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Rappel envoyé le'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('rappel_envoye_le__isnull', True)), fields=['scheduled_date'], name='reservation_a_rappeler_idx'),
+        ),
+    ]
@@ -9,6 +9,7 @@ from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 from accounts.models import User, ClientProfile, ProviderProfile
 from services.models import ProviderService
+from historiques.audit import QuerySetAudite
 import uuid
 
 
@@ -126,6 +127,16 @@ class Reservation(models.Model):
     # Notes internes
     notes = models.TextField(_('Notes internes'), blank=True)
     
+    # Rappel avant intervention (voir messaging.rappels)
+    rappel_envoye_le = models.DateTimeField(
+        _('Rappel envoyé le'),
+        null=True,
+        blank=True
+    )
+    
+    # Mises à jour groupées historisées (voir historiques.audit)
+    objects = QuerySetAudite.as_manager()
+    
     class Meta:
         verbose_name = _('Réservation')
         verbose_name_plural = _('Réservations')
@@ -138,6 +149,12 @@ class Reservation(models.Model):
             models.Index(fields=['scheduled_date']),
             models.Index(fields=['priority']),
             models.Index(fields=['-created_at']),
+            # Réservations restant à rappeler, seules parcourues par le job de rappel
+            models.Index(
+                fields=['scheduled_date'],
+                condition=models.Q(rappel_envoye_le__isnull=True),
+                name='reservation_a_rappeler_idx'
+            ),
         ]
     
     def __str__(self):
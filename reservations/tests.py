@@ -1,3 +1,55 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from messaging.models import CompteurNonLus, EnvoiMail, Notification
+from messaging.rappels import envoyer_rappels_reservations
+from messaging.tasks import send_reminder_notifications
+from tabali_platform.utils.fabriques import creer_reservation
+
+from .models import Reservation
+
+
+class RappelsReservationsTests(TestCase):
+    """Rappels planifiés des réservations à venir."""
+
+    def setUp(self):
+        self.maintenant = timezone.now()
+
+    def dans(self, **delai):
+        return self.maintenant + timedelta(**delai)
+
+    def test_rappel_unique_aux_deux_participants(self):
+        prochaine = creer_reservation(scheduled_date=self.dans(hours=5))
+        creer_reservation(scheduled_date=self.dans(hours=30))
+        creer_reservation(scheduled_date=self.dans(hours=-1))
+        creer_reservation(scheduled_date=self.dans(hours=2), status=Reservation.Status.CANCELLED)
+
+        self.assertEqual(send_reminder_notifications(), 1)
+        self.assertEqual(send_reminder_notifications(), 0)
+
+        self.assertEqual(
+            set(Notification.objects.values_list('utilisateur_id', flat=True)),
+            {prochaine.client.user_id, prochaine.provider.user_id}
+        )
+        self.assertEqual(EnvoiMail.objects.filter(type_email=EnvoiMail.TypeEmail.RAPPEL).count(), 2)
+        self.assertEqual(CompteurNonLus.lire(prochaine.client.user_id)['notifications_non_lues'], 1)
+        prochaine.refresh_from_db()
+        self.assertIsNotNone(prochaine.rappel_envoye_le)
+
+    def test_traitement_par_lots(self):
+        modele = creer_reservation(scheduled_date=self.dans(hours=3))
+        Reservation.objects.bulk_create([
+            Reservation(
+                client=modele.client, provider=modele.provider, provider_service=modele.provider_service,
+                service_address=modele.service_address, description=modele.description,
+                scheduled_date=self.dans(minutes=10 + i)
+            )
+            for i in range(249)
+        ])
+
+        self.assertEqual(envoyer_rappels_reservations(taille_lot=100), 250)
 
-# Create your tests here.
+        self.assertEqual(Notification.objects.count(), 500)
+        self.assertFalse(Reservation.objects.filter(rappel_envoye_le__isnull=True).exists())
@@ -7,6 +7,7 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.db.models import Avg, Count
 from .models import NoteAvis
+from .tasks import auto_moderate_reviews
 
 
 @admin.register(NoteAvis)
@@ -52,7 +53,7 @@ class NoteAvisAdmin(admin.ModelAdmin):
     date_hierarchy = 'date_note'
     
     # Actions personnalisées
-    actions = ['approuver_avis', 'moderer_avis', 'masquer_avis', 'export_avis']
+    actions = ['approuver_avis', 'moderer_avis', 'masquer_avis', 'verifier_automatiquement', 'export_avis']
     
     def id_court(self, obj):
         """ID court."""
@@ -135,24 +136,39 @@ class NoteAvisAdmin(admin.ModelAdmin):
         return "Aucune réservation"
     reservation_details.short_description = "Détails réservation"
     
+    def delete_queryset(self, request, queryset):
+        """Suppression en masse en retirant les notes des prestataires."""
+        NoteAvis.supprimer_en_masse(queryset)
+    
     def approuver_avis(self, request, queryset):
         """Approuver les avis."""
-        updated = queryset.update(est_visible=True, est_modere=False, raison_moderation='')
+        updated = NoteAvis.changer_visibilite(queryset, True, est_modere=False, raison_moderation='')
         self.message_user(request, f"{updated} avis approuvé(s).")
     approuver_avis.short_description = "✅ Approuver"
     
     def moderer_avis(self, request, queryset):
         """Modérer les avis."""
-        updated = queryset.update(est_modere=True, est_visible=False)
+        updated = NoteAvis.changer_visibilite(queryset, False, est_modere=True)
         self.message_user(request, f"{updated} avis modéré(s).")
     moderer_avis.short_description = "🚫 Modérer"
     
     def masquer_avis(self, request, queryset):
         """Masquer les avis."""
-        updated = queryset.update(est_visible=False)
+        updated = NoteAvis.changer_visibilite(queryset, False)
         self.message_user(request, f"{updated} avis masqué(s).")
     masquer_avis.short_description = "👁️ Masquer"
     
+    def verifier_automatiquement(self, request, queryset):
+        """Repasser les avis au pré-filtre de modération (tâche Celery)."""
+        pks = [str(pk) for pk in queryset.values_list('pk', flat=True)]
+        auto_moderate_reviews.delay(pks)
+        self.message_user(
+            request,
+            f"Vérification automatique de {len(pks)} avis lancée : "
+            f"les avis enfreignant une règle seront modérés sous peu."
+        )
+    verifier_automatiquement.short_description = "🔍 Vérification automatique"
+    
     def export_avis(self, request, queryset):
         """Exporter les avis."""
         count = queryset.count()
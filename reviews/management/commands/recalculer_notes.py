@@ -0,0 +1,67 @@
+"""
+Commande de réparation des notes des prestataires.
+
+La somme et le nombre des notes sont tenus à jour de façon incrémentale ;
+cette commande les recalcule depuis les avis, par lots de profils, et
+corrige ceux qui ont dérivé (suppressions en cascade, modifications SQL...).
+La répartition des notes par destinataire est ensuite réécrite de même.
+"""
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import ProviderProfile
+from reviews.models import NoteAvis, RepartitionNotes
+
+
+class Command(BaseCommand):
+    help = "Recalcule la note moyenne des prestataires depuis leurs avis"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=1000,
+            help='Nombre de profils prestataires traités par lot'
+        )
+    
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+        
+        nb_profils = 0
+        nb_corriges = 0
+        dernier_id = None
+        
+        while True:
+            profils = ProviderProfile.objects.order_by('pk')
+            if dernier_id is not None:
+                profils = profils.filter(pk__gt=dernier_id)
+            lot = list(profils.values_list('pk', flat=True)[:taille_lot])
+            if not lot:
+                break
+            dernier_id = lot[-1]
+            
+            nb_profils += len(lot)
+            nb_corriges += ProviderProfile.recalculer_notes(ProviderProfile.objects.filter(pk__in=lot))
+        
+        nb_repartitions = 0
+        dernier_id = None
+        while True:
+            destinataires = NoteAvis.objects.values_list('destinataire_id', flat=True).distinct()
+            repartitions = RepartitionNotes.objects.values_list('pk', flat=True)
+            if dernier_id is not None:
+                destinataires = destinataires.filter(destinataire_id__gt=dernier_id)
+                repartitions = repartitions.filter(pk__gt=dernier_id)
+            # Destinataires d'avis et répartitions existantes, fusionnés par ordre d'identifiant
+            lot = sorted(
+                set(destinataires.order_by('destinataire_id')[:taille_lot]) |
+                set(repartitions.order_by('pk')[:taille_lot])
+            )[:taille_lot]
+            if not lot:
+                break
+            dernier_id = lot[-1]
+            nb_repartitions += RepartitionNotes.recalculer(lot)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"{nb_profils} profil(s) vérifié(s), {nb_corriges} note(s) corrigée(s), "
+            f"{nb_repartitions} répartition(s) recalculée(s)"
+        ))
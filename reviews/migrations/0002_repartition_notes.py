@@ -0,0 +1,49 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def remplir_repartitions(apps, schema_editor):
+    """Initialise la répartition des notes depuis les avis visibles existants."""
+    NoteAvis = apps.get_model('reviews', 'NoteAvis')
+    RepartitionNotes = apps.get_model('reviews', 'RepartitionNotes')
+    lignes = NoteAvis.objects.filter(est_visible=True).values('destinataire_id').annotate(
+        nb_avec_reponse=Count('pk', filter=~Q(reponse='')),
+        **{f'nb_notes_{note}': Count('pk', filter=Q(note=note)) for note in range(1, 6)}
+    ).order_by()
+    RepartitionNotes.objects.bulk_create([
+        RepartitionNotes(utilisateur_id=ligne.pop('destinataire_id'), **ligne) for ligne in lignes
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_note_incrementale'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepartitionNotes',
+            fields=[
+                ('utilisateur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='repartition_notes', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+                ('nb_notes_1', models.PositiveIntegerField(default=0, verbose_name='Notes 1 étoile')),
+                ('nb_notes_2', models.PositiveIntegerField(default=0, verbose_name='Notes 2 étoiles')),
+                ('nb_notes_3', models.PositiveIntegerField(default=0, verbose_name='Notes 3 étoiles')),
+                ('nb_notes_4', models.PositiveIntegerField(default=0, verbose_name='Notes 4 étoiles')),
+                ('nb_notes_5', models.PositiveIntegerField(default=0, verbose_name='Notes 5 étoiles')),
+                ('nb_avec_reponse', models.PositiveIntegerField(default=0, verbose_name='Avis avec réponse')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Répartition des notes',
+                'verbose_name_plural': 'Répartitions des notes',
+                'db_table': 'tabali_repartition_notes',
+            },
+        ),
+        migrations.RunPython(remplir_repartitions, migrations.RunPython.noop),
+    ]
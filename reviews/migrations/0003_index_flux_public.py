@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0002_repartition_notes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='noteavis',
+            index=models.Index(condition=models.Q(('est_visible', True)), fields=['destinataire', 'date_note', 'id_note'], name='avis_flux_public_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_index_flux_public'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noteavis',
+            name='date_verification_auto',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Date de vérification automatique'),
+        ),
+        migrations.AddField(
+            model_name='noteavis',
+            name='empreinte_contenu',
+            field=models.CharField(blank=True, db_index=True, help_text='Empreinte du commentaire normalisé, pour détecter les contenus dupliqués', max_length=32, verbose_name='Empreinte du commentaire'),
+        ),
+        migrations.AddIndex(
+            model_name='noteavis',
+            index=models.Index(condition=models.Q(('date_verification_auto__isnull', True)), fields=['date_note'], name='avis_a_verifier_idx'),
+        ),
+    ]
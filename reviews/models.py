@@ -4,11 +4,15 @@ Modèles pour la gestion des avis et notes - Application reviews.
 Basé sur le diagramme de base de données : Note-Avis.
 """
 
-from django.db import models
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import Greatest, Now
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
-from accounts.models import User
+from accounts.models import ProviderProfile, User
 from reservations.models import Reservation
+from historiques.audit import QuerySetAudite
 import uuid
 
 
@@ -73,6 +77,18 @@ class NoteAvis(models.Model):
         blank=True,
         help_text=_('Pourquoi cet avis a été modéré')
     )
+    empreinte_contenu = models.CharField(
+        _('Empreinte du commentaire'),
+        max_length=32,
+        blank=True,
+        db_index=True,
+        help_text=_('Empreinte du commentaire normalisé, pour détecter les contenus dupliqués')
+    )
+    date_verification_auto = models.DateTimeField(
+        _('Date de vérification automatique'),
+        null=True,
+        blank=True
+    )
     
     # Réponse du prestataire
     reponse = models.TextField(
@@ -86,24 +102,27 @@ class NoteAvis(models.Model):
         blank=True
     )
     
+    # Mises à jour groupées historisées (voir historiques.audit)
+    objects = QuerySetAudite.as_manager()
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # État tel que chargé, pour reporter les variations sur les agrégats dans save()
+        self._etat_initial = self._etat()
+        self._commentaire_initial = self.__dict__.get('commentaire')
+    
     # Méthodes du diagramme
     def ajouter(self):
         """Ajouter un nouvel avis."""
         self.save()
-        # Mettre à jour la note moyenne du destinataire
-        self._update_average_rating()
     
     def modifier(self):
         """Modifier un avis existant."""
         self.save()
-        self._update_average_rating()
     
     def supprimer(self):
         """Supprimer un avis."""
-        destinataire = self.destinataire
         self.delete()
-        # Recalculer la note moyenne après suppression
-        self._update_average_rating(destinataire)
     
     def rechercher(self):
         """Méthode de recherche (à implémenter dans les vues)."""
@@ -113,29 +132,138 @@ class NoteAvis(models.Model):
         """Méthode de listage (à implémenter dans les vues)."""
         pass
     
-    def _update_average_rating(self, user=None):
-        """Met à jour la note moyenne du prestataire."""
-        if not user:
-            user = self.destinataire
-            
-        if hasattr(user, 'provider_profile'):
-            # Calculer la nouvelle moyenne
-            avis_prestataire = NoteAvis.objects.filter(
-                destinataire=user,
-                type_avis=self.TypeAvis.CLIENT_VERS_PRESTATAIRE,
-                est_visible=True
-            )
-            
-            if avis_prestataire.exists():
-                moyenne = avis_prestataire.aggregate(
-                    models.Avg('note')
-                )['note__avg']
-                total_avis = avis_prestataire.count()
-                
-                # Mettre à jour le profil prestataire
-                user.provider_profile.average_rating = round(moyenne, 2)
-                user.provider_profile.total_reviews = total_avis
-                user.provider_profile.save()
+    def _etat(self):
+        """État de l'avis dont dépendent la note du prestataire et la répartition des notes."""
+        etat = self.__dict__
+        return (
+            etat.get('destinataire_id'), etat.get('note'), etat.get('type_avis'),
+            etat.get('est_visible'), bool(etat.get('reponse'))
+        )
+    
+    @classmethod
+    def _contributions_etat(cls, etat):
+        """Contribution d'un avis aux agrégats de son destinataire : {destinataire_id: {champ: valeur}}."""
+        if etat is None:
+            return {}
+        destinataire_id, note, type_avis, est_visible, avec_reponse = etat
+        if not est_visible or destinataire_id is None:
+            return {}
+        valeurs = {}
+        if note in range(1, 6):
+            valeurs[f'nb_notes_{note}'] = 1
+        if avec_reponse:
+            valeurs['nb_avec_reponse'] = 1
+        if type_avis == cls.TypeAvis.CLIENT_VERS_PRESTATAIRE:
+            valeurs.update(somme=note, nombre=1)
+        return {destinataire_id: valeurs}
+    
+    @staticmethod
+    def _appliquer_contributions(contributions, signe):
+        """Ajoute (signe=1) ou retire (signe=-1) des contributions aux agrégats des destinataires."""
+        for destinataire_id, valeurs in contributions.items():
+            variations = {champ: signe * valeur for champ, valeur in valeurs.items() if valeur}
+            somme, nombre = variations.pop('somme', 0), variations.pop('nombre', 0)
+            ProviderProfile.ajuster_notes(destinataire_id, somme=somme, nombre=nombre)
+            RepartitionNotes.ajuster(destinataire_id, variations)
+    
+    @classmethod
+    def _reporter_changement(cls, etat_avant, etat_apres):
+        """Reporte sur les agrégats le passage d'un état de l'avis à un autre."""
+        if etat_avant == etat_apres:
+            return
+        variations = {}
+        for contributions, signe in ((cls._contributions_etat(etat_avant), -1),
+                                     (cls._contributions_etat(etat_apres), 1)):
+            for destinataire_id, valeurs in contributions.items():
+                cumul = variations.setdefault(destinataire_id, {})
+                for champ, valeur in valeurs.items():
+                    cumul[champ] = cumul.get(champ, 0) + signe * valeur
+        cls._appliquer_contributions(variations, 1)
+    
+    @staticmethod
+    def cle_flux_public(destinataire_id):
+        """Clé de cache de la première page du flux public d'avis d'un utilisateur."""
+        return f"avis:flux-public:{destinataire_id}"
+    
+    @classmethod
+    def invalider_flux_public(cls, destinataire_ids):
+        """Invalide, après le commit, la première page en cache du flux public des destinataires."""
+        cles = [cls.cle_flux_public(destinataire_id) for destinataire_id in set(destinataire_ids) if destinataire_id]
+        if cles:
+            transaction.on_commit(lambda: cache.delete_many(cles))
+    
+    @classmethod
+    def flux_public(cls, destinataire_id):
+        """Avis visibles reçus par un utilisateur, du plus récent au plus ancien (index partiel dédié)."""
+        return cls.objects.filter(
+            destinataire_id=destinataire_id, est_visible=True
+        ).select_related('auteur').only(
+            'id_note', 'note', 'commentaire', 'date_note', 'reponse', 'date_reponse',
+            'auteur__first_name', 'auteur__last_name'
+        ).order_by('-date_note', '-id_note')
+    
+    @classmethod
+    def _contributions(cls, avis, est_visible=True):
+        """Contributions cumulées d'un ensemble d'avis, par destinataire, en une requête."""
+        client_vers_prestataire = Q(type_avis=cls.TypeAvis.CLIENT_VERS_PRESTATAIRE)
+        lignes = avis.filter(est_visible=est_visible).values('destinataire_id').annotate(
+            somme=Sum('note', filter=client_vers_prestataire),
+            nombre=Count('pk', filter=client_vers_prestataire),
+            nb_avec_reponse=Count('pk', filter=~Q(reponse='')),
+            **{champ: Count('pk', filter=Q(note=note)) for note, champ in RepartitionNotes.CHAMPS_NOTES}
+        ).order_by()
+        return {
+            ligne.pop('destinataire_id'): {champ: valeur or 0 for champ, valeur in ligne.items()}
+            for ligne in lignes
+        }
+    
+    @classmethod
+    def changer_visibilite(cls, queryset, est_visible, **champs):
+        """
+        Rend visibles ou masque un ensemble d'avis en une requête, en ajustant
+        les agrégats des seuls destinataires dont des avis changent réellement d'état.
+        
+        Returns:
+            int: nombre d'avis mis à jour
+        """
+        with transaction.atomic():
+            pks = list(queryset.select_for_update().values_list('pk', flat=True))
+            avis = cls.objects.filter(pk__in=pks)
+            # Contributions des seuls avis qui basculent, évaluées avant la mise à jour
+            contributions = cls._contributions(avis, est_visible=not est_visible)
+            nb_avis = avis.update(est_visible=est_visible, **champs)
+            cls._appliquer_contributions(contributions, 1 if est_visible else -1)
+            cls.invalider_flux_public(contributions)
+        return nb_avis
+    
+    @classmethod
+    def supprimer_en_masse(cls, queryset):
+        """Supprime un ensemble d'avis en retirant leurs contributions des agrégats."""
+        with transaction.atomic():
+            pks = list(queryset.select_for_update().values_list('pk', flat=True))
+            contributions = cls._contributions(cls.objects.filter(pk__in=pks))
+            resultat = cls.objects.filter(pk__in=pks).delete()
+            cls._appliquer_contributions(contributions, -1)
+            cls.invalider_flux_public(contributions)
+        return resultat
+    
+    @classmethod
+    def statistiques(cls, queryset):
+        """Statistiques d'un ensemble quelconque d'avis, en un seul agrégat conditionnel."""
+        agregats = queryset.aggregate(
+            total_avis=Count('pk'),
+            note_moyenne=Avg('note'),
+            total_avec_reponse=Count('pk', filter=~Q(reponse='')),
+            **{champ: Count('pk', filter=Q(note=note)) for note, champ in RepartitionNotes.CHAMPS_NOTES}
+        )
+        return {
+            'total_avis': agregats['total_avis'],
+            'note_moyenne': agregats['note_moyenne'] or 0,
+            'repartition_notes': {
+                f'{note}_etoiles': agregats[champ] for note, champ in RepartitionNotes.CHAMPS_NOTES
+            },
+            'total_avec_reponse': agregats['total_avec_reponse'],
+        }
     
     def clean(self):
         """Validation métier."""
@@ -163,21 +291,49 @@ class NoteAvis(models.Model):
             raise ValidationError("Un avis a déjà été donné pour cette réservation")
     
     def save(self, *args, **kwargs):
-        """Override save pour validation et mise à jour automatique."""
+        """Override save pour validation et mise à jour incrémentale de la note du prestataire."""
         # Déterminer automatiquement le type d'avis
-        if self.reservation:
-            if self.auteur == self.reservation.client.user:
+        if self.reservation_id:
+            client_id, prestataire_id = Reservation.objects.filter(
+                pk=self.reservation_id
+            ).values_list('client__user_id', 'provider__user_id').get()
+            if self.auteur_id == client_id:
                 self.type_avis = self.TypeAvis.CLIENT_VERS_PRESTATAIRE
-                self.destinataire = self.reservation.provider.user
-            elif self.auteur == self.reservation.provider.user:
+                self.destinataire_id = prestataire_id
+            elif self.auteur_id == prestataire_id:
                 self.type_avis = self.TypeAvis.PRESTATAIRE_VERS_CLIENT
-                self.destinataire = self.reservation.client.user
+                self.destinataire_id = client_id
         
-        super().save(*args, **kwargs)
+        if not self._state.adding and self.commentaire != self._commentaire_initial:
+            # Commentaire modifié : repasser par le pré-filtre de modération
+            self.date_verification_auto = None
+            self.empreinte_contenu = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], 'date_verification_auto', 'empreinte_contenu'
+                }
         
-        # Mettre à jour la note moyenne après sauvegarde
-        if self.type_avis == self.TypeAvis.CLIENT_VERS_PRESTATAIRE:
-            self._update_average_rating()
+        etat_avant = None if self._state.adding else self._etat_initial
+        etat_apres = self._etat()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._reporter_changement(etat_avant, etat_apres)
+            self._commentaire_initial = self.commentaire
+            # Toute modification d'un avis visible (ou qui le devient) change le flux public
+            self.invalider_flux_public(
+                etat[0] for etat in (etat_avant, etat_apres) if etat and etat[3]
+            )
+        self._etat_initial = etat_apres
+    
+    def delete(self, *args, **kwargs):
+        """Override delete pour retirer l'avis de la note du prestataire et de la répartition."""
+        with transaction.atomic():
+            resultat = super().delete(*args, **kwargs)
+            self._reporter_changement(self._etat_initial, None)
+            if self._etat_initial and self._etat_initial[3]:
+                self.invalider_flux_public([self._etat_initial[0]])
+        self._etat_initial = None
+        return resultat
     
     class Meta:
         verbose_name = _('Note et Avis')
@@ -192,6 +348,18 @@ class NoteAvis(models.Model):
             models.Index(fields=['reservation']),
             models.Index(fields=['-date_note']),
             models.Index(fields=['est_visible']),
+            # Avis en attente du pré-filtre de modération
+            models.Index(
+                fields=['date_note'],
+                condition=models.Q(date_verification_auto__isnull=True),
+                name='avis_a_verifier_idx'
+            ),
+            # Flux public des avis d'un utilisateur
+            models.Index(
+                fields=['destinataire', 'date_note', 'id_note'],
+                condition=models.Q(est_visible=True),
+                name='avis_flux_public_idx'
+            ),
         ]
     
     def __str__(self):
@@ -208,3 +376,132 @@ class NoteAvis(models.Model):
         if len(self.commentaire) > 150:
             return self.commentaire[:147] + "..."
         return self.commentaire
+
+
+
+class RepartitionNotes(models.Model):
+    """
+    Répartition dénormalisée des notes des avis visibles reçus par un utilisateur.
+    
+    Tenue à jour de façon incrémentale par ``NoteAvis`` (enregistrement,
+    suppression et opérations en masse) : statistiques et pages profil lisent
+    l'histogramme par clé primaire. Une ligne absente équivaut à aucun avis.
+    """
+    
+    # (note, champ) pour chaque nombre d'étoiles
+    CHAMPS_NOTES = tuple((note, f'nb_notes_{note}') for note in range(1, 6))
+    
+    utilisateur = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='repartition_notes',
+        verbose_name=_('Utilisateur')
+    )
+    nb_notes_1 = models.PositiveIntegerField(_('Notes 1 étoile'), default=0)
+    nb_notes_2 = models.PositiveIntegerField(_('Notes 2 étoiles'), default=0)
+    nb_notes_3 = models.PositiveIntegerField(_('Notes 3 étoiles'), default=0)
+    nb_notes_4 = models.PositiveIntegerField(_('Notes 4 étoiles'), default=0)
+    nb_notes_5 = models.PositiveIntegerField(_('Notes 5 étoiles'), default=0)
+    nb_avec_reponse = models.PositiveIntegerField(_('Avis avec réponse'), default=0)
+    date_mise_a_jour = models.DateTimeField(_('Dernière mise à jour'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Répartition des notes')
+        verbose_name_plural = _('Répartitions des notes')
+        db_table = 'tabali_repartition_notes'
+    
+    def __str__(self):
+        return f"Répartition des notes de {self.utilisateur_id}"
+    
+    @property
+    def total(self):
+        return sum(getattr(self, champ) for _, champ in self.CHAMPS_NOTES)
+    
+    @property
+    def moyenne(self):
+        total = self.total
+        if not total:
+            return 0
+        return sum(note * getattr(self, champ) for note, champ in self.CHAMPS_NOTES) / total
+    
+    @property
+    def statistiques(self):
+        """Statistiques au format de ``NoteAvis.statistiques``."""
+        return {
+            'total_avis': self.total,
+            'note_moyenne': self.moyenne,
+            'repartition_notes': {
+                f'{note}_etoiles': getattr(self, champ) for note, champ in self.CHAMPS_NOTES
+            },
+            'total_avec_reponse': self.nb_avec_reponse,
+        }
+    
+    @classmethod
+    def lire(cls, utilisateur_id):
+        """Statistiques de l'utilisateur (lecture par clé primaire)."""
+        repartition = cls.objects.filter(pk=utilisateur_id).first()
+        return (repartition or cls(utilisateur_id=utilisateur_id)).statistiques
+    
+    @classmethod
+    def ajuster(cls, utilisateur_id, variations):
+        """
+        Applique des deltas ({champ: delta}) à la répartition (à appeler dans
+        la transaction qui modifie les avis). Les compteurs ne descendent pas sous zéro.
+        """
+        variations = {champ: delta for champ, delta in variations.items() if delta}
+        if not variations:
+            return
+        valeurs = {
+            champ: Greatest(F(champ) + delta, 0, output_field=models.IntegerField())
+            for champ, delta in variations.items()
+        }
+        valeurs['date_mise_a_jour'] = Now()
+        if cls.objects.filter(pk=utilisateur_id).update(**valeurs):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    utilisateur_id=utilisateur_id,
+                    **{champ: max(delta, 0) for champ, delta in variations.items()}
+                )
+        except IntegrityError:
+            # Ligne créée en parallèle
+            cls.objects.filter(pk=utilisateur_id).update(**valeurs)
+    
+    @classmethod
+    def recalculer(cls, utilisateur_ids=None):
+        """
+        Recalcule depuis les avis la répartition des utilisateurs donnés (ou de
+        tous les destinataires d'avis), pour réparer une dérive.
+        
+        Returns:
+            int: nombre de répartitions réécrites
+        """
+        avis = NoteAvis.objects.all()
+        if utilisateur_ids is not None:
+            utilisateur_ids = set(utilisateur_ids)
+            avis = avis.filter(destinataire_id__in=utilisateur_ids)
+        contributions = NoteAvis._contributions(avis)
+        if utilisateur_ids is None:
+            utilisateur_ids = set(contributions) | set(cls.objects.values_list('pk', flat=True))
+        
+        champs = [champ for _, champ in cls.CHAMPS_NOTES] + ['nb_avec_reponse']
+        repartitions = [
+            cls(utilisateur_id=utilisateur_id, **{
+                champ: contributions.get(utilisateur_id, {}).get(champ, 0) for champ in champs
+            })
+            for utilisateur_id in utilisateur_ids
+        ]
+        with transaction.atomic():
+            existants = set(cls.objects.select_for_update().filter(
+                pk__in=utilisateur_ids
+            ).values_list('pk', flat=True))
+            cls.objects.bulk_update(
+                [r for r in repartitions if r.utilisateur_id in existants], champs, batch_size=1000
+            )
+            cls.objects.bulk_create(
+                [r for r in repartitions if r.utilisateur_id not in existants],
+                ignore_conflicts=True, batch_size=1000
+            )
+        return len(repartitions)
@@ -0,0 +1,187 @@
+"""
+Modération des avis en masse et pré-filtre automatique.
+
+Les décisions de modération s'appliquent à un ensemble d'avis en une seule
+requête (``NoteAvis.changer_visibilite``) : la note et la répartition des
+notes de chaque destinataire concerné ne sont ajustées qu'une fois.
+
+Le pré-filtre examine les avis pas encore vérifiés et modère ceux qui
+enfreignent une règle :
+
+- termes interdits (``TABALI_SETTINGS['REVIEWS_BANNED_TERMS']``), recherchés
+  dans le commentaire normalisé (minuscules, sans accents ni ponctuation) ;
+- contenu dupliqué : même empreinte du commentaire normalisé partagée par au
+  moins ``REVIEWS_AUTOMOD_DUPLICATE_THRESHOLD`` avis (les commentaires plus
+  courts que ``REVIEWS_AUTOMOD_MIN_DUPLICATE_LENGTH`` ne sont pas comparés).
+
+L'analyse des textes est répartie sur un pool de ``REVIEWS_AUTOMOD_WORKERS``
+processus ; dans un worker Celery (processus démon, qui ne peut pas créer de
+processus enfants), un pool de threads est utilisé à la place.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import NoteAvis
+
+logger = logging.getLogger(__name__)
+
+# Décision -> (est_visible, champs mis à jour)
+DECISIONS = {
+    'approuver': (True, {'est_modere': False, 'raison_moderation': ''}),
+    'moderer': (False, {'est_modere': True}),
+    'masquer': (False, {}),
+}
+
+RAISON_TERMES_INTERDITS = "Modération automatique : termes interdits"
+RAISON_DOUBLON = "Modération automatique : contenu dupliqué"
+
+
+def moderer_en_masse(queryset, decision, raison=''):
+    """
+    Applique une décision de modération à un ensemble d'avis.
+
+    Returns:
+        int: nombre d'avis mis à jour
+    """
+    est_visible, champs = DECISIONS[decision]
+    champs = dict(champs)
+    if raison and decision != 'approuver':
+        champs['raison_moderation'] = raison
+    return NoteAvis.changer_visibilite(queryset, est_visible, **champs)
+
+
+def normaliser(texte):
+    """Texte en minuscules, sans accents ni ponctuation, espaces réduits."""
+    texte = unicodedata.normalize('NFKD', texte or '')
+    texte = ''.join(caractere for caractere in texte if not unicodedata.combining(caractere))
+    return re.sub(r'[\W_]+', ' ', texte.lower()).strip()
+
+
+# Règles compilées une fois par worker (voir _initialiser)
+_motif_termes = None
+_longueur_min = 0
+
+
+def _initialiser(termes, longueur_min):
+    global _motif_termes, _longueur_min
+    termes = [normaliser(terme) for terme in termes if normaliser(terme)]
+    _motif_termes = re.compile(
+        r'\b(?:' + '|'.join(re.escape(terme) for terme in termes) + r')\b'
+    ) if termes else None
+    _longueur_min = longueur_min
+
+
+def _analyser(lignes):
+    """
+    Analyse un lot de (pk, commentaire).
+
+    Returns:
+        list: (pk, empreinte, terme_interdit ou None)
+    """
+    resultats = []
+    for pk, commentaire in lignes:
+        texte = normaliser(commentaire)
+        empreinte = ''
+        if len(texte) >= _longueur_min:
+            empreinte = hashlib.blake2b(texte.encode('utf-8'), digest_size=16).hexdigest()
+        trouve = _motif_termes.search(texte) if _motif_termes else None
+        resultats.append((pk, empreinte, trouve.group(0) if trouve else None))
+    return resultats
+
+
+def _pool(nb_workers, initargs):
+    if multiprocessing.current_process().daemon:
+        return ThreadPoolExecutor(nb_workers, initializer=_initialiser, initargs=initargs)
+    return ProcessPoolExecutor(nb_workers, initializer=_initialiser, initargs=initargs)
+
+
+def _lots_a_verifier(pks, taille_lot):
+    """Lots de (pk, commentaire) : les avis donnés, sinon ceux jamais vérifiés."""
+    if pks is not None:
+        pks = list(pks)
+        for debut in range(0, len(pks), taille_lot):
+            yield list(NoteAvis.objects.filter(
+                pk__in=pks[debut:debut + taille_lot]
+            ).values_list('pk', 'commentaire'))
+        return
+    while True:
+        lot = list(NoteAvis.objects.filter(
+            date_verification_auto__isnull=True
+        ).order_by('date_note').values_list('pk', 'commentaire')[:taille_lot])
+        if not lot:
+            return
+        yield lot
+
+
+def prefiltrer(pks=None):
+    """
+    Passe les avis au pré-filtre et modère ceux qui enfreignent une règle.
+
+    Args:
+        pks: avis à (re)vérifier ; par défaut, tous ceux jamais vérifiés
+
+    Returns:
+        dict: bilan (verifies, termes_interdits, doublons)
+    """
+    tabali_settings = settings.TABALI_SETTINGS
+    taille_lot = tabali_settings.get('REVIEWS_AUTOMOD_BATCH_SIZE', 2000)
+    nb_workers = max(tabali_settings.get('REVIEWS_AUTOMOD_WORKERS', 4), 1)
+    seuil = tabali_settings.get('REVIEWS_AUTOMOD_DUPLICATE_THRESHOLD', 3)
+    initargs = (
+        tabali_settings.get('REVIEWS_BANNED_TERMS', []),
+        tabali_settings.get('REVIEWS_AUTOMOD_MIN_DUPLICATE_LENGTH', 20),
+    )
+
+    bilan = {'verifies': 0, 'termes_interdits': 0, 'doublons': 0}
+    with _pool(nb_workers, initargs) as pool:
+        for lot in _lots_a_verifier(pks, taille_lot):
+            if not lot:
+                continue
+            taille_part = -(-len(lot) // nb_workers)
+            parts = [lot[debut:debut + taille_part] for debut in range(0, len(lot), taille_part)]
+            resultats = [resultat for part in pool.map(_analyser, parts) for resultat in part]
+
+            maintenant = timezone.now()
+            with transaction.atomic():
+                NoteAvis.objects.bulk_update([
+                    NoteAvis(pk=pk, empreinte_contenu=empreinte, date_verification_auto=maintenant)
+                    for pk, empreinte, _ in resultats
+                ], ['empreinte_contenu', 'date_verification_auto'], batch_size=500)
+
+                interdits = [pk for pk, _, terme in resultats if terme]
+                if interdits:
+                    bilan['termes_interdits'] += moderer_en_masse(
+                        NoteAvis.objects.filter(pk__in=interdits, est_visible=True),
+                        'moderer', RAISON_TERMES_INTERDITS
+                    )
+
+                # Empreintes du lot partagées par trop d'avis : toutes leurs copies visibles sont modérées
+                empreintes = {empreinte for _, empreinte, _ in resultats if empreinte}
+                dupliquees = list(
+                    NoteAvis.objects.filter(empreinte_contenu__in=empreintes)
+                    .values('empreinte_contenu').annotate(nombre=Count('pk'))
+                    .filter(nombre__gte=seuil).values_list('empreinte_contenu', flat=True)
+                ) if empreintes else []
+                if dupliquees:
+                    bilan['doublons'] += moderer_en_masse(
+                        NoteAvis.objects.filter(empreinte_contenu__in=dupliquees, est_visible=True),
+                        'moderer', RAISON_DOUBLON
+                    )
+            bilan['verifies'] += len(resultats)
+
+    if bilan['verifies']:
+        logger.info(
+            f"Pré-filtre des avis : {bilan['verifies']} vérifié(s), "
+            f"{bilan['termes_interdits']} pour termes interdits, {bilan['doublons']} pour doublons"
+        )
+    return bilan
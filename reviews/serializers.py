@@ -156,4 +156,26 @@ class NoteAvisModerationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = NoteAvis
-        fields = ['est_visible', 'est_modere', 'raison_moderation'] 
\ No newline at end of file
+        fields = ['est_visible', 'est_modere', 'raison_moderation'] 
+
+
+class NoteAvisModerationMasseSerializer(serializers.Serializer):
+    """Serializer pour la modération de plusieurs avis à la fois (admin uniquement)."""
+    
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+    decision = serializers.ChoiceField(choices=['approuver', 'moderer', 'masquer'])
+    raison_moderation = serializers.CharField(required=False, allow_blank=True, default='')
+
+class NoteAvisPublicSerializer(serializers.ModelSerializer):
+    """Serializer allégé du flux public des avis (page profil)."""
+    
+    auteur_nom = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = NoteAvis
+        fields = ['id_note', 'note', 'commentaire', 'date_note', 'auteur_nom', 'reponse', 'date_reponse']
+    
+    def get_auteur_nom(self, obj):
+        """Prénom et initiale du nom de l'auteur."""
+        initiale = f" {obj.auteur.last_name[:1]}." if obj.auteur.last_name else ""
+        return f"{obj.auteur.first_name}{initiale}"
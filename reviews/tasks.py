@@ -0,0 +1,23 @@
+"""
+Tâches asynchrones pour l'application reviews.
+"""
+
+import logging
+
+from celery import shared_task
+
+from .moderation import prefiltrer
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def auto_moderate_reviews(pks=None):
+    """
+    Passe les avis au pré-filtre de modération.
+
+    Args:
+        pks: avis à revérifier (action d'administration) ; par défaut, les
+            nouveaux avis
+    """
+    return prefiltrer(pks)
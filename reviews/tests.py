@@ -1,3 +1,288 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import ProviderProfile
+from tabali_platform.utils.fabriques import creer_reservation, creer_utilisateur, reglages
+
+from . import moderation
+from .models import NoteAvis, RepartitionNotes
+from .tasks import auto_moderate_reviews
+
+
+def publier_avis(reservation, note, commentaire='Commentaire', auteur=None):
+    return NoteAvis.objects.create(
+        reservation=reservation, auteur=auteur or reservation.client.user, note=note, commentaire=commentaire
+    )
+
+
+class NotesPrestatairesTests(TestCase):
+    """Maintien incrémental de la note moyenne des prestataires."""
+
+    def setUp(self):
+        self.prestataire = creer_utilisateur('provider')
+        self.reservations = [creer_reservation(prestataire=self.prestataire) for _ in range(3)]
+
+    def etat(self):
+        profil = ProviderProfile.objects.get(user=self.prestataire)
+        return profil.rating_sum, profil.total_reviews, profil.average_rating
+
+    def test_creation_et_modification(self):
+        premier = NoteAvis(reservation=self.reservations[0], auteur=self.reservations[0].client.user, note=5,
+                          commentaire='Parfait')
+        # Cache des types de contenu (historique) vide : nombre de requêtes stable
+        ContentType.objects.clear_cache()
+        with self.assertNumQueries(10):
+            premier.save()
+        second = publier_avis(self.reservations[1], 2)
+        self.assertEqual(self.etat(), (7, 2, Decimal('3.50')))
+
+        second = NoteAvis.objects.get(pk=second.pk)
+        second.note = 4
+        second.save()
+        self.assertEqual(self.etat(), (9, 2, Decimal('4.50')))
+
+        second.est_visible = False
+        second.save()
+        second.save()
+        self.assertEqual(self.etat(), (5, 1, Decimal('5.00')))
+
+        second.delete()
+        self.assertEqual(self.etat(), (5, 1, Decimal('5.00')))
+
+    def test_operations_en_masse(self):
+        premier = publier_avis(self.reservations[0], 5)
+        publier_avis(self.reservations[1], 4)
+
+        NoteAvis.changer_visibilite(NoteAvis.objects.filter(pk=premier.pk), False, est_modere=True)
+        self.assertEqual(self.etat(), (4, 1, Decimal('4.00')))
+        NoteAvis.changer_visibilite(NoteAvis.objects.all(), True)
+        NoteAvis.changer_visibilite(NoteAvis.objects.all(), True)
+        self.assertEqual(self.etat(), (9, 2, Decimal('4.50')))
+
+        NoteAvis.supprimer_en_masse(NoteAvis.objects.filter(pk=premier.pk))
+        self.assertEqual(self.etat(), (4, 1, Decimal('4.00')))
+
+    def test_avis_sur_un_client_ignore(self):
+        publier_avis(self.reservations[0], 1, auteur=self.prestataire)
+
+        self.assertEqual(self.etat(), (0, 0, Decimal('0')))
+
+    def test_recalcul(self):
+        publier_avis(self.reservations[0], 5)
+        ProviderProfile.objects.update(rating_sum=50, total_reviews=3, average_rating=1)
+
+        call_command('recalculer_notes', stdout=StringIO())
+        call_command('recalculer_notes', stdout=StringIO())
+
+        self.assertEqual(self.etat(), (5, 1, Decimal('5.00')))
+        profil = ProviderProfile.objects.get(user=self.prestataire)
+        profil.update_rating(1)
+        self.assertEqual(self.etat(), (6, 2, Decimal('3.00')))
+
+
+class RepartitionNotesTests(TestCase):
+    """Répartition dénormalisée des notes reçues par utilisateur."""
+
+    URL_STATISTIQUES = '/api/v1/reviews/api/avis/statistiques/'
+
+    def setUp(self):
+        self.prestataire = creer_utilisateur('provider')
+        self.reservations = [creer_reservation(prestataire=self.prestataire) for _ in range(4)]
+        self.avis = [
+            publier_avis(reservation, note) for reservation, note in zip(self.reservations, (5, 5, 3, 1))
+        ]
+
+    def repartition(self, utilisateur_id=None):
+        return RepartitionNotes.lire(utilisateur_id or self.prestataire.pk)
+
+    def test_repartition_maintenue(self):
+        statistiques = self.repartition()
+        self.assertEqual(
+            statistiques['repartition_notes'],
+            {'1_etoiles': 1, '2_etoiles': 0, '3_etoiles': 1, '4_etoiles': 0, '5_etoiles': 2}
+        )
+        self.assertEqual(statistiques['note_moyenne'], 3.5)
+
+        avis = NoteAvis.objects.get(pk=self.avis[3].pk)
+        avis.reponse = 'Merci'
+        avis.note = 2
+        avis.save()
+        repartition = self.repartition()['repartition_notes']
+        self.assertEqual((repartition['1_etoiles'], repartition['2_etoiles']), (0, 1))
+        self.assertEqual(self.repartition()['total_avec_reponse'], 1)
+
+        NoteAvis.changer_visibilite(NoteAvis.objects.filter(note=5), False)
+        self.assertEqual(self.repartition()['total_avis'], 2)
+        NoteAvis.supprimer_en_masse(NoteAvis.objects.filter(note=2))
+        self.assertEqual(self.repartition()['total_avec_reponse'], 0)
+
+    def test_avis_sur_un_client(self):
+        client = self.reservations[0].client.user
+
+        publier_avis(self.reservations[0], 4, auteur=self.prestataire)
+
+        self.assertEqual(self.repartition(client.pk)['total_avis'], 1)
+        self.assertEqual(self.repartition()['total_avis'], 4)
+
+    def test_recalcul(self):
+        publier_avis(self.reservations[0], 4, auteur=self.prestataire)
+        utilisateurs = [self.prestataire.pk, self.reservations[0].client.user_id]
+        attendu = {utilisateur: self.repartition(utilisateur) for utilisateur in utilisateurs}
+        RepartitionNotes.objects.update(nb_notes_3=9)
+
+        call_command('recalculer_notes', '--taille-lot', '1', stdout=StringIO())
+
+        self.assertEqual({utilisateur: self.repartition(utilisateur) for utilisateur in utilisateurs}, attendu)
+
+    def test_statistiques_en_une_requete(self):
+        api = APIClient()
+        api.force_authenticate(self.prestataire)
+
+        with self.assertNumQueries(1):
+            reponse = api.get(self.URL_STATISTIQUES, {'user_id': self.prestataire.pk})
+        self.assertEqual(reponse.data['total_avis'], 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(api.get(self.URL_STATISTIQUES).data['total_avis'], 4)
+
+    def test_identifiant_invalide(self):
+        api = APIClient()
+        api.force_authenticate(self.prestataire)
+
+        self.assertEqual(api.get(self.URL_STATISTIQUES, {'user_id': 'invalide'}).status_code, 400)
+
+
+@reglages(REVIEWS_PUBLIC_PAGE_SIZE=2, AUDIT_BUFFERED=False)
+class FluxPublicAvisTests(TestCase):
+    """Flux public des avis reçus, en cache et invalidé au commit."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.prestataire = creer_utilisateur('provider')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.avis = [
+                publier_avis(creer_reservation(prestataire=self.prestataire), 4, f'Commentaire {i}')
+                for i in range(3)
+            ]
+        self.url = f'/api/v1/reviews/api/avis/public/{self.prestataire.pk}/'
+        self.api = APIClient()
+
+    def test_pagination_en_cache(self):
+        with self.assertNumQueries(1):
+            premiere_page = self.api.get(self.url).json()
+        self.assertEqual(len(premiere_page['results']), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(self.url).json(), premiere_page)
+
+        seconde_page = self.api.get(self.url, {'curseur': premiere_page['suivant']}).json()
+
+        self.assertEqual(len(seconde_page['results']), 1)
+        self.assertIsNone(seconde_page['suivant'])
+
+    def test_invalidation(self):
+        self.api.get(self.url)
+        avis = NoteAvis.objects.get(pk=self.avis[2].pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            avis.commentaire = 'Modifié'
+            avis.save()
+        self.assertEqual(self.api.get(self.url).json()['results'][0]['commentaire'], 'Modifié')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NoteAvis.changer_visibilite(NoteAvis.objects.filter(pk=avis.pk), False)
+        self.assertNotIn('Modifié', str(self.api.get(self.url).json()))
+
+    def test_requetes_invalides(self):
+        self.assertEqual(self.api.get('/api/v1/reviews/api/avis/public/inconnu/').status_code, 404)
+        self.assertEqual(self.api.get(self.url, {'curseur': '!!'}).status_code, 400)
+
+
+@reglages(REVIEWS_BANNED_TERMS=['arnaque'], REVIEWS_AUTOMOD_WORKERS=2, REVIEWS_AUTOMOD_BATCH_SIZE=3)
+class ModerationTests(TestCase):
+    """Modération en masse et pré-filtrage automatique des avis."""
+
+    URL_MODERATION = '/api/v1/reviews/api/avis/moderer-en-masse/'
+
+    def setUp(self):
+        self.prestataire = creer_utilisateur('provider')
+
+    def publier(self, *commentaires):
+        return [
+            publier_avis(creer_reservation(prestataire=self.prestataire), 5, commentaire)
+            for commentaire in commentaires
+        ]
+
+    def test_prefiltrage(self):
+        avis = self.publier(
+            'Très bien', 'Quelle ARNAQUE !', 'Service impeccable et rapide, merci',
+            'service impeccable, et rapide. Merci!', 'Service IMPÉCCABLE et rapide merci', 'Correct'
+        )
+
+        bilan = moderation.prefiltrer()
+
+        self.assertEqual(bilan, {'verifies': 6, 'termes_interdits': 1, 'doublons': 3})
+        self.assertEqual(NoteAvis.objects.filter(est_visible=True).count(), 2)
+        self.assertFalse(NoteAvis.objects.filter(date_verification_auto__isnull=True).exists())
+        self.assertEqual(ProviderProfile.objects.get(user=self.prestataire).total_reviews, 2)
+        self.assertEqual(RepartitionNotes.objects.get(pk=self.prestataire.pk).total, 2)
+        self.assertEqual(moderation.prefiltrer()['verifies'], 0)
+        self.assertEqual(moderation.prefiltrer([avis[5].pk])['verifies'], 1)
+
+    def test_avis_modifie_reverifie(self):
+        avis, = self.publier('Très bien')
+        moderation.prefiltrer()
+
+        avis.commentaire = 'Une arnaque'
+        avis.save(update_fields=['commentaire'])
+
+        avis.refresh_from_db()
+        self.assertIsNone(avis.date_verification_auto)
+        self.assertEqual(moderation.prefiltrer()['termes_interdits'], 1)
+
+    def test_moderation_en_masse(self):
+        avis = self.publier('Premier', 'Deuxième', 'Troisième')
+        api = APIClient()
+        api.force_authenticate(creer_utilisateur('admin', is_staff=True))
+
+        reponse = api.post(
+            self.URL_MODERATION,
+            {'ids': [str(a.pk) for a in avis[:2]], 'decision': 'moderer', 'raison_moderation': 'Spam'},
+            format='json'
+        )
+
+        self.assertEqual(reponse.json(), {'avis_mis_a_jour': 2})
+        self.assertEqual(ProviderProfile.objects.get(user=self.prestataire).total_reviews, 1)
+        self.assertEqual(NoteAvis.objects.get(pk=avis[0].pk).raison_moderation, 'Spam')
+        api.post(self.URL_MODERATION, {'ids': [str(avis[0].pk)], 'decision': 'approuver'}, format='json')
+        self.assertEqual(ProviderProfile.objects.get(user=self.prestataire).total_reviews, 2)
+        self.assertEqual(api.post(self.URL_MODERATION, {'ids': [], 'decision': 'x'}, format='json').status_code, 400)
+
+    def test_moderation_reservee_au_staff(self):
+        avis, = self.publier('Premier')
+        api = APIClient()
+        api.force_authenticate(avis.auteur)
+
+        reponse = api.post(self.URL_MODERATION, {'ids': [str(avis.pk)], 'decision': 'masquer'}, format='json')
+
+        self.assertEqual(reponse.status_code, 403)
+
+    def test_action_admin_en_tache_celery(self):
+        avis, = self.publier('Premier')
+        self.client.force_login(creer_utilisateur('admin', is_staff=True, is_superuser=True))
+
+        with mock.patch('reviews.admin.auto_moderate_reviews.delay') as planifier:
+            reponse = self.client.post(
+                '/admin/reviews/noteavis/',
+                {'action': 'verifier_automatiquement', '_selected_action': [str(avis.pk)]}
+            )
 
-# Create your tests here.
+        self.assertEqual(reponse.status_code, 302)
+        planifier.assert_called_once_with([str(avis.pk)])
+        self.assertEqual(auto_moderate_reviews([str(avis.pk)])['verifies'], 1)
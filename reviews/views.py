@@ -2,8 +2,11 @@
 Vues pour l'application reviews.
 """
 
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
-from django.db.models import Avg
 from rest_framework import viewsets, status, filters, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -12,11 +15,14 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
-from .models import NoteAvis
+from .models import NoteAvis, RepartitionNotes
 from .serializers import (
     NoteAvisSerializer, NoteAvisCreateSerializer, NoteAvisUpdateSerializer,
-    NoteAvisReponseSerializer, NoteAvisModerationSerializer
+    NoteAvisReponseSerializer, NoteAvisModerationSerializer, NoteAvisPublicSerializer,
+    NoteAvisModerationMasseSerializer
 )
+from .moderation import moderer_en_masse
+from messaging.pagination import decoder_position, encoder_position, filtrer_avant_position
 
 
 @extend_schema_view(
@@ -72,6 +78,8 @@ class NoteAvisViewSet(viewsets.ModelViewSet):
             return NoteAvisReponseSerializer
         elif self.action == 'moderer':
             return NoteAvisModerationSerializer
+        elif self.action == 'moderer_en_masse':
+            return NoteAvisModerationMasseSerializer
         return NoteAvisSerializer
     
     def get_queryset(self):
@@ -182,6 +190,74 @@ class NoteAvisViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(avis, many=True)
         return Response(serializer.data)
     
+    @staticmethod
+    def _page_publique(user_id, position=None):
+        """Page du flux public : {'results': [...], 'suivant': curseur ou None}."""
+        taille = settings.TABALI_SETTINGS.get('REVIEWS_PUBLIC_PAGE_SIZE', 20)
+        avis = NoteAvis.flux_public(user_id)
+        if position is not None:
+            avis = filtrer_avant_position(avis, position, 'date_note', 'id_note')
+        # Un élément de plus pour savoir s'il existe une page suivante
+        page = list(avis[:taille + 1])
+        suivant = None
+        if len(page) > taille:
+            page = page[:taille]
+            suivant = encoder_position(page[-1].date_note, page[-1].id_note)
+        return {'results': NoteAvisPublicSerializer(page, many=True).data, 'suivant': suivant}
+    
+    @extend_schema(
+        summary="Flux public des avis",
+        description=(
+            "Avis visibles reçus par un utilisateur, du plus récent au plus ancien. "
+            "La première page est mise en cache ; les suivantes s'obtiennent avec "
+            "le paramètre curseur renvoyé dans 'suivant'."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name='user_id',
+                type=OpenApiTypes.UUID,
+                location=OpenApiParameter.PATH,
+                description='ID de l\'utilisateur'
+            ),
+            OpenApiParameter(
+                name='curseur',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Curseur de la page suivante'
+            )
+        ],
+        tags=["Avis et Notes"]
+    )
+    @action(
+        detail=False, methods=['get'], url_path='public/(?P<user_id>[0-9a-fA-F-]+)',
+        permission_classes=[AllowAny], pagination_class=None
+    )
+    def flux_public(self, request, user_id=None):
+        """Flux public des avis d'un utilisateur (page profil)."""
+        try:
+            user_id = uuid.UUID(str(user_id))
+        except ValueError:
+            return Response(
+                {'error': 'Identifiant utilisateur invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        curseur = request.query_params.get('curseur')
+        if curseur:
+            try:
+                position = decoder_position(curseur)
+            except ValueError:
+                return Response({'error': 'Curseur invalide'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(self._page_publique(user_id, position))
+        
+        # Première page : en cache, invalidée à chaque modification d'un avis visible
+        cle = NoteAvis.cle_flux_public(user_id)
+        page = cache.get(cle)
+        if page is None:
+            page = self._page_publique(user_id)
+            cache.set(cle, page, settings.TABALI_SETTINGS.get('REVIEWS_PUBLIC_CACHE_TIMEOUT', 300))
+        return Response(page)
+    
     @extend_schema(
         summary="Répondre à un avis",
         description="Permet au destinataire d'un avis de répondre",
@@ -220,6 +296,26 @@ class NoteAvisViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @extend_schema(
+        summary="Modérer des avis en masse",
+        description="Applique une décision de modération à plusieurs avis en une fois (admin uniquement)",
+        tags=["Avis et Notes"]
+    )
+    @action(
+        detail=False, methods=['post'], url_path='moderer-en-masse',
+        permission_classes=[permissions.IsAdminUser]
+    )
+    def moderer_en_masse(self, request):
+        """Modérer plusieurs avis (admin uniquement)."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        donnees = serializer.validated_data
+        nombre = moderer_en_masse(
+            NoteAvis.objects.filter(pk__in=donnees['ids']),
+            donnees['decision'], donnees['raison_moderation']
+        )
+        return Response({'avis_mis_a_jour': nombre})
+    
     @extend_schema(
         summary="Statistiques des avis",
         description="Statistiques sur les avis d'un utilisateur",
@@ -237,23 +333,19 @@ class NoteAvisViewSet(viewsets.ModelViewSet):
     def statistiques(self, request):
         """Statistiques des avis."""
         user_id = request.query_params.get('user_id')
-        queryset = self.get_queryset().filter(est_visible=True)
         
         if user_id:
-            queryset = queryset.filter(destinataire_id=user_id)
-        
-        stats = {
-            'total_avis': queryset.count(),
-            'note_moyenne': queryset.aggregate(Avg('note'))['note__avg'] or 0,
-            'repartition_notes': {},
-            'total_avec_reponse': queryset.exclude(reponse='').count(),
-        }
-        
-        # Répartition par note
-        for i in range(1, 6):
-            stats['repartition_notes'][f'{i}_etoiles'] = queryset.filter(note=i).count()
+            try:
+                user_id = uuid.UUID(user_id)
+            except ValueError:
+                return Response(
+                    {'error': 'Identifiant utilisateur invalide'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Répartition dénormalisée : une lecture par clé primaire
+            return Response(RepartitionNotes.lire(user_id))
         
-        return Response(stats)
+        return Response(NoteAvis.statistiques(self.get_queryset().filter(est_visible=True)))
     
     @extend_schema(
         summary="Mes avis donnés",
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'services'
+    
+    def ready(self):
+        from tabali_platform.utils.cache import suivre_versions_vues
+        
+        from . import views
+        
+        # Les réponses en cache des vues du catalogue sont invalidées à chaque modification
+        vues = [views.CategoryViewSet, views.ServiceViewSet, views.ProviderServiceViewSet, views.ServiceImageViewSet]
+        suivre_versions_vues(*vues)
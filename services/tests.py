@@ -1,3 +1,114 @@
+import uuid
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import ProviderProfile, User
+from tabali_platform.utils.cache import versions
+from tabali_platform.utils.fabriques import creer_utilisateur
+
+from .models import Category
+
+URL_SERVICES = '/api/v1/services/api/'
+URL_CATEGORIES = f'{URL_SERVICES}categories/'
+
+
+class ReponsesEnCacheTests(TestCase):
+    """Réponses en lecture du catalogue servies depuis le cache, avec ETag."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.categorie = Category.objects.create(name='Ménage', slug='menage')
+        Category.objects.create(name='Vitres', slug='vitres', parent=self.categorie)
+        self.api = APIClient()
+
+    def test_liste_en_cache(self):
+        premiere = self.api.get(URL_CATEGORIES)
+        self.assertEqual(premiere.status_code, 200)
+
+        with self.assertNumQueries(0):
+            seconde = self.api.get(URL_CATEGORIES)
+
+        self.assertEqual(seconde.json(), premiere.json())
+        self.assertEqual(seconde['ETag'], premiere['ETag'])
+
+    def test_etag_correspondant(self):
+        etag = self.api.get(URL_CATEGORIES)['ETag']
+
+        with self.assertNumQueries(0):
+            reponse = self.api.get(URL_CATEGORIES, HTTP_IF_NONE_MATCH=f'W/{etag}')
+
+        self.assertEqual(reponse.status_code, 304)
+
+    def test_parametres_normalises(self):
+        reponse = self.api.get(f'{URL_CATEGORIES}?search=&ordering=name')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(f'{URL_CATEGORIES}?ordering=name')['ETag'], reponse['ETag'])
+
+    def test_invalidation_au_commit(self):
+        etag = self.api.get(URL_CATEGORIES)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Jardin', slug='jardin')
+
+        reponse = self.api.get(URL_CATEGORIES, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+        self.assertEqual(reponse.json()['count'], 3)
+
+    def test_detail_et_actions(self):
+        url_detail = f'{URL_CATEGORIES}{self.categorie.pk}/'
+        detail = self.api.get(url_detail).json()
+        parents = self.api.get(f'{URL_CATEGORIES}parents/').json()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(url_detail).json(), detail)
+            self.assertEqual(self.api.get(f'{URL_CATEGORIES}parents/').json(), parents)
+        self.assertEqual([categorie['slug'] for categorie in parents], ['menage'])
+
+    def test_erreurs_non_mises_en_cache(self):
+        url = f'{URL_CATEGORIES}{uuid.UUID(int=0)}/'
+
+        self.assertEqual(self.api.get(url).status_code, 404)
+        self.assertEqual(self.api.get(url).status_code, 404)
+        self.assertFalse(self.api.get(url).has_header('ETag'))
+
+    def test_autres_vues_du_catalogue(self):
+        for vue in ('services/', 'service-images/', 'provider-services/'):
+            with self.subTest(vue=vue):
+                self.assertEqual(self.api.get(f'{URL_SERVICES}{vue}').status_code, 200)
+
+
+class VersionsModelesTests(TestCase):
+    """Versions des modèles dont dépendent les réponses en cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_mise_a_jour_groupee_des_notes(self):
+        prestataire = creer_utilisateur('provider')
+        version = versions([ProviderProfile])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProviderProfile.ajuster_notes(prestataire.pk, somme=3, nombre=1)
+
+        self.assertNotEqual(versions([ProviderProfile]), version)
+
+    def test_champs_non_affiches_ignores(self):
+        utilisateur = User.objects.create_user(username='alice', email='alice@exemple.fr', password='MotDePasse123')
+        version = versions([User])
+
+        utilisateur.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            utilisateur.save(update_fields=['last_login'])
+        self.assertEqual(versions([User]), version)
 
-# Create your tests here.
+        utilisateur.first_name = 'Alice'
+        with self.captureOnCommitCallbacks(execute=True):
+            utilisateur.save(update_fields=['first_name'])
+        self.assertNotEqual(versions([User]), version)
@@ -10,6 +10,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db.models import Q, Count, Avg
 from drf_spectacular.utils import extend_schema, extend_schema_view
+from accounts.models import User, ProviderProfile
+from tabali_platform.utils.cache import ReponseEnCacheMixin, en_cache
 from .models import Category, Service, ProviderService, ServiceImage
 from .serializers import (
     CategorySerializer, ServiceSerializer, 
@@ -24,13 +26,17 @@ from .serializers import (
     update=extend_schema(summary="Modifier une catégorie", tags=["Services"]),
     destroy=extend_schema(summary="Supprimer une catégorie", tags=["Services"]),
 )
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReponseEnCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des catégories de services.
     """
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    # Réponses en cache (sous-catégories et nombre de services compris)
+    cache_modeles = [Category, Service]
+    cache_public = True
+    cache_ttl = 3600
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['parent', 'is_active']
     search_fields = ['name', 'description']
@@ -42,6 +48,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         description="Récupère toutes les catégories racines (sans parent)"
     )
     @action(detail=False, methods=['get'])
+    @en_cache
     def parents(self, request):
         """Retourne les catégories parentes."""
         categories = self.queryset.filter(parent__isnull=True)
@@ -53,6 +60,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         description="Récupère les sous-catégories d'une catégorie donnée"
     )
     @action(detail=True, methods=['get'])
+    @en_cache
     def enfants(self, request, pk=None):
         """Retourne les sous-catégories."""
         category = self.get_object()
@@ -68,13 +76,17 @@ class CategoryViewSet(viewsets.ModelViewSet):
     update=extend_schema(summary="Modifier un service", tags=["Services"]),
     destroy=extend_schema(summary="Supprimer un service", tags=["Services"]),
 )
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(ReponseEnCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des services.
     """
     queryset = Service.objects.filter(is_active=True).select_related('category')
     serializer_class = ServiceSerializer
     permission_classes = [AllowAny]
+    # Réponses en cache (catégorie, images et prestataires compris)
+    cache_modeles = [Service, Category, ServiceImage, ProviderService]
+    cache_public = True
+    cache_ttls = {'recherche': 120}
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['category', 'service_type', 'pricing_type', 'is_featured']
     search_fields = ['name', 'description', 'category__name']
@@ -86,6 +98,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
         description="Recherche avancée de services avec filtres multiples"
     )
     @action(detail=False, methods=['get'])
+    @en_cache
     def recherche(self, request):
         """Recherche avancée de services."""
         query = request.query_params.get('q', '')
@@ -122,6 +135,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
         description="Récupère les services les plus populaires"
     )
     @action(detail=False, methods=['get'])
+    @en_cache
     def populaires(self, request):
         """Retourne les services les plus populaires."""
         services = self.queryset.order_by('-popularity_score')[:10]
@@ -136,13 +150,18 @@ class ServiceViewSet(viewsets.ModelViewSet):
     update=extend_schema(summary="Modifier un service prestataire", tags=["Services"]),
     destroy=extend_schema(summary="Supprimer un service prestataire", tags=["Services"]),
 )
-class ProviderServiceViewSet(viewsets.ModelViewSet):
+class ProviderServiceViewSet(ReponseEnCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des services des prestataires.
     """
     queryset = ProviderService.objects.filter(is_available=True).select_related('provider', 'service')
     serializer_class = ProviderServiceSerializer
     permission_classes = [AllowAny]
+    # Réponses en cache (prestataire, utilisateur et service compris)
+    cache_modeles = [ProviderService, ProviderProfile, User, Service, Category]
+    # Seul le nom de l'utilisateur est affiché : last_login (à chaque connexion) n'invalide rien
+    cache_champs = {User: ['first_name', 'last_name']}
+    cache_public = True
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['provider', 'service', 'is_available']
     search_fields = ['service__name', 'description', 'provider__business_name']
@@ -154,6 +173,7 @@ class ProviderServiceViewSet(viewsets.ModelViewSet):
         description="Récupère tous les services d'un prestataire spécifique"
     )
     @action(detail=False, methods=['get'])
+    @en_cache
     def by_provider(self, request, provider_id=None):
         """Retourne les services d'un prestataire."""
         if provider_id:
@@ -170,13 +190,16 @@ class ProviderServiceViewSet(viewsets.ModelViewSet):
     update=extend_schema(summary="Modifier une image", tags=["Services"]),
     destroy=extend_schema(summary="Supprimer une image", tags=["Services"]),
 )
-class ServiceImageViewSet(viewsets.ModelViewSet):
+class ServiceImageViewSet(ReponseEnCacheMixin, viewsets.ModelViewSet):
     """
     ViewSet pour la gestion des images de services.
     """
     queryset = ServiceImage.objects.all().select_related('service')
     serializer_class = ServiceImageSerializer
     permission_classes = [AllowAny]
+    cache_modeles = [ServiceImage]
+    cache_public = True
+    cache_ttl = 3600
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['service', 'is_primary']
     ordering_fields = ['order', 'created_at']
@@ -2,6 +2,8 @@
 ASGI config for tabali_platform project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Les connexions WebSocket sont aiguillées vers la diffusion temps réel, le
+reste est servi par Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tabali_platform.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Import après l'initialisation de Django (accès aux modèles)
+from messaging.realtime.consumers import application_temps_reel  # noqa: E402
+
+websocket_routes = {
+    '/ws/temps-reel/': application_temps_reel,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        route = websocket_routes.get(scope['path'])
+        if route is None:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4004})
+            return
+        return await route(scope, receive, send)
+    return await django_application(scope, receive, send)
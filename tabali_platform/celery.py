@@ -33,11 +33,56 @@ app.conf.beat_schedule = {
         'task': 'messaging.tasks.send_reminder_notifications',
         'schedule': 3600.0,  # 1 heure
     },
+    # Livraison des événements de l'outbox (notifications, emails...)
+    'drain-outbox': {
+        'task': 'messaging.tasks.drain_outbox',
+        'schedule': 5.0,  # 5 secondes
+    },
+    # Expédition des emails en file
+    'send-queued-emails': {
+        'task': 'messaging.tasks.send_queued_emails',
+        'schedule': 15.0,  # 15 secondes
+    },
+    # Application des ouvertures d'emails mises en tampon
+    'flush-email-opens': {
+        'task': 'messaging.tasks.flush_email_opens',
+        'schedule': 10.0,  # 10 secondes
+    },
     # Mise à jour des statistiques des prestataires
     'update-provider-stats': {
         'task': 'accounts.tasks.update_provider_statistics',
         'schedule': 21600.0,  # 6 heures
     },
+    # Détection des factures échues et envoi des rappels
+    'detect-overdue-invoices': {
+        'task': 'billing.tasks.detect_overdue_invoices',
+        'schedule': 86400.0,  # 24 heures
+    },
+    # Instantanés des soldes du grand livre
+    'snapshot-balances': {
+        'task': 'billing.tasks.snapshot_balances',
+        'schedule': 3600.0,  # 1 heure
+    },
+    # Partitions mensuelles des historiques
+    'maintain-audit-partitions': {
+        'task': 'historiques.tasks.maintain_audit_partitions',
+        'schedule': 86400.0,  # 1 jour
+    },
+    # Statistiques horaires des historiques
+    'rollup-audit-statistics': {
+        'task': 'historiques.tasks.rollup_audit_statistics',
+        'schedule': 900.0,  # 15 minutes
+    },
+    # Pré-filtre de modération des nouveaux avis
+    'auto-moderate-reviews': {
+        'task': 'reviews.tasks.auto_moderate_reviews',
+        'schedule': 300.0,  # 5 minutes
+    },
+    # Rétention des notifications et des messages
+    'apply-retention-policies': {
+        'task': 'messaging.tasks.apply_retention_policies',
+        'schedule': 86400.0,  # 1 jour
+    },
     # Archivage des réservations anciennes
     'archive-old-reservations': {
         'task': 'reservations.tasks.archive_old_reservations',
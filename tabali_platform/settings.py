@@ -10,6 +10,7 @@ import sys
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -84,6 +85,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'historiques.audit.ContexteAuditMiddleware',
 ]
 
 ROOT_URLCONF = 'tabali_platform.urls'
@@ -109,6 +111,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'tabali_platform.wsgi.application'
+ASGI_APPLICATION = 'tabali_platform.asgi.application'
 
 # ==============================================================================
 # DATABASE CONFIGURATION
@@ -161,7 +164,9 @@ REST_FRAMEWORK = {
     'FORM_METHOD_OVERRIDE': 'POST',
     'FORM_CONTENT_OVERRIDE': 'application/json',
     'URL_FIELD_NAME': 'url',
-    'NUM_PROXIES': None,
+    # Proxys devant l'application (routeur Heroku en production) : l'adresse
+    # du client est lue dans X-Forwarded-For par les throttles
+    'NUM_PROXIES': config('NUM_PROXIES', default=None if DEBUG else 1, cast=int),
 }
 
 # Configuration JWT
@@ -311,14 +316,122 @@ LOGGING = {
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuration spécifique à Tabali Platform
+# Redis partagé par les processus web et les workers (diffusion temps réel)
+REALTIME_REDIS_URL = config('REDIS_URL') or (
+    CELERY_BROKER_URL if os.environ.get('CELERY_BROKER_URL', '').startswith('redis') else None
+)
+
 TABALI_SETTINGS = {
     'MAX_SERVICE_RADIUS_KM': 50,  # Rayon de recherche maximum
     'DEFAULT_SERVICE_RADIUS_KM': 10,  # Rayon par défaut
     'RESERVATION_CANCELLATION_HOURS': 24,  # Heures avant annulation
     'RATING_SCALE': (1, 5),  # Échelle de notation
     'MAX_UPLOAD_SIZE_MB': 10,  # Taille max des fichiers
+    # Diffusion temps réel (WebSocket) : Redis dès qu'il est configuré, les
+    # notifications étant publiées depuis les workers Celery
+    'REALTIME_BACKEND': config(
+        'REALTIME_BACKEND',
+        default='messaging.realtime.backends.RedisBackend' if REALTIME_REDIS_URL
+        else 'messaging.realtime.backends.MemoireBackend'
+    ),
+    'REALTIME_REDIS_URL': REALTIME_REDIS_URL or 'redis://localhost:6379/0',
+    'REALTIME_QUEUE_SIZE': 100,  # Événements en attente par connexion
+    'REALTIME_REPLAY_LIMIT': 500,  # Éléments rattrapés à la reconnexion
+    'REALTIME_HANDSHAKE_TIMEOUT': 10,  # Secondes pour envoyer la trame de reprise
+    'REALTIME_LONGPOLL_TIMEOUT': 25,  # Attente maximale d'un long-poll (secondes)
+    'REALTIME_SSE_DURATION': 300,  # Durée d'un flux SSE avant reconnexion (secondes)
+    'REALTIME_SSE_HEARTBEAT': 15,  # Intervalle des keepalive SSE (secondes)
+    # Facturation
+    'OVERDUE_INVOICES_BATCH_SIZE': 500,  # Factures passées en retard par transaction
+    # Outbox (livraison asynchrone des événements)
+    'OUTBOX_BATCH_SIZE': 200,  # Événements traités par lot
+    'OUTBOX_MAX_RETRIES': 8,  # Tentatives avant échec définitif
+    # Moteur d'envoi des emails
+    'EMAIL_BATCH_SIZE': 200,  # Emails expédiés par connexion SMTP
+    'EMAIL_MAX_RETRIES': 5,  # Tentatives avant échec définitif
+    'EMAIL_CLAIM_LEASE_SECONDS': 600,  # Bail d'un lot réservé avant sa reprise par un autre worker
+    'EMAIL_DEFAULT_DOMAIN_RATE': 600,  # Emails par minute et par domaine
+    'EMAIL_DOMAIN_RATES': {},  # Débits spécifiques, ex. {'gmail.com': 300}
+    # Suivi des ouvertures (pixel)
+    'EMAIL_TRACKING_BUFFER': config(
+        'EMAIL_TRACKING_BUFFER', default='messaging.tracking.TamponMemoire'
+    ),
+    'EMAIL_TRACKING_FLUSH_INTERVAL': 10,  # Secondes entre deux vidages du tampon mémoire
+    # URL publique de l'API, pour le pixel inclus dans la version HTML des emails
+    'EMAIL_TRACKING_BASE_URL': config('EMAIL_TRACKING_BASE_URL', default='http://localhost:8000'),
+    # Rappels des réservations à venir
+    'REMINDER_WINDOW_HOURS': 24,  # Réservations rappelées dans les N heures précédentes
+    'REMINDER_BATCH_SIZE': 5000,  # Réservations traitées par transaction
+    # Flux public des avis
+    'REVIEWS_PUBLIC_PAGE_SIZE': 20,  # Avis par page
+    'REVIEWS_PUBLIC_CACHE_TIMEOUT': 300,  # Durée de vie de la première page en cache (secondes)
+    # Réponses en cache des vues du catalogue
+    'RESPONSE_CACHE_TIMEOUT': 300,  # Durée de vie par défaut (secondes)
+    # Écriture groupée des historiques
+    'AUDIT_BUFFERED': config('AUDIT_BUFFERED', default=True, cast=bool),  # False : un INSERT par événement
+    'AUDIT_BATCH_SIZE': 500,  # Historiques en attente déclenchant un vidage
+    'AUDIT_FLUSH_INTERVAL_MS': 1000,  # Délai maximal avant insertion (millisecondes)
+    'AUDIT_BUFFER_MAX_SIZE': 100000,  # Historiques en attente au maximum (base indisponible)
+    'AUDIT_FLUSH_MAX_BACKOFF_SECONDS': 60,  # Délai maximal entre deux tentatives après un échec
+    'AUDIT_PARTITIONS_AHEAD': 3,  # Partitions mensuelles créées à l'avance
+    'AUDIT_RETENTION_MONTHS': 24,  # Mois complets conservés (None : aucune suppression)
+    'AUDIT_EXPORT_CHUNK_SIZE': 2000,  # Lignes lues par aller-retour lors des exports
+    'AUDIT_ROLLUP_DELAY_SECONDS': 300,  # Délai avant agrégation d'une heure révolue
+    'AUDIT_ROLLUP_REFRESH_HOURS': 24,  # Heures déjà agrégées recalculées à chaque passage (retards)
+    # Détection des anomalies de connexion
+    'AUTH_ANOMALY_WINDOW_SECONDS': 300,  # Fenêtre glissante des compteurs
+    'AUTH_ANOMALY_BUCKET_SECONDS': 10,  # Granularité de la fenêtre
+    'AUTH_ANOMALY_MAX_FAILURES_PER_ACCOUNT': 5,  # Échecs sur un compte déclenchant un blocage
+    'AUTH_ANOMALY_MAX_FAILURES_PER_IP': 20,  # Échecs depuis une adresse déclenchant un blocage
+    'AUTH_ANOMALY_MAX_ACCOUNTS_PER_IP': 10,  # Comptes distincts essayés depuis une adresse
+    'AUTH_ANOMALY_BLOCK_SECONDS': 900,  # Durée d'un blocage
+    'AUTH_ANOMALY_MAX_TRACKED': 100000,  # Adresses et comptes suivis au maximum
+    # Audit automatique des modifications (champs exclus par modèle)
+    'AUDIT_MODELS': {
+        'reservations.Reservation': {'exclus': ['rappel_envoye_le']},
+        'billing.Paiement': {},
+        'billing.Facture': {},
+        'reviews.NoteAvis': {'exclus': ['empreinte_contenu', 'date_verification_auto']},
+    },
+    # Pré-filtre de modération des avis
+    'REVIEWS_BANNED_TERMS': [],  # Termes dont la présence entraîne la modération
+    'REVIEWS_AUTOMOD_DUPLICATE_THRESHOLD': 3,  # Avis au contenu identique à partir duquel ils sont modérés
+    'REVIEWS_AUTOMOD_MIN_DUPLICATE_LENGTH': 20,  # Longueur minimale d'un commentaire comparé
+    'REVIEWS_AUTOMOD_BATCH_SIZE': 2000,  # Avis vérifiés par transaction
+    'REVIEWS_AUTOMOD_WORKERS': 4,  # Processus d'analyse des textes
+    # Rétention des notifications et des messages
+    # Stockage durable des archives (classe de stockage Django, ex. storages.backends.s3.S3Storage) ;
+    # à défaut, dossier local RETENTION_ARCHIVE_DIR, à déclarer persistant hors développement
+    'RETENTION_ARCHIVE_STORAGE': config('RETENTION_ARCHIVE_STORAGE', default=''),
+    'RETENTION_ARCHIVE_STORAGE_OPTIONS': {},  # Arguments du stockage, ex. {'bucket_name': ...}
+    'RETENTION_ARCHIVE_DIR': config('RETENTION_ARCHIVE_DIR', default=str(BASE_DIR / 'archives')),
+    'RETENTION_ARCHIVE_LOCAL_DURABLE': config('RETENTION_ARCHIVE_LOCAL_DURABLE', default=DEBUG, cast=bool),
+    'RETENTION_BATCH_SIZE': 1000,  # Lignes supprimées par transaction
+    'RETENTION_POLICIES': {
+        'notifications_lues': {
+            'modele': 'messaging.Notification',
+            'champ_date': 'date',
+            'age_jours': 90,
+            'filtre': {'statut__in': ['lue', 'archivee']},
+            'action': 'supprimer',
+        },
+        'messages_reservations_closes': {
+            'modele': 'messaging.Messagerie',
+            'champ_date': 'date_envoi',
+            'age_jours': 365,
+            'filtre': {'reservation__status__in': ['completed', 'cancelled', 'cancelled_by_provider']},
+            'action': 'archiver',
+        },
+    },
 }
 
+# Le backend en mémoire ne relie pas les workers Celery (qui publient) aux
+# processus ASGI (qui diffusent) : les notifications n'arriveraient jamais
+if not DEBUG and TABALI_SETTINGS['REALTIME_BACKEND'].endswith('.MemoireBackend'):
+    raise ImproperlyConfigured(
+        "REALTIME_BACKEND en mémoire hors DEBUG : configurez REDIS_URL (ou REALTIME_BACKEND)"
+    )
+
 # API Keys externes
 GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', default='')
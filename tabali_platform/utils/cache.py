@@ -0,0 +1,200 @@
+"""
+Mise en cache des réponses des ViewSets en lecture.
+
+``ReponseEnCacheMixin`` conserve en cache les données des réponses ``GET``
+(``list``, ``retrieve`` et les actions décorées par ``en_cache``). La clé
+est construite à partir :
+
+- de la vue, de l'action et de ses arguments d'URL ;
+- des paramètres de requête normalisés (triés, sans paramètre vide) ;
+- de la portée : publique ou propre à l'utilisateur ;
+- du format de rendu négocié ;
+- du numéro de version de chaque modèle dont dépend la réponse
+  (``cache_modeles``), incrémenté après le commit de chaque enregistrement
+  ou suppression (signaux ``post_save`` / ``post_delete``, voir
+  ``suivre_versions``). Si seuls certains champs d'un modèle sont affichés
+  (``cache_champs``), un ``save(update_fields=...)`` qui n'en touche aucun
+  (``last_login`` à chaque connexion, par exemple) ne l'incrémente pas.
+
+Une modification ne supprime donc aucune entrée : elle change les clés, et
+les anciennes réponses expirent d'elles-mêmes. Une mise à jour qui ne passe
+pas par ``save()`` (``QuerySet.update()``) doit appeler
+``incrementer_version``.
+
+La clé sert aussi d'ETag : un ``If-None-Match`` qui correspond est servi en
+``304`` sans lire les données en cache. Sur un cache chaud, une lecture ne
+coûte qu'un ou deux accès au cache et aucune requête SQL.
+"""
+
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+# Méthodes HTTP dont les réponses sont mises en cache
+METHODES_EN_CACHE = ('GET', 'HEAD')
+
+
+def cle_version(modele):
+    return f"reponses:version:{modele._meta.label_lower}"
+
+
+def versions(modeles):
+    """Numéros de version actuels des modèles, dans l'ordre donné."""
+    cles = [cle_version(modele) for modele in modeles]
+    trouvees = cache.get_many(cles)
+    manquantes = {cle: time.time_ns() for cle in cles if cle not in trouvees}
+    if manquantes:
+        # Version initiale horodatée : une version expulsée du cache ne
+        # retombe pas sur une valeur déjà utilisée par d'anciennes réponses
+        for cle, valeur in manquantes.items():
+            cache.add(cle, valeur, None)
+        trouvees.update(cache.get_many(list(manquantes)))
+    return [trouvees.get(cle, manquantes.get(cle)) for cle in cles]
+
+
+def incrementer_version(*modeles):
+    """Invalide, après le commit, les réponses en cache qui dépendent des modèles."""
+    def incrementer():
+        for modele in modeles:
+            try:
+                cache.incr(cle_version(modele))
+            except ValueError:
+                cache.set(cle_version(modele), time.time_ns(), None)
+
+    transaction.on_commit(incrementer)
+
+
+# Modèle -> champs affichés (None : tous)
+_champs_suivis = {}
+
+
+def _modele_modifie(sender, update_fields=None, **kwargs):
+    champs = _champs_suivis.get(sender)
+    if champs is not None and update_fields is not None and not champs & set(update_fields):
+        return
+    incrementer_version(sender)
+
+
+def suivre_versions(*modeles, champs=None):
+    """
+    Incrémente la version des modèles à chaque enregistrement ou suppression.
+
+    Args:
+        champs: champs affichés par modèle, ex. ``{User: {'first_name'}}`` ;
+            les modèles absents sont suivis sur tous leurs champs
+    """
+    champs = champs or {}
+    for modele in modeles:
+        _champs_suivis[modele] = frozenset(champs[modele]) if modele in champs else None
+        uid = f'version-reponses-{modele._meta.label_lower}'
+        post_save.connect(_modele_modifie, sender=modele, dispatch_uid=uid)
+        post_delete.connect(_modele_modifie, sender=modele, dispatch_uid=uid)
+
+
+def suivre_versions_vues(*vues):
+    """Suit les modèles des vues utilisant ``ReponseEnCacheMixin`` (``cache_modeles`` / ``cache_champs``)."""
+    modeles, champs = set(), {}
+    for vue in vues:
+        for modele in vue.cache_modeles:
+            if modele in vue.cache_champs and champs.get(modele, set()) is not None:
+                champs[modele] = champs.get(modele, set()) | set(vue.cache_champs[modele])
+            else:
+                # Une vue qui affiche tous les champs l'emporte
+                champs[modele] = None
+            modeles.add(modele)
+    suivre_versions(*modeles, champs={modele: c for modele, c in champs.items() if c is not None})
+
+
+def en_cache(action):
+    """Met en cache les réponses d'une action d'un ViewSet utilisant ``ReponseEnCacheMixin``."""
+    @functools.wraps(action)
+    def envelopper(self, request, *args, **kwargs):
+        return self.reponse_en_cache(request, lambda: action(self, request, *args, **kwargs))
+    return envelopper
+
+
+class ReponseEnCacheMixin:
+    """
+    Mixin de ViewSet mettant en cache les réponses en lecture.
+
+    Attributs :
+        cache_modeles: modèles dont dépendent les réponses (par défaut, celui
+            du queryset)
+        cache_champs: champs affichés de certains de ces modèles, ex.
+            ``{User: ['first_name', 'last_name']}``
+        cache_public: vrai si la réponse ne dépend pas de l'utilisateur
+        cache_ttl: durée de vie par défaut, en secondes
+        cache_ttls: durées de vie par action, ex. ``{'retrieve': 600}``
+    """
+
+    cache_modeles = None
+    cache_champs = {}
+    cache_public = False
+    cache_ttl = None
+    cache_ttls = {}
+
+    def get_cache_modeles(self):
+        return self.cache_modeles or [self.queryset.model]
+
+    def get_cache_ttl(self):
+        ttl = self.cache_ttls.get(self.action, self.cache_ttl)
+        if ttl is None:
+            ttl = settings.TABALI_SETTINGS.get('RESPONSE_CACHE_TIMEOUT', 300)
+        return ttl
+
+    def get_cache_portee(self, request):
+        if self.cache_public:
+            return 'public'
+        return f'utilisateur:{request.user.pk}' if request.user.is_authenticated else 'anonyme'
+
+    def get_cache_cle(self, request):
+        parametres = sorted(
+            (nom, sorted(valeurs)) for nom, valeurs in request.query_params.lists()
+            if any(valeurs)
+        )
+        elements = [
+            type(self).__module__, type(self).__qualname__, self.action,
+            repr(sorted(self.kwargs.items())), repr(parametres),
+            self.get_cache_portee(request), request.accepted_renderer.format,
+            # Les URLs de pagination sont absolues
+            request.get_host(),
+            repr(versions(self.get_cache_modeles())),
+        ]
+        empreinte = hashlib.blake2b('\x1f'.join(elements).encode('utf-8'), digest_size=16).hexdigest()
+        return f"reponses:{empreinte}"
+
+    def reponse_en_cache(self, request, calculer):
+        """Réponse en cache pour la requête, à défaut celle de ``calculer()`` mise en cache."""
+        if request.method not in METHODES_EN_CACHE:
+            return calculer()
+        cle = self.get_cache_cle(request)
+        etag = f'"{cle.rsplit(":", 1)[-1]}"'
+        etags_client = request.headers.get('If-None-Match', '').split(',')
+        if etag in [valeur.strip().removeprefix('W/') for valeur in etags_client]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        donnees = cache.get(cle)
+        if donnees is not None:
+            response = Response(donnees)
+        else:
+            response = calculer()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(cle, response.data, self.get_cache_ttl())
+        response['ETag'] = etag
+        return response
+
+    @en_cache
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @en_cache
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
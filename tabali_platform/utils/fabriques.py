@@ -0,0 +1,64 @@
+"""
+Fabriques de données pour les tests des applications.
+
+    from tabali_platform.utils.fabriques import creer_reservation, creer_utilisateur
+"""
+
+import itertools
+
+from django.conf import settings
+from django.test import override_settings
+from django.utils import timezone
+
+_compteur = itertools.count()
+
+
+def reglages(**valeurs):
+    """``override_settings`` de certaines clés de ``TABALI_SETTINGS``."""
+    return override_settings(TABALI_SETTINGS={**settings.TABALI_SETTINGS, **valeurs})
+
+
+def creer_utilisateur(user_type='client', **champs):
+    """Utilisateur avec son profil client ou prestataire."""
+    from accounts.models import ClientProfile, ProviderProfile, User
+
+    numero = next(_compteur)
+    champs.setdefault('first_name', f'Prénom{numero}')
+    champs.setdefault('last_name', f'Nom{numero}')
+    utilisateur = User.objects.create(
+        username=f'utilisateur{numero}', email=f'utilisateur{numero}@exemple.fr',
+        user_type=user_type, **champs
+    )
+    if user_type == User.UserType.CLIENT:
+        ClientProfile.objects.create(user=utilisateur)
+    elif user_type == User.UserType.PROVIDER:
+        ProviderProfile.objects.create(user=utilisateur, hourly_rate=30, siret=f'siret{numero}')
+    return utilisateur
+
+
+def creer_service_prestataire(prestataire=None):
+    """Service (et sa catégorie) proposé par un prestataire."""
+    from services.models import Category, ProviderService, Service
+
+    numero = next(_compteur)
+    prestataire = prestataire or creer_utilisateur('provider')
+    categorie = Category.objects.create(name=f'Catégorie {numero}', slug=f'categorie-{numero}')
+    service = Service.objects.create(name=f'Service {numero}', description='Description', category=categorie)
+    return ProviderService.objects.create(provider=prestataire.provider_profile, service=service)
+
+
+def creer_reservation(client=None, prestataire=None, **champs):
+    """Réservation d'un client auprès d'un prestataire (créés au besoin)."""
+    from reservations.models import Reservation
+
+    client = client or creer_utilisateur('client')
+    prestataire = prestataire or creer_utilisateur('provider')
+    champs.setdefault('scheduled_date', timezone.now())
+    return Reservation.objects.create(
+        client=client.client_profile,
+        provider=prestataire.provider_profile,
+        provider_service=creer_service_prestataire(prestataire),
+        service_address='1 rue de la Paix, Paris',
+        description='Réservation de test',
+        **champs
+    )